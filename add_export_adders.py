@@ -6,6 +6,7 @@ Based on the multiplier rate table provided by user
 
 import sqlite3
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 def add_export_adder_rates():
     """Add Export multiplier adder rates"""
@@ -121,6 +122,7 @@ def add_export_adder_rates():
             print(f"Error processing rate {rate['weight_from']}-{rate['weight_to']}: {e}")
             continue
     
+    bump_rate_card_version(cursor, 'dhl_express_rate_cards', 'add_export_adders')
     conn.commit()
     
     # Verify the new rates
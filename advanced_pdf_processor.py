@@ -11,20 +11,125 @@ This processor extracts charge details from DHL invoice PDFs using:
 
 import os
 import re
+import copy
 import json
+import time
 import sqlite3
 import warnings
-import pickle
+import threading
 import numpy as np
-from typing import Dict, List, Optional, Tuple
-import PyPDF2
-import pdfplumber
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from nltk.stem import PorterStemmer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestClassifier
+from charge_model_registry import (get_charge_model_registry, create_vectorizer, create_classifier,
+                                   create_hashing_vectorizer, ChargeModels, DEFAULT_MODEL_KIND,
+                                   MODEL_KINDS, MODEL_KIND_ONLINE)
+from charge_model_versions import ChargeModelVersions, TRAINING_FULL, TRAINING_INCREMENTAL
+from pdf_text_cache import (get_pdf_text_cache, extract_plain_text_pages, PDFExtraction,
+                            PLAIN_TEXT_ENGINES)
+from pdf_ingestion_pipeline import PDFIngestionPipeline, DEFAULT_PARSE_WORKERS
+
+# Invoice number patterns, in priority order
+INVOICE_NUMBER_PATTERNS = [
+    re.compile(r'Invoice\s*(?:No\.?|Number)?\s*:?\s*([A-Z]\d{7,})', re.IGNORECASE),
+    re.compile(r'Invoice\s*([A-Z]\d{7,})', re.IGNORECASE),
+    re.compile(r'Bill\s*(?:No\.?|Number)?\s*:?\s*([A-Z]\d{7,})', re.IGNORECASE),
+    re.compile(r'Document\s*(?:No\.?|Number)?\s*:?\s*([A-Z]\d{7,})', re.IGNORECASE)
+]
+
+# Charge line patterns, in the order their matches are collected
+CHARGE_PATTERNS = [
+    # Pattern 1: Description followed by amount
+    re.compile(r'([A-Z][^$\n]*?)[\s\-:]+\$?([\d,]+\.?\d*)', re.MULTILINE | re.IGNORECASE),
+    # Pattern 2: Amount followed by description
+    re.compile(r'\$?([\d,]+\.?\d*)[\s\-:]+([A-Z][^$\n]*?)(?=\n|\$|$)', re.MULTILINE | re.IGNORECASE),
+    # Pattern 3: Line item format
+    re.compile(r'(\d+)\.\s+([^$\n]+?)[\s\-:]+\$?([\d,]+\.?\d*)', re.MULTILINE | re.IGNORECASE),
+    # Pattern 4: Table format
+    re.compile(r'([A-Z][^|$\n]*?)\s*\|\s*\$?([\d,]+\.?\d*)', re.MULTILINE | re.IGNORECASE),
+]
+
+# Shipment reference patterns, in priority order per reference
+SHIPMENT_REFERENCE_PATTERNS = {
+    'master_bill': [re.compile(r'Master\s*Bill\s*[:\-]?\s*(\w+)', re.IGNORECASE),
+                    re.compile(r'MAWB\s*[:\-]?\s*(\w+)', re.IGNORECASE)],
+    'house_bill': [re.compile(r'House\s*Bill\s*[:\-]?\s*(\w+)', re.IGNORECASE),
+                   re.compile(r'HAWB\s*[:\-]?\s*(\w+)', re.IGNORECASE)],
+    'shipment_date': [re.compile(r'Shipment\s*Date\s*[:\-]?\s*(\d{4}-\d{2}-\d{2})', re.IGNORECASE),
+                      re.compile(r'Ship\s*Date\s*[:\-]?\s*(\d{2}/\d{2}/\d{4})', re.IGNORECASE)],
+    'origin': [re.compile(r'Origin\s*[:\-]?\s*([A-Z]{3})', re.IGNORECASE),
+               re.compile(r'From\s*[:\-]?\s*([A-Z]{3})', re.IGNORECASE)],
+    'destination': [re.compile(r'Destination\s*[:\-]?\s*([A-Z]{3})', re.IGNORECASE),
+                    re.compile(r'To\s*[:\-]?\s*([A-Z]{3})', re.IGNORECASE)]
+}
+
+# Total amount patterns, in priority order
+TOTAL_AMOUNT_PATTERNS = [
+    re.compile(r'Total\s*[:\-]?\s*([A-Z]{3})?\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Amount\s*Due\s*[:\-]?\s*([A-Z]{3})?\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Invoice\s*Total\s*[:\-]?\s*([A-Z]{3})?\s*\$?([\d,]+\.?\d*)', re.IGNORECASE)
+]
+
+# Characters of the previous page searched again with the next one, so a
+# match across the page break is still found
+PAGE_OVERLAP_CHARS = 200
+
+# Shuffled passes of partial_fit when the online model is trained from scratch
+ONLINE_TRAINING_EPOCHS = 5
+
+
+def iter_page_windows(pages: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """
+    (window, overlap) per non-empty page: the page in the plain_text() format
+    after the last lines of the previous page, overlap being their length.
+    A match that ends within the overlap was already seen on the previous page.
+    """
+    tail = ""
+    for page_text in pages:
+        if not page_text:
+            continue
+        window = tail + page_text + "\n"
+        yield window, len(tail)
+        tail = window[-PAGE_OVERLAP_CHARS:]
+        if len(window) > PAGE_OVERLAP_CHARS and "\n" in tail[:-1]:
+            # Start the overlap on a line boundary
+            tail = tail[tail.index("\n") + 1:]
+
+
+def first_page_matches(patterns: Sequence[re.Pattern], pages: Iterable[str]) -> List[Optional[re.Match]]:
+    """
+    First match of each pattern, as a search of the joined pages would find it,
+    one page at a time. Stops reading pages once patterns[0] has matched, since
+    the callers take the first pattern that matches anywhere.
+    """
+    matches: List[Optional[re.Match]] = [None] * len(patterns)
+    for window, _overlap in iter_page_windows(pages):
+        for position, pattern in enumerate(patterns):
+            if matches[position] is None:
+                matches[position] = pattern.search(window)
+        if matches[0] is not None:
+            break
+    return matches
+
+
+class ChargeRule(NamedTuple):
+    """Keyword rule for one charge type, compiled from charge_type_definitions"""
+    charge_type: str
+    keywords: Tuple[str, ...]    # lower-cased, in definition order
+    pattern: re.Pattern          # matches any of the keywords
+
+
+def compile_charge_rule(charge_type: str, keywords: List[str]) -> ChargeRule:
+    """Build the single case-insensitive alternation regex for a charge type"""
+    lowered = tuple(keyword.lower() for keyword in keywords)
+    # Longest first so overlapping keywords still prefer the more specific one
+    alternatives = sorted({re.escape(keyword) for keyword in lowered}, key=len, reverse=True)
+    pattern = re.compile('|'.join(alternatives) if alternatives else r'(?!)', re.IGNORECASE)
+    return ChargeRule(charge_type, lowered, pattern)
+
 
 # Suppress scikit-learn version warnings
 warnings.filterwarnings('ignore', category=UserWarning, module='sklearn')
@@ -50,10 +155,19 @@ class AdvancedPDFProcessor:
                  upload_folder: str = 'uploads'):
         self.db_path = db_path
         self.upload_folder = upload_folder
+        self.last_text_cache_hit = False
+        self.last_ingestion_stats = {}
         self.stemmer = PorterStemmer()
         self.stop_words = set(stopwords.words('english'))
+        self._charge_rules: Optional[List[ChargeRule]] = None
+        self._charge_rules_lock = threading.Lock()
+        # Models are loaded from the process-wide registry on first classification
+        self.models_path = 'ml_models'
+        self.model_kind = DEFAULT_MODEL_KIND
+        self._charge_models: Optional[ChargeModels] = None
+        self._online_update_lock = threading.Lock()
         self.init_database()
-        self.load_or_create_ml_models()
+        self.model_versions = ChargeModelVersions(db_path)
     
     def init_database(self):
         """Initialize database tables for advanced PDF processing"""
@@ -218,37 +332,36 @@ class AdvancedPDFProcessor:
         conn.commit()
         conn.close()
     
+    @property
+    def charge_models(self) -> ChargeModels:
+        """Vectorizer/classifier pair, loaded (or trained) on first use"""
+        if self._charge_models is None:
+            self.load_or_create_ml_models()
+        return self._charge_models
+    
+    @property
+    def vectorizer(self):
+        return self.charge_models.vectorizer
+    
+    @property
+    def classifier(self):
+        return self.charge_models.classifier
+    
     def load_or_create_ml_models(self):
         """Load existing ML models or create new ones"""
-        self.models_path = 'ml_models'
-        os.makedirs(self.models_path, exist_ok=True)
+        registry = get_charge_model_registry(self.models_path)
+        if registry.is_missing(self.model_kind):
+            # A recent load or retrain found none; classification falls back to rules
+            return
+        models = registry.get(self.model_kind)
         
-        try:
-            # Load vectorizer
-            with open(os.path.join(self.models_path, 'tfidf_vectorizer.pkl'), 'rb') as f:
-                self.vectorizer = pickle.load(f)
-            
-            # Load classifier
-            with open(os.path.join(self.models_path, 'charge_classifier.pkl'), 'rb') as f:
-                self.classifier = pickle.load(f)
-                
-            print("Loaded existing ML models")
-            
-        except FileNotFoundError:
-            # Create new models
-            self.vectorizer = TfidfVectorizer(
-                max_features=1000,
-                stop_words='english',
-                ngram_range=(1, 2)
-            )
-            self.classifier = RandomForestClassifier(
-                n_estimators=100,
-                random_state=42
-            )
-            
+        if models is None:
             # Train with initial data
             self.train_initial_models()
+            models = registry.get(self.model_kind)
             print("Created new ML models")
+        
+        self._charge_models = models
     
     def train_initial_models(self):
         """Train models with initial training data"""
@@ -266,12 +379,32 @@ class AdvancedPDFProcessor:
             # Preprocess descriptions
             processed_descriptions = [self.preprocess_text(desc) for desc in descriptions]
             
-            # Train vectorizer and classifier
-            X = self.vectorizer.fit_transform(processed_descriptions)
-            self.classifier.fit(X, labels)
+            # Train vectorizer and every batch classifier kind on the same features
+            vectorizer = create_vectorizer()
+            X = vectorizer.fit_transform(processed_descriptions)
+            classifiers = {}
+            training_seconds = {}
+            for kind in MODEL_KINDS:
+                start = time.time()
+                try:
+                    if kind == MODEL_KIND_ONLINE:
+                        classifier = self.fit_online_classifier(processed_descriptions, labels)
+                    else:
+                        classifier = create_classifier(kind)
+                        classifier.fit(X, labels)
+                except ValueError as e:
+                    print(f"Could not train {kind} charge classifier: {e}")
+                    continue
+                classifiers[kind] = classifier
+                training_seconds[kind] = time.time() - start
             
-            # Save models
-            self.save_models()
+            # Save models and share them with every processor in this process
+            registry = get_charge_model_registry(self.models_path)
+            registry.put(vectorizer, classifiers)
+            for kind, seconds in training_seconds.items():
+                self.model_versions.record_version(kind, TRAINING_FULL, len(training_data),
+                                                   training_seconds=seconds)
+            self._charge_models = registry.get(self.model_kind)
             print(f"Trained models with {len(training_data)} samples")
     
     def generate_synthetic_training_data(self) -> List[Dict]:
@@ -330,80 +463,175 @@ class AdvancedPDFProcessor:
     
     def save_models(self):
         """Save trained ML models"""
-        with open(os.path.join(self.models_path, 'tfidf_vectorizer.pkl'), 'wb') as f:
-            pickle.dump(self.vectorizer, f)
+        registry = get_charge_model_registry(self.models_path)
+        if self.model_kind == MODEL_KIND_ONLINE:
+            registry.update(self.model_kind, self.classifier)
+        else:
+            registry.put(self.vectorizer, {self.model_kind: self.classifier})
+
+    def get_known_charge_types(self) -> List[str]:
+        """Every charge type the online model should be able to predict"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT charge_type FROM charge_type_definitions
+            UNION SELECT charge_type FROM charge_training_data
+        ''')
+        charge_types = {row[0] for row in cursor.fetchall()}
+        conn.close()
+
+        charge_types.update(item['charge_type'] for item in self.generate_synthetic_training_data())
+        return sorted(charge_types)
+
+    def fit_online_classifier(self, processed_descriptions: List[str], labels: List[str]):
+        """
+        Train the online model from scratch with partial_fit, declaring every
+        known charge type up front so later corrections can be folded in
+        """
+        classes = np.array(sorted(set(self.get_known_charge_types()) | set(labels)))
+        X = create_hashing_vectorizer().transform(processed_descriptions)
+        y = np.array(labels)
+
+        classifier = create_classifier(MODEL_KIND_ONLINE)
+        rng = np.random.RandomState(42)
+        for _ in range(ONLINE_TRAINING_EPOCHS):
+            order = rng.permutation(len(labels))
+            classifier.partial_fit(X[order], y[order], classes=classes)
+        return classifier
+
+    def learn_charge_correction(self, description: str, charge_type: str) -> Dict:
+        """
+        Fold a user correction into the online model with one partial_fit step.
+        A charge type the model has never seen needs a from-scratch retrain.
+        """
+        start = time.time()
+        registry = get_charge_model_registry(self.models_path)
+
+        with self._online_update_lock:
+            models = registry.get(MODEL_KIND_ONLINE)
+            if models is None or charge_type not in models.classifier.classes_:
+                self.train_initial_models()
+                return {'model_kind': MODEL_KIND_ONLINE, 'training_type': TRAINING_FULL,
+                        'version': self.model_versions.current_version(MODEL_KIND_ONLINE),
+                        'seconds': round(time.time() - start, 4)}
+
+            # Update a copy so concurrent classifications never see a half-updated model
+            classifier = copy.deepcopy(models.classifier)
+            X = models.vectorizer.transform([self.preprocess_text(description)])
+            classifier.partial_fit(X, [charge_type])
+            models = registry.update(MODEL_KIND_ONLINE, classifier)
+
+        if self.model_kind == MODEL_KIND_ONLINE:
+            self._charge_models = models
+
+        seconds = time.time() - start
+        version = self.model_versions.record_version(MODEL_KIND_ONLINE, TRAINING_INCREMENTAL, 0,
+                                                     update_rows=1, training_seconds=seconds)
+        return {'model_kind': MODEL_KIND_ONLINE, 'training_type': TRAINING_INCREMENTAL,
+                'version': version, 'seconds': round(seconds, 4)}
+
+    def evaluate_charge_models(self, kinds: Iterable[str] = MODEL_KINDS, limit: int = 500) -> List[Dict]:
+        """
+        A/B compare the current model of each kind on the most recent training
+        rows (manual corrections included): accuracy and items per second
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT charge_description, charge_type FROM charge_training_data
+            WHERE confidence >= 0.8 ORDER BY id DESC LIMIT ?
+        ''', (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        if not rows:
+            return []
+
+        processed = [self.preprocess_text(row[0]) for row in rows]
+        expected = np.array([row[1] for row in rows])
+        registry = get_charge_model_registry(self.models_path)
+
+        results = []
+        for kind in kinds:
+            models = registry.get(kind)
+            if models is None:
+                continue
+            start = time.perf_counter()
+            predictions = models.classifier.predict(models.vectorizer.transform(processed))
+            elapsed = time.perf_counter() - start
+
+            accuracy = float(np.mean(predictions == expected))
+            items_per_second = len(rows) / elapsed if elapsed > 0 else 0.0
+            version = self.model_versions.current_version(kind)
+            self.model_versions.record_evaluation(kind, version, len(rows), accuracy, items_per_second)
+            results.append({'model_kind': kind, 'version': version, 'sample_size': len(rows),
+                            'accuracy': round(accuracy, 4), 'items_per_second': round(items_per_second, 1)})
+        return results
+
+    def extract_pdf(self, pdf_path: str) -> Optional[PDFExtraction]:
+        """Page-level PDF extraction, None when no engine can read the file"""
+        # Parsed pages are cached by file content, so reprocessing skips the parse
+        self.last_text_cache_hit = False
         
-        with open(os.path.join(self.models_path, 'charge_classifier.pkl'), 'wb') as f:
-            pickle.dump(self.classifier, f)
+        try:
+            # Try pdfplumber first (better for tables), fall back to PyPDF2
+            extraction = get_pdf_text_cache(self.db_path).extract_first(pdf_path, PLAIN_TEXT_ENGINES)
+        except Exception as e:
+            print(f"Error extracting text from PDF: {e}")
+            return None
+        
+        self.last_text_cache_hit = extraction.cache_hit
+        return extraction
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from PDF using multiple methods"""
-        text_content = ""
-        
-        try:
-            # Try pdfplumber first (better for tables)
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text + "\n"
-        except:
-            # Fallback to PyPDF2
-            try:
-                with open(pdf_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        text_content += page.extract_text() + "\n"
-            except Exception as e:
-                print(f"Error extracting text from PDF: {e}")
-                return ""
-        
-        return text_content
+        extraction = self.extract_pdf(pdf_path)
+        return extraction.plain_text() if extraction else ""
     
     def extract_charges_with_descriptions(self, text: str) -> List[Dict]:
         """Extract charges with detailed descriptions using advanced patterns"""
-        charges = []
-        
-        # Enhanced patterns for charge extraction
-        charge_patterns = [
-            # Pattern 1: Description followed by amount
-            r'([A-Z][^$\n]*?)[\s\-:]+\$?([\d,]+\.?\d*)',
-            # Pattern 2: Amount followed by description
-            r'\$?([\d,]+\.?\d*)[\s\-:]+([A-Z][^$\n]*?)(?=\n|\$|$)',
-            # Pattern 3: Line item format
-            r'(\d+)\.\s+([^$\n]+?)[\s\-:]+\$?([\d,]+\.?\d*)',
-            # Pattern 4: Table format
-            r'([A-Z][^|$\n]*?)\s*\|\s*\$?([\d,]+\.?\d*)',
-        ]
+        return self.extract_charges_from_pages([text])
+    
+    def extract_charges_from_pages(self, pages: Iterable[str]) -> List[Dict]:
+        """
+        Charge extraction one page at a time. Matches are collected per pattern
+        in document order, as on the joined text, without building that text.
+        """
+        charges_by_pattern: List[List[Dict]] = [[] for _ in CHARGE_PATTERNS]
         
-        for pattern in charge_patterns:
-            matches = re.findall(pattern, text, re.MULTILINE | re.IGNORECASE)
-            for match in matches:
-                if len(match) == 2:
-                    description, amount_str = match
-                elif len(match) == 3:
-                    # Handle numbered items
-                    if match[0].isdigit():
-                        description, amount_str = match[1], match[2]
+        for window, overlap in iter_page_windows(pages):
+            for pattern, pattern_charges in zip(CHARGE_PATTERNS, charges_by_pattern):
+                for match_obj in pattern.finditer(window):
+                    if match_obj.end() <= overlap:
+                        continue
+                    match = match_obj.groups()
+                    if len(match) == 2:
+                        description, amount_str = match
+                    elif len(match) == 3:
+                        # Handle numbered items
+                        if match[0].isdigit():
+                            description, amount_str = match[1], match[2]
+                        else:
+                            description, amount_str = match[0], match[1]
                     else:
-                        description, amount_str = match[0], match[1]
-                else:
-                    continue
-                
-                # Clean and validate
-                description = description.strip()
-                amount_str = amount_str.replace(',', '')
-                
-                try:
-                    amount = float(amount_str)
-                    if amount > 0 and len(description) > 3:
-                        charges.append({
-                            'description': description,
-                            'amount': amount,
-                            'raw_text': f"{description} ${amount_str}"
-                        })
-                except ValueError:
-                    continue
+                        continue
+                    
+                    # Clean and validate
+                    description = description.strip()
+                    amount_str = amount_str.replace(',', '')
+                    
+                    try:
+                        amount = float(amount_str)
+                        if amount > 0 and len(description) > 3:
+                            pattern_charges.append({
+                                'description': description,
+                                'amount': amount,
+                                'raw_text': f"{description} ${amount_str}"
+                            })
+                    except ValueError:
+                        continue
+        
+        charges = [charge for pattern_charges in charges_by_pattern for charge in pattern_charges]
         
         # Remove duplicates and sort by amount
         unique_charges = []
@@ -417,65 +645,76 @@ class AdvancedPDFProcessor:
         
         return unique_charges[:20]  # Limit to top 20 charges
     
-    def classify_charge_with_ml(self, description: str) -> Tuple[str, float]:
-        """Classify charge using ML model"""
+    def classify_charges_with_ml(self, descriptions: List[str]) -> List[Tuple[str, float]]:
+        """Classify charges with the ML model: one transform and one predict_proba for the batch"""
+        if not descriptions:
+            return []
         try:
-            # Preprocess description
-            processed_desc = self.preprocess_text(description)
-            
-            # Vectorize
-            X = self.vectorizer.transform([processed_desc])
+            # Preprocess descriptions
+            processed = [self.preprocess_text(description) for description in descriptions]
             
-            # Predict
-            prediction = self.classifier.predict(X)[0]
-            probabilities = self.classifier.predict_proba(X)[0]
-            confidence = max(probabilities)
+            # Vectorize and predict the whole batch as one matrix
+            X = self.vectorizer.transform(processed)
+            probabilities = self.classifier.predict_proba(X)
+            best = probabilities.argmax(axis=1)
+            predictions = self.classifier.classes_[best]
+            confidences = probabilities[np.arange(len(descriptions)), best]
             
-            return prediction, confidence
+            return [(prediction, float(confidence))
+                    for prediction, confidence in zip(predictions.tolist(), confidences)]
             
         except Exception as e:
             print(f"ML classification error: {e}")
-            return 'unknown', 0.0
+            return [('unknown', 0.0)] * len(descriptions)
+    
+    def classify_charge_with_ml(self, description: str) -> Tuple[str, float]:
+        """Classify charge using ML model"""
+        return self.classify_charges_with_ml([description])[0]
+    
+    def load_charge_rules(self) -> List[ChargeRule]:
+        """Compiled keyword rules, read from charge_type_definitions once per processor"""
+        with self._charge_rules_lock:
+            if self._charge_rules is None:
+                conn = sqlite3.connect(self.db_path)
+                cursor = conn.cursor()
+                cursor.execute('SELECT charge_type, keywords FROM charge_type_definitions')
+                definitions = cursor.fetchall()
+                conn.close()
+                
+                self._charge_rules = [compile_charge_rule(charge_type, json.loads(keywords_json))
+                                      for charge_type, keywords_json in definitions]
+            return self._charge_rules
+    
+    def reload_charge_rules(self):
+        """Pick up edited charge_type_definitions on the next classification"""
+        with self._charge_rules_lock:
+            self._charge_rules = None
     
     def classify_charge_with_rules(self, description: str) -> Tuple[str, float]:
         """Classify charge using rule-based approach"""
         description_lower = description.lower()
         
-        # Get charge type definitions
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT charge_type, keywords FROM charge_type_definitions')
-        definitions = cursor.fetchall()
-        conn.close()
-        
         best_match = None
         best_score = 0
         
-        for charge_type, keywords_json in definitions:
-            keywords = json.loads(keywords_json)
-            score = 0
-            
-            for keyword in keywords:
-                if keyword.lower() in description_lower:
-                    score += 1
+        for rule in self.load_charge_rules():
+            # One regex search rules out most charge types; count keywords only on a hit
+            if not rule.pattern.search(description_lower):
+                continue
+            score = sum(1 for keyword in rule.keywords if keyword in description_lower)
             
             if score > best_score:
                 best_score = score
-                best_match = charge_type
+                best_match = rule.charge_type
         
         confidence = min(best_score / 3.0, 1.0)  # Normalize score
         
         return best_match or 'unknown', confidence
     
-    def classify_charge(self, description: str) -> Dict:
-        """Classify charge using both ML and rules"""
-        # Try ML classification
-        ml_type, ml_confidence = self.classify_charge_with_ml(description)
-        
-        # Try rule-based classification
-        rule_type, rule_confidence = self.classify_charge_with_rules(description)
-        
-        # Combine results
+    @staticmethod
+    def combine_classifications(ml_type: str, ml_confidence: float,
+                                rule_type: str, rule_confidence: float) -> Dict:
+        """Pick between the ML and rule-based classification"""
         if ml_confidence > 0.7:
             final_type = ml_type
             final_confidence = ml_confidence
@@ -502,22 +741,29 @@ class AdvancedPDFProcessor:
             'rule_prediction': rule_type,
             'rule_confidence': rule_confidence
         }
+    
+    def classify_charges(self, descriptions: List[str]) -> List[Dict]:
+        """Classify a batch of charge descriptions using both ML and rules"""
+        ml_results = self.classify_charges_with_ml(descriptions)
+        return [
+            self.combine_classifications(ml_type, ml_confidence, *self.classify_charge_with_rules(description))
+            for description, (ml_type, ml_confidence) in zip(descriptions, ml_results)
+        ]
+    
+    def classify_charge(self, description: str) -> Dict:
+        """Classify charge using both ML and rules"""
+        return self.classify_charges([description])[0]
 
     def extract_shipment_references(self, text: str) -> Dict:
         """Extract shipment references"""
+        return self.extract_shipment_references_from_pages([text])
+    
+    def extract_shipment_references_from_pages(self, pages: List[str]) -> Dict:
+        """Extract shipment references page by page"""
         references = {}
         
-        patterns = {
-            'master_bill': [r'Master\s*Bill\s*[:\-]?\s*(\w+)', r'MAWB\s*[:\-]?\s*(\w+)'],
-            'house_bill': [r'House\s*Bill\s*[:\-]?\s*(\w+)', r'HAWB\s*[:\-]?\s*(\w+)'],
-            'shipment_date': [r'Shipment\s*Date\s*[:\-]?\s*(\d{4}-\d{2}-\d{2})', r'Ship\s*Date\s*[:\-]?\s*(\d{2}/\d{2}/\d{4})'],
-            'origin': [r'Origin\s*[:\-]?\s*([A-Z]{3})', r'From\s*[:\-]?\s*([A-Z]{3})'],
-            'destination': [r'Destination\s*[:\-]?\s*([A-Z]{3})', r'To\s*[:\-]?\s*([A-Z]{3})']
-        }
-        
-        for ref_type, ref_patterns in patterns.items():
-            for pattern in ref_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
+        for ref_type, ref_patterns in SHIPMENT_REFERENCE_PATTERNS.items():
+            for match in first_page_matches(ref_patterns, pages):
                 if match:
                     references[ref_type] = match.group(1)
                     break
@@ -526,14 +772,11 @@ class AdvancedPDFProcessor:
 
     def extract_total_amount(self, text: str) -> Tuple[float, str]:
         """Extract total amount and currency"""
-        total_patterns = [
-            r'Total\s*[:\-]?\s*([A-Z]{3})?\s*\$?([\d,]+\.?\d*)',
-            r'Amount\s*Due\s*[:\-]?\s*([A-Z]{3})?\s*\$?([\d,]+\.?\d*)',
-            r'Invoice\s*Total\s*[:\-]?\s*([A-Z]{3})?\s*\$?([\d,]+\.?\d*)'
-        ]
-        
-        for pattern in total_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        return self.extract_total_amount_from_pages([text])
+    
+    def extract_total_amount_from_pages(self, pages: Iterable[str]) -> Tuple[float, str]:
+        """Extract total amount and currency page by page"""
+        for match in first_page_matches(TOTAL_AMOUNT_PATTERNS, pages):
             if match:
                 currency = match.group(1) if match.group(1) else 'USD'
                 amount_str = match.group(2).replace(',', '')
@@ -547,15 +790,20 @@ class AdvancedPDFProcessor:
 
     def parse_invoice_number(self, text: str) -> Optional[str]:
         """Extract invoice number from PDF text"""
-        patterns = [
-            r'Invoice\s*(?:No\.?|Number)?\s*:?\s*([A-Z]\d{7,})',
-            r'Invoice\s*([A-Z]\d{7,})',
-            r'Bill\s*(?:No\.?|Number)?\s*:?\s*([A-Z]\d{7,})',
-            r'Document\s*(?:No\.?|Number)?\s*:?\s*([A-Z]\d{7,})'
-        ]
+        for pattern in INVOICE_NUMBER_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return match.group(1)
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        return None
+    
+    def parse_invoice_number_from_pages(self, pages: Iterable[str]) -> Optional[str]:
+        """
+        Extract invoice number page by page with the pattern priority of
+        parse_invoice_number, stopping at the first page where the highest
+        priority pattern matches
+        """
+        for match in first_page_matches(INVOICE_NUMBER_PATTERNS, pages):
             if match:
                 return match.group(1)
         
@@ -605,43 +853,81 @@ class AdvancedPDFProcessor:
         
         return None
 
-    def process_uploads_folder(self) -> List[Dict]:
-        """Process all PDFs in uploads folder"""
-        results = []
+    def process_uploads_folder(self, save_fn: Callable = None, extract_workers: int = None,
+                               parse_workers: int = DEFAULT_PARSE_WORKERS) -> List[Dict]:
+        """
+        Process all PDFs in uploads folder through the ingestion pipeline.
         
+        Text extraction runs in a process pool and charge parsing / classification
+        in a thread pool. save_fn(result, pdf_path, filename), when given, is called
+        for every successful result from the pipeline's single DB writer thread.
+        """
         if not os.path.exists(self.upload_folder):
-            return results
+            return []
         
-        for filename in os.listdir(self.upload_folder):
-            if filename.lower().endswith('.pdf'):
-                pdf_path = os.path.join(self.upload_folder, filename)
-                
-                # Try to extract invoice number from filename
-                invoice_match = re.search(r'([A-Z]\d{7,})', filename)
-                invoice_no = invoice_match.group(1) if invoice_match else None
-                
-                result = self.process_pdf_advanced(pdf_path, invoice_no)
-                result['filename'] = filename
-                results.append(result)
+        pdf_paths = [os.path.join(self.upload_folder, filename)
+                     for filename in os.listdir(self.upload_folder)
+                     if filename.lower().endswith('.pdf')]
         
+        def parse(pdf_path: str, extraction) -> Dict:
+            filename = os.path.basename(pdf_path)
+            
+            # Try to extract invoice number from filename
+            invoice_match = re.search(r'([A-Z]\d{7,})', filename)
+            invoice_no = invoice_match.group(1) if invoice_match else None
+            
+            result = self.process_pages_advanced(extraction.pages, invoice_no, extraction.cache_hit)
+            result['filename'] = filename
+            return result
+        
+        def write(batch):
+            for pdf_path, _extraction, result in batch:
+                if result.get('success'):
+                    save_fn(result, pdf_path, result['filename'])
+        
+        def extraction_error(pdf_path: str, error: Exception) -> Dict:
+            print(f"Error extracting text from PDF: {error}")
+            return {'error': 'Could not extract text from PDF', 'filename': os.path.basename(pdf_path)}
+        
+        pipeline = PDFIngestionPipeline(
+            extract_fn=partial(extract_plain_text_pages, db_path=self.db_path),
+            parse_fn=parse,
+            write_fn=write if save_fn else None,
+            error_fn=extraction_error,
+            text_cache=get_pdf_text_cache(self.db_path),
+            extract_workers=extract_workers,
+            parse_workers=parse_workers
+        )
+        results = pipeline.run(pdf_paths)
+        self.last_ingestion_stats = pipeline.last_stats
         return results
 
     def process_pdf_advanced(self, pdf_path: str, invoice_no: str = None) -> Dict:
         """Process PDF with advanced charge extraction and classification"""
+        extraction = self.extract_pdf(pdf_path)
+        if extraction is None:
+            return {'error': 'Could not extract text from PDF'}
+        return self.process_pages_advanced(extraction.pages, invoice_no, extraction.cache_hit)
+
+    def process_pages_advanced(self, pages: List[str], invoice_no: str = None,
+                               text_cache_hit: bool = False) -> Dict:
+        """
+        Charge extraction and classification on already extracted per-page text.
+        Every lookup reads the pages one at a time, so the document is never
+        joined into one string.
+        """
         try:
-            # Extract text
-            text = self.extract_text_from_pdf(pdf_path)
-            if not text:
+            if not any(pages):
                 return {'error': 'Could not extract text from PDF'}
             
             # Parse invoice number if not provided
             if not invoice_no:
-                invoice_no = self.parse_invoice_number(text)
+                invoice_no = self.parse_invoice_number_from_pages(pages)
                 if not invoice_no:
                     return {'error': 'Could not identify invoice number in PDF'}
             
             # Extract charges with descriptions
-            raw_charges = self.extract_charges_with_descriptions(text)
+            raw_charges = self.extract_charges_from_pages(pages)
             
             # Classify each charge
             classified_charges = {}
@@ -649,13 +935,13 @@ class AdvancedPDFProcessor:
             ml_predictions = {}
             unknown_charges = []
             
-            for charge in raw_charges:
+            # Classify every charge in one batch
+            classifications = self.classify_charges([charge['description'] for charge in raw_charges])
+            
+            for charge, classification in zip(raw_charges, classifications):
                 description = charge['description']
                 amount = charge['amount']
                 
-                # Classify the charge
-                classification = self.classify_charge(description)
-                
                 charge_type = classification['charge_type']
                 confidence = classification['confidence']
                 
@@ -684,8 +970,8 @@ class AdvancedPDFProcessor:
             service_type, type_confidence = self.determine_service_type(classified_charges)
             
             # Extract other details
-            references = self.extract_shipment_references(text)
-            total_amount, currency = self.extract_total_amount(text)
+            references = self.extract_shipment_references_from_pages(pages)
+            total_amount, currency = self.extract_total_amount_from_pages(pages)
             
             # Calculate overall confidence
             overall_confidence = self.calculate_overall_confidence(
@@ -695,6 +981,7 @@ class AdvancedPDFProcessor:
             return {
                 'success': True,
                 'invoice_no': invoice_no,
+                'text_cache_hit': text_cache_hit,
                 'charges': classified_charges,
                 'charge_descriptions': charge_descriptions,
                 'references': references,
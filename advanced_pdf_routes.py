@@ -8,6 +8,7 @@ import json
 import sqlite3
 from werkzeug.utils import secure_filename
 from advanced_pdf_processor import AdvancedPDFProcessor
+from charge_model_registry import MODEL_KIND_ONLINE
 
 # Import authentication
 try:
@@ -162,17 +163,14 @@ def pdf_details(invoice_no, user_data=None):
 def process_uploads(user_data=None):
     """Process all PDFs in uploads folder"""
     
-    results = pdf_processor.process_uploads_folder()
+    # Successful results are saved by the pipeline's DB writer as they complete
+    results = pdf_processor.process_uploads_folder(save_fn=save_pdf_details)
     
     processed_count = 0
     error_count = 0
     
     for result in results:
         if result.get('success'):
-            # Save to database
-            filename = result.get('filename', 'unknown.pdf')
-            upload_path = os.path.join('uploads', filename)
-            save_pdf_details(result, upload_path, filename)
             processed_count += 1
         else:
             error_count += 1
@@ -224,12 +222,25 @@ def classify_charge(user_data=None):
         
         conn.commit()
         
-        # Retrain ML model
-        pdf_processor.train_initial_models()
+        # The online model takes the correction incrementally; batch models retrain
+        if pdf_processor.model_kind == MODEL_KIND_ONLINE:
+            model_update = pdf_processor.learn_charge_correction(description, charge_type)
+        else:
+            model_versions = pdf_processor.model_versions
+            previous_version = model_versions.current_version(pdf_processor.model_kind)
+            pdf_processor.train_initial_models()
+            # Report the version the retrain recorded; none means this kind was not retrained
+            model_update = {'model_kind': pdf_processor.model_kind}
+            latest = model_versions.get_versions(pdf_processor.model_kind, limit=1)
+            if latest and latest[0]['version'] != previous_version:
+                model_update.update({'training_type': latest[0]['training_type'],
+                                     'version': latest[0]['version'],
+                                     'seconds': latest[0]['training_seconds']})
         
         return jsonify({
             'success': True,
-            'message': f'Charge classified as {charge_type}'
+            'message': f'Charge classified as {charge_type}',
+            'model_update': model_update
         })
         
     except Exception as e:
@@ -238,6 +249,24 @@ def classify_charge(user_data=None):
     finally:
         conn.close()
 
+@advanced_pdf_bp.route('/advanced-pdf/api/charge-models', methods=['GET', 'POST'])
+@require_auth_api
+def charge_models(user_data=None):
+    """Charge classifier versions and A/B comparison; POST runs a new evaluation"""
+    
+    try:
+        evaluation = pdf_processor.evaluate_charge_models() if request.method == 'POST' else None
+    
+        return jsonify({
+            'active_kind': pdf_processor.model_kind,
+            'evaluation': evaluation,
+            'comparison': pdf_processor.model_versions.get_comparison(),
+            'versions': pdf_processor.model_versions.get_versions(limit=20)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @advanced_pdf_bp.route('/advanced-pdf/audit-comparison/<invoice_no>')
 @require_auth
 def audit_comparison(invoice_no, user_data=None):
@@ -5,9 +5,35 @@ Enhanced auditing for air freight invoices using rate card matching
 
 import sqlite3
 import json
+from collections import defaultdict
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+from location_normalizer import normalize_port_code
+from rate_card_versions import RateCardSubscription
+
+# dhl_ytd_invoices columns read for an air freight audit
+AIR_INVOICE_COLUMNS = """
+    invoice_no, transportation_mode, housebill_origin,
+    housebill_destination, origin, destination,
+    shipment_weight_kg, total_shipment_chargeable_weight_kg,
+    freight_charges_usd, fuel_surcharges_usd,
+    security_surcharges_usd, origin_handling_charges_usd,
+    destination_handling_charges_usd, pickup_charges_usd,
+    delivery_charges_usd, other_charges_usd,
+    origin_customs_charges_usd, destination_customs_charges_usd,
+    duties_and_taxes_usd,
+    total_charges_without_duty_tax_usd,
+    total_charges_with_duty_tax_usd,
+    invoice_currency, exchange_rate_usd
+"""
+
+# Rate entries joined with their rate card, as returned by _find_matching_rate_cards
+AIR_RATE_QUERY = """
+    SELECT ar.*, arc.card_name, arc.validity_start, arc.validity_end
+    FROM air_rate_entries ar
+    JOIN air_rate_cards arc ON ar.rate_card_id = arc.id
+"""
 
 class AirFreightAuditEngine:
     """
@@ -45,6 +71,31 @@ class AirFreightAuditEngine:
             
             # Get invoice data
             invoice_data = self._get_invoice_data(invoice_no)
+            return self._audit_invoice_data(invoice_no, invoice_data, start_time)
+            
+        except Exception as e:
+            return {
+                'audit_status': 'error',
+                'reason': f'Error during audit: {str(e)}',
+                'processing_time_ms': 0
+            }
+    
+    def _audit_invoice_data(self, invoice_no: str, invoice_data: Optional[Dict], start_time: datetime,
+                            rate_index: Dict[Tuple[str, str], List[Dict]] = None) -> Dict:
+        """
+        Audit already loaded invoice data
+        
+        Args:
+            invoice_no: Invoice number being audited
+            invoice_data: Row from _get_invoice_data (None if not found)
+            start_time: When processing of this invoice started
+            rate_index: Preloaded rate cards from load_rate_card_index; when
+                omitted rate cards are queried from the database
+            
+        Returns:
+            Dict containing audit results
+        """
+        try:
             if not invoice_data:
                 return {
                     'audit_status': 'error',
@@ -53,7 +104,7 @@ class AirFreightAuditEngine:
                 }
             
             # Find matching rate cards
-            rate_cards = self._find_matching_rate_cards(invoice_data)
+            rate_cards = self._find_matching_rate_cards(invoice_data, rate_index)
             if not rate_cards:
                 return {
                     'audit_status': 'error',
@@ -164,19 +215,8 @@ class AirFreightAuditEngine:
         cursor = conn.cursor()
         
         try:
-            cursor.execute("""
-                SELECT invoice_no, transportation_mode, housebill_origin, 
-                       housebill_destination, origin, destination, 
-                       shipment_weight_kg, total_shipment_chargeable_weight_kg,
-                       freight_charges_usd, fuel_surcharges_usd, 
-                       security_surcharges_usd, origin_handling_charges_usd, 
-                       destination_handling_charges_usd, pickup_charges_usd, 
-                       delivery_charges_usd, other_charges_usd,
-                       origin_customs_charges_usd, destination_customs_charges_usd,
-                       duties_and_taxes_usd, 
-                       total_charges_without_duty_tax_usd,
-                       total_charges_with_duty_tax_usd,
-                       invoice_currency, exchange_rate_usd
+            cursor.execute(f"""
+                SELECT {AIR_INVOICE_COLUMNS}
                 FROM dhl_ytd_invoices 
                 WHERE invoice_no = ? AND transportation_mode = 'Air'
             """, (invoice_no,))
@@ -193,64 +233,157 @@ class AirFreightAuditEngine:
         finally:
             conn.close()
     
-    def _find_matching_rate_cards(self, invoice_data: Dict) -> List[Dict]:
+    def _find_matching_rate_cards(self, invoice_data: Dict,
+                                  rate_index: Dict[Tuple[str, str], List[Dict]] = None) -> List[Dict]:
         """Find matching rate cards using housebill port codes"""
+        # Canonical port codes from the shared (cached) location normalizer
+        housebill_origin = normalize_port_code(invoice_data.get('housebill_origin', ''))
+        housebill_destination = normalize_port_code(invoice_data.get('housebill_destination', ''))
+        
+        if not housebill_origin or not housebill_destination:
+            return []
+        
+        if rate_index is not None:
+            def lookup(origin: str, destination: str) -> List[Dict]:
+                return list(rate_index.get((origin, destination), ()))
+            return self._match_port_codes(housebill_origin, housebill_destination, lookup)
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            housebill_origin = invoice_data.get('housebill_origin', '')
-            housebill_destination = invoice_data.get('housebill_destination', '')
-            
-            if not housebill_origin or not housebill_destination:
-                return []
+            def lookup(origin: str, destination: str) -> List[Dict]:
+                # Find exact matches using housebill port codes
+                cursor.execute(AIR_RATE_QUERY + """
+                    WHERE ar.origin_port_code = ? AND ar.destination_port_code = ?
+                    ORDER BY ar.lane_id
+                """, (origin, destination))
+                air_columns = [desc[0] for desc in cursor.description]
+                return [dict(zip(air_columns, row)) for row in cursor.fetchall()]
             
-            # Apply port code mappings/exceptions
-            # Map CNPVG (Shanghai Pudong) to CNSHA for the initial query
-            if housebill_origin == 'CNPVG':
-                housebill_origin = 'CNSHA'
+            return self._match_port_codes(housebill_origin, housebill_destination, lookup)
             
-            # Find exact matches using housebill port codes
-            cursor.execute("""
-                SELECT ar.*, arc.card_name, arc.validity_start, arc.validity_end
-                FROM air_rate_entries ar
-                JOIN air_rate_cards arc ON ar.rate_card_id = arc.id
-                WHERE ar.origin_port_code = ? AND ar.destination_port_code = ?
-                ORDER BY ar.lane_id
-            """, (housebill_origin, housebill_destination))
+        finally:
+            conn.close()
+    
+    def _match_port_codes(self, housebill_origin: str, housebill_destination: str, lookup) -> List[Dict]:
+        """Apply the port code mappings/exceptions around a rate lookup"""
+        # Map CNPVG (Shanghai Pudong) to CNSHA for the initial query
+        if housebill_origin == 'CNPVG':
+            housebill_origin = 'CNSHA'
+        
+        matches = lookup(housebill_origin, housebill_destination)
+        
+        # If no matches found and we have an alternate origin code, try again
+        if not matches and housebill_origin == 'CNSHA':
+            # Try with CNPVG as an alternate origin
+            matches = lookup('CNPVG', housebill_destination)
+        
+        return matches
+    
+    def load_rate_card_index(self, conn: sqlite3.Connection = None) -> Dict[Tuple[str, str], List[Dict]]:
+        """
+        Load every air rate entry once, keyed by (origin, destination) port code
+        
+        Entries keep the lane_id order used by the per-invoice query.
+        """
+        own_connection = conn is None
+        if own_connection:
+            conn = sqlite3.connect(self.db_path)
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(AIR_RATE_QUERY + " ORDER BY ar.lane_id")
+            air_columns = [desc[0] for desc in cursor.description]
             
-            matches = []
+            rate_index = defaultdict(list)
             for row in cursor.fetchall():
-                cursor.execute("PRAGMA table_info(air_rate_entries)")
-                air_columns = [col[1] for col in cursor.fetchall()]
-                air_columns.extend(['card_name', 'validity_start', 'validity_end'])
-                
                 rate_data = dict(zip(air_columns, row))
-                matches.append(rate_data)
-            
-            # If no matches found and we have an alternate origin code, try again
-            if not matches and housebill_origin == 'CNSHA':
-                # Try with CNPVG as an alternate origin
-                cursor.execute("""
-                    SELECT ar.*, arc.card_name, arc.validity_start, arc.validity_end
-                    FROM air_rate_entries ar
-                    JOIN air_rate_cards arc ON ar.rate_card_id = arc.id
-                    WHERE ar.origin_port_code = ? AND ar.destination_port_code = ?
-                    ORDER BY ar.lane_id
-                """, ('CNPVG', housebill_destination))
-                
-                for row in cursor.fetchall():
-                    cursor.execute("PRAGMA table_info(air_rate_entries)")
-                    air_columns = [col[1] for col in cursor.fetchall()]
-                    air_columns.extend(['card_name', 'validity_start', 'validity_end'])
-                    
-                    rate_data = dict(zip(air_columns, row))
-                    matches.append(rate_data)
-            
-            return matches
+                key = (rate_data.get('origin_port_code'), rate_data.get('destination_port_code'))
+                rate_index[key].append(rate_data)
+            return dict(rate_index)
+        finally:
+            if own_connection:
+                conn.close()
+    
+    def audit_batch(self, invoice_nos: List[str] = None) -> Dict:
+        """
+        Audit many air freight invoices against preloaded rate cards
+        
+        Invoices are read once over a single connection and the rate card index
+        is reused until an air rate card import bumps its version; the audit
+        loop itself does no per-invoice database work.
+        
+        Args:
+            invoice_nos: Invoices to audit (None = every air invoice)
             
+        Returns:
+            Dict with per-invoice results and throughput statistics
+        """
+        start_time = datetime.now()
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            rate_index = get_air_rate_card_index(self.db_path, conn)
+            invoices = self._get_invoice_data_bulk(conn, invoice_nos)
         finally:
             conn.close()
+        
+        if invoice_nos is None:
+            invoice_nos = list(invoices.keys())
+        
+        loaded_time = datetime.now()
+        results = {}
+        for invoice_no in invoice_nos:
+            results[invoice_no] = self._audit_invoice_data(
+                invoice_no, invoices.get(invoice_no), datetime.now(), rate_index)
+        end_time = datetime.now()
+        
+        audit_seconds = (end_time - loaded_time).total_seconds()
+        total_seconds = (end_time - start_time).total_seconds()
+        return {
+            'total_invoices': len(results),
+            'rate_card_lanes': len(rate_index),
+            'load_time_ms': int((loaded_time - start_time).total_seconds() * 1000),
+            'processing_time_ms': int(total_seconds * 1000),
+            'invoices_per_second': len(results) / audit_seconds if audit_seconds > 0 else 0,
+            'results': results
+        }
+    
+    def _get_invoice_data_bulk(self, conn: sqlite3.Connection,
+                               invoice_nos: List[str] = None) -> Dict[str, Dict]:
+        """Load air invoice rows for many invoices (first row per invoice wins)"""
+        if invoice_nos is not None and not invoice_nos:
+            return {}
+        
+        cursor = conn.cursor()
+        rows = []
+        
+        if invoice_nos is None:
+            cursor.execute(f"""
+                SELECT {AIR_INVOICE_COLUMNS}
+                FROM dhl_ytd_invoices 
+                WHERE transportation_mode = 'Air'
+            """)
+            rows = cursor.fetchall()
+        else:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(invoice_nos), 500):
+                chunk = invoice_nos[i:i + 500]
+                placeholders = ', '.join('?' for _ in chunk)
+                cursor.execute(f"""
+                    SELECT {AIR_INVOICE_COLUMNS}
+                    FROM dhl_ytd_invoices 
+                    WHERE invoice_no IN ({placeholders}) AND transportation_mode = 'Air'
+                """, chunk)
+                rows.extend(cursor.fetchall())
+        
+        columns = [desc[0] for desc in cursor.description]
+        invoices = {}
+        for row in rows:
+            invoice_data = dict(zip(columns, row))
+            invoices.setdefault(invoice_data['invoice_no'], invoice_data)
+        return invoices
     
     def _calculate_charges(self, invoice_data: Dict, rate_card: Dict) -> Dict:
         """Calculate expected charges based on rate card with item-by-item comparison"""
@@ -300,12 +433,6 @@ class AirFreightAuditEngine:
         # For delivery: max(ptd_min_charge, ptd_freight_charge × weight)
         delivery_charge_expected = max(ptd_calculated, ptd_min_charge)
         
-        # Get actual amounts and convert to USD
-        def to_usd(amount):
-            if currency != 'USD' and exchange_rate > 0:
-                return float(amount or 0) * exchange_rate
-            return float(amount or 0)
-        
         # Actual charges from invoice (using correct USD column names)
         freight_actual_usd = float(invoice_data.get('freight_charges_usd') or 0)
         fuel_actual_usd = float(invoice_data.get('fuel_surcharges_usd') or 0)
@@ -459,3 +586,18 @@ class AirFreightAuditEngine:
             },
             'charge_breakdown': charge_breakdown
         }
+
+
+# Rebuilt when import_rate_card bumps the air_rate_cards version
+_rate_card_indexes = RateCardSubscription(
+    ['air_rate_cards'], lambda db_path: AirFreightAuditEngine(db_path).load_rate_card_index())
+
+
+def get_air_rate_card_index(db_path: str, conn: sqlite3.Connection = None) -> Dict[Tuple[str, str], List[Dict]]:
+    """Return the air rate card index for a database, rebuilding it after a rate card import"""
+    return _rate_card_indexes.get(db_path, conn)
+
+
+def invalidate_air_rate_card_index(db_path: str = None):
+    """Drop cached air rate card indexes (all of them when db_path is None)"""
+    _rate_card_indexes.invalidate(db_path)
@@ -18,7 +18,7 @@ Where This File is Used:
 import os
 import sys
 from flask import Flask, session
-from app.database import init_database
+from app.database import DATABASE_NAME, init_database
 from app.routes.rate_card_routes import rate_card_bp
 from app.routes.audit_api import audit_api_bp
 from app.routes.enhanced_audit_routes import audit_bp
@@ -34,6 +34,7 @@ from app.routes.download_routes import download_bp
 from app.routes.validation_routes import validation_bp
 from app.routes.api_routes import api_bp
 from app.utils.template_filters import register_filters
+from upload_dedup_index import get_upload_dedup_index
 
 
 app = Flask(__name__)
@@ -237,4 +238,7 @@ if __name__ == '__main__':
         if not os.path.exists(app.config['DATABASE']):
             init_database()
         
+        # Load upload file hashes and row fingerprints before the first upload
+        get_upload_dedup_index(DATABASE_NAME)
+        
         app.run(debug=True, host='0.0.0.0', port=5000)
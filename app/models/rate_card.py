@@ -7,6 +7,8 @@ import os
 import sqlite3
 import datetime
 
+from rate_card_versions import bump_rate_card_version
+
 def create_rate_card_table():
     """Create the rate_cards table if it doesn't exist."""
     conn = get_db_connection()
@@ -252,6 +254,8 @@ def import_rate_card(file_path, card_name=None):
             
             entries_added += 1
             
+        # Air audits rebuild their cached rate card index on the next batch
+        bump_rate_card_version(conn.cursor(), 'air_rate_cards', os.path.basename(file_path))
         conn.commit()
         conn.close()
         
@@ -7,6 +7,7 @@ import pandas as pd
 import sqlite3
 import re
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 def parse_net_charge(net_charge_str):
     """Parse the net charge string to extract amount, minimum, and percentage"""
@@ -234,6 +235,7 @@ def load_service_charges_to_database(service_charges, db_path='dhl_audit.db'):
             else:
                 loaded_count += 1
         
+        bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'auto_convert_ss_published')
         conn.commit()
         conn.close()
         
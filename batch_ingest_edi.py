@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Batch EDI Ingest Script
+Loads a directory or zip/tar archive of EDI files into the invoice tables:
+files are parsed and validated in parallel worker processes and written by
+one connection with bulk inserts, one transaction per file
+"""
+
+import argparse
+import os
+
+from enhanced_upload_processor import EnhancedEDIProcessor, ProcessingStatus
+
+def main():
+    """Main function to run a batch ingest"""
+    parser = argparse.ArgumentParser(description='Ingest a directory or archive of EDI invoice files')
+    parser.add_argument('source', help='Directory of EDI files, or a .zip/.tar/.tar.gz archive')
+    parser.add_argument('--workers', type=int, default=None, help='Parser processes (default: CPU count)')
+    parser.add_argument('--db-path', type=str, default='dhl_audit.db', help='Path to SQLite database')
+    parser.add_argument('--upload-folder', type=str, default='uploads', help='Where archives are extracted')
+
+    args = parser.parse_args()
+
+    processor = EnhancedEDIProcessor(args.upload_folder)
+    result = processor.ingest_batch(args.source, db_path=args.db_path, workers=args.workers)
+
+    for file_result in result.file_results:
+        if file_result.status != ProcessingStatus.COMPLETED:
+            print(f"⚠️  {os.path.basename(file_result.file_path)}: {file_result.status.value}, "
+                  f"{len(file_result.errors)} errors")
+            for error in file_result.errors[:3]:
+                print(f"     {error}")
+
+    print(f"✅ Ingested {result.invoices_processed} invoices, {result.charges_processed} charges, "
+          f"{result.line_items_processed} line items from {result.files_processed}/{result.files_total} files")
+    print(f"   {result.elapsed_seconds:.2f}s: {result.files_per_second} files/s, "
+          f"{result.invoices_per_second} invoices/s")
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ import time
 import argparse
 from typing import Dict, List, Optional, Any
 from schema_driven_llm_processor import SchemaDrivenLLMProcessor
+from ollama_scheduler import OllamaScheduler, LLMRequest, DEFAULT_PARALLEL_SLOTS
 
 class InvoiceReprocessor:
     """
@@ -30,6 +31,7 @@ class InvoiceReprocessor:
             'total_identified': 0,
             'successfully_reprocessed': 0,
             'failures': 0,
+            'skipped': 0,
             'processing_time': 0
         }
         
@@ -96,6 +98,7 @@ class InvoiceReprocessor:
             return {
                 'invoice_no': invoice_no,
                 'success': False,
+                'skipped': True,
                 'error': 'No raw PDF text available'
             }
         
@@ -106,9 +109,25 @@ class InvoiceReprocessor:
             # Create a custom structured prompt with the exact schema and format examples
             custom_prompt = self.create_custom_prompt(raw_pdf_text)
             
-            # Query the Llama 3.2 model with the enhanced prompt
-            llm_response = self.processor.query_llm(custom_prompt)
-            
+            # Query the Llama 3.2 model with the enhanced prompt (num_ctx sized to it)
+            llm_response = self.processor.query_llm(
+                custom_prompt, self.processor.get_generation_options(custom_prompt))
+        except Exception as e:
+            print(f"❌ Error reprocessing invoice {invoice_no}: {e}")
+            return {
+                'invoice_no': invoice_no,
+                'success': False,
+                'error': str(e)
+            }
+        
+        return self.process_llm_response(invoice_no, llm_response, start_time)
+    
+    def process_llm_response(self, invoice_no: str, llm_response: Optional[str],
+                             start_time: float) -> Dict:
+        """
+        Parse, validate and store one LLM response for an invoice
+        """
+        try:
             if not llm_response:
                 return {
                     'invoice_no': invoice_no,
@@ -655,7 +674,8 @@ NOW EXTRACT FROM THIS INVOICE USING THE EXACT SAME FORMAT AND CLASSIFICATION PAT
 
 RESPONSE (JSON only, no explanations):"""
     
-    def batch_reprocess(self, limit: int = 100, dry_run: bool = False) -> Dict:
+    def batch_reprocess(self, limit: int = 100, dry_run: bool = False,
+                        max_parallel: int = DEFAULT_PARALLEL_SLOTS) -> Dict:
         """
         Batch reprocess incomplete extractions
         """
@@ -674,6 +694,15 @@ RESPONSE (JSON only, no explanations):"""
             
         print(f"✅ LLM connection test successful")
         
+        # The scheduler posts to Ollama directly, so load the model once for the whole batch
+        model_ready, model_message = self.processor.model_manager.ensure_model_ready(self.model_name)
+        if not model_ready:
+            print(f"❌ Model preparation failed: {model_message}")
+            return {
+                'success': False,
+                'error': f"Model preparation failed: {model_message}"
+            }
+        
         # Identify incomplete extractions
         incomplete_invoices = self.identify_incomplete_extractions(limit=limit)
         
@@ -694,36 +723,49 @@ RESPONSE (JSON only, no explanations):"""
                 'stats': self.stats
             }
         
-        # Reprocess each invoice
+        # Reprocess invoices concurrently; responses are parsed and stored one at a time
         start_time = time.time()
-        results = []
+        scheduler = OllamaScheduler(self.processor.ollama_url, max_parallel=max_parallel)
         
-        for invoice in incomplete_invoices:
-            try:
-                invoice_no = invoice['invoice_no']
-                print(f"\n🔄 Processing invoice {invoice_no} ({self.reprocessed_count + 1}/{len(incomplete_invoices)})")
-                print(f"   Missing fields: {', '.join(invoice['missing_fields'])}")
-                
-                result = self.reprocess_invoice(invoice)
-                results.append(result)
-                
+        llm_requests = []
+        results = [None] * len(incomplete_invoices)
+        for index, invoice in enumerate(incomplete_invoices):
+            if not invoice.get('raw_pdf_text'):
+                # Nothing to send to the LLM: skipped, not failed
+                results[index] = self.reprocess_invoice(invoice)
                 self.reprocessed_count += 1
-                if result.get('success', False):
-                    self.stats['successfully_reprocessed'] += 1
-                else:
-                    self.stats['failures'] += 1
-                    
-                # Add a small delay to avoid overloading the LLM service
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"❌ Unexpected error processing invoice: {e}")
+                self.stats['skipped'] += 1
+                continue
+            print(f"   Queued {invoice['invoice_no']} - missing fields: {', '.join(invoice['missing_fields'])}")
+            prompt = self.create_custom_prompt(invoice['raw_pdf_text'])
+            llm_requests.append(LLMRequest(
+                key=index,
+                model=self.model_name,
+                prompt=prompt,
+                options=self.processor.get_generation_options(prompt)
+            ))
+        
+        def on_result(request: LLMRequest, llm_response: Optional[str],
+                      error: Optional[Exception], latency: float) -> Dict:
+            invoice_no = incomplete_invoices[request.key]['invoice_no']
+            self.reprocessed_count += 1
+            print(f"\n🔄 Processing invoice {invoice_no} ({self.reprocessed_count}/{len(incomplete_invoices)})")
+            if error is not None:
+                print(f"❌ Error reprocessing invoice {invoice_no}: {error}")
+                result = {'invoice_no': invoice_no, 'success': False, 'error': str(error)}
+            else:
+                result = self.process_llm_response(invoice_no, llm_response, time.time() - latency)
+            
+            if result.get('success', False):
+                self.stats['successfully_reprocessed'] += 1
+            else:
                 self.stats['failures'] += 1
-                results.append({
-                    'invoice_no': invoice.get('invoice_no', 'Unknown'),
-                    'success': False,
-                    'error': str(e)
-                })
+            return result
+        
+        for request, result in zip(llm_requests, scheduler.run_batch(llm_requests, on_result)):
+            results[request.key] = result
+        
+        self.stats['llm_scheduler'] = scheduler.get_stats()
         
         processing_time = time.time() - start_time
         self.stats['processing_time'] = processing_time
@@ -733,7 +775,11 @@ RESPONSE (JSON only, no explanations):"""
         print(f"   Total identified: {self.stats['total_identified']}")
         print(f"   Successfully reprocessed: {self.stats['successfully_reprocessed']}")
         print(f"   Failures: {self.stats['failures']}")
+        print(f"   Skipped (no PDF text): {self.stats['skipped']}")
         print(f"   Processing time: {processing_time:.2f} seconds")
+        print(f"   LLM requests: {self.stats['llm_scheduler']['requests']} "
+              f"(avg latency {self.stats['llm_scheduler']['avg_latency']:.2f}s, "
+              f"peak concurrency {self.stats['llm_scheduler']['peak_in_flight']})")
         
         return {
             'success': True,
@@ -749,11 +795,13 @@ def main():
     parser.add_argument('--dry-run', action='store_true', help='Perform a dry run without updating the database')
     parser.add_argument('--model', type=str, default='llama3.2:latest', help='LLM model to use')
     parser.add_argument('--db-path', type=str, default='dhl_audit.db', help='Path to SQLite database')
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL_SLOTS,
+                        help='Concurrent LLM requests (match the Ollama server\'s OLLAMA_NUM_PARALLEL)')
     
     args = parser.parse_args()
     
     reprocessor = InvoiceReprocessor(db_path=args.db_path, model_name=args.model)
-    result = reprocessor.batch_reprocess(limit=args.limit, dry_run=args.dry_run)
+    result = reprocessor.batch_reprocess(limit=args.limit, dry_run=args.dry_run, max_parallel=args.parallel)
     
     if result.get('success', False):
         print("✅ Batch reprocessing completed successfully")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark 3rd Party Audit
+=========================
+
+Builds a 3rd party rate card of the shape the Commscope cards have (countries
+in zones 1-8, an 8 x 8 matrix onto rate zones A-H, half-kilo brackets to 30kg
+then whole kilos) in a scratch database, and prices the same invoice lines
+two ways: with the four queries per line _audit_3rd_party_rate used, and with
+the compiled matrix read once per invoice as DHLExpressAuditEngine.audit_invoice
+does (the rate card version query included; audit_batch reads it once per
+batch). Checks that both paths find the same rates and reports the time to
+compile the matrix and the time and lines/s of each path.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+
+from complete_3rd_party_loader import create_3rd_party_tables
+from dhl_express_3rd_party_matrix import ThirdPartyRateMatrix, get_3rd_party_matrix, invalidate_3rd_party_matrix
+
+ZONES = range(1, 9)
+RATE_ZONES = 'ABCDEFGH'
+
+
+def build_card(db_path: str, countries: int, seed: int):
+    """Zones, matrix and rates with a few gaps, so misses are priced too"""
+    rng = random.Random(seed)
+    create_3rd_party_tables(db_path)
+    codes = [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase][:countries]
+    weights = [w / 2 for w in range(1, 61)] + [float(w) for w in range(31, 301)]
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO dhl_express_3rd_party_zones (country_code, zone) VALUES (?, ?)',
+                     [(code, rng.choice(ZONES)) for code in codes[:-5]])
+    conn.executemany('''
+        INSERT INTO dhl_express_3rd_party_matrix (origin_zone, destination_zone, rate_zone)
+        VALUES (?, ?, ?)
+    ''', [(o, d, RATE_ZONES[(o + d) % len(RATE_ZONES)]) for o in ZONES for d in ZONES if (o, d) != (8, 8)])
+    conn.executemany(f'''
+        INSERT INTO dhl_express_3rd_party_rates (weight_kg, {', '.join('zone_' + z.lower() for z in RATE_ZONES)})
+        VALUES ({', '.join(['?'] * (len(RATE_ZONES) + 1))})
+    ''', [(w, *[None if rng.random() < 0.02 else round(20 + w * (3 + i), 2) for i in range(len(RATE_ZONES))])
+          for w in weights])
+    conn.commit()
+    conn.close()
+    return codes, weights
+
+
+def invoice_lines(codes, weights, count: int, seed: int):
+    """(origin, destination, weight) with some weights between brackets"""
+    rng = random.Random(seed + 1)
+    return [(rng.choice(codes), rng.choice(codes),
+             rng.choice(weights) if rng.random() < 0.95 else rng.choice(weights) + 0.25)
+            for _ in range(count)]
+
+
+def price_by_query(conn, origin_country, dest_country, weight):
+    """The zone, matrix and rate queries of _audit_3rd_party_rate"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT zone FROM dhl_express_3rd_party_zones WHERE country_code = ?', (origin_country,))
+    origin_result = cursor.fetchone()
+    cursor.execute('SELECT zone FROM dhl_express_3rd_party_zones WHERE country_code = ?', (dest_country,))
+    dest_result = cursor.fetchone()
+    if not origin_result or not dest_result:
+        return None
+    cursor.execute('''
+        SELECT rate_zone FROM dhl_express_3rd_party_matrix
+        WHERE origin_zone = ? AND destination_zone = ?
+    ''', (origin_result[0], dest_result[0]))
+    matrix_result = cursor.fetchone()
+    if not matrix_result:
+        return None
+    cursor.execute(f"SELECT zone_{matrix_result[0].lower()} FROM dhl_express_3rd_party_rates WHERE weight_kg = ?",
+                   (weight,))
+    rate_result = cursor.fetchone()
+    if not rate_result or rate_result[0] is None:
+        return None
+    return float(rate_result[0])
+
+
+def price_by_matrix(matrix: ThirdPartyRateMatrix, origin_country, dest_country, weight):
+    """The same steps on the compiled matrix"""
+    origin = matrix.zone(origin_country)
+    destination = matrix.zone(dest_country)
+    if origin is None or destination is None or matrix.rate_zone(origin, destination) is None:
+        return None
+    return matrix.rate(origin, destination, weight)
+
+
+def price_by_invoice(db_path: str, conn, lines, lines_per_invoice: int):
+    """The matrix path of the audit: one version read per invoice, then array lookups"""
+    rates = []
+    for start in range(0, len(lines), lines_per_invoice):
+        matrix = get_3rd_party_matrix(db_path, conn)
+        rates.extend(price_by_matrix(matrix, *line) for line in lines[start:start + lines_per_invoice])
+    return rates
+
+
+def report(label: str, lines: int, seconds: float):
+    print(f"{label:<8} {lines:>8} {seconds:>9.4f} {lines / seconds:>12.0f}")
+
+
+def benchmark(lines: int = 20000, lines_per_invoice: int = 5, countries: int = 230, seed: int = 7):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, '3rd_party.db')
+        codes, weights = build_card(db_path, countries, seed)
+        batch = invoice_lines(codes, weights, lines, seed)
+
+        start = time.perf_counter()
+        matrix = ThirdPartyRateMatrix.from_database(db_path)
+        print(f"\nCompiled {len(matrix.country_zones)} countries, {len(matrix.zones)} zones, "
+              f"{len(matrix.weights)} weight brackets in {time.perf_counter() - start:.4f}s\n")
+
+        header = f"{'path':<8} {'lines':>8} {'seconds':>9} {'lines/s':>12}"
+        print(header)
+        print('-' * len(header))
+
+        conn = sqlite3.connect(db_path)
+        start = time.perf_counter()
+        by_query = [price_by_query(conn, *line) for line in batch]
+        report('query', lines, time.perf_counter() - start)
+
+        # The first read compiles the matrix, as the first audit after a reload would
+        invalidate_3rd_party_matrix(db_path)
+        start = time.perf_counter()
+        by_matrix = price_by_invoice(db_path, conn, batch, lines_per_invoice)
+        report('matrix', lines, time.perf_counter() - start)
+        conn.close()
+
+        priced = sum(rate is not None for rate in by_query)
+        print(f"\n{priced} of {lines} lines priced, {lines_per_invoice} lines per invoice; "
+              f"paths agree: {by_query == by_matrix}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark 3rd party rate lookups')
+    parser.add_argument('--lines', type=int, default=20000, help='Invoice lines to price')
+    parser.add_argument('--lines-per-invoice', type=int, default=5,
+                        help='Lines priced per rate card version read')
+    parser.add_argument('--countries', type=int, default=230, help='Countries in the zone mapping')
+    parser.add_argument('--seed', type=int, default=7, help='Seed for the card and the lines')
+    args = parser.parse_args()
+
+    benchmark(args.lines, args.lines_per_invoice, args.countries, args.seed)
+
+
+if __name__ == '__main__':
+    main()
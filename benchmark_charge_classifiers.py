@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark Charge Classifiers
+============================
+
+Compares the random forest charge classifier with the compact linear model and
+the incrementally trained online model on the charge_training_data table: artifact size, load time (pickle, joblib,
+joblib memory-mapped), per-item and batched prediction latency, and held-out
+accuracy.
+"""
+
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+import joblib
+from sklearn.model_selection import train_test_split
+
+from advanced_pdf_processor import AdvancedPDFProcessor
+from charge_model_registry import (create_vectorizer, create_classifier, create_hashing_vectorizer,
+                                   MODEL_KINDS, MODEL_KIND_ONLINE)
+
+
+def time_load(path: str, loader) -> float:
+    start = time.perf_counter()
+    loader(path)
+    return time.perf_counter() - start
+
+
+def benchmark(db_path: str = 'dhl_audit.db', test_size: float = 0.25, latency_items: int = 200):
+    processor = AdvancedPDFProcessor(db_path=db_path)
+
+    training_data = processor.get_training_data()
+    if len(training_data) < 10:
+        print(f"Only {len(training_data)} training rows; adding synthetic examples")
+        training_data.extend(processor.generate_synthetic_training_data())
+
+    descriptions = [processor.preprocess_text(item['description']) for item in training_data]
+    labels = [item['charge_type'] for item in training_data]
+
+    # Stratify when every class has at least two examples
+    label_counts = {label: labels.count(label) for label in set(labels)}
+    stratify = labels if min(label_counts.values()) >= 2 else None
+    train_x, test_x, train_y, test_y = train_test_split(
+        descriptions, labels, test_size=test_size, random_state=42, stratify=stratify
+    )
+
+    tfidf_vectorizer = create_vectorizer()
+    tfidf_vectorizer.fit(train_x)
+    latency_texts = (test_x * (latency_items // max(len(test_x), 1) + 1))[:latency_items]
+
+    print(f"\n{len(train_x)} training / {len(test_x)} held-out descriptions, {len(label_counts)} charge types\n")
+    header = f"{'model':<8} {'size KB':>9} {'pickle ms':>10} {'joblib ms':>10} {'mmap ms':>9} " \
+             f"{'item ms':>9} {'batch ms/item':>14} {'accuracy':>9}"
+    print(header)
+    print('-' * len(header))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in MODEL_KINDS:
+            # The online model uses hashed features and is trained like the processor trains it
+            if kind == MODEL_KIND_ONLINE:
+                vectorizer = create_hashing_vectorizer()
+                classifier = processor.fit_online_classifier(train_x, train_y)
+            else:
+                vectorizer = tfidf_vectorizer
+                classifier = create_classifier(kind)
+                classifier.fit(vectorizer.transform(train_x), train_y)
+            test_matrix = vectorizer.transform(test_x)
+
+            pickle_path = os.path.join(tmp, f'{kind}.pkl')
+            joblib_path = os.path.join(tmp, f'{kind}.joblib')
+            with open(pickle_path, 'wb') as f:
+                pickle.dump(classifier, f)
+            joblib.dump(classifier, joblib_path)
+
+            def load_pickle(path):
+                with open(path, 'rb') as f:
+                    return pickle.load(f)
+
+            pickle_load = time_load(pickle_path, load_pickle)
+            joblib_load = time_load(joblib_path, joblib.load)
+            mmap_load = time_load(joblib_path, lambda path: joblib.load(path, mmap_mode='r'))
+
+            # One description at a time, as the processor used to classify
+            start = time.perf_counter()
+            for text in latency_texts:
+                classifier.predict_proba(vectorizer.transform([text]))
+            item_latency = (time.perf_counter() - start) / len(latency_texts)
+
+            # Whole invoice as one matrix (classify_charges)
+            start = time.perf_counter()
+            classifier.predict_proba(vectorizer.transform(latency_texts))
+            batch_latency = (time.perf_counter() - start) / len(latency_texts)
+
+            accuracy = classifier.score(test_matrix, test_y) if test_y else 0.0
+
+            print(f"{kind:<8} {os.path.getsize(joblib_path) / 1024:>9.1f} {pickle_load * 1000:>10.2f} "
+                  f"{joblib_load * 1000:>10.2f} {mmap_load * 1000:>9.2f} {item_latency * 1000:>9.3f} "
+                  f"{batch_latency * 1000:>14.4f} {accuracy:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark charge classifier models')
+    parser.add_argument('--db', default='dhl_audit.db', help='Database with charge_training_data')
+    parser.add_argument('--test-size', type=float, default=0.25, help='Held-out fraction for accuracy')
+    parser.add_argument('--items', type=int, default=200, help='Descriptions used for latency timing')
+    args = parser.parse_args()
+
+    benchmark(args.db, args.test_size, args.items)
+
+
+if __name__ == '__main__':
+    main()
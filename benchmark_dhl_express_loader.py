@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark DHL Express CSV Loader
+================================
+
+Writes a synthetic DHL Express invoice CSV and loads it into a scratch
+database twice: with the row-at-a-time csv.reader loop load_invoices_from_csv
+used (parse_date and int/float per cell, a duplicate check and an INSERT per
+line) and with the columnar DHLExpressCSVLoader.
+Reports the time to read and parse the file, the total time and rows/s for each.
+"""
+
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from dhl_express_audit_utils import parse_date
+from dhl_express_csv_loader import CSV_COLUMNS, DHLExpressCSVLoader
+from upload_dedup_index import CARRIER_DHL_EXPRESS, get_upload_dedup_index, row_key
+
+# The dhl_express_invoices columns the CSV loader writes, with a line key
+SCHEMA = f'''
+    CREATE TABLE dhl_express_invoices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        {', '.join(f'{column} TEXT' for column in CSV_COLUMNS)},
+        UNIQUE(invoice_no, awb_number, line_number)
+    )
+'''
+
+PRODUCTS = ['EXPRESS WORLDWIDE', 'FUEL SURCHARGE', 'EXPRESS 12:00', 'REMOTE AREA DELIVERY', 'DUTY TAX PAID']
+PLACES = ['SYD', 'MEL', 'BNE', 'HKG', 'LAX', 'FRA', 'SIN']
+
+
+def build_csv(rows: int, path: str, reject_rate: float = 0.001, seed: int = 7) -> int:
+    """Write a header and rows invoice lines, a few with bad amounts; returns the file size in bytes"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Invoice No', 'Invoice Date', 'Company Name', 'Account Number', 'Line Number',
+                         'Item ID', 'DHL Product Description', 'Pal Col', 'Amount', 'Weight Charge',
+                         'Discount Amount', 'Discount Code', 'Tax Amount', 'Tax Code', 'AWB Number',
+                         'Weight', 'Shipper Reference', 'Shipment Date', 'Origin', 'Destination',
+                         'Shipper Details', 'Receiver Details'])
+        for i in range(rows):
+            invoice = i // 40
+            day = 1 + invoice % 28
+            month = 1 + invoice % 12
+            amount = f'{rng.uniform(5, 900):.2f}' if rng.random() >= reject_rate else 'n/a'
+            writer.writerow([
+                f'MELIR{invoice:08d}', f'{day}/{month:02d}/2025', 'ACME PTY LTD', '950000000',
+                str(i % 40 + 1), f'I{i % 9}', rng.choice(PRODUCTS), '1', amount,
+                f'{rng.uniform(1, 300):.2f}', '0', '', f'{rng.uniform(0, 50):.2f}', 'GST',
+                f'{1000000000 + i // 2}', f'{rng.uniform(0.5, 70):.1f}', f'REF{i}',
+                f'{month:02d}/{day:02d}/2025', rng.choice(PLACES), rng.choice(PLACES),
+                'ACME PTY LTD, 1 MAIN ST, SYDNEY NSW 2000, AU', 'RECEIVER LTD, HONG KONG, HK'
+            ])
+    return os.path.getsize(path)
+
+
+def new_database(path: str) -> str:
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def parse_rows(csv_path: str):
+    """The per-row conversions load_invoices_from_csv used to do"""
+    with open(csv_path, 'r', encoding='utf-8') as csvfile:
+        next(csvfile)
+        for row in csv.reader(csvfile):
+            if not any(cell.strip() for cell in row):
+                continue
+            if len(row) < 22:
+                row.extend([''] * (22 - len(row)))
+            try:
+                yield (
+                    row[0].strip(), parse_date(row[1]) if row[1] else None, row[2].strip(), row[3].strip(),
+                    int(row[4]) if row[4].strip().isdigit() else 0, row[5].strip(), row[6].strip(),
+                    int(row[7]) if row[7].strip().isdigit() else 0,
+                    float(row[8]) if row[8].strip() else 0.0, float(row[9]) if row[9].strip() else 0.0,
+                    float(row[10]) if row[10].strip() else 0.0, row[11].strip(),
+                    float(row[12]) if row[12].strip() else 0.0, row[13].strip(), row[14].strip(),
+                    float(row[15]) if row[15].strip() else 0.0, row[16].strip(),
+                    parse_date(row[17]) if row[17] else None, row[18].strip(), row[19].strip(),
+                    row[20].strip(), row[21].strip()
+                )
+            except ValueError:
+                continue
+
+
+def load_row_by_row(csv_path: str, db_path: str) -> int:
+    dedup_index = get_upload_dedup_index(db_path)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    placeholders = ', '.join(['?'] * len(CSV_COLUMNS))
+    inserted_keys = []
+    file_keys = set()
+    for values in parse_rows(csv_path):
+        key = row_key(CARRIER_DHL_EXPRESS, values[0], values[14], values[4])
+        if key in file_keys or dedup_index.is_duplicate_row(*key, conn=conn):
+            continue
+        cursor.execute(f"INSERT OR IGNORE INTO dhl_express_invoices ({', '.join(CSV_COLUMNS)}) "
+                       f"VALUES ({placeholders})", values)
+        if cursor.rowcount > 0:
+            inserted_keys.append(key)
+            file_keys.add(key)
+    dedup_index.add_rows(inserted_keys, None, conn)
+    conn.commit()
+    conn.close()
+    return len(inserted_keys)
+
+
+def report(label: str, rows: int, parse_seconds: float, total_seconds: float, inserted: int):
+    print(f"{label:<10} {inserted:>10} {parse_seconds:>9.2f} {total_seconds:>9.2f} {rows / total_seconds:>10.0f}")
+
+
+def benchmark(rows: int = 1000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'dhl_express.csv')
+        size_bytes = build_csv(rows, csv_path)
+        print(f"\n{rows} invoice lines: {size_bytes / 1024 / 1024:.1f} MB\n")
+
+        header = f"{'mode':<10} {'inserted':>10} {'read s':>9} {'total s':>9} {'rows/s':>10}"
+        print(header)
+        print('-' * len(header))
+
+        start = time.perf_counter()
+        for _values in parse_rows(csv_path):
+            pass
+        parse_seconds = time.perf_counter() - start
+        db_path = new_database(os.path.join(tmp, 'rows.db'))
+        start = time.perf_counter()
+        inserted = load_row_by_row(csv_path, db_path)
+        report('row', rows, parse_seconds, time.perf_counter() - start, inserted)
+
+        db_path = new_database(os.path.join(tmp, 'columnar.db'))
+        loader = DHLExpressCSVLoader(db_path)
+        start = time.perf_counter()
+        loader.read_csv(csv_path)
+        parse_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        result = loader.load(csv_path)
+        report('columnar', rows, parse_seconds, time.perf_counter() - start, result.get('inserted_records', 0))
+        print(f"\ncolumnar rejects: {result.get('error_records', 0)}, duplicates: {result.get('duplicate_records', 0)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DHL Express CSV invoice loading')
+    parser.add_argument('--rows', type=int, default=1000000, help='Synthetic invoice lines to load')
+    args = parser.parse_args()
+
+    benchmark(args.rows)
+
+
+if __name__ == '__main__':
+    main()
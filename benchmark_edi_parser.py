@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark EDI Parser
+====================
+
+Replicates sample_dhl_invoices.edi into a large EDI file and compares parsing
+it as one string (parse_edi_content) with streaming it through iter_invoices:
+throughput in MB/s and invoices/s, and peak Python memory.
+
+With --segments, parses synthetic 210 and 310 files of that many segments and
+reports segment handling throughput in segments/s.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.edi_parser import EDIParser, DEFAULT_BUFFER_SIZE
+
+ISA_HEADER = ('ISA*00*          *00*          *ZZ*DGFAFR         *ZZ*ANDAAUAIR      '
+              '*250630*0425*U*00401*000006764*0*P*>~')
+GS_HEADER = 'GS*IM*DGFAFR*AUOU0003*20250630*0425*6764*X*004010~'
+
+# One transaction set per type, {n} is the control number
+SYNTHETIC_INVOICES = {
+    '210': [
+        'ST*210*{n}', 'B3*INV{n}*PRO{n}', 'B2A*00*SS*REF{n}', 'N1*SH*DHL EXPRESS USA INC',
+        'N3*7101 GATEWAY BLVD', 'N4*HEBRON*KY*41048', 'N1*CN*ACME CORPORATION',
+        'N3*123 BUSINESS PARK DRIVE', 'N4*ATLANTA*GA*30309', 'G62*10*20231215', 'G62*17*20231216',
+        'L0*1***2500*LB***25*PCS', 'L5*1*ELECTRONICS EQUIPMENT', 'L1*1***18575****FC',
+        'L1*2***2250****FSC', 'SE*15*{n}',
+    ],
+    '310': [
+        'ST*310*{n}', 'B3**INV{n}*PRO{n}*PP*20250601*****123456*DGF**FOB',
+        'N1*BT*ANDA PTY*25*AUOU0003', 'N3*1 MAIN ST', 'N4*SYDNEY*NSW*2000*AU', 'N9*BM*BL{n}',
+        'N9*Q8*AB 123', 'R4*L*UN*CNSHA*SHANGHAI', 'R4*D*UN*AUSYD*SYDNEY',
+        'N7*UETU*535655*14014.9*G****0*X**4B******K*2****45G0**FCL', 'L0*1***49*G***1*PCS**K',
+        'L5*1*GENERAL CARGO', 'C3*AUD*.611224*AUD*USD', 'DTM*140*20250611',
+        'L1*1***12345****FRT****OCEAN FREIGHT', 'L1*2***500****BAF****FUEL', 'SE*17*{n}',
+    ],
+}
+
+
+def build_file(sample_path: str, copies: int, path: str) -> int:
+    """Write the sample copies times over; returns the file size in bytes"""
+    with open(sample_path, 'r', encoding='utf-8') as f:
+        sample = f.read().strip()
+    if not sample.endswith('~'):
+        sample += '~'
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(copies):
+            f.write(sample)
+            f.write('\n')
+    return os.path.getsize(path)
+
+
+def build_synthetic_file(transaction_type: str, segments: int, path: str) -> int:
+    """Write ISA/GS headers and transaction sets until the file has segments segments"""
+    template = SYNTHETIC_INVOICES[transaction_type]
+    written = 2
+    control_number = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(ISA_HEADER)
+        f.write(GS_HEADER)
+        while written + len(template) <= segments:
+            control_number += 1
+            n = f'{control_number:09d}'
+            f.write('~'.join(segment.format(n=n) for segment in template))
+            f.write('~')
+            written += len(template)
+    return written
+
+
+def parse_whole(path: str) -> int:
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return len(EDIParser().parse_edi_content(content))
+
+
+def parse_streaming(path: str, buffer_size: int) -> int:
+    count = 0
+    with open(path, 'rb') as f:
+        for _invoice in EDIParser().iter_invoices(f, buffer_size):
+            count += 1
+    return count
+
+
+def measure(label: str, parse, size_bytes: int):
+    start = time.perf_counter()
+    invoices = parse()
+    elapsed = time.perf_counter() - start
+
+    # Separate run: tracemalloc slows parsing down
+    tracemalloc.start()
+    parse()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<10} {invoices:>10} {elapsed:>9.2f} {size_bytes / 1024 / 1024 / elapsed:>8.1f} "
+          f"{invoices / elapsed:>12.0f} {peak / 1024 / 1024:>12.1f}")
+
+
+def benchmark(sample_path: str = 'sample_dhl_invoices.edi', copies: int = 20000,
+              buffer_size: int = DEFAULT_BUFFER_SIZE):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'replicated.edi')
+        size_bytes = build_file(sample_path, copies, path)
+        print(f"\n{copies} copies of {sample_path}: {size_bytes / 1024 / 1024:.1f} MB\n")
+
+        header = f"{'mode':<10} {'invoices':>10} {'seconds':>9} {'MB/s':>8} {'invoices/s':>12} {'peak MB':>12}"
+        print(header)
+        print('-' * len(header))
+        measure('whole', lambda: parse_whole(path), size_bytes)
+        measure('streaming', lambda: parse_streaming(path, buffer_size), size_bytes)
+
+
+def benchmark_segments(segments: int = 1000000, buffer_size: int = DEFAULT_BUFFER_SIZE):
+    with tempfile.TemporaryDirectory() as tmp:
+        header = f"{'type':<6} {'segments':>10} {'invoices':>10} {'seconds':>9} {'segments/s':>12}"
+        print(f"\n{header}")
+        print('-' * len(header))
+        for transaction_type in SYNTHETIC_INVOICES:
+            path = os.path.join(tmp, f'synthetic_{transaction_type}.edi')
+            written = build_synthetic_file(transaction_type, segments, path)
+
+            start = time.perf_counter()
+            invoices = parse_streaming(path, buffer_size)
+            elapsed = time.perf_counter() - start
+
+            print(f"{transaction_type:<6} {written:>10} {invoices:>10} {elapsed:>9.2f} {written / elapsed:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark EDI parsing throughput and memory')
+    parser.add_argument('--sample', default='sample_dhl_invoices.edi', help='EDI file to replicate')
+    parser.add_argument('--copies', type=int, default=20000, help='Times the sample is repeated')
+    parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE,
+                        help='Characters read per buffer when streaming')
+    parser.add_argument('--segments', type=int, help='Benchmark synthetic 210/310 files of this many segments')
+    args = parser.parse_args()
+
+    if args.segments:
+        benchmark_segments(args.segments, args.buffer_size)
+    else:
+        benchmark(args.sample, args.copies, args.buffer_size)
+
+
+if __name__ == '__main__':
+    main()
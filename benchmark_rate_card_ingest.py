@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark Rate Card Ingest
+==========================
+
+Loads the DSV ocean rate card from uploads/ into a scratch database twice:
+with the row-at-a-time loop OceanRateCardProcessor.process_excel_file used
+(whole sheet read, iterrows, a clean call per cell and three INSERTs per row)
+and with the columnar rate_card_ingest path. The same is repeated for a card
+made of copies of the rate sheet, where the per-row costs dominate.
+Reports the time to read the sheet, to clean and insert the rows, the total
+time and rows/s for each.
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from ocean_rate_card_processor import OceanRateCardProcessor
+from rate_card_ingest import EXCEL_ENGINE, NULL_TEXT, find_sheet, open_workbook
+
+DSV_RATE_CARD = os.path.join('uploads', '2025.07.01_Andrew_DSV Ocean Rate Card (2).xlsx')
+
+
+def new_database(path: str, processor: OceanRateCardProcessor) -> str:
+    """The ocean rate card tables, with the columns the processor maps"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE ocean_rate_card_uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, upload_id TEXT, filename TEXT, file_size INTEGER,
+            upload_date TEXT, processed_date TEXT, total_records INTEGER, processed_records INTEGER,
+            failed_records INTEGER, status TEXT
+        )
+    ''')
+    conn.execute(f"CREATE TABLE ocean_rate_cards (id INTEGER PRIMARY KEY AUTOINCREMENT, upload_id TEXT, "
+                 f"{', '.join(processor.main_columns.values())})")
+    conn.execute(f"CREATE TABLE ocean_fcl_charges (id INTEGER PRIMARY KEY AUTOINCREMENT, rate_card_id INTEGER, "
+                 f"{', '.join(processor.fcl_columns.values())})")
+    conn.execute(f"CREATE TABLE ocean_lcl_rates (id INTEGER PRIMARY KEY AUTOINCREMENT, rate_card_id INTEGER, "
+                 f"{', '.join(processor.lcl_columns.values())})")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def rate_sheet(path: str) -> str:
+    processor = OceanRateCardProcessor()
+    mapped = list(processor.main_columns) + list(processor.fcl_columns) + list(processor.lcl_columns)
+    return find_sheet(open_workbook(path), mapped)
+
+
+def build_card(source: str, copies: int, path: str) -> str:
+    """Write the rate sheet of source repeated copies times"""
+    sheet = rate_sheet(source)
+    df = pd.read_excel(source, sheet_name=sheet)
+    pd.concat([df] * copies, ignore_index=True).to_excel(path, sheet_name=sheet, index=False)
+    return path
+
+
+def clean_numeric_value(value):
+    """The per-cell numeric cleaning the row loop used"""
+    if pd.isna(value) or value is None or value == '':
+        return None
+    try:
+        if isinstance(value, str):
+            value = value.strip().replace('$', '').replace(',', '')
+            if value == '' or value.lower() in ['n/a', 'na', 'null']:
+                return None
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def clean_text_value(value):
+    """The per-cell text cleaning the row loop used"""
+    if pd.isna(value) or value is None:
+        return None
+    text = str(value).strip()
+    return None if text.lower() in NULL_TEXT else text
+
+
+def load_row_by_row(processor: OceanRateCardProcessor, df: pd.DataFrame, db_path: str) -> int:
+    """iterrows with three INSERTs per row, as process_excel_file used to"""
+    main_text = set(processor.main_columns.values()) - processor.main_numeric_columns - processor.main_int_columns
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    loaded = 0
+    for _idx, row in df.iterrows():
+        main_data = {'upload_id': 'benchmark'}
+        for excel_col, db_col in processor.main_columns.items():
+            if excel_col in df.columns:
+                if db_col in main_text:
+                    main_data[db_col] = clean_text_value(row[excel_col])
+                else:
+                    val = clean_numeric_value(row[excel_col])
+                    if db_col in processor.main_int_columns and val is not None:
+                        val = int(val)
+                    main_data[db_col] = val
+        cursor.execute(f"INSERT INTO ocean_rate_cards ({', '.join(main_data)}) "
+                       f"VALUES ({', '.join(['?'] * len(main_data))})", list(main_data.values()))
+        rate_card_id = cursor.lastrowid
+
+        fcl_data = {'rate_card_id': rate_card_id}
+        for excel_col, db_col in processor.fcl_columns.items():
+            if excel_col in df.columns:
+                val = clean_numeric_value(row[excel_col])
+                if db_col in processor.fcl_int_columns and val is not None:
+                    val = int(val)
+                fcl_data[db_col] = val
+        cursor.execute(f"INSERT INTO ocean_fcl_charges ({', '.join(fcl_data)}) "
+                       f"VALUES ({', '.join(['?'] * len(fcl_data))})", list(fcl_data.values()))
+
+        lcl_data = {'rate_card_id': rate_card_id}
+        for excel_col, db_col in processor.lcl_columns.items():
+            if excel_col in df.columns:
+                if db_col in processor.lcl_text_columns:
+                    lcl_data[db_col] = clean_text_value(row[excel_col])
+                else:
+                    lcl_data[db_col] = clean_numeric_value(row[excel_col])
+        cursor.execute(f"INSERT INTO ocean_lcl_rates ({', '.join(lcl_data)}) "
+                       f"VALUES ({', '.join(['?'] * len(lcl_data))})", list(lcl_data.values()))
+        loaded += 1
+    conn.commit()
+    conn.close()
+    return loaded
+
+
+def report(label: str, rows: int, read_seconds: float, load_seconds: float):
+    total = read_seconds + load_seconds
+    print(f"{label:<10} {rows:>8} {read_seconds:>8.3f} {load_seconds:>8.3f} {total:>8.3f} {rows / total:>9.0f}")
+
+
+def benchmark_card(path: str, tmp: str):
+    processor = OceanRateCardProcessor()
+    header = f"{'mode':<10} {'rows':>8} {'read s':>8} {'load s':>8} {'total s':>8} {'rows/s':>9}"
+    print(header)
+    print('-' * len(header))
+
+    # Row loop: the whole rate sheet is read, then cleaned and inserted a row at a time
+    start = time.perf_counter()
+    df = pd.read_excel(path, sheet_name=rate_sheet(path))
+    read_seconds = time.perf_counter() - start
+    db_path = new_database(os.path.join(tmp, 'rows.db'), processor)
+    start = time.perf_counter()
+    rows = load_row_by_row(processor, df, db_path)
+    report('row', rows, read_seconds, time.perf_counter() - start)
+
+    # Columnar: the processor times its own phases
+    processor.db_path = new_database(os.path.join(tmp, 'columnar.db'), processor)
+    result = processor.process_excel_file(path)
+    timings = result.get('timings', {})
+    report('columnar', result['processed_records'], timings.get('read', 0.0),
+           timings.get('clean', 0.0) + timings.get('insert', 0.0))
+    print(f"columnar phases: {', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in timings.items())}")
+
+
+def benchmark(path: str = DSV_RATE_CARD, copies: int = 20):
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\nExcel engine: {EXCEL_ENGINE or 'pandas default (openpyxl)'}")
+        print(f"\n{os.path.basename(path)}\n")
+        benchmark_card(path, tmp)
+
+        if copies > 1:
+            large_path = build_card(path, copies, os.path.join(tmp, 'ocean_rate_card_large.xlsx'))
+            print(f"\n{copies} copies of the rate sheet\n")
+            benchmark_card(large_path, tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ocean rate card loading')
+    parser.add_argument('--file', default=DSV_RATE_CARD, help='Ocean rate card workbook')
+    parser.add_argument('--copies', type=int, default=20, help='Copies of the rate sheet in the larger card')
+    args = parser.parse_args()
+
+    benchmark(args.file, args.copies)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Charge Model Registry
+Process-wide, lazily loaded charge classifier artifacts (TF-IDF vectorizer plus a
+random forest or a compact linear classifier, or a hashing vectorizer plus an
+incrementally trained SGD classifier), optionally memory-mapped with joblib
+"""
+
+import os
+import pickle
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+DEFAULT_MODELS_PATH = 'ml_models'
+
+MODEL_KIND_FOREST = 'forest'
+MODEL_KIND_LINEAR = 'linear'
+MODEL_KIND_ONLINE = 'online'
+MODEL_KINDS = (MODEL_KIND_FOREST, MODEL_KIND_LINEAR, MODEL_KIND_ONLINE)
+
+# Which classifier the processors use; the forest stays the default
+DEFAULT_MODEL_KIND = os.environ.get('CHARGE_CLASSIFIER_KIND', MODEL_KIND_FOREST)
+# Memory-map joblib artifacts so worker processes share the numpy arrays (slower to load)
+DEFAULT_MMAP = os.environ.get('CHARGE_MODELS_MMAP', '0') == '1'
+
+VECTORIZER_NAME = 'tfidf_vectorizer'
+CLASSIFIER_NAMES = {
+    MODEL_KIND_FOREST: 'charge_classifier',
+    MODEL_KIND_LINEAR: 'charge_classifier_linear',
+    MODEL_KIND_ONLINE: 'charge_classifier_online',
+}
+
+# Hashed feature space of the online model (coefficients: classes x features)
+ONLINE_HASH_FEATURES = 2 ** 14
+
+# How long a kind found without artifacts (or left out of a retrain) stays missing
+MISSING_RETRY_SECONDS = 300
+
+
+class ChargeModels(NamedTuple):
+    """A fitted vectorizer/classifier pair"""
+    vectorizer: Any
+    classifier: Any
+    kind: str
+    load_seconds: float
+
+
+def create_vectorizer() -> TfidfVectorizer:
+    return TfidfVectorizer(
+        max_features=1000,
+        stop_words='english',
+        ngram_range=(1, 2)
+    )
+
+
+def create_hashing_vectorizer() -> HashingVectorizer:
+    """Stateless vectorizer of the online model: no vocabulary to refit on new data"""
+    return HashingVectorizer(
+        n_features=ONLINE_HASH_FEATURES,
+        stop_words='english',
+        ngram_range=(1, 2),
+        alternate_sign=False
+    )
+
+
+def create_classifier(kind: str = MODEL_KIND_FOREST):
+    """Unfitted classifier of the given kind"""
+    if kind == MODEL_KIND_ONLINE:
+        # Log loss so predict_proba is available; trained with partial_fit
+        return SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+    if kind == MODEL_KIND_LINEAR:
+        # A few KB of coefficients instead of 100 pickled trees
+        return LogisticRegression(max_iter=1000)
+    if kind == MODEL_KIND_FOREST:
+        return RandomForestClassifier(
+            n_estimators=100,
+            random_state=42
+        )
+    raise ValueError(f"Unknown charge classifier kind: {kind}")
+
+
+def load_artifact(models_path: str, name: str, mmap: bool = False):
+    """
+    Load a model artifact. Plain pickle is the fastest to load for these small
+    sklearn objects, so <name>.pkl is preferred; <name>.joblib is used when
+    memory-mapping is requested (or no pickle exists).
+    Raises FileNotFoundError when neither exists.
+    """
+    pickle_path = os.path.join(models_path, f'{name}.pkl')
+    joblib_path = os.path.join(models_path, f'{name}.joblib')
+
+    if mmap and os.path.exists(joblib_path):
+        return joblib.load(joblib_path, mmap_mode='r')
+    if os.path.exists(pickle_path):
+        with open(pickle_path, 'rb') as f:
+            return pickle.load(f)
+    return joblib.load(joblib_path)
+
+
+def save_artifact(models_path: str, name: str, obj):
+    """Write both the joblib artifact and the legacy pickle"""
+    os.makedirs(models_path, exist_ok=True)
+    joblib.dump(obj, os.path.join(models_path, f'{name}.joblib'))
+    with open(os.path.join(models_path, f'{name}.pkl'), 'wb') as f:
+        pickle.dump(obj, f)
+
+
+class ChargeModelRegistry:
+    """
+    Loads each classifier kind at most once per process, on first use.
+    Processors share the loaded objects; retraining swaps in new ones with put().
+    A kind with no artifacts is remembered as missing for MISSING_RETRY_SECONDS,
+    so lookups in that window neither hit the disk nor trigger another retrain.
+    """
+
+    def __init__(self, models_path: str = DEFAULT_MODELS_PATH, mmap: bool = DEFAULT_MMAP):
+        self.models_path = models_path
+        self.mmap = mmap
+        self._models: Dict[str, ChargeModels] = {}
+        # kind -> time.monotonic() when it was found missing
+        self._missing: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _is_missing(self, kind: str) -> bool:
+        missing_at = self._missing.get(kind)
+        return missing_at is not None and time.monotonic() - missing_at < MISSING_RETRY_SECONDS
+
+    def is_missing(self, kind: str = DEFAULT_MODEL_KIND) -> bool:
+        """Whether a recent load or retrain found no models of a kind"""
+        with self._lock:
+            return self._is_missing(kind)
+
+    def get(self, kind: str = DEFAULT_MODEL_KIND) -> Optional[ChargeModels]:
+        """Loaded models of a kind, or None when its artifacts do not exist"""
+        with self._lock:
+            models = self._models.get(kind)
+            if models is None:
+                if self._is_missing(kind):
+                    return None
+                start = time.time()
+                try:
+                    if kind == MODEL_KIND_ONLINE:
+                        vectorizer = create_hashing_vectorizer()
+                    else:
+                        vectorizer = load_artifact(self.models_path, VECTORIZER_NAME, self.mmap)
+                    classifier = load_artifact(self.models_path, CLASSIFIER_NAMES[kind], self.mmap)
+                except FileNotFoundError:
+                    self._missing[kind] = time.monotonic()
+                    return None
+                models = ChargeModels(vectorizer, classifier, kind, time.time() - start)
+                self._models[kind] = models
+                print(f"Loaded {kind} charge classifier in {models.load_seconds:.3f}s")
+            return models
+
+    def put(self, vectorizer, classifiers: Dict[str, Any], save: bool = True):
+        """
+        Register freshly trained models and persist them. The TF-IDF kinds share
+        vectorizer; an online classifier is paired with the hashing vectorizer.
+        """
+        if save:
+            save_artifact(self.models_path, VECTORIZER_NAME, vectorizer)
+            for kind, classifier in classifiers.items():
+                save_artifact(self.models_path, CLASSIFIER_NAMES[kind], classifier)
+
+        with self._lock:
+            # Classifiers of other kinds were fitted on the old vocabulary
+            self._models = {
+                kind: ChargeModels(create_hashing_vectorizer() if kind == MODEL_KIND_ONLINE else vectorizer,
+                                   classifier, kind, 0.0)
+                for kind, classifier in classifiers.items()
+            }
+            # A kind the retrain could not fit keeps its missing mark
+            for kind in classifiers:
+                self._missing.pop(kind, None)
+
+    def update(self, kind: str, classifier, save: bool = True) -> ChargeModels:
+        """
+        Swap in a new classifier of one kind that keeps its current vectorizer
+        (an incrementally updated online model), leaving the other kinds loaded
+        """
+        if save:
+            save_artifact(self.models_path, CLASSIFIER_NAMES[kind], classifier)
+
+        with self._lock:
+            current = self._models.get(kind)
+            if current is not None:
+                vectorizer = current.vectorizer
+            elif kind == MODEL_KIND_ONLINE:
+                vectorizer = create_hashing_vectorizer()
+            else:
+                vectorizer = load_artifact(self.models_path, VECTORIZER_NAME, self.mmap)
+            models = ChargeModels(vectorizer, classifier, kind, 0.0)
+            self._models[kind] = models
+            self._missing.pop(kind, None)
+            return models
+
+    def invalidate(self):
+        """Drop loaded models so the next get() reads the artifacts again"""
+        with self._lock:
+            self._models.clear()
+            self._missing.clear()
+
+
+_registries: Dict[str, ChargeModelRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_charge_model_registry(models_path: str = DEFAULT_MODELS_PATH) -> ChargeModelRegistry:
+    """Return the shared registry for a models directory"""
+    with _registries_lock:
+        registry = _registries.get(models_path)
+        if registry is None:
+            registry = ChargeModelRegistry(models_path)
+            _registries[models_path] = registry
+        return registry
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Charge Model Versions
+Database record of every charge classifier version (full retrains and
+incremental updates) and of evaluations run against them, so models can be
+compared on accuracy and throughput
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+TRAINING_FULL = 'FULL'
+TRAINING_INCREMENTAL = 'INCREMENTAL'
+
+
+class ChargeModelVersions:
+    """Version history and A/B evaluation results per classifier kind"""
+
+    def __init__(self, db_path: str = 'dhl_audit.db'):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create the version and evaluation tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS charge_model_versions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model_kind TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                training_type TEXT,
+                training_rows INTEGER,
+                update_rows INTEGER DEFAULT 0,
+                training_seconds REAL,
+                created_at TEXT,
+                UNIQUE(model_kind, version)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS charge_model_evaluations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model_kind TEXT NOT NULL,
+                version INTEGER,
+                sample_size INTEGER,
+                accuracy REAL,
+                items_per_second REAL,
+                evaluated_at TEXT
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def record_version(self, model_kind: str, training_type: str, training_rows: int,
+                       update_rows: int = 0, training_seconds: float = 0.0) -> int:
+        """Add the next version of a kind and return its number"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO charge_model_versions
+                (model_kind, version, training_type, training_rows, update_rows, training_seconds, created_at)
+                SELECT ?, COALESCE(MAX(version), 0) + 1, ?, ?, ?, ?, ?
+                FROM charge_model_versions WHERE model_kind = ?
+            ''', (model_kind, training_type, training_rows, update_rows,
+                  round(training_seconds, 4), datetime.now().isoformat(), model_kind))
+            cursor.execute('SELECT version FROM charge_model_versions WHERE id = ?', (cursor.lastrowid,))
+            version = cursor.fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+        return version
+
+    def current_version(self, model_kind: str) -> Optional[int]:
+        """Latest version number of a kind, None if it was never trained"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(version) FROM charge_model_versions WHERE model_kind = ?',
+                           (model_kind,))
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def record_evaluation(self, model_kind: str, version: Optional[int], sample_size: int,
+                          accuracy: float, items_per_second: float):
+        """Store one evaluation run"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT INTO charge_model_evaluations
+                (model_kind, version, sample_size, accuracy, items_per_second, evaluated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (model_kind, version, sample_size, round(accuracy, 4),
+                  round(items_per_second, 1), datetime.now().isoformat()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_versions(self, model_kind: str = None, limit: int = 50) -> List[Dict]:
+        """Most recent versions, newest first"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            query = '''
+                SELECT model_kind, version, training_type, training_rows, update_rows,
+                       training_seconds, created_at
+                FROM charge_model_versions
+            '''
+            params: list = []
+            if model_kind:
+                query += ' WHERE model_kind = ?'
+                params.append(model_kind)
+            query += ' ORDER BY id DESC LIMIT ?'
+            params.append(limit)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        return [
+            {
+                'model_kind': row[0],
+                'version': row[1],
+                'training_type': row[2],
+                'training_rows': row[3],
+                'update_rows': row[4],
+                'training_seconds': row[5],
+                'created_at': row[6]
+            }
+            for row in rows
+        ]
+
+    def get_comparison(self) -> List[Dict]:
+        """Latest evaluation of each kind/version, best accuracy first"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT e.model_kind, e.version, e.sample_size, e.accuracy, e.items_per_second, e.evaluated_at
+                FROM charge_model_evaluations e
+                JOIN (
+                    SELECT MAX(id) AS id FROM charge_model_evaluations GROUP BY model_kind, version
+                ) latest ON latest.id = e.id
+                ORDER BY e.accuracy DESC, e.items_per_second DESC
+            ''')
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        return [
+            {
+                'model_kind': row[0],
+                'version': row[1],
+                'sample_size': row[2],
+                'accuracy': row[3],
+                'items_per_second': row[4],
+                'evaluated_at': row[5]
+            }
+            for row in rows
+        ]
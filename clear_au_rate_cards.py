@@ -3,6 +3,7 @@
 Check and clear existing DHL Express AU rate cards before loading CN cards
 """
 import sqlite3
+from rate_card_versions import bump_rate_card_version
 
 def check_existing_rates():
     """Check what rate cards currently exist"""
@@ -47,6 +48,7 @@ def clear_existing_rates():
     cursor.execute('DELETE FROM dhl_express_rate_cards')
     cursor.execute('DELETE FROM dhl_express_rate_cards_new WHERE 1=1')  # Clear new table too if exists
     
+    bump_rate_card_version(cursor, 'dhl_express_rate_cards', 'clear_au_rate_cards')
     conn.commit()
     
     # Verify cleared
@@ -13,6 +13,7 @@ This includes:
 
 import sqlite3
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 class DHLExpressAUCleaner:
     def __init__(self, db_path: str = 'dhl_audit.db'):
@@ -93,7 +94,8 @@ class DHLExpressAUCleaner:
                 print(f"   ⚠️  Error clearing AU zone mappings: {e}")
             
             # 6. Clear any backup tables
-            backup_tables = ['dhl_express_rate_cards_backup', 'dhl_express_services_surcharges_backup']
+            backup_tables = ['dhl_express_rate_cards_backup', 'dhl_express_services_surcharges_backup',
+                             'dhl_express_rate_cards_swap_backup', 'dhl_express_services_surcharges_swap_backup']
             for table in backup_tables:
                 try:
                     cursor.execute(f"SELECT COUNT(*) FROM {table}")
@@ -113,6 +115,8 @@ class DHLExpressAUCleaner:
             except sqlite3.Error as e:
                 print(f"   ⚠️  Error resetting sequences: {e}")
             
+            bump_rate_card_version(cursor, 'dhl_express_rate_cards', 'clear_dhl_express_au_data')
+            bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'clear_dhl_express_au_data')
             conn.commit()
             
             # Verify cleanup
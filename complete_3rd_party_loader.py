@@ -6,10 +6,13 @@ Complete DHL Express 3rd Party Charge Loader
 Loads all 3rd party data into database tables with verified logic.
 """
 
+import os
 import sqlite3
 import pandas as pd
 import numpy as np
 
+from rate_card_versions import DHL_EXPRESS_3RD_PARTY_TABLES, bump_rate_card_version
+
 
 def create_3rd_party_tables(db_path: str):
     """Create the 3rd party tables"""
@@ -64,6 +67,10 @@ def create_3rd_party_tables(db_path: str):
         )
     """)
     
+    # The tables are empty until the loads run; cached lookups must not outlive them
+    for table_name in DHL_EXPRESS_3RD_PARTY_TABLES:
+        bump_rate_card_version(cursor, table_name, 'create_3rd_party_tables')
+    
     conn.commit()
     conn.close()
     print("✅ Created 3rd party tables")
@@ -109,6 +116,7 @@ def load_zone_mappings(excel_path: str, db_path: str):
                 (country_code, zone, region) VALUES (?, ?, ?)
             """, (data['country_code'], data['zone'], data['region']))
         
+        bump_rate_card_version(conn.cursor(), 'dhl_express_3rd_party_zones', os.path.basename(excel_path))
         conn.commit()
         print(f"✅ Loaded {len(zone_data)} zone mappings")
         
@@ -180,6 +188,7 @@ def load_matrix_data(excel_path: str, db_path: str):
                 (origin_zone, destination_zone, rate_zone) VALUES (?, ?, ?)
             """, (data['origin_zone'], data['destination_zone'], data['rate_zone']))
         
+        bump_rate_card_version(conn.cursor(), 'dhl_express_3rd_party_matrix', os.path.basename(excel_path))
         conn.commit()
         print(f"✅ Loaded {len(matrix_data)} matrix entries")
         
@@ -261,6 +270,7 @@ def load_rate_data(excel_path: str, db_path: str):
                 data.get('zone_h')
             ))
         
+        bump_rate_card_version(conn.cursor(), 'dhl_express_3rd_party_rates', os.path.basename(excel_path))
         conn.commit()
         print(f"✅ Loaded {len(rate_data)} rate entries")
         
@@ -13,59 +13,81 @@ Each with:
 3. Multiplier rate per 0.5 KG from 30.1 KG
 """
 
+import os
+import numpy as np
 import pandas as pd
 import sqlite3
 import re
 from datetime import datetime
 from typing import Dict, List, Tuple
 
+from multiplier_range_protection import critical_multiplier_checks
+from rate_card_ingest import float_values, label_rows, open_workbook, read_sheet, zone_rates
+from rate_card_swap import ShadowCheck, ShadowTableSwap
+
+# Zone columns loaded per rate row (Import sheets have a 10th zone, which is dropped)
+ZONE_COUNT = 9
+
+RATE_CARD_TABLE = 'dhl_express_rate_cards'
+
+# Rate card schema (19 zones); {table} is the live or shadow table name
+RATE_CARD_TABLE_SQL = '''
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        service_type VARCHAR(20) NOT NULL,  -- 'Import' or 'Export'
+        rate_section VARCHAR(50) NOT NULL,  -- 'Documents', 'Non-documents', 'Multiplier'
+        weight_from DECIMAL(10,3) NOT NULL,
+        weight_to DECIMAL(10,3) NOT NULL,
+        zone_1 DECIMAL(10,2),
+        zone_2 DECIMAL(10,2),
+        zone_3 DECIMAL(10,2),
+        zone_4 DECIMAL(10,2),
+        zone_5 DECIMAL(10,2),
+        zone_6 DECIMAL(10,2),
+        zone_7 DECIMAL(10,2),
+        zone_8 DECIMAL(10,2),
+        zone_9 DECIMAL(10,2),
+        zone_10 DECIMAL(10,2),
+        zone_11 DECIMAL(10,2),
+        zone_12 DECIMAL(10,2),
+        zone_13 DECIMAL(10,2),
+        zone_14 DECIMAL(10,2),
+        zone_15 DECIMAL(10,2),
+        zone_16 DECIMAL(10,2),
+        zone_17 DECIMAL(10,2),
+        zone_18 DECIMAL(10,2),
+        zone_19 DECIMAL(10,2),
+        is_multiplier BOOLEAN DEFAULT FALSE,
+        weight_range_from DECIMAL(10,3),  -- For multiplier ranges
+        weight_range_to DECIMAL(10,3),    -- For multiplier ranges
+        created_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def rate_card_checks(service_types=('Import', 'Export')) -> List[ShadowCheck]:
+    """Sections every DHL Express rate card load must produce before it replaces the live card"""
+    checks = []
+    for service_type in service_types:
+        checks += [
+            ShadowCheck(f'{service_type} Documents rates',
+                        "service_type = ? AND rate_section = 'Documents'", (service_type,), 4),
+            ShadowCheck(f'{service_type} Non-documents from 0.5 KG',
+                        "service_type = ? AND rate_section = 'Non-documents' AND weight_from <= 0.5", (service_type,)),
+            ShadowCheck(f'{service_type} Non-documents up to 30 KG',
+                        "service_type = ? AND rate_section = 'Non-documents' AND weight_to >= 30", (service_type,))
+        ]
+    return checks
+
 class DHLExpressRateCardLoader:
     def __init__(self, db_path: str = 'dhl_audit.db'):
         self.db_path = db_path
+        # Rates are loaded into a shadow table, then swapped in
+        self.swap = ShadowTableSwap(db_path, RATE_CARD_TABLE, RATE_CARD_TABLE_SQL)
         
     def init_rate_card_table(self):
-        """Initialize the DHL Express rate card table with proper structure"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Drop existing table and recreate with proper structure
-        cursor.execute('DROP TABLE IF EXISTS dhl_express_rate_cards_new')
-        
-        cursor.execute('''
-            CREATE TABLE dhl_express_rate_cards_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                service_type VARCHAR(20) NOT NULL,  -- 'Import' or 'Export'
-                rate_section VARCHAR(50) NOT NULL,  -- 'Documents', 'Non-documents', 'Multiplier'
-                weight_from DECIMAL(10,3) NOT NULL,
-                weight_to DECIMAL(10,3) NOT NULL,
-                zone_1 DECIMAL(10,2),
-                zone_2 DECIMAL(10,2),
-                zone_3 DECIMAL(10,2),
-                zone_4 DECIMAL(10,2),
-                zone_5 DECIMAL(10,2),
-                zone_6 DECIMAL(10,2),
-                zone_7 DECIMAL(10,2),
-                zone_8 DECIMAL(10,2),
-                zone_9 DECIMAL(10,2),
-                zone_10 DECIMAL(10,2),
-                zone_11 DECIMAL(10,2),
-                zone_12 DECIMAL(10,2),
-                zone_13 DECIMAL(10,2),
-                zone_14 DECIMAL(10,2),
-                zone_15 DECIMAL(10,2),
-                zone_16 DECIMAL(10,2),
-                zone_17 DECIMAL(10,2),
-                zone_18 DECIMAL(10,2),
-                zone_19 DECIMAL(10,2),
-                is_multiplier BOOLEAN DEFAULT FALSE,
-                weight_range_from DECIMAL(10,3),  -- For multiplier ranges
-                weight_range_to DECIMAL(10,3),    -- For multiplier ranges
-                created_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Create an empty shadow rate card table for the load to write into"""
+        self.swap.create_shadow()
         print("Initialized new DHL Express rate card table structure with 19 zones")
     
     def load_complete_rate_cards(self, excel_path: str) -> Dict:
@@ -79,25 +101,29 @@ class DHLExpressRateCardLoader:
                 'errors': []
             }
             
-            # Initialize table
+            # Initialize the shadow table
             self.init_rate_card_table()
             
+            # Both sheets are read from one open workbook
+            workbook = open_workbook(excel_path)
+            
             # Load Import rates (AU TD IMP WW)
-            import_count = self._load_service_rates(excel_path, 'AU TD Imp WW', 'Import')
+            import_count = self._load_service_rates(workbook, 'AU TD Imp WW', 'Import')
             results['import_rates_loaded'] = import_count
             
             # Load Export rates (AU TD EXP WW)  
-            export_count = self._load_service_rates(excel_path, 'AU TD Exp WW', 'Export')
+            export_count = self._load_service_rates(workbook, 'AU TD Exp WW', 'Export')
             results['export_rates_loaded'] = export_count
             
             results['sections_processed'] = 6  # 3 sections each for Import and Export
             
-            # Replace old table with new one
-            self._replace_rate_card_table()
+            # Validate the new rates and replace the live table with them
+            results['rate_card_version'] = self._replace_rate_card_table(os.path.basename(excel_path))
             
             return results
             
         except Exception as e:
+            self.swap.discard()
             return {
                 'success': False,
                 'error': f'Failed to load rate cards: {str(e)}',
@@ -105,12 +131,12 @@ class DHLExpressRateCardLoader:
                 'export_rates_loaded': 0
             }
     
-    def _load_service_rates(self, excel_path: str, sheet_name: str, service_type: str) -> int:
+    def _load_service_rates(self, workbook, sheet_name: str, service_type: str) -> int:
         """Load rates for a specific service (Import or Export)"""
         print(f"Loading {service_type} rates from sheet: {sheet_name}")
         
         # Read the Excel sheet
-        df = pd.read_excel(excel_path, sheet_name=sheet_name, header=None)
+        df = read_sheet(workbook, sheet_name, header=None)
         
         total_loaded = 0
         
@@ -131,267 +157,133 @@ class DHLExpressRateCardLoader:
         
         return total_loaded
     
-    def _load_documents_section(self, df: pd.DataFrame, service_type: str) -> int:
-        """Load Section 1: Documents up to 2.0 KG"""
+    def _section_row(self, df: pd.DataFrame, label: str):
+        """Row of the first column-0 cell containing label, or None"""
+        if df.empty:
+            return None
+        rows = label_rows(df[0], label)
+        return int(rows[0]) if len(rows) else None
+    
+    def _insert_rates(self, rows: List[tuple], multiplier: bool = False) -> int:
+        """executemany the rate rows (service, section, weight from/to, zones[, multiplier range])"""
+        if not rows:
+            return 0
+        columns = ['service_type', 'rate_section', 'weight_from', 'weight_to'] + \
+            [f'zone_{zone}' for zone in range(1, ZONE_COUNT + 1)]
+        if multiplier:
+            columns += ['is_multiplier', 'weight_range_from', 'weight_range_to']
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
+        cursor.executemany(f"""
+            INSERT INTO {self.swap.shadow_table} ({', '.join(columns)})
+            VALUES ({', '.join(['?'] * len(columns))})
+        """, rows)
+        conn.commit()
+        conn.close()
+        return len(rows)
+    
+    def _load_documents_section(self, df: pd.DataFrame, service_type: str) -> int:
+        """Load Section 1: Documents up to 2.0 KG"""
         # Find the "Documents up to 2.0 KG" section
-        doc_section_row = None
-        for idx, row in df.iterrows():
-            if pd.notna(row[0]) and "Documents up to 2.0" in str(row[0]):
-                doc_section_row = idx
-                break
+        doc_section_row = self._section_row(df, "Documents up to 2.0")
         
         if doc_section_row is None:
             print(f"  Warning: Documents section not found in {service_type}")
-            conn.close()
             return 0
         
-        # The header row should be next (KG, Zone 1, Zone 2, etc.)
+        # The header row should be next (KG, Zone 1, Zone 2, etc.), then one row per weight point
         header_row = doc_section_row + 1
-        
-        # Define the weight points for documents section
         doc_weights = [0.5, 1.0, 1.5, 2.0]
-        
-        loaded_count = 0
-        
-        for i, weight in enumerate(doc_weights):
-            data_row = header_row + 1 + i
-            
-            if data_row < len(df):
-                row_data = df.iloc[data_row]
-                
-                # Extract zone rates (columns 2-10 for zones, column 1 is empty)
-                zone_rates = []
-                for zone_col in range(2, 11):  # Zones 1-9 (columns 2-10)
-                    try:
-                        rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                        zone_rates.append(rate)
-                    except:
-                        zone_rates.append(None)
-                
-                # Insert the rate
-                weight_to = weight if weight < 2.0 else 2.0
-                
-                cursor.execute('''
-                    INSERT INTO dhl_express_rate_cards_new 
-                    (service_type, rate_section, weight_from, weight_to, 
-                     zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (service_type, 'Documents', weight, weight_to, *zone_rates))
-                
-                loaded_count += 1
-        
-        conn.commit()
-        conn.close()
-        return loaded_count
+        data_rows = [row for row in range(header_row + 1, header_row + 1 + len(doc_weights)) if row < len(df)]
+        
+        # Zone rates (zones 1-9, columns 2-10)
+        rates = zone_rates(df, data_rows, ZONE_COUNT)
+        return self._insert_rates([
+            (service_type, 'Documents', weight, weight, *zone_rate)
+            for weight, zone_rate in zip(doc_weights, rates)
+        ])
     
     def _load_non_documents_section(self, df: pd.DataFrame, service_type: str) -> int:
         """Load Section 2: Non-documents from 0.5 KG & Documents from 2.5 KG"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Find the "Non-documents from 0.5 KG" section
-        non_doc_section_row = None
-        for idx, row in df.iterrows():
-            if pd.notna(row[0]) and "Non-documents from 0.5" in str(row[0]):
-                non_doc_section_row = idx
-                break
+        non_doc_section_row = self._section_row(df, "Non-documents from 0.5")
         
         if non_doc_section_row is None:
             print(f"  Warning: Non-documents section not found in {service_type}")
-            conn.close()
             return 0
         
-        # The header row should be next
-        header_row = non_doc_section_row + 1
-        
-        loaded_count = 0
-        
-        # Read until we hit the multiplier section or end of data
-        data_start_row = header_row + 1
-        
-        for row_idx in range(data_start_row, len(df)):
-            row_data = df.iloc[row_idx]
-            
-            # Check if we've hit the multiplier section
-            if pd.notna(row_data[0]) and "Multiplier" in str(row_data[0]):
-                break
-            
-            # Skip empty rows
-            if pd.isna(row_data[0]):
-                continue
-                
-            try:
-                weight = float(row_data[0])
-                
-                # Extract zone rates
-                zone_rates = []
-                for zone_col in range(2, 11):  # Zones 1-9 (columns 2-10)
-                    try:
-                        rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                        zone_rates.append(rate)
-                    except:
-                        zone_rates.append(None)
-                
-                # Determine weight_to (next weight or same for last entry)
-                weight_to = weight + 0.5 if weight < 30.0 else 30.0
-                
-                cursor.execute('''
-                    INSERT INTO dhl_express_rate_cards_new 
-                    (service_type, rate_section, weight_from, weight_to, 
-                     zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (service_type, 'Non-documents', weight, weight_to, *zone_rates))
-                
-                loaded_count += 1
-                
-            except ValueError:
-                # Skip non-numeric weight values
-                continue
-        
-        conn.commit()
-        conn.close()
-        return loaded_count
+        # Data starts after the header row and runs until the multiplier section or end of data
+        data_start_row = non_doc_section_row + 2
+        section = df.iloc[data_start_row:]
+        multiplier_rows = label_rows(section[0], "Multiplier")
+        if len(multiplier_rows):
+            section = section.iloc[:multiplier_rows[0]]
+        
+        # Rows without a numeric weight (empty or text) are skipped
+        weights = float_values(section[0])
+        numeric = weights.notna().to_numpy()
+        weights = weights[numeric].tolist()
+        rates = zone_rates(section, np.flatnonzero(numeric), ZONE_COUNT)
+        
+        # weight_to is the next weight point, capped at 30 KG
+        return self._insert_rates([
+            (service_type, 'Non-documents', weight, weight + 0.5 if weight < 30.0 else 30.0, *zone_rate)
+            for weight, zone_rate in zip(weights, rates)
+        ])
     
     def _load_multiplier_section(self, df: pd.DataFrame, service_type: str) -> int:
         """Load Section 3: Multiplier rate per 0.5 KG from 30.1 KG"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # For Export sheet, look for explicit "Multiplier rate per 0.5 KG" section
         # For Import sheet, look for weight ranges > 30kg (like 75.1-100, 100.1-200, etc.)
         
-        loaded_count = 0
-        
         if service_type == 'Export':
             # Find the "Multiplier rate per 0.5 KG" section
-            mult_section_row = None
-            for idx, row in df.iterrows():
-                if pd.notna(row[0]) and "Multiplier rate per 0.5" in str(row[0]):
-                    mult_section_row = idx
-                    break
+            mult_section_row = self._section_row(df, "Multiplier rate per 0.5")
             
             if mult_section_row is None:
                 print(f"  Warning: Multiplier section not found in {service_type}")
-                conn.close()
                 return 0
             
-            # Find the header row (From, To, Zone 1, etc.)
-            header_row = mult_section_row + 1
-            data_start_row = header_row + 1
+            # Up to 10 rows after the header row (From, To, Zone 1, etc.), skipping empty rows
+            data_start_row = mult_section_row + 2
+            section = df.iloc[data_start_row:data_start_row + 10]
+            section = section[section[0].notna().to_numpy()]
+            limits = section.reindex(columns=[0, 1])
+            weights_from = float_values(limits[0])
+            weights_to = float_values(limits[1])
+            
+            # Stop at the first row with non-numeric data (like Premium section); a blank To is open-ended
+            bad = weights_from.isna() | (limits[1].notna() & weights_to.isna())
+            rows = np.flatnonzero(~bad.cummax().to_numpy())
+            weights_from = weights_from.iloc[rows].tolist()
+            weights_to = weights_to.iloc[rows].where(limits[1].iloc[rows].notna(), 99999).tolist()
             
-            for row_idx in range(data_start_row, data_start_row + 10):
-                if row_idx >= len(df):
-                    break
-                    
-                row_data = df.iloc[row_idx]
-                
-                # Skip empty rows
-                if pd.isna(row_data[0]):
-                    continue
-                
-                try:
-                    weight_from = float(row_data[0])
-                    weight_to = float(row_data[1]) if pd.notna(row_data[1]) else 99999
-                    
-                    # Extract zone rates (multiplier rates) - Export has 9 zones
-                    zone_rates = []
-                    for zone_col in range(2, 11):  # Zones 1-9 (columns 2-10)
-                        try:
-                            rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                            zone_rates.append(rate)
-                        except:
-                            zone_rates.append(None)
-                    
-                    cursor.execute('''
-                        INSERT INTO dhl_express_rate_cards_new 
-                        (service_type, rate_section, weight_from, weight_to, 
-                         zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9,
-                         is_multiplier, weight_range_from, weight_range_to)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (service_type, 'Multiplier', weight_from, weight_to, *zone_rates, 
-                         True, weight_from, weight_to))
-                    
-                    loaded_count += 1
-                    
-                except ValueError:
-                    # Stop when we hit non-numeric data (like Premium section)
-                    break
-        
         else:  # Import sheet
-            # For Import, look for weight ranges that look like multipliers (> 30kg)
-            # These appear as regular rows in the non-documents section
-            for row_idx in range(len(df)):
-                row_data = df.iloc[row_idx]
-                
-                # Skip empty rows
-                if pd.isna(row_data[0]):
-                    continue
-                
-                try:
-                    weight_from = float(row_data[0])
-                    
-                    # Look for multiplier-style ranges (> 30kg and with decimal ranges)
-                    if weight_from > 30 and '.' in str(row_data[0]):
-                        # This looks like a multiplier range (e.g., 75.1, 100.1, 200.1)
-                        if pd.notna(row_data[1]):
-                            try:
-                                weight_to = float(row_data[1])
-                            except:
-                                weight_to = 99999
-                        else:
-                            weight_to = 99999
-                        
-                        # Extract zone rates - Import has 10 zones  
-                        zone_rates = []
-                        for zone_col in range(2, 12):  # Zones 1-10 (columns 2-11)
-                            try:
-                                rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                                zone_rates.append(rate)
-                            except:
-                                zone_rates.append(None)
-                        
-                        # Pad to 9 zones for consistency (drop zone 10)
-                        zone_rates = zone_rates[:9]
-                        
-                        cursor.execute('''
-                            INSERT INTO dhl_express_rate_cards_new 
-                            (service_type, rate_section, weight_from, weight_to, 
-                             zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9,
-                             is_multiplier, weight_range_from, weight_range_to)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (service_type, 'Multiplier', weight_from, weight_to, *zone_rates, 
-                             True, weight_from, weight_to))
-                        
-                        loaded_count += 1
-                        
-                except ValueError:
-                    continue
-        
-        conn.commit()
-        conn.close()
-        return loaded_count
+            # For Import, multiplier ranges are rows with a decimal weight above 30kg (e.g. 75.1, 100.1, 200.1)
+            if df.empty:
+                return 0
+            weights = float_values(df[0]).astype(np.float64)
+            decimal = np.zeros(len(df), dtype=bool)
+            decimal[label_rows(df[0], '.')] = True
+            rows = np.flatnonzero(decimal & (weights > 30).to_numpy())
+            
+            limits = df.iloc[rows].reindex(columns=[0, 1])
+            weights_from = weights.iloc[rows].tolist()
+            weights_to = float_values(limits[1], 99999).tolist()
+            section = df
+        
+        # Zone rates (multiplier rates)
+        rates = zone_rates(section, rows, ZONE_COUNT)
+        return self._insert_rates([
+            (service_type, 'Multiplier', weight_from, weight_to, *zone_rate, True, weight_from, weight_to)
+            for weight_from, weight_to, zone_rate in zip(weights_from, weights_to, rates)
+        ], multiplier=True)
     
-    def _replace_rate_card_table(self):
-        """Replace the old rate card table with the new one"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Backup old table if it exists
-        try:
-            cursor.execute('DROP TABLE IF EXISTS dhl_express_rate_cards_backup')
-            cursor.execute('ALTER TABLE dhl_express_rate_cards RENAME TO dhl_express_rate_cards_backup')
-        except:
-            pass  # Table might not exist
-        
-        # Rename new table to main table
-        cursor.execute('ALTER TABLE dhl_express_rate_cards_new RENAME TO dhl_express_rate_cards')
-        
-        conn.commit()
-        conn.close()
-        print("Replaced rate card table with new complete structure")
+    def _replace_rate_card_table(self, source: str = None) -> int:
+        """Swap the loaded shadow table in if it has every section and the critical multiplier ranges"""
+        version = self.swap.swap(rate_card_checks() + critical_multiplier_checks(), source=source)
+        print(f"Replaced rate card table with new complete structure (version {version})")
+        return version
 
 def main():
     """Load complete DHL Express rate cards"""
@@ -8,6 +8,7 @@ import sqlite3
 import re
 import os
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 class ComprehensiveFixedRateCardLoader:
     def __init__(self, database_path='dhl_audit.db'):
@@ -31,6 +32,7 @@ class ComprehensiveFixedRateCardLoader:
         
         deleted_count = self.cursor.rowcount
         print(f"🗑️ Removed {deleted_count} duplicate entries")
+        bump_rate_card_version(self.cursor, 'dhl_express_rate_cards', 'clean_all_duplicates')
         self.conn.commit()
 
     def load_rate_card_from_excel(self, excel_file, service_type, sheet_name):
@@ -64,6 +66,7 @@ class ComprehensiveFixedRateCardLoader:
         # Load multiplier section  
         self._load_multipliers(df, service_type)
         
+        bump_rate_card_version(self.cursor, 'dhl_express_rate_cards', 'load_rate_card_from_excel')
         self.conn.commit()
         return True
 
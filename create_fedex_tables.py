@@ -1,5 +1,7 @@
 import sqlite3
 
+from rate_card_versions import bump_rate_card_version
+
 # Create FedEx tables and insert sample data for testing
 import sqlite3
 
@@ -140,6 +142,7 @@ for rate in rate_data:
     cursor.execute('''INSERT OR REPLACE INTO fedex_rate_cards 
         (service_type, zone, weight_kg, rate_usd, fuel_surcharge_rate) VALUES (?, ?, ?, ?, ?)''', rate)
 
+bump_rate_card_version(cursor, 'fedex_rate_cards', 'create_fedex_tables')
 conn.commit()
 conn.close()
 
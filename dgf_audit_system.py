@@ -27,6 +27,10 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tolerance levels
+RATE_TOLERANCE = 0.05  # 5%
+FEE_TOLERANCE = 0.10   # 10%
+
 class DGFAuditSystem:
     def __init__(self, db_path: str = 'dhl_audit.db'):
         self.db_path = db_path
@@ -788,10 +792,6 @@ class DGFAuditSystem:
             'undercharge_amount': 0.0
         }
         
-        # Tolerance levels
-        RATE_TOLERANCE = 0.05  # 5%
-        FEE_TOLERANCE = 0.10   # 10%
-        
         # Helper function to safely convert to float
         def safe_float(value, default=0.0):
             if value is None:
@@ -906,15 +906,32 @@ class DGFAuditSystem:
         conn.close()
     
     def audit_all_invoices(self) -> Dict:
-        """Audit all processed invoices against their quotes."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """
+        Audit all processed invoices against their quotes.
         
-        cursor.execute('SELECT id FROM dgf_invoices WHERE status = "PROCESSED"')
-        invoice_ids = [row[0] for row in cursor.fetchall()]
+        Invoices are fetched joined to dgf_spot_quotes in one query, variances
+        are computed column-wise over the joined frame with the same rules as
+        audit_invoice_against_quote, and all results are saved with a single
+        executemany.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            df = pd.read_sql_query('''
+                SELECT i.id AS invoice_id, i.quote_id, i.mode,
+                       i.chargeable_weight, i.volume_cbm, i.origin_freight,
+                       i.origin_handling_fee AS invoice_origin_fee,
+                       q.id AS quote_row_id, q.rate_per_kg, q.rate_per_cbm,
+                       q.origin_handling_fee AS quote_origin_fee
+                FROM dgf_invoices i
+                LEFT JOIN dgf_spot_quotes q ON q.quote_id = i.quote_id
+                WHERE i.status = "PROCESSED"
+                ORDER BY i.id
+            ''', conn)
+        finally:
+            conn.close()
         
         results = {
-            'total_invoices': len(invoice_ids),
+            'total_invoices': len(df),
             'audited': 0,
             'passed': 0,
             'warnings': 0,
@@ -924,33 +941,104 @@ class DGFAuditSystem:
             'total_undercharge': 0.0
         }
         
-        for invoice_id in invoice_ids:
-            try:
-                audit_result = self.audit_invoice_against_quote(invoice_id)
-                
-                if 'error' in audit_result:
-                    results['errors'] += 1
-                    continue
-                
-                results['audited'] += 1
-                
-                if audit_result['overall_status'] == 'PASS':
-                    results['passed'] += 1
-                elif audit_result['overall_status'] == 'WARNING':
-                    results['warnings'] += 1
-                else:
-                    results['failed'] += 1
-                
-                results['total_overcharge'] += audit_result.get('overcharge_amount', 0)
-                results['total_undercharge'] += audit_result.get('undercharge_amount', 0)
-                
-            except Exception as e:
-                logger.error(f"Error auditing invoice {invoice_id}: {e}")
-                results['errors'] += 1
+        # Invoices without a matching quote are errors, as in the per-invoice audit
+        has_quote = df['quote_row_id'].notna()
+        results['errors'] = int((~has_quote).sum())
+        audited = self._audit_invoice_frame(df[has_quote])
         
-        conn.close()
+        if audited.empty:
+            return results
+        
+        results['audited'] = len(audited)
+        status_counts = audited['overall_status'].value_counts()
+        results['passed'] = int(status_counts.get('PASS', 0))
+        results['warnings'] = int(status_counts.get('WARNING', 0))
+        results['failed'] = int(status_counts.get('FAIL', 0))
+        results['total_overcharge'] = float(audited['overcharge_amount'].sum())
+        results['total_undercharge'] = float(audited['undercharge_amount'].sum())
+        
+        self.save_audit_results(audited)
         return results
     
+    def _audit_invoice_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Vectorized equivalent of audit_invoice_against_quote over joined invoice/quote rows."""
+        def to_float(column: str) -> pd.Series:
+            # Same as safe_float: missing or non-numeric values count as 0.0
+            return pd.to_numeric(df[column], errors='coerce').fillna(0.0).astype(float)
+        
+        is_air = df['mode'] == 'AIR'
+        is_sea = df['mode'] == 'SEA'
+        
+        # Air compares chargeable weight x rate/kg, sea compares volume x rate/CBM
+        quantity = to_float('chargeable_weight').where(is_air, to_float('volume_cbm'))
+        rate = to_float('rate_per_kg').where(is_air, to_float('rate_per_cbm'))
+        actual_freight = to_float('origin_freight')
+        
+        expected_freight = quantity * rate
+        freight_checked = (is_air | is_sea) & (quantity > 0) & (rate > 0) & (actual_freight > 0)
+        freight_pct = ((actual_freight - expected_freight).abs() /
+                       expected_freight.where(freight_checked, 1.0))
+        freight_flag = freight_checked & (freight_pct > RATE_TOLERANCE)
+        
+        # Compare handling fees
+        quote_origin_fee = to_float('quote_origin_fee')
+        invoice_origin_fee = to_float('invoice_origin_fee')
+        fee_checked = (quote_origin_fee > 0) & (invoice_origin_fee > 0)
+        fee_pct = ((invoice_origin_fee - quote_origin_fee).abs() /
+                   quote_origin_fee.where(fee_checked, 1.0))
+        fee_flag = fee_checked & (fee_pct > FEE_TOLERANCE)
+        
+        audited = pd.DataFrame({'invoice_id': df['invoice_id'], 'quote_id': df['quote_id']})
+        
+        audited['overall_status'] = 'PASS'
+        audited.loc[fee_flag, 'overall_status'] = 'WARNING'
+        audited.loc[freight_flag, 'overall_status'] = 'WARNING'
+        audited.loc[freight_flag & (freight_pct > 0.15), 'overall_status'] = 'FAIL'
+        
+        audit_score = pd.Series(100.0, index=df.index)
+        audit_score = audit_score - (freight_pct * 100).clip(upper=50).where(freight_flag, 0.0)
+        audit_score = audit_score - (fee_pct * 50).clip(upper=25).where(fee_flag, 0.0)
+        audited['audit_score'] = audit_score
+        
+        audited['freight_variance_pct'] = (freight_pct * 100).where(freight_flag, 0.0)
+        audited['freight_variance_amount'] = (actual_freight - expected_freight).where(freight_flag, 0.0)
+        audited['origin_variance_pct'] = (fee_pct * 100).where(fee_flag, 0.0)
+        audited['origin_variance_amount'] = (invoice_origin_fee - quote_origin_fee).where(fee_flag, 0.0)
+        
+        # Calculate financial impact
+        net_variance = audited['freight_variance_amount'] + audited['origin_variance_amount']
+        audited['overcharge_amount'] = net_variance.where(net_variance > 0, 0.0)
+        audited['undercharge_amount'] = net_variance.abs().where(net_variance <= 0, 0.0)
+        audited['net_variance'] = net_variance
+        audited['variance_count'] = freight_flag.astype(int) + fee_flag.astype(int)
+        
+        return audited
+    
+    def save_audit_results(self, audited: pd.DataFrame):
+        """Save a frame of audit results (from _audit_invoice_frame) in one transaction."""
+        rows = zip(
+            audited['invoice_id'].tolist(), audited['quote_id'].tolist(),
+            audited['overall_status'].tolist(), audited['audit_score'].tolist(),
+            audited['freight_variance_pct'].tolist(), audited['freight_variance_amount'].tolist(),
+            audited['origin_variance_pct'].tolist(), audited['origin_variance_amount'].tolist(),
+            audited['overcharge_amount'].tolist(), audited['undercharge_amount'].tolist(),
+            audited['net_variance'].tolist(),
+            [f"Found {count} variances" for count in audited['variance_count'].tolist()]
+        )
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO dgf_audit_results
+                (invoice_id, quote_id, overall_status, audit_score, freight_variance_pct,
+                 freight_variance_amount, origin_variance_pct, origin_variance_amount,
+                 overcharge_amount, undercharge_amount, net_variance, audit_comments)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        finally:
+            conn.close()
+    
     def generate_audit_report(self, output_file: str = 'dgf_audit_report.xlsx'):
         """Generate comprehensive audit report."""
         conn = sqlite3.connect(self.db_path)
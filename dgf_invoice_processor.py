@@ -1,9 +1,21 @@
 import os
 import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
+from rate_card_ingest import bulk_insert, float_values, map_distinct, open_workbook
+
+# dgf_*_invoices columns, in insert order
+INVOICE_COLUMNS = [
+    'lane_id', 'quote_id', 'actual_arrival_date', 'hbl_number', 'pieces',
+    'gross_weight', 'chargeable_weight', 'terms', 'origin_country', 'origin_port',
+    'freight', 'origin_currency', 'origin_fx_rate', 'destination_charges',
+    'destination_currency', 'destination_fx_rate', 'total_cny',
+    'file_name', 'sheet_name', 'row_number', 'uploaded_by'
+]
+
 class DGFInvoiceProcessor:
     """Process DGF invoice Excel files and load into DB (AIR/FCL/LCL)."""
 
@@ -38,36 +50,60 @@ class DGFInvoiceProcessor:
         except Exception:
             return ''
 
-    def _norm_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
-        return {self._norm_key(k): v for k, v in row.items()}
-
-    def pick(self, nrow: Dict[str, Any], candidates: List[str], default=None):
+    def _candidate_columns(self, columns: List[Any], candidates: List[str]) -> List[int]:
+        """
+        Positions of the columns a field is read from, in lookup order: exact
+        header matches first, then headers containing a candidate. Of columns
+        with the same header the last one is used.
+        """
+        positions = {}
+        for position, column in enumerate(columns):
+            positions[self._norm_key(column)] = position
+        keys = list(positions)
         # 1) exact key match
-        for c in candidates:
-            v = nrow.get(self._norm_key(c))
-            if v is not None and v != '':
-                return v
+        found = [positions[self._norm_key(c)] for c in candidates if self._norm_key(c) in positions]
         # 2) loose contains match on keys
-        keys = list(nrow.keys())
         for c in candidates:
             needle = self._norm_key(c)
-            for k in keys:
-                if needle and needle in k:
-                    v = nrow.get(k)
-                    if v is not None and v != '':
-                        return v
-        return default
-
-    def pick_float(self, nrow: Dict[str, Any], candidates: List[str]) -> Optional[float]:
-        v = self.pick(nrow, candidates, None)
+            if needle:
+                found.extend(positions[k] for k in keys if needle in k)
+        return found
+
+    def pick(self, df: pd.DataFrame, candidates: List[str], default=None) -> np.ndarray:
+        """Per row, the first candidate column's value that is not None or ''"""
+        values = np.full(len(df), default, dtype=object)
+        unresolved = np.ones(len(df), dtype=bool)
+        for position in self._candidate_columns(list(df.columns), candidates):
+            cells = df.iloc[:, position].to_numpy(dtype=object)
+            found = unresolved & ~((cells == None) | (cells == ''))  # noqa: E711 (elementwise)
+            values[found] = cells[found]
+            unresolved &= ~found
+            if not unresolved.any():
+                break
+        return values
+
+    def pick_float(self, df: pd.DataFrame, candidates: List[str]) -> pd.Series:
+        """pick() as floats: thousands separators removed, None where float() fails"""
+        values = pd.Series(self.pick(df, candidates), dtype=object)
         try:
-            if v is None or v == '':
+            text = values.str.replace(',', '', regex=False).str.strip()
+        except AttributeError:
+            # No text cells
+            return float_values(values)
+        return float_values(text.where(text.notna(), values))
+
+    @staticmethod
+    def _arrival_date(value):
+        """Arrival dates as YYYY-MM-DD; unparseable text is None, other values are kept"""
+        if isinstance(value, pd.Timestamp):
+            return value.strftime('%Y-%m-%d')
+        if isinstance(value, str) and value.strip():
+            try:
+                parsed = pd.to_datetime(value, errors='coerce')
+                return parsed.strftime('%Y-%m-%d') if not pd.isna(parsed) else None
+            except Exception:
                 return None
-            if isinstance(v, str):
-                v = v.replace(',', '').strip()
-            return float(v)
-        except Exception:
-            return None
+        return value
 
     def _candidate_set(self) -> set:
         return {self._norm_key(x) for vals in self.HEADERS.values() for x in vals}
@@ -106,69 +142,59 @@ class DGFInvoiceProcessor:
         cur = conn.cursor()
 
         try:
-            xls = pd.ExcelFile(file_path)
-            # Iterate sheets and rows
+            xls = open_workbook(file_path)
+            insert_mode = 'INSERT OR REPLACE' if replace_existing else 'INSERT OR IGNORE'
+            file_name = os.path.basename(file_path)
+            # Iterate sheets; each field is resolved to its columns once and read a column at a time
             for sheet in xls.sheet_names:
                 df = xls.parse(sheet)
                 df = self._ensure_headers(df)
-                records = df.to_dict(orient='records')
-                for i, row in enumerate(records):
-                    try:
-                        nrow = self._norm_row(row)
-                        lane_id = self.pick(nrow, self.HEADERS['lane_id'])
-                        quote_id = self.pick(nrow, self.HEADERS['quote_id'])
-                        arrival = self.pick(nrow, self.HEADERS['actual_arrival_date'])
-                        if isinstance(arrival, pd.Timestamp):
-                            arrival = arrival.strftime('%Y-%m-%d')
-                        elif isinstance(arrival, str) and arrival.strip():
-                            try:
-                                parsed = pd.to_datetime(arrival, errors='coerce')
-                                arrival = parsed.strftime('%Y-%m-%d') if not pd.isna(parsed) else None
-                            except Exception:
-                                arrival = None
-                        hbl = self.pick(nrow, self.HEADERS['hbl_number'])
-                        pieces = self.pick_float(nrow, self.HEADERS['pieces'])
-                        gross = self.pick_float(nrow, self.HEADERS['gross_weight'])
-                        chargeable = self.pick_float(nrow, self.HEADERS['chargeable_weight'])
-                        terms = self.pick(nrow, self.HEADERS['terms'])
-                        o_country = self.pick(nrow, self.HEADERS['origin_country'])
-                        o_port = self.pick(nrow, self.HEADERS['origin_port'])
-                        freight = self.pick_float(nrow, self.HEADERS['freight'])
-                        o_curr = self.pick(nrow, self.HEADERS['origin_currency'])
-                        o_fx = self.pick_float(nrow, self.HEADERS['origin_fx_rate'])
-                        d_charges = self.pick_float(nrow, self.HEADERS['destination_charges'])
-                        d_curr = self.pick(nrow, self.HEADERS['destination_currency'])
-                        d_fx = self.pick_float(nrow, self.HEADERS['destination_fx_rate'])
-                        total_cny = self.pick_float(nrow, self.HEADERS['total_cny'])
-
-                        if not (lane_id or hbl or quote_id):
-                            # Skip empty rows
-                            continue
-
-                        # Ensure lane_id exists; try to synthesize from HBL if needed
-                        if not lane_id and hbl:
-                            lane_id = f"HBL:{hbl}"
-                            result.setdefault('messages', []).append(
-                                f"Sheet '{sheet}' row {i+1}: Lane ID missing; using fallback '{lane_id}'."
-                            )
-
-                        insert_mode = 'INSERT OR REPLACE' if replace_existing else 'INSERT OR IGNORE'
-                        cur.execute(f'''{insert_mode} INTO {table} (
-                                lane_id, quote_id, actual_arrival_date, hbl_number, pieces,
-                                gross_weight, chargeable_weight, terms, origin_country, origin_port,
-                                freight, origin_currency, origin_fx_rate, destination_charges,
-                                destination_currency, destination_fx_rate, total_cny,
-                                file_name, sheet_name, row_number, uploaded_by
-                            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                        ''', (
-                            lane_id, quote_id, arrival, hbl, pieces, gross, chargeable, terms,
-                            o_country, o_port, freight, o_curr, o_fx, d_charges,
-                            d_curr, d_fx, total_cny, os.path.basename(file_path), sheet, i+1, uploaded_by
-                        ))
-                        result['success'] += 1
-                    except Exception as e:
-                        result['errors'] += 1
-                        result['messages'].append(f"Sheet '{sheet}' row {i+1}: {type(e).__name__}: {e}")
+                lane_id = self.pick(df, self.HEADERS['lane_id'])
+                quote_id = self.pick(df, self.HEADERS['quote_id'])
+                hbl = self.pick(df, self.HEADERS['hbl_number'])
+
+                # Skip empty rows
+                keep = np.flatnonzero(lane_id.astype(bool) | hbl.astype(bool) | quote_id.astype(bool))
+                if not len(keep):
+                    continue
+
+                # Ensure lane_id exists; try to synthesize from HBL if needed
+                messages = []
+                for i in keep:
+                    if not lane_id[i] and hbl[i]:
+                        lane_id[i] = f"HBL:{hbl[i]}"
+                        messages.append((i, f"Sheet '{sheet}' row {i+1}: Lane ID missing; using fallback '{lane_id[i]}'."))
+
+                arrival = map_distinct(pd.Series(self.pick(df, self.HEADERS['actual_arrival_date']), dtype=object),
+                                       self._arrival_date)
+                columns = [
+                    lane_id, quote_id, arrival, hbl,
+                    self.pick_float(df, self.HEADERS['pieces']),
+                    self.pick_float(df, self.HEADERS['gross_weight']),
+                    self.pick_float(df, self.HEADERS['chargeable_weight']),
+                    self.pick(df, self.HEADERS['terms']),
+                    self.pick(df, self.HEADERS['origin_country']),
+                    self.pick(df, self.HEADERS['origin_port']),
+                    self.pick_float(df, self.HEADERS['freight']),
+                    self.pick(df, self.HEADERS['origin_currency']),
+                    self.pick_float(df, self.HEADERS['origin_fx_rate']),
+                    self.pick_float(df, self.HEADERS['destination_charges']),
+                    self.pick(df, self.HEADERS['destination_currency']),
+                    self.pick_float(df, self.HEADERS['destination_fx_rate']),
+                    self.pick_float(df, self.HEADERS['total_cny'])
+                ]
+                columns = [list(values) for values in columns]
+                rows = [tuple(values[i] for values in columns) + (file_name, sheet, int(i) + 1, uploaded_by) for i in keep]
+
+                inserted, errors = bulk_insert(cur, table, INVOICE_COLUMNS, rows, insert_mode)
+                result['success'] += len(inserted)
+                result['errors'] += len(errors)
+                for position, e in errors:
+                    i = keep[position]
+                    messages.append((i, f"Sheet '{sheet}' row {i+1}: {type(e).__name__}: {e}"))
+                # Messages in row order, a row's fallback note before its error
+                messages.sort(key=lambda message: message[0])
+                result['messages'].extend(message for _, message in messages)
             conn.commit()
         finally:
             conn.close()
@@ -5,6 +5,7 @@ Handles Excel file uploads for AIR, FCL, and LCL quotes
 """
 
 import sqlite3
+import numpy as np
 import pandas as pd
 import os
 import re
@@ -13,10 +14,81 @@ from typing import Dict, List, Optional, Tuple
 import logging
 import openpyxl
 
+from rate_card_ingest import (
+    PhaseTimer, bulk_insert, float_values, map_distinct, open_workbook, read_sheet, sql_values, text_values
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Charge columns of each quote sheet: (database column, Excel column)
+AIR_RATE_COLUMNS = [
+    ('dtp_min_charge', 'DTP Min Charge'),
+    ('dtp_freight_cost', 'DTP Freight Cost '),  # Note space in original
+    ('customs_clearance', 'CUSTOMS CLEARANCE'),
+    ('origin_min_charge', 'Origin Min Charge '),
+    ('origin_fees', 'Origin Fees \n(THC, ISS, Screening, etc.) '),
+    ('per_shipment_charges', 'Per shpt charges'),
+    ('ata_min_charge', 'ATA Min Charge'),
+    ('ata_cost_charge', 'ATA Cost \nCharge'),
+    ('destination_min_charge', 'Destination Min Charge '),
+    ('destination_fees', 'Destination Fees \n(THC, ISS, Screening, etc.) '),
+    ('total_charges', 'Total charges')
+]
+
+FCL_RATE_COLUMNS = [
+    ('pickup_charges_20', "Pickup Charges 20' "),
+    ('pickup_charges_40', "Pickup Charges 40' "),
+    ('customs_clearance', 'CUSTOMS CLEARANCE'),
+    ('origin_handling_20', "Origin Handling 20' "),
+    ('origin_handling_40', "Origin Handling 40' "),
+    ('freight_rate_20', "Freight Rate 20' "),
+    ('freight_rate_40', "Freight Rate 40' "),
+    ('per_shipment_charges', 'Per Shipment Charges'),
+    ('destination_handling', 'Destination Handling '),
+    ('total_charges', 'Total Charges')
+]
+
+LCL_RATE_COLUMNS = [
+    ('lcl_pickup_charges_min', 'LCL Pickup Charges Min '),
+    ('lcl_pickup_charges_rate', 'LCL Pickup Charges Rate '),
+    ('customs_clearance', 'CUSTOMS CLEARANCE'),
+    ('lcl_origin_handling_min', 'LCL Origin Handling Min '),
+    ('lcl_origin_handling', 'LCL Origin Handling '),
+    ('per_shipment_charges', 'Per Shipment Charges'),
+    ('lcl_freight_min', 'LCL Freight Min'),
+    ('lcl_freight_rate', 'LCL Freight Rate '),
+    ('lcl_destination_handling_min', 'LCL Destination Handling Min '),
+    ('lcl_destination_handling_rate', 'LCL Destination Handling Rate '),
+    ('dest_document_handover', 'Dest. Document Handove'),
+    ('total_charges', 'Total Charges')
+]
+
+# Per quote type: table, label in messages, origin/destination code columns,
+# charge columns and the prefix of generated references (None: a reference is required)
+QUOTE_TYPES = {
+    'air': {
+        'table': 'dgf_air_quotes', 'label': 'air',
+        'code_columns': ('origin_airport_code', 'destination_airport_code'),
+        'rate_columns': AIR_RATE_COLUMNS, 'reference_prefix': 'AIR'
+    },
+    'fcl': {
+        'table': 'dgf_fcl_quotes', 'label': 'FCL',
+        'code_columns': ('origin_port_code', 'destination_port_code'),
+        'rate_columns': FCL_RATE_COLUMNS, 'reference_prefix': None
+    },
+    'lcl': {
+        'table': 'dgf_lcl_quotes', 'label': 'LCL',
+        'code_columns': ('origin_port_code', 'destination_port_code'),
+        'rate_columns': LCL_RATE_COLUMNS, 'reference_prefix': None
+    }
+}
+
+# Text columns every quote sheet has
+QUOTE_TEXT_COLUMNS = ['Fild', 'Quote Reference No.', 'Vendor Name', 'Validity Period', 'Origin',
+                      'Destination', 'Service Type', 'Incoterms', 'Transit Time', 'Currency', 'Remarks']
+
 class DGFQuoteProcessor:
     def __init__(self, db_path: str = 'dhl_audit.db'):
         self.db_path = db_path
@@ -39,7 +111,7 @@ class DGFQuoteProcessor:
         
         try:
             # Read Excel file
-            excel_file = pd.ExcelFile(file_path)
+            excel_file = open_workbook(file_path)
             
             # Process each sheet type
             for sheet_name in excel_file.sheet_names:
@@ -67,383 +139,141 @@ class DGFQuoteProcessor:
     
     def process_air_quotes(self, excel_file: pd.ExcelFile, sheet_name: str, file_path: str, uploaded_by: str, replace_existing: bool = True) -> Dict:
         """Process AIR quotes from Excel sheet matching the actual air quote format."""
+        return self._process_quotes('air', excel_file, sheet_name, file_path, uploaded_by, replace_existing)
+    
+    def process_fcl_quotes(self, excel_file: pd.ExcelFile, sheet_name: str, file_path: str, uploaded_by: str, replace_existing: bool = True) -> Dict:
+        """Process FCL quotes from Excel sheet - Based on actual FCL quote format."""
+        return self._process_quotes('fcl', excel_file, sheet_name, file_path, uploaded_by, replace_existing)
+    
+    def process_lcl_quotes(self, excel_file: pd.ExcelFile, sheet_name: str, file_path: str, uploaded_by: str, replace_existing: bool = True) -> Dict:
+        """Process LCL quotes from Excel sheet - Based on actual LCL quote format."""
+        return self._process_quotes('lcl', excel_file, sheet_name, file_path, uploaded_by, replace_existing)
+    
+    def _process_quotes(self, quote_type: str, excel_file: pd.ExcelFile, sheet_name: str, file_path: str,
+                        uploaded_by: str, replace_existing: bool = True) -> Dict:
+        """Load one quote sheet: columns are cleaned as a whole and the rows inserted with executemany."""
+        config = QUOTE_TYPES[quote_type]
+        label = config['label']
         result = {'success': 0, 'errors': 0, 'messages': []}
         
         try:
-            df = pd.read_excel(excel_file, sheet_name=sheet_name)
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            timer = PhaseTimer()
+            rate_columns = config['rate_columns']
+            df = read_sheet(excel_file, sheet_name, QUOTE_TEXT_COLUMNS + [excel for _, excel in rate_columns])
+            df = df.reset_index(drop=True)
+            timer.lap('read')
             
-            # Column mapping from Excel to database
-            column_mapping = {
-                'Fild': 'field_type',
-                'Quote Reference No.': 'quote_reference_no',
-                'Vendor Name': 'vendor_name', 
-                'Validity Period': 'validity_period',
-                'Origin': 'origin',
-                'Destination': 'destination',
-                'Service Type': 'service_type',
-                'Incoterms': 'incoterms',
-                'Transit Time': 'transit_time',
-                'Currency': 'currency',
-                'DTP Min Charge': 'dtp_min_charge',
-                'DTP Freight Cost ': 'dtp_freight_cost',  # Note space in original
-                'CUSTOMS CLEARANCE': 'customs_clearance',
-                'Origin Min Charge ': 'origin_min_charge',  # Note space in original
-                'Origin Fees \n(THC, ISS, Screening, etc.) ': 'origin_fees',
-                'Per shpt charges': 'per_shipment_charges',
-                'ATA Min Charge': 'ata_min_charge',
-                'ATA Cost \nCharge': 'ata_cost_charge',
-                'Destination Min Charge ': 'destination_min_charge',  # Note space in original
-                'Destination Fees \n(THC, ISS, Screening, etc.) ': 'destination_fees',
-                'Total charges': 'total_charges',
-                'Remarks': 'remarks'
-            }
+            def text(column, default=None):
+                if column not in df.columns:
+                    return pd.Series(default, index=df.index, dtype=object)
+                return text_values(df[column], default)
             
-            for idx, row in df.iterrows():
-                try:
-                    # Extract and validate quote reference number
-                    quote_ref = self.safe_get(row, 'Quote Reference No.')
-                    if not quote_ref:
-                        quote_ref = f"AIR_{datetime.now().strftime('%Y%m%d')}_{idx+1:03d}"
-                    
-                    # Parse validity period (format: "8/25/2025-8/31/2025")
-                    validity_start, validity_end = self.parse_validity_period(
-                        self.safe_get(row, 'Validity Period', '')
-                    )
-                    
-                    # Extract airport codes and countries from origin/destination
-                    origin_airport, origin_country = self.parse_location(
-                        self.safe_get(row, 'Origin', '')
-                    )
-                    dest_airport, dest_country = self.parse_location(
-                        self.safe_get(row, 'Destination', '')
-                    )
-                    
-                    # Parse transit time to extract days
-                    transit_days = self.parse_transit_time(
-                        self.safe_get(row, 'Transit Time', '')
-                    )
-                    
-                    # Calculate main rate per kg (using DTP Freight Cost as primary rate)
-                    rate_per_kg = self.safe_float(row, 'DTP Freight Cost ')
-                    
-                    # Check if quote already exists (when replace_existing is False)
-                    if not replace_existing:
-                        cursor.execute('SELECT id FROM dgf_air_quotes WHERE quote_reference_no = ?', (quote_ref,))
-                        if cursor.fetchone():
-                            result['messages'].append(f"Skipped existing quote: {quote_ref}")
-                            continue
-                    
-                    # Use appropriate INSERT strategy based on replace_existing
-                    insert_mode = "INSERT OR REPLACE" if replace_existing else "INSERT OR IGNORE"
-                    
-                    # Insert air quote with new structure
-                    cursor.execute(f'''
-                        {insert_mode} INTO dgf_air_quotes (
-                            field_type, quote_reference_no, vendor_name, validity_period,
-                            validity_start, validity_end, origin, destination,
-                            origin_airport_code, destination_airport_code, 
-                            origin_country, destination_country,
-                            service_type, incoterms, transit_time, transit_time_days, currency,
-                            dtp_min_charge, dtp_freight_cost, customs_clearance,
-                            origin_min_charge, origin_fees, per_shipment_charges,
-                            ata_min_charge, ata_cost_charge, destination_min_charge,
-                            destination_fees, total_charges, remarks, rate_per_kg,
-                            file_name, sheet_name, row_number, uploaded_by
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        self.safe_get(row, 'Fild'),
-                        quote_ref,
-                        self.safe_get(row, 'Vendor Name'),
-                        self.safe_get(row, 'Validity Period'),
-                        validity_start,
-                        validity_end,
-                        self.safe_get(row, 'Origin'),
-                        self.safe_get(row, 'Destination'),
-                        origin_airport,
-                        dest_airport,
-                        origin_country,
-                        dest_country,
-                        self.safe_get(row, 'Service Type'),
-                        self.safe_get(row, 'Incoterms'),
-                        self.safe_get(row, 'Transit Time'),
-                        transit_days,
-                        self.safe_get(row, 'Currency', 'USD'),
-                        self.safe_float(row, 'DTP Min Charge'),
-                        self.safe_float(row, 'DTP Freight Cost '),
-                        self.safe_float(row, 'CUSTOMS CLEARANCE'),
-                        self.safe_float(row, 'Origin Min Charge '),
-                        self.safe_float(row, 'Origin Fees \n(THC, ISS, Screening, etc.) '),
-                        self.safe_float(row, 'Per shpt charges'),
-                        self.safe_float(row, 'ATA Min Charge'),
-                        self.safe_float(row, 'ATA Cost \nCharge'),
-                        self.safe_float(row, 'Destination Min Charge '),
-                        self.safe_float(row, 'Destination Fees \n(THC, ISS, Screening, etc.) '),
-                        self.safe_float(row, 'Total charges'),
-                        self.safe_get(row, 'Remarks'),
-                        rate_per_kg,
-                        os.path.basename(file_path),
-                        sheet_name,
-                        idx + 1,
-                        uploaded_by
-                    ))
-                    result['success'] += 1
-                    
-                except Exception as e:
-                    result['errors'] += 1
-                    result['messages'].append(f"Row {idx+1}: {str(e)}")
-                    logger.error(f"Error processing air quote row {idx+1}: {str(e)}")
+            def number(column):
+                if column not in df.columns:
+                    return pd.Series(None, index=df.index, dtype=object)
+                return float_values(df[column])
             
-            conn.commit()
-            conn.close()
-            result['messages'].append(f"Successfully processed {result['success']} air quotes")
+            def part(pairs, i):
+                return pd.Series([pair[i] for pair in pairs], index=df.index, dtype=object)
             
-        except Exception as e:
-            result['errors'] += 1
-            result['messages'].append(f"Error processing air quotes: {str(e)}")
-            logger.error(f"Error processing air quotes: {str(e)}")
-        
-        return result
-    
-    def process_fcl_quotes(self, excel_file: pd.ExcelFile, sheet_name: str, file_path: str, uploaded_by: str, replace_existing: bool = True) -> Dict:
-        """Process FCL quotes from Excel sheet - Based on actual FCL quote format."""
-        result = {'success': 0, 'errors': 0, 'messages': []}
-        
-        try:
-            df = pd.read_excel(excel_file, sheet_name=sheet_name)
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Quote references: generated for air quotes, required otherwise
+            quote_refs = text('Quote Reference No.')
+            missing_ref = (quote_refs.isna() | (quote_refs == '')).to_numpy(copy=True)
+            if config['reference_prefix']:
+                today = datetime.now().strftime('%Y%m%d')
+                for idx in np.flatnonzero(missing_ref):
+                    quote_refs[idx] = f"{config['reference_prefix']}_{today}_{idx+1:03d}"
+                missing_ref[:] = False
             
-            for idx, row in df.iterrows():
-                try:
-                    # Get quote reference number
-                    quote_ref = self.safe_get(row, 'Quote Reference No.')
-                    if not quote_ref:
-                        result['errors'] += 1
-                        result['messages'].append(f"Row {idx+1}: Missing Quote Reference No.")
-                        continue
-                    
-                    # Parse validity period
-                    validity_start, validity_end = self.parse_validity_period(
-                        self.safe_get(row, 'Validity Period')
-                    )
-                    
-                    # Parse locations
-                    origin_port, origin_country = self.parse_location(self.safe_get(row, 'Origin'))
-                    dest_port, dest_country = self.parse_location(self.safe_get(row, 'Destination'))
-                    
-                    # Parse transit time
-                    transit_days = self.parse_transit_time(self.safe_get(row, 'Transit Time'))
-                    
-                    # Check if quote already exists (when replace_existing is False)
-                    if not replace_existing:
-                        cursor.execute('SELECT id FROM dgf_fcl_quotes WHERE quote_reference_no = ?', (quote_ref,))
-                        if cursor.fetchone():
-                            result['messages'].append(f"Skipped existing quote: {quote_ref}")
-                            continue
-                    
-                    # Use appropriate INSERT strategy based on replace_existing
-                    insert_mode = "INSERT OR REPLACE" if replace_existing else "INSERT OR IGNORE"
-                    
-                    # Insert FCL quote
-                    cursor.execute(f'''
-                        {insert_mode} INTO dgf_fcl_quotes (
-                            field_type, quote_reference_no, vendor_name, validity_period,
-                            validity_start, validity_end, origin, destination,
-                            origin_port_code, destination_port_code, origin_country, destination_country,
-                            service_type, incoterms, transit_time, transit_time_days, currency,
-                            pickup_charges_20, pickup_charges_40, customs_clearance,
-                            origin_handling_20, origin_handling_40, freight_rate_20, freight_rate_40,
-                            per_shipment_charges, destination_handling, total_charges,
-                            file_name, sheet_name, row_number, uploaded_by
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        self.safe_get(row, 'Fild'),
-                        quote_ref,
-                        self.safe_get(row, 'Vendor Name'),
-                        self.safe_get(row, 'Validity Period'),
-                        validity_start,
-                        validity_end,
-                        self.safe_get(row, 'Origin'),
-                        self.safe_get(row, 'Destination'),
-                        origin_port,
-                        dest_port,
-                        origin_country,
-                        dest_country,
-                        self.safe_get(row, 'Service Type'),
-                        self.safe_get(row, 'Incoterms'),
-                        self.safe_get(row, 'Transit Time'),
-                        transit_days,
-                        self.safe_get(row, 'Currency', 'USD'),
-                        self.safe_float(row, "Pickup Charges 20' "),
-                        self.safe_float(row, "Pickup Charges 40' "),
-                        self.safe_float(row, 'CUSTOMS CLEARANCE'),
-                        self.safe_float(row, "Origin Handling 20' "),
-                        self.safe_float(row, "Origin Handling 40' "),
-                        self.safe_float(row, "Freight Rate 20' "),
-                        self.safe_float(row, "Freight Rate 40' "),
-                        self.safe_float(row, 'Per Shipment Charges'),
-                        self.safe_float(row, 'Destination Handling '),
-                        self.safe_float(row, 'Total Charges'),
-                        os.path.basename(file_path),
-                        sheet_name,
-                        idx + 1,
-                        uploaded_by
-                    ))
-                    result['success'] += 1
-                    
-                except Exception as e:
-                    result['errors'] += 1
-                    result['messages'].append(f"Row {idx+1}: {str(e)}")
-                    logger.error(f"Error processing FCL quote row {idx+1}: {str(e)}")
+            validity = text('Validity Period')
+            validity_dates = map_distinct(validity, self.parse_validity_period)
+            origin, destination = text('Origin'), text('Destination')
+            origin_parts = map_distinct(origin, self.parse_location)
+            dest_parts = map_distinct(destination, self.parse_location)
+            transit_time = text('Transit Time')
             
-            conn.commit()
-            conn.close()
-            result['messages'].append(f"Successfully processed {result['success']} FCL quotes")
+            columns = {
+                'field_type': text('Fild'),
+                'quote_reference_no': quote_refs,
+                'vendor_name': text('Vendor Name'),
+                'validity_period': validity,
+                'validity_start': part(validity_dates, 0),
+                'validity_end': part(validity_dates, 1),
+                'origin': origin,
+                'destination': destination,
+                config['code_columns'][0]: part(origin_parts, 0),
+                config['code_columns'][1]: part(dest_parts, 0),
+                'origin_country': part(origin_parts, 1),
+                'destination_country': part(dest_parts, 1),
+                'service_type': text('Service Type'),
+                'incoterms': text('Incoterms'),
+                'transit_time': transit_time,
+                'transit_time_days': map_distinct(transit_time, self.parse_transit_time),
+                'currency': text('Currency', 'USD')
+            }
+            for db_column, excel_column in rate_columns:
+                columns[db_column] = number(excel_column)
+            if quote_type == 'air':
+                columns['remarks'] = text('Remarks')
+                # Main rate per kg is the DTP Freight Cost
+                columns['rate_per_kg'] = columns['dtp_freight_cost']
+            columns['file_name'] = pd.Series(os.path.basename(file_path), index=df.index, dtype=object)
+            columns['sheet_name'] = pd.Series(sheet_name, index=df.index, dtype=object)
+            columns['row_number'] = pd.Series(df.index + 1, index=df.index)
+            columns['uploaded_by'] = pd.Series(uploaded_by, index=df.index, dtype=object)
+            timer.lap('clean')
             
-        except Exception as e:
-            result['errors'] += 1
-            result['messages'].append(f"Error processing FCL quotes: {str(e)}")
-            logger.error(f"Error processing FCL quotes: {str(e)}")
-        
-        return result
-    
-    def process_lcl_quotes(self, excel_file: pd.ExcelFile, sheet_name: str, file_path: str, uploaded_by: str, replace_existing: bool = True) -> Dict:
-        """Process LCL quotes from Excel sheet - Based on actual LCL quote format."""
-        result = {'success': 0, 'errors': 0, 'messages': []}
-        
-        try:
-            df = pd.read_excel(excel_file, sheet_name=sheet_name)
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            for idx, row in df.iterrows():
-                try:
-                    # Get quote reference number
-                    quote_ref = self.safe_get(row, 'Quote Reference No.')
-                    if not quote_ref:
-                        result['errors'] += 1
-                        result['messages'].append(f"Row {idx+1}: Missing Quote Reference No.")
-                        continue
-                    
-                    # Parse validity period
-                    validity_start, validity_end = self.parse_validity_period(
-                        self.safe_get(row, 'Validity Period')
-                    )
-                    
-                    # Parse locations
-                    origin_port, origin_country = self.parse_location(self.safe_get(row, 'Origin'))
-                    dest_port, dest_country = self.parse_location(self.safe_get(row, 'Destination'))
-                    
-                    # Parse transit time
-                    transit_days = self.parse_transit_time(self.safe_get(row, 'Transit Time'))
-                    
-                    # Check if quote already exists (when replace_existing is False)
-                    if not replace_existing:
-                        cursor.execute('SELECT id FROM dgf_lcl_quotes WHERE quote_reference_no = ?', (quote_ref,))
-                        if cursor.fetchone():
-                            result['messages'].append(f"Skipped existing quote: {quote_ref}")
-                            continue
-                    
-                    # Use appropriate INSERT strategy based on replace_existing
-                    insert_mode = "INSERT OR REPLACE" if replace_existing else "INSERT OR IGNORE"
-                    
-                    # Insert LCL quote
-                    cursor.execute(f'''
-                        {insert_mode} INTO dgf_lcl_quotes (
-                            field_type, quote_reference_no, vendor_name, validity_period,
-                            validity_start, validity_end, origin, destination,
-                            origin_port_code, destination_port_code, origin_country, destination_country,
-                            service_type, incoterms, transit_time, transit_time_days, currency,
-                            lcl_pickup_charges_min, lcl_pickup_charges_rate, customs_clearance,
-                            lcl_origin_handling_min, lcl_origin_handling, per_shipment_charges,
-                            lcl_freight_min, lcl_freight_rate, lcl_destination_handling_min,
-                            lcl_destination_handling_rate, dest_document_handover, total_charges,
-                            file_name, sheet_name, row_number, uploaded_by
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        self.safe_get(row, 'Fild'),
-                        quote_ref,
-                        self.safe_get(row, 'Vendor Name'),
-                        self.safe_get(row, 'Validity Period'),
-                        validity_start,
-                        validity_end,
-                        self.safe_get(row, 'Origin'),
-                        self.safe_get(row, 'Destination'),
-                        origin_port,
-                        dest_port,
-                        origin_country,
-                        dest_country,
-                        self.safe_get(row, 'Service Type'),
-                        self.safe_get(row, 'Incoterms'),
-                        self.safe_get(row, 'Transit Time'),
-                        transit_days,
-                        self.safe_get(row, 'Currency', 'USD'),
-                        self.safe_float(row, 'LCL Pickup Charges Min '),
-                        self.safe_float(row, 'LCL Pickup Charges Rate '),
-                        self.safe_float(row, 'CUSTOMS CLEARANCE'),
-                        self.safe_float(row, 'LCL Origin Handling Min '),
-                        self.safe_float(row, 'LCL Origin Handling '),
-                        self.safe_float(row, 'Per Shipment Charges'),
-                        self.safe_float(row, 'LCL Freight Min'),
-                        self.safe_float(row, 'LCL Freight Rate '),
-                        self.safe_float(row, 'LCL Destination Handling Min '),
-                        self.safe_float(row, 'LCL Destination Handling Rate '),
-                        self.safe_float(row, 'Dest. Document Handove'),
-                        self.safe_float(row, 'Total Charges'),
-                        os.path.basename(file_path),
-                        sheet_name,
-                        idx + 1,
-                        uploaded_by
-                    ))
-                    result['success'] += 1
-                    
-                except Exception as e:
+            # Without replace_existing, references already stored (or earlier in the sheet) are skipped
+            skipped = np.zeros(len(df), dtype=bool)
+            if not replace_existing:
+                existing = self._existing_references(cursor, config['table'], quote_refs[~missing_ref].tolist())
+                skipped = ~missing_ref & (quote_refs.isin(existing) | quote_refs.duplicated()).to_numpy()
+            
+            for idx in np.flatnonzero(missing_ref | skipped):
+                if missing_ref[idx]:
                     result['errors'] += 1
-                    result['messages'].append(f"Row {idx+1}: {str(e)}")
-                    logger.error(f"Error processing LCL quote row {idx+1}: {str(e)}")
+                    result['messages'].append(f"Row {idx+1}: Missing Quote Reference No.")
+                else:
+                    result['messages'].append(f"Skipped existing quote: {quote_refs[idx]}")
+            
+            # Use appropriate INSERT strategy based on replace_existing
+            insert_mode = "INSERT OR REPLACE" if replace_existing else "INSERT OR IGNORE"
+            row_positions = np.flatnonzero(~(missing_ref | skipped))
+            all_rows = list(zip(*(sql_values(values) for values in columns.values())))
+            rows = [all_rows[idx] for idx in row_positions]
+            inserted, errors = bulk_insert(cursor, config['table'], list(columns), rows, insert_mode)
+            result['success'] += len(inserted)
+            for position, error in errors:
+                idx = row_positions[position]
+                result['errors'] += 1
+                result['messages'].append(f"Row {idx+1}: {str(error)}")
+                logger.error(f"Error processing {label} quote row {idx+1}: {str(error)}")
             
             conn.commit()
             conn.close()
-            result['messages'].append(f"Successfully processed {result['success']} LCL quotes")
+            timer.lap('insert')
+            result['messages'].append(f"Successfully processed {result['success']} {label} quotes")
+            logger.info(f"Loaded {result['success']} {label} quotes from {sheet_name}: {timer.summary()}")
             
         except Exception as e:
             result['errors'] += 1
-            result['messages'].append(f"Error processing LCL quotes: {str(e)}")
-            logger.error(f"Error processing LCL quotes: {str(e)}")
+            result['messages'].append(f"Error processing {label} quotes: {str(e)}")
+            logger.error(f"Error processing {label} quotes: {str(e)}")
         
         return result
     
-    def safe_get(self, row, key, default=None):
-        """Safely get value from pandas row."""
-        try:
-            value = row.get(key, default)
-            if pd.isna(value):
-                return default
-            return str(value).strip() if value is not None else default
-        except:
-            return default
-    
-    def safe_float(self, row, key, default=None):
-        """Safely convert value to float."""
-        try:
-            value = row.get(key, default)
-            if pd.isna(value) or value is None:
-                return default
-            return float(value)
-        except:
-            return default
-    
-    def safe_int(self, row, key, default=None):
-        """Safely convert value to int."""
-        try:
-            value = row.get(key, default)
-            if pd.isna(value) or value is None:
-                return default
-            return int(float(value))
-        except:
-            return default
+    def _existing_references(self, cursor, table: str, quote_refs: List[str]) -> set:
+        """Quote references of the list that are already stored"""
+        existing = set()
+        for start in range(0, len(quote_refs), 500):
+            chunk = quote_refs[start:start + 500]
+            cursor.execute(f"SELECT quote_reference_no FROM {table} WHERE quote_reference_no IN ({', '.join(['?'] * len(chunk))})",
+                           chunk)
+            existing.update(row[0] for row in cursor.fetchall())
+        return existing
     
     def parse_date(self, date_value):
         """Parse date from various formats."""
@@ -6,11 +6,14 @@ DHL Express 3rd Party Charge Database Schema and Loader
 This script creates the database schema and loads the 3rd party charge data.
 """
 
+import os
 import sqlite3
 import pandas as pd
 import re
 from typing import Dict, List, Tuple, Optional
 
+from rate_card_versions import DHL_EXPRESS_3RD_PARTY_TABLES, bump_rate_card_version
+
 class DHLExpress3rdPartyLoader:
     """Loader for DHL Express 3rd Party rate cards"""
     
@@ -76,6 +79,10 @@ class DHLExpress3rdPartyLoader:
         cursor.execute('CREATE INDEX idx_3rd_party_matrix_zones ON dhl_express_3rd_party_matrix(origin_zone, destination_zone)')
         cursor.execute('CREATE INDEX idx_3rd_party_rates_weight ON dhl_express_3rd_party_rates(weight_kg)')
         
+        # The tables are empty until the loads run; cached lookups must not outlive them
+        for table_name in DHL_EXPRESS_3RD_PARTY_TABLES:
+            bump_rate_card_version(cursor, table_name, 'create_3rd_party_tables')
+        
         conn.commit()
         conn.close()
         
@@ -132,6 +139,7 @@ class DHLExpress3rdPartyLoader:
                 VALUES (?, ?, ?)
             ''', zones_data)
             
+            bump_rate_card_version(cursor, 'dhl_express_3rd_party_zones', os.path.basename(excel_path))
             conn.commit()
             conn.close()
             
@@ -199,6 +207,7 @@ class DHLExpress3rdPartyLoader:
                 VALUES (?, ?, ?)
             ''', matrix_data)
             
+            bump_rate_card_version(cursor, 'dhl_express_3rd_party_matrix', os.path.basename(excel_path))
             conn.commit()
             conn.close()
             
@@ -292,6 +301,7 @@ class DHLExpress3rdPartyLoader:
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', rates_data)
             
+            bump_rate_card_version(cursor, 'dhl_express_3rd_party_rates', os.path.basename(excel_path))
             conn.commit()
             conn.close()
             
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+DHL Express 3rd Party Matrix
+The 3rd party zone mapping, zone matrix and rate table compiled into dense
+NumPy arrays, so a 3rd party audit is a dict lookup per country and array
+indexing per (origin zone, destination zone, weight bracket) instead of
+four queries per line. Rebuilt when a loader bumps one of the tables' versions.
+"""
+
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rate_card_versions import DHL_EXPRESS_3RD_PARTY_TABLES, RateCardSubscription
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ThirdPartyRateMatrix:
+    """
+    Compiled 3rd party rate card.
+
+    zones holds the zone values of dhl_express_3rd_party_zones by position;
+    rate_zone_index[origin, destination] is the position of the matrix's
+    rate zone (-1 without a matrix entry) and zone_rates[origin, destination,
+    bracket] the rate for that lane and weights[bracket] (NaN when the rate
+    cell is empty or the rate zone has no zone_x column). Lookups return
+    what the audit's queries returned: the first row for a key, exact weight
+    matches only.
+    """
+
+    def __init__(self, zone_rows: List[tuple], matrix_rows: List[tuple],
+                 rate_columns: Sequence[str], rate_rows: List[tuple]):
+        self.country_zones: Dict[str, int] = {}
+        self.zones: List = []
+        zone_positions: Dict = {}
+        for country_code, zone in zone_rows:
+            if country_code in self.country_zones:
+                continue
+            if zone not in zone_positions:
+                zone_positions[zone] = len(self.zones)
+                self.zones.append(zone)
+            self.country_zones[country_code] = zone_positions[zone]
+
+        # Rate zones in the order the matrix first uses them
+        self.rate_zones: List = []
+        rate_zone_positions: Dict = {}
+        self.rate_zone_index = np.full((len(self.zones), len(self.zones)), -1, dtype=np.int16)
+        for origin_zone, destination_zone, rate_zone in matrix_rows:
+            # NULL never equals a zone in SQL
+            if origin_zone is None or destination_zone is None:
+                continue
+            origin = zone_positions.get(origin_zone)
+            destination = zone_positions.get(destination_zone)
+            if origin is None or destination is None or self.rate_zone_index[origin, destination] >= 0:
+                continue
+            if rate_zone not in rate_zone_positions:
+                rate_zone_positions[rate_zone] = len(self.rate_zones)
+                self.rate_zones.append(rate_zone)
+            self.rate_zone_index[origin, destination] = rate_zone_positions[rate_zone]
+
+        # zone_x column of each rate zone, -1 when the rates table has none
+        column_positions = {name: position for position, name in enumerate(rate_columns)}
+        self.rate_zone_columns = np.array([
+            column_positions.get(f'zone_{rate_zone.lower()}', -1) if isinstance(rate_zone, str) else -1
+            for rate_zone in self.rate_zones
+        ], dtype=np.int64)
+
+        # Weight brackets in order, the first row of a repeated weight kept
+        rates = np.array([[_float(value) for value in row] for row in rate_rows],
+                         dtype=np.float64).reshape(len(rate_rows), len(rate_columns))
+        weights = rates[:, 0] if len(rate_columns) else np.empty(0)
+        keep = ~np.isnan(weights)
+        weights, first = np.unique(weights[keep], return_index=True)
+        rates = rates[keep][first]
+        self.weights = weights
+        self.brackets: Dict[float, int] = {weight: position for position, weight in enumerate(weights.tolist())}
+
+        # (rate zone, bracket) rates with a NaN column for rate zones without one
+        by_rate_zone = np.full((len(self.rate_zones) + 1, len(weights)), np.nan)
+        valid = self.rate_zone_columns >= 0
+        by_rate_zone[:-1][valid] = rates[:, self.rate_zone_columns[valid]].T
+        # Index -1 (no matrix entry) lands on the NaN row
+        self.zone_rates = by_rate_zone[self.rate_zone_index]
+
+    @classmethod
+    def from_database(cls, db_path: str) -> 'ThirdPartyRateMatrix':
+        """Read the 3 tables with the columns the audit queries"""
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT country_code, zone FROM dhl_express_3rd_party_zones')
+            zone_rows = cursor.fetchall()
+            cursor.execute('''
+                SELECT origin_zone, destination_zone, rate_zone
+                FROM dhl_express_3rd_party_matrix
+            ''')
+            matrix_rows = cursor.fetchall()
+
+            cursor.execute('PRAGMA table_info(dhl_express_3rd_party_rates)')
+            zone_columns = [row[1] for row in cursor.fetchall() if row[1].startswith('zone_')]
+            rate_columns = ['weight_kg'] + zone_columns
+            cursor.execute(f"SELECT {', '.join(rate_columns)} FROM dhl_express_3rd_party_rates")
+            rate_rows = cursor.fetchall()
+        finally:
+            conn.close()
+        return cls(zone_rows, matrix_rows, rate_columns, rate_rows)
+
+    def zone(self, country_code: str) -> Optional[int]:
+        """Position of a country's 3rd party zone, None if it has none"""
+        return self.country_zones.get(country_code)
+
+    def rate_zone(self, origin: int, destination: int):
+        """Matrix rate zone of two zone positions, None without an entry"""
+        position = self.rate_zone_index[origin, destination]
+        return self.rate_zones[position] if position >= 0 else None
+
+    def bracket(self, weight) -> int:
+        """Position of the weight bracket equal to weight, -1 when there is none"""
+        return self.brackets.get(_float(weight), -1)
+
+    def rate(self, origin: int, destination: int, weight) -> Optional[float]:
+        """Rate of a lane for an exact weight, None when the rate card has no value"""
+        position = self.rate_zone_index[origin, destination]
+        if position >= 0 and self.rate_zone_columns[position] < 0:
+            # What the query on the rate zone's missing zone_x column raised
+            raise sqlite3.OperationalError(f'no such column: zone_{self.rate_zones[position].lower()}')
+        bracket = self.bracket(weight)
+        if bracket < 0:
+            return None
+        rate = self.zone_rates[origin, destination, bracket]
+        return None if np.isnan(rate) else float(rate)
+
+
+# Rebuilt when a 3rd party loader bumps one of the tables' versions
+_matrices = RateCardSubscription(DHL_EXPRESS_3RD_PARTY_TABLES, ThirdPartyRateMatrix.from_database)
+
+
+def get_3rd_party_matrix(db_path: str, conn=None) -> ThirdPartyRateMatrix:
+    """Return the compiled 3rd party rate card, rebuilding it after a reload"""
+    return _matrices.get(db_path, conn)
+
+
+def invalidate_3rd_party_matrix(db_path: str = None):
+    """Drop compiled 3rd party rate cards (all of them when db_path is None)"""
+    _matrices.invalidate(db_path)
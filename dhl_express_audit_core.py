@@ -3,8 +3,6 @@
 from typing import Dict, List, Optional, Union
 import sqlite3
 import json
-import csv
-from pathlib import Path
 from datetime import datetime
 
 # Import from our new modules
@@ -12,11 +10,13 @@ from dhl_express_audit_constants import (
     THIRD_PARTY_INDICATORS, VARIANCE_THRESHOLD_PASS, VARIANCE_THRESHOLD_REVIEW
 )
 from dhl_express_audit_utils import (
-    extract_country_code, get_au_domestic_zone, parse_date, is_domestic_shipment
+    extract_country_code, get_au_domestic_zone, is_domestic_shipment
 )
 from dhl_express_audit_service_charges import (
     match_service_description, get_bonded_storage_charge, get_expected_service_charge
 )
+from dhl_express_csv_loader import DHLExpressCSVLoader
+from dhl_express_3rd_party_matrix import ThirdPartyRateMatrix, get_3rd_party_matrix
 
 
 class DHLExpressAuditEngine:
@@ -35,12 +35,14 @@ class DHLExpressAuditEngine:
         """Initialize the audit engine with database connection."""
         self.db_path = db_path
     
-    def audit_invoice(self, invoice_no: str, conn=None) -> Dict:
+    def audit_invoice(self, invoice_no: str, conn=None,
+                      matrix: Optional[ThirdPartyRateMatrix] = None) -> Dict:
         """Audit a DHL Express invoice and return detailed results.
         
         Args:
             invoice_no: The invoice number to audit
             conn: Optional database connection (will create if not provided)
+            matrix: Optional compiled 3rd party rate card (read once here if not provided)
             
         Returns:
             Dict containing audit results with status, amounts, and line item details
@@ -66,6 +68,10 @@ class DHLExpressAuditEngine:
                 conn.close()
             return {'status': 'ERROR', 'message': f'Invoice {invoice_no} not found'}
         
+        # One 3rd party rate card for every line of the invoice
+        if matrix is None:
+            matrix = self._get_3rd_party_matrix(conn)
+        
         # Process each line item
         line_items = []
         total_invoice_amount = 0
@@ -91,7 +97,7 @@ class DHLExpressAuditEngine:
             total_invoice_amount += line['amount']
             
             # Audit the line item
-            audit_result = self._audit_line_item(line, conn)
+            audit_result = self._audit_line_item(line, conn, matrix)
             
             # Add audit results to the line item
             line_item_result = {
@@ -165,14 +171,15 @@ class DHLExpressAuditEngine:
             'line_items': line_items
         }
     
-    def _audit_line_item(self, line: Dict, conn) -> Dict:
+    def _audit_line_item(self, line: Dict, conn,
+                         matrix: Optional[ThirdPartyRateMatrix] = None) -> Dict:
         """Audit a single line item based on product description."""
         product_desc = line.get('description', '').upper()
         
         # Different audit logic based on product description
         if 'EXPRESS' in product_desc and ('WORLDWIDE' in product_desc or 'DOMESTIC' in product_desc):
             # Express shipment rate
-            return self._audit_express_rate(line, conn)
+            return self._audit_express_rate(line, conn, matrix)
         elif 'FUEL SURCHARGE' in product_desc:
             # Fuel surcharge - accept as-is for now
             return {
@@ -213,6 +220,13 @@ class DHLExpressAuditEngine:
             service_code = match_service_description(product_desc, conn)
             return get_expected_service_charge(line, service_code, conn)
     
+    def _get_3rd_party_matrix(self, conn) -> Optional[ThirdPartyRateMatrix]:
+        """Compiled 3rd party rate card, None when it cannot be built from the tables."""
+        try:
+            return get_3rd_party_matrix(self.db_path, conn)
+        except sqlite3.Error:
+            return None
+    
     def _is_3rd_party_charge(self, product_desc: str) -> bool:
         """Determine if this is a 3rd party charge."""
         for indicator in THIRD_PARTY_INDICATORS:
@@ -220,7 +234,8 @@ class DHLExpressAuditEngine:
                 return True
         return False
     
-    def _audit_express_rate(self, line: Dict, conn) -> Dict:
+    def _audit_express_rate(self, line: Dict, conn,
+                            matrix: Optional[ThirdPartyRateMatrix] = None) -> Dict:
         """Audit express rate - determines rate card based on origin/destination."""
         cursor = conn.cursor()
         
@@ -274,7 +289,7 @@ class DHLExpressAuditEngine:
             # Neither shipper nor consignee is Australia → Use 3rd Party rate card
             # But only if this is actually a 3rd party charge description
             if self._is_3rd_party_charge(product_desc):
-                return self._audit_3rd_party_rate(line, conn)
+                return self._audit_3rd_party_rate(line, conn, matrix, origin_country, dest_country)
             else:
                 # This shouldn't happen - non-AU to non-AU but not 3rd party description
                 return {
@@ -508,8 +523,14 @@ class DHLExpressAuditEngine:
                 'comments': [f'Regular audit error: {str(e)}']
             }
     
-    def _audit_3rd_party_rate(self, line: Dict, conn) -> Dict:
-        """Audit 3rd party charge using our new logic"""
+    def _audit_3rd_party_rate(self, line: Dict, conn, matrix: Optional[ThirdPartyRateMatrix] = None,
+                              origin_country: str = None, dest_country: str = None) -> Dict:
+        """Audit 3rd party charge using our new logic
+        
+        The zone mapping, matrix and rates come from the compiled 3rd party
+        matrix the invoice or batch read once; countries already extracted by
+        the caller skip the invoice query.
+        """
         cursor = conn.cursor()
         
         weight = line.get('weight', 0)
@@ -517,28 +538,29 @@ class DHLExpressAuditEngine:
         awb = line.get('awb_number')
         
         try:
-            # Get origin and destination countries
-            cursor.execute('''
-                SELECT shipper_details, receiver_details
-                FROM dhl_express_invoices
-                WHERE awb_number = ?
-                LIMIT 1
-            ''', (awb,))
-            
-            result = cursor.fetchone()
-            if not result:
-                return {
-                    'expected_amount': amount,
-                    'variance': 0,
-                    'audit_result': 'REVIEW',
-                    'comments': ['No shipment details found for 3rd party audit']
-                }
-            
-            shipper_details, receiver_details = result
-            
-            # Extract country codes
-            origin_country = extract_country_code(shipper_details)
-            dest_country = extract_country_code(receiver_details)
+            if not origin_country or not dest_country:
+                # Get origin and destination countries
+                cursor.execute('''
+                    SELECT shipper_details, receiver_details
+                    FROM dhl_express_invoices
+                    WHERE awb_number = ?
+                    LIMIT 1
+                ''', (awb,))
+                
+                result = cursor.fetchone()
+                if not result:
+                    return {
+                        'expected_amount': amount,
+                        'variance': 0,
+                        'audit_result': 'REVIEW',
+                        'comments': ['No shipment details found for 3rd party audit']
+                    }
+                
+                shipper_details, receiver_details = result
+                
+                # Extract country codes
+                origin_country = extract_country_code(shipper_details)
+                dest_country = extract_country_code(receiver_details)
             
             if not origin_country or not dest_country:
                 return {
@@ -548,20 +570,15 @@ class DHLExpressAuditEngine:
                     'comments': ['Could not extract country codes for 3rd party audit']
                 }
             
-            # Step 1: Get zones from 3rd party mapping
-            cursor.execute('''
-                SELECT zone FROM dhl_express_3rd_party_zones 
-                WHERE country_code = ?
-            ''', (origin_country,))
-            origin_result = cursor.fetchone()
+            if matrix is None:
+                # Not read up front (a 3rd party table error is reported here, per line)
+                matrix = get_3rd_party_matrix(self.db_path, conn)
             
-            cursor.execute('''
-                SELECT zone FROM dhl_express_3rd_party_zones 
-                WHERE country_code = ?
-            ''', (dest_country,))
-            dest_result = cursor.fetchone()
+            # Step 1: Get zones from 3rd party mapping
+            origin_position = matrix.zone(origin_country)
+            dest_position = matrix.zone(dest_country)
             
-            if not origin_result or not dest_result:
+            if origin_position is None or dest_position is None:
                 return {
                     'expected_amount': amount,
                     'variance': 0,
@@ -569,17 +586,13 @@ class DHLExpressAuditEngine:
                     'comments': [f'3rd party zones not found for {origin_country} → {dest_country}']
                 }
             
-            origin_zone = origin_result[0]
-            dest_zone = dest_result[0]
+            origin_zone = matrix.zones[origin_position]
+            dest_zone = matrix.zones[dest_position]
             
             # Step 2: Get rate zone from matrix
-            cursor.execute('''
-                SELECT rate_zone FROM dhl_express_3rd_party_matrix 
-                WHERE origin_zone = ? AND destination_zone = ?
-            ''', (origin_zone, dest_zone))
-            matrix_result = cursor.fetchone()
+            rate_zone = matrix.rate_zone(origin_position, dest_position)
             
-            if not matrix_result:
+            if rate_zone is None:
                 return {
                     'expected_amount': amount,
                     'variance': 0,
@@ -587,17 +600,10 @@ class DHLExpressAuditEngine:
                     'comments': [f'No 3rd party matrix entry for Zone {origin_zone} × Zone {dest_zone}']
                 }
             
-            rate_zone = matrix_result[0]
-            
             # Step 3: Get rate for weight and zone
-            zone_column = f"zone_{rate_zone.lower()}"
-            cursor.execute(f'''
-                SELECT {zone_column} FROM dhl_express_3rd_party_rates 
-                WHERE weight_kg = ?
-            ''', (weight,))
-            rate_result = cursor.fetchone()
+            expected_amount = matrix.rate(origin_position, dest_position, weight)
             
-            if not rate_result or rate_result[0] is None:
+            if expected_amount is None:
                 return {
                     'expected_amount': amount,
                     'variance': 0,
@@ -605,7 +611,6 @@ class DHLExpressAuditEngine:
                     'comments': [f'No 3rd party rate found for {weight}kg Zone {rate_zone}']
                 }
             
-            expected_amount = float(rate_result[0])
             variance = expected_amount - amount
             
             # Determine audit result
@@ -834,10 +839,12 @@ class DHLExpressAuditEngine:
         results = []
         
         conn = sqlite3.connect(self.db_path)
+        # One 3rd party rate card version read for the whole batch
+        matrix = self._get_3rd_party_matrix(conn)
         
         for invoice_id in invoice_list:
             try:
-                result = self.audit_invoice(invoice_id, conn)
+                result = self.audit_invoice(invoice_id, conn, matrix)
                 results.append({
                     'invoice_id': invoice_id,
                     'status': result['status'],
@@ -867,118 +874,17 @@ class DHLExpressAuditEngine:
             'results': results
         }
     
-    def load_invoices_from_csv(self, file_path: str) -> Dict:
-        """Load DHL Express invoices from CSV file."""
-        file_path = Path(file_path)
-        if not file_path.exists():
-            return {'success': False, 'error': f'File not found: {file_path}'}
+    def load_invoices_from_csv(self, file_path: str, file_hash: Optional[str] = None) -> Dict:
+        """Load DHL Express invoices from CSV file.
         
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            total_records = 0
-            inserted_records = 0
-            duplicate_records = 0
-            error_records = 0
-            errors = []
-            
-            with open(file_path, 'r', encoding='utf-8') as csvfile:
-                # Read first line to check if it's a header
-                first_line = csvfile.readline().strip()
-                csvfile.seek(0)
-                
-                # Skip header if present
-                if 'Invoice No' in first_line or 'invoice_no' in first_line:
-                    next(csvfile)
-                    
-                reader = csv.reader(csvfile)
-                
-                for row_num, row in enumerate(reader, start=2 if 'Invoice No' in first_line else 1):
-                    total_records += 1
-                    
-                    try:
-                        # Skip empty rows
-                        if not any(cell.strip() for cell in row):
-                            continue
-                            
-                        # Ensure we have enough columns
-                        if len(row) < 22:
-                            row.extend([''] * (22 - len(row)))
-                        
-                        # Parse the row data
-                        invoice_data = {
-                            'invoice_no': row[0].strip() if row[0] else '',
-                            'invoice_date': parse_date(row[1]) if row[1] else None,
-                            'company_name': row[2].strip() if row[2] else '',
-                            'account_number': row[3].strip() if row[3] else '',
-                            'line_number': int(row[4]) if row[4] and row[4].strip().isdigit() else 0,
-                            'item_id': row[5].strip() if row[5] else '',
-                            'dhl_product_description': row[6].strip() if row[6] else '',
-                            'pal_col': int(row[7]) if row[7] and row[7].strip().isdigit() else 0,
-                            'amount': float(row[8]) if row[8] and row[8].strip() else 0.0,
-                            'weight_charge': float(row[9]) if row[9] and row[9].strip() else 0.0,
-                            'discount_amount': float(row[10]) if row[10] and row[10].strip() else 0.0,
-                            'discount_code': row[11].strip() if row[11] else '',
-                            'tax_amount': float(row[12]) if row[12] and row[12].strip() else 0.0,
-                            'tax_code': row[13].strip() if row[13] else '',
-                            'awb_number': row[14].strip() if row[14] else '',
-                            'weight': float(row[15]) if row[15] and row[15].strip() else 0.0,
-                            'shipper_reference': row[16].strip() if row[16] else '',
-                            'shipment_date': parse_date(row[17]) if row[17] else None,
-                            'origin_code': row[18].strip() if row[18] else '',
-                            'destination_code': row[19].strip() if row[19] else '',
-                            'shipper_details': row[20].strip() if len(row) > 20 and row[20] else '',
-                            'receiver_details': row[21].strip() if len(row) > 21 and row[21] else ''
-                        }
-                        
-                        # Insert into database
-                        cursor.execute('''
-                            INSERT OR IGNORE INTO dhl_express_invoices 
-                            (invoice_no, invoice_date, company_name, account_number, line_number,
-                             item_id, dhl_product_description, pal_col, amount, weight_charge,
-                             discount_amount, discount_code, tax_amount, tax_code, awb_number,
-                             weight, shipper_reference, shipment_date, origin_code, destination_code,
-                             shipper_details, receiver_details)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            invoice_data['invoice_no'], invoice_data['invoice_date'],
-                            invoice_data['company_name'], invoice_data['account_number'],
-                            invoice_data['line_number'], invoice_data['item_id'],
-                            invoice_data['dhl_product_description'], invoice_data['pal_col'],
-                            invoice_data['amount'], invoice_data['weight_charge'],
-                            invoice_data['discount_amount'], invoice_data['discount_code'],
-                            invoice_data['tax_amount'], invoice_data['tax_code'],
-                            invoice_data['awb_number'], invoice_data['weight'],
-                            invoice_data['shipper_reference'], invoice_data['shipment_date'],
-                            invoice_data['origin_code'], invoice_data['destination_code'],
-                            invoice_data['shipper_details'], invoice_data['receiver_details']
-                        ))
-                        
-                        if cursor.rowcount > 0:
-                            inserted_records += 1
-                        else:
-                            duplicate_records += 1
-                            
-                    except Exception as e:
-                        error_records += 1
-                        errors.append(f"Row {row_num}: {str(e)}")
-                        continue
-            
-            conn.commit()
-            conn.close()
-            
-            return {
-                'success': True,
-                'total_records': total_records,
-                'inserted_records': inserted_records,
-                'duplicate_records': duplicate_records,
-                'error_records': error_records,
-                'errors': errors[:10]  # Limit to first 10 errors
-            }
-            
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        Rows are parsed and validated column-wise and bulk inserted; rows that
+        fail validation are stored in invoice_load_rejects.
+        
+        Args:
+            file_path: The CSV file to load
+            file_hash: SHA-256 of the file when the caller already has it (saved uploads)
+        """
+        return DHLExpressCSVLoader(self.db_path).load(file_path, file_hash)
     
     def get_unaudited_invoices(self) -> List[str]:
         """Get list of invoice numbers that haven't been audited yet."""
@@ -6,12 +6,97 @@ DHL Express China Invoice Loader
 Loads Chinese DHL Express invoices from Excel files
 Handles the 68-column format with proper data mapping
 """
+import numpy as np
 import pandas as pd
 import sqlite3
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from dhl_express_csv_loader import INSERT_BATCH_SIZE, create_rejects_table, record_rejects
+
+LOADER_NAME = 'dhl_express_china'
+
+# (database column, Excel column, conversion, value when the Excel column is missing);
+# 'text' keeps the cell (NaN as NULL), 'str' is str(cell), air_waybill is converted separately
+COLUMN_MAP = [
+    ('source_country', 'Source Country', 'text', None),
+    ('billing_period', 'Billing Period', 'text', None),
+    ('service_type', 'Service Type', 'text', None),
+    ('billing_term', 'Billing Term', 'text', None),
+    ('billing_type', 'Billing Type', 'text', None),
+    ('transaction_status', 'Transaction Status', 'text', None),
+    ('ib434_line_id', 'IB434 Line ID', 'text', None),
+    ('omit_code', 'Omit Code', 'text', None),
+    ('offset_code', 'Offset Code', 'text', None),
+    ('transaction_status_description', 'Transaction Status Description', 'text', None),
+    
+    ('shipment_date', 'Shipment Date', 'text', None),
+    ('load_date', 'Load Date', 'text', None),
+    ('air_waybill', 'Air waybill', 'awb', ''),
+    ('unique_record_id', 'Unique Record ID', 'text', None),
+    ('shipper_account', 'Shipper Account', 'str', ''),
+    ('bill_to_account', 'Bill To Account', 'str', ''),
+    ('bill_to_account_name', 'Bill To Account Name', 'text', None),
+    ('shipper_reference', 'Shipper Reference', 'text', None),
+    ('local_product_code', 'Local Product Code', 'text', None),
+    ('origin_code', 'Orgn', 'text', None),
+    ('dest_code', 'Dest', 'text', None),
+    
+    ('billing_currency', 'Billing Currency', 'text', None),
+    ('invoice_number', 'Invoice Number', 'text', None),
+    ('invoice_date', 'Invoice Date', 'text', None),
+    ('original_invoice', 'Original Invoice', 'text', None),
+    ('original_invoice_date', 'Original Invoice Dt.', 'text', None),
+    ('modify_code', 'Modify Code', 'text', None),
+    ('modify_description', 'Modify Description', 'text', None),
+    
+    ('pieces', 'Pieces', 'int', 0),
+    ('customer_weight', 'Customer Weight', 'float', 0.0),
+    ('dhl_weight', 'DHL Weight', 'float', 0.0),
+    ('customer_vol_weight', 'Customer Vol. Weight', 'float', 0.0),
+    ('dhl_vol_weight', 'DHL Vol. Weight', 'float', 0.0),
+    ('weight_code', 'Weight Code', 'text', None),
+    ('billed_weight_kg', 'Billed Weight (Kilos)', 'float', 0.0),
+    ('billed_weight_lbs', 'Billed Weight (Pounds)', 'float', 0.0),
+    
+    ('bcu_weight_charge', 'Weight Charge', 'float', 0.0),
+    ('bcu_fuel_surcharges', 'Fuel Surcharges', 'float', 0.0),
+    ('bcu_other_charges', 'Other Charges', 'float', 0.0),
+    ('bcu_discount', 'Discount', 'float', 0.0),
+    ('bcu_duties_taxes', 'Imp/Exp Duties & Taxes', 'float', 0.0),
+    ('bcu_taxes_applicable', 'Taxes to Applicable Charges', 'float', 0.0),
+    ('bcu_total', 'BCU Total', 'float', 0.0),
+    
+    ('exchange_rate', 'Ex. Rate To LCU', 'float', 1.0),
+    ('local_currency', 'Local Currency', 'text', None),
+    ('lcu_weight_charge', 'LCU Weight Charge', 'float', 0.0),
+    ('lcu_fuel_surcharges', 'LCU Fuel Surcharges', 'float', 0.0),
+    ('lcu_other_charges', 'LCU Other Charges', 'float', 0.0),
+    ('lcu_discount', 'LCU Discount', 'float', 0.0),
+    ('lcu_duties_taxes', 'LCU Imp/Exp Duties & Taxes', 'float', 0.0),
+    ('lcu_taxes_applicable', 'LCU Taxes to Applicable Charges', 'float', 0.0),
+    ('lcu_total', 'LCU Total', 'float', 0.0),
+    
+    ('consignor_name', 'Consignor Name', 'text', None),
+    ('consignor_contact_name', 'Consignor Contact Name', 'text', None),
+    ('consignor_address_1', 'Consignor Address 1', 'text', None),
+    ('consignor_address_2', 'Consignor Address 2', 'text', None),
+    ('consignor_city', 'Consignor City', 'text', None),
+    ('consignor_province_state', 'Consignor Province / State', 'text', None),
+    ('consignor_country', 'Consignor Country', 'text', None),
+    ('consignor_postal_code', 'Consignor Postal Code', 'str', ''),
+    
+    ('consignee_name', 'Consignee Name', 'text', None),
+    ('consignee_contact_name', 'Consignee Contact Name', 'text', None),
+    ('consignee_address_1', 'Consignee Address 1', 'text', None),
+    ('consignee_address_2', 'Consignee Address 2', 'text', None),
+    ('consignee_city', 'Consignee City', 'text', None),
+    ('consignee_province_state', 'Consignee Province / State', 'text', None),
+    ('consignee_country', 'Consignee Country', 'text', None),
+    ('consignee_postal_code', 'Consignee Postal Code', 'str', '')
+]
+
 class DHLExpressChinaInvoiceLoader:
     def __init__(self, db_path: str = 'dhl_audit.db'):
         self.db_path = db_path
@@ -33,10 +118,10 @@ class DHLExpressChinaInvoiceLoader:
             print(f"   🧹 Cleaned data: {len(df_clean)} valid records")
             
             # Load into database
-            loaded_count = self._load_to_database(df_clean)
+            loaded_count = self._load_to_database(df_clean, os.path.basename(excel_path))
             
-            # Update upload record
-            self._record_upload_complete(upload_id, loaded_count, len(df), 0)
+            # Update upload record; rows that could not be loaded are in invoice_load_rejects
+            self._record_upload_complete(upload_id, loaded_count, len(df), len(df_clean) - loaded_count)
             
             return {
                 'success': True,
@@ -92,113 +177,92 @@ class DHLExpressChinaInvoiceLoader:
         
         return df_clean
     
-    def _load_to_database(self, df: pd.DataFrame) -> int:
+    def _load_to_database(self, df: pd.DataFrame, source_file: str = None) -> int:
         """Load cleaned data to database"""
         print("   💾 Loading to database...")
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        loaded_count = 0
+        # Excel row numbers (header is row 1) before the index is reset
+        row_numbers = (df.index.to_numpy() + 2).tolist()
+        df = df.reset_index(drop=True)
         
-        for _, row in df.iterrows():
-            try:
-                # Map DataFrame columns to database columns
-                invoice_data = {
-                    'source_country': row.get('Source Country'),
-                    'billing_period': row.get('Billing Period'),
-                    'service_type': row.get('Service Type'),
-                    'billing_term': row.get('Billing Term'),
-                    'billing_type': row.get('Billing Type'),
-                    'transaction_status': row.get('Transaction Status'),
-                    'ib434_line_id': row.get('IB434 Line ID'),
-                    'omit_code': row.get('Omit Code'),
-                    'offset_code': row.get('Offset Code'),
-                    'transaction_status_description': row.get('Transaction Status Description'),
-                    
-                    'shipment_date': row.get('Shipment Date'),
-                    'load_date': row.get('Load Date'),
-                    'air_waybill': str(int(row.get('Air waybill', 0))) if pd.notna(row.get('Air waybill')) else '',
-                    'unique_record_id': row.get('Unique Record ID'),
-                    'shipper_account': str(row.get('Shipper Account', '')),
-                    'bill_to_account': str(row.get('Bill To Account', '')),
-                    'bill_to_account_name': row.get('Bill To Account Name'),
-                    'shipper_reference': row.get('Shipper Reference'),
-                    'local_product_code': row.get('Local Product Code'),
-                    'origin_code': row.get('Orgn'),
-                    'dest_code': row.get('Dest'),
-                    
-                    'billing_currency': row.get('Billing Currency'),
-                    'invoice_number': row.get('Invoice Number'),
-                    'invoice_date': row.get('Invoice Date'),
-                    'original_invoice': row.get('Original Invoice'),
-                    'original_invoice_date': row.get('Original Invoice Dt.'),
-                    'modify_code': row.get('Modify Code'),
-                    'modify_description': row.get('Modify Description'),
-                    
-                    'pieces': int(row.get('Pieces', 0)),
-                    'customer_weight': float(row.get('Customer Weight', 0)),
-                    'dhl_weight': float(row.get('DHL Weight', 0)),
-                    'customer_vol_weight': float(row.get('Customer Vol. Weight', 0)),
-                    'dhl_vol_weight': float(row.get('DHL Vol. Weight', 0)),
-                    'weight_code': row.get('Weight Code'),
-                    'billed_weight_kg': float(row.get('Billed Weight (Kilos)', 0)),
-                    'billed_weight_lbs': float(row.get('Billed Weight (Pounds)', 0)),
-                    
-                    'bcu_weight_charge': float(row.get('Weight Charge', 0)),
-                    'bcu_fuel_surcharges': float(row.get('Fuel Surcharges', 0)),
-                    'bcu_other_charges': float(row.get('Other Charges', 0)),
-                    'bcu_discount': float(row.get('Discount', 0)),
-                    'bcu_duties_taxes': float(row.get('Imp/Exp Duties & Taxes', 0)),
-                    'bcu_taxes_applicable': float(row.get('Taxes to Applicable Charges', 0)),
-                    'bcu_total': float(row.get('BCU Total', 0)),
-                    
-                    'exchange_rate': float(row.get('Ex. Rate To LCU', 1)),
-                    'local_currency': row.get('Local Currency'),
-                    'lcu_weight_charge': float(row.get('LCU Weight Charge', 0)),
-                    'lcu_fuel_surcharges': float(row.get('LCU Fuel Surcharges', 0)),
-                    'lcu_other_charges': float(row.get('LCU Other Charges', 0)),
-                    'lcu_discount': float(row.get('LCU Discount', 0)),
-                    'lcu_duties_taxes': float(row.get('LCU Imp/Exp Duties & Taxes', 0)),
-                    'lcu_taxes_applicable': float(row.get('LCU Taxes to Applicable Charges', 0)),
-                    'lcu_total': float(row.get('LCU Total', 0)),
-                    
-                    'consignor_name': row.get('Consignor Name'),
-                    'consignor_contact_name': row.get('Consignor Contact Name'),
-                    'consignor_address_1': row.get('Consignor Address 1'),
-                    'consignor_address_2': row.get('Consignor Address 2'),
-                    'consignor_city': row.get('Consignor City'),
-                    'consignor_province_state': row.get('Consignor Province / State'),
-                    'consignor_country': row.get('Consignor Country'),
-                    'consignor_postal_code': str(row.get('Consignor Postal Code', '')),
-                    
-                    'consignee_name': row.get('Consignee Name'),
-                    'consignee_contact_name': row.get('Consignee Contact Name'),
-                    'consignee_address_1': row.get('Consignee Address 1'),
-                    'consignee_address_2': row.get('Consignee Address 2'),
-                    'consignee_city': row.get('Consignee City'),
-                    'consignee_province_state': row.get('Consignee Province / State'),
-                    'consignee_country': row.get('Consignee Country'),
-                    'consignee_postal_code': str(row.get('Consignee Postal Code', ''))
-                }
-                
-                # Insert into database
-                columns = ', '.join(invoice_data.keys())
-                placeholders = ', '.join(['?' for _ in invoice_data.values()])
-                
-                cursor.execute(f'''
-                    INSERT OR REPLACE INTO dhl_express_china_invoices ({columns})
-                    VALUES ({placeholders})
-                ''', list(invoice_data.values()))
-                
-                loaded_count += 1
-                
-            except Exception as e:
-                print(f"      ⚠️  Error loading record {loaded_count + 1}: {e}")
+        columns = {}
+        for db_column, excel_column, kind, default in COLUMN_MAP:
+            if kind == 'awb':
                 continue
+            if excel_column not in df.columns:
+                columns[db_column] = pd.Series(default, index=df.index, dtype=object)
+            elif kind == 'int':
+                columns[db_column] = df[excel_column].astype('int64')
+            elif kind == 'float':
+                columns[db_column] = df[excel_column].astype('float64')
+            elif kind == 'str':
+                # str() of each cell, 'nan' included (pandas astype(str) keeps NaN missing)
+                columns[db_column] = pd.Series(df[excel_column].to_numpy(dtype=object).astype(str),
+                                               index=df.index, dtype=object)
+            else:
+                values = df[excel_column]
+                columns[db_column] = values.astype(object).where(values.notna(), None)
         
-        conn.commit()
-        conn.close()
+        # Air waybills are stored as integer text; anything int() rejects cannot be loaded
+        if 'Air waybill' in df.columns:
+            awb = df['Air waybill']
+            awb_numbers = pd.to_numeric(awb, errors='coerce')
+            invalid_awb = awb.notna() & (awb_numbers.isna() | np.isinf(awb_numbers))
+            present = awb.notna() & ~invalid_awb
+            columns['air_waybill'] = np.trunc(awb_numbers.where(present, 0)).astype('int64') \
+                .astype(str).where(present, '')
+        else:
+            invalid_awb = pd.Series(False, index=df.index)
+            columns['air_waybill'] = pd.Series('', index=df.index, dtype=object)
+        
+        db_columns = [db_column for db_column, _, _, _ in COLUMN_MAP]
+        query = f'''
+            INSERT OR REPLACE INTO dhl_express_china_invoices ({', '.join(db_columns)})
+            VALUES ({', '.join(['?'] * len(db_columns))})
+        '''
+        rows = list(zip(*(columns[db_column].tolist() for db_column in db_columns)))
+        valid = (~invalid_awb).tolist()
+        
+        rejects = [i for i, ok in enumerate(valid) if not ok]
+        reject_reasons = ['invalid Air waybill'] * len(rejects)
+        
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        cursor = conn.cursor()
+        loaded_count = 0
+        
+        try:
+            cursor.execute('BEGIN')
+            valid_rows = [i for i, ok in enumerate(valid) if ok]
+            for start in range(0, len(valid_rows), INSERT_BATCH_SIZE):
+                chunk = valid_rows[start:start + INSERT_BATCH_SIZE]
+                cursor.execute('SAVEPOINT chunk')
+                try:
+                    cursor.executemany(query, [rows[i] for i in chunk])
+                    loaded_count += len(chunk)
+                except sqlite3.Error:
+                    # Redo the chunk one row at a time to find the rows SQLite refuses
+                    cursor.execute('ROLLBACK TO chunk')
+                    for i in chunk:
+                        try:
+                            cursor.execute(query, rows[i])
+                            loaded_count += 1
+                        except sqlite3.Error as e:
+                            print(f"      ⚠️  Error loading record at row {row_numbers[i]}: {e}")
+                            rejects.append(i)
+                            reject_reasons.append(str(e))
+                cursor.execute('RELEASE chunk')
+            
+            if rejects:
+                create_rejects_table(cursor)
+                record_rejects(conn, LOADER_NAME, source_file, None, [row_numbers[i] for i in rejects],
+                               reject_reasons, [df.iloc[i].to_dict() for i in rejects])
+            cursor.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
         
         return loaded_count
     
@@ -15,28 +15,26 @@ Each with:
 Rates are in CNY (Chinese Yuan) instead of AUD.
 """
 
+import os
+import numpy as np
 import pandas as pd
 import sqlite3
 import re
 from datetime import datetime
 from typing import Dict, List, Tuple
 
+from complete_dhl_express_rate_card_loader import RATE_CARD_TABLE, rate_card_checks
+from rate_card_ingest import float_values, label_rows, open_workbook, read_sheet, zone_rates
+from rate_card_swap import ShadowTableSwap
+
+# Zone columns loaded per rate row
+ZONE_COUNT = 19
+
 class DHLExpressChinaRateCardLoader:
     def __init__(self, db_path: str = 'dhl_audit.db'):
         self.db_path = db_path
-        
-    def clear_existing_rates(self):
-        """Clear existing DHL Express rate cards to replace with Chinese ones"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Clear existing rate cards
-        cursor.execute('DELETE FROM dhl_express_rate_cards')
-        cursor.execute('DELETE FROM dhl_express_rate_cards_backup WHERE 1=1')
-        
-        conn.commit()
-        conn.close()
-        print("✅ Cleared existing AU rate cards")
+        # Rates are loaded into a shadow copy of the live table, then swapped in
+        self.swap = ShadowTableSwap(db_path, RATE_CARD_TABLE)
         
     def init_rate_card_table(self):
         """Initialize the DHL Express rate card table with proper structure for China"""
@@ -79,6 +77,9 @@ class DHLExpressChinaRateCardLoader:
         
         conn.commit()
         conn.close()
+        
+        # The load writes into an empty shadow table with the live table's structure
+        self.swap.create_shadow()
         print("✅ Initialized DHL Express rate card table structure for China (CNY rates)")
     
     def load_complete_rate_cards(self, excel_path: str) -> Dict:
@@ -97,25 +98,30 @@ class DHLExpressChinaRateCardLoader:
                 'currency': 'CNY'
             }
             
-            # Clear existing AU rates first
-            self.clear_existing_rates()
-            
-            # Initialize table
+            # Initialize the table and an empty shadow copy (the AU rates stay live until the swap)
             self.init_rate_card_table()
             
+            # Both sheets are read from one open workbook
+            workbook = open_workbook(excel_path)
+            
             # Load Import rates (CN TD IMP WW) 
-            import_count = self._load_service_rates(excel_path, 'CN TD Imp WW', 'Import')
+            import_count = self._load_service_rates(workbook, 'CN TD Imp WW', 'Import')
             results['import_rates_loaded'] = import_count
             
             # Load Export rates (CN TD EXP WW)  
-            export_count = self._load_service_rates(excel_path, 'CN TD Exp WW', 'Export')
+            export_count = self._load_service_rates(workbook, 'CN TD Exp WW', 'Export')
             results['export_rates_loaded'] = export_count
             
             results['sections_processed'] = 6  # 3 sections each for Import and Export
             
+            # Replace the live rates (AU or an older CN card) once the new ones pass the checks
+            results['rate_card_version'] = self.swap.swap(rate_card_checks(), source=os.path.basename(excel_path))
+            print(f"✅ Replaced existing rate cards with China rates (version {results['rate_card_version']})")
+            
             return results
             
         except Exception as e:
+            self.swap.discard()
             return {
                 'success': False,
                 'error': f'Failed to load Chinese rate cards: {str(e)}',
@@ -123,12 +129,12 @@ class DHLExpressChinaRateCardLoader:
                 'export_rates_loaded': 0
             }
     
-    def _load_service_rates(self, excel_path: str, sheet_name: str, service_type: str) -> int:
+    def _load_service_rates(self, workbook, sheet_name: str, service_type: str) -> int:
         """Load rates for a specific service (Import or Export)"""
         print(f"Loading China {service_type} rates from sheet: {sheet_name}")
         
         # Read the Excel sheet
-        df = pd.read_excel(excel_path, sheet_name=sheet_name, header=None)
+        df = read_sheet(workbook, sheet_name, header=None)
         
         total_loaded = 0
         
@@ -149,285 +155,128 @@ class DHLExpressChinaRateCardLoader:
         
         return total_loaded
     
-    def _load_documents_section(self, df: pd.DataFrame, service_type: str) -> int:
-        """Load Section 1: Documents up to 2.0 KG"""
+    def _section_row(self, df: pd.DataFrame, label: str):
+        """Row of the first column-0 cell containing label, or None"""
+        if df.empty:
+            return None
+        rows = label_rows(df[0], label)
+        return int(rows[0]) if len(rows) else None
+    
+    def _insert_rates(self, rows: List[tuple], multiplier: bool = False) -> int:
+        """executemany the rate rows (service, section, weight from/to, zones[, multiplier range])"""
+        if not rows:
+            return 0
+        columns = ['service_type', 'rate_section', 'weight_from', 'weight_to'] + \
+            [f'zone_{zone}' for zone in range(1, ZONE_COUNT + 1)]
+        if multiplier:
+            columns += ['is_multiplier', 'weight_range_from', 'weight_range_to']
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
+        cursor.executemany(f"""
+            INSERT INTO {self.swap.shadow_table} ({', '.join(columns)})
+            VALUES ({', '.join(['?'] * len(columns))})
+        """, rows)
+        conn.commit()
+        conn.close()
+        return len(rows)
+    
+    def _load_documents_section(self, df: pd.DataFrame, service_type: str) -> int:
+        """Load Section 1: Documents up to 2.0 KG"""
         # Find the "Documents up to 2.0 KG" section
-        doc_section_row = None
-        for idx, row in df.iterrows():
-            if pd.notna(row[0]) and "Documents up to 2.0" in str(row[0]):
-                doc_section_row = idx
-                break
+        doc_section_row = self._section_row(df, "Documents up to 2.0")
         
         if doc_section_row is None:
             print(f"  Warning: Documents section not found in {service_type}")
-            conn.close()
             return 0
         
-        # The header row should be next (KG, Zone 1, Zone 2, etc.)
+        # The header row should be next (KG, Zone 1, Zone 2, etc.), then one row per weight point
         header_row = doc_section_row + 1
-        
-        # Define the weight points for documents section
         doc_weights = [0.5, 1.0, 1.5, 2.0]
-        
-        loaded_count = 0
-        
-        for i, weight in enumerate(doc_weights):
-            data_row = header_row + 1 + i
-            
-            if data_row < len(df):
-                row_data = df.iloc[data_row]
-                
-                # Extract zone rates - Chinese sheets may have different zone counts
-                zone_rates = []
-                max_zones = min(19, len(row_data) - 2)  # Up to 19 zones, starting from column 2
-                
-                for zone_col in range(2, 2 + max_zones):
-                    if zone_col < len(row_data):
-                        try:
-                            rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                            zone_rates.append(rate)
-                        except:
-                            zone_rates.append(None)
-                    else:
-                        zone_rates.append(None)
-                
-                # Pad or truncate to exactly 19 zones
-                while len(zone_rates) < 19:
-                    zone_rates.append(None)
-                zone_rates = zone_rates[:19]
-                
-                # Insert the rate
-                weight_to = weight if weight < 2.0 else 2.0
-                
-                cursor.execute('''
-                    INSERT INTO dhl_express_rate_cards 
-                    (service_type, rate_section, weight_from, weight_to, 
-                     zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9, zone_10,
-                     zone_11, zone_12, zone_13, zone_14, zone_15, zone_16, zone_17, zone_18, zone_19)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (service_type, 'Documents', weight, weight_to, *zone_rates))
-                
-                loaded_count += 1
-        
-        conn.commit()
-        conn.close()
-        return loaded_count
+        data_rows = [row for row in range(header_row + 1, header_row + 1 + len(doc_weights)) if row < len(df)]
+        
+        # Zone rates (up to 19 zones from column 2, None past the last column)
+        rates = zone_rates(df, data_rows, ZONE_COUNT)
+        return self._insert_rates([
+            (service_type, 'Documents', weight, weight, *zone_rate)
+            for weight, zone_rate in zip(doc_weights, rates)
+        ])
     
     def _load_non_documents_section(self, df: pd.DataFrame, service_type: str) -> int:
         """Load Section 2: Non-documents from 0.5 KG & Documents from 2.5 KG"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Find the "Non-documents from 0.5 KG" section
-        non_doc_section_row = None
-        for idx, row in df.iterrows():
-            if pd.notna(row[0]) and "Non-documents from 0.5" in str(row[0]):
-                non_doc_section_row = idx
-                break
+        non_doc_section_row = self._section_row(df, "Non-documents from 0.5")
         
         if non_doc_section_row is None:
             print(f"  Warning: Non-documents section not found in {service_type}")
-            conn.close()
             return 0
         
-        # The header row should be next
-        header_row = non_doc_section_row + 1
-        
-        loaded_count = 0
-        
-        # Read until we hit the multiplier section or end of data
-        data_start_row = header_row + 1
-        
-        for row_idx in range(data_start_row, len(df)):
-            row_data = df.iloc[row_idx]
-            
-            # Check if we've hit the multiplier section
-            if pd.notna(row_data[0]) and "Multiplier" in str(row_data[0]):
-                break
-            
-            # Skip empty rows
-            if pd.isna(row_data[0]):
-                continue
-                
-            try:
-                weight = float(row_data[0])
-                
-                # Extract zone rates - handle variable zone counts
-                zone_rates = []
-                max_zones = min(19, len(row_data) - 2)
-                
-                for zone_col in range(2, 2 + max_zones):
-                    if zone_col < len(row_data):
-                        try:
-                            rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                            zone_rates.append(rate)
-                        except:
-                            zone_rates.append(None)
-                    else:
-                        zone_rates.append(None)
-                
-                # Pad or truncate to exactly 19 zones
-                while len(zone_rates) < 19:
-                    zone_rates.append(None)
-                zone_rates = zone_rates[:19]
-                
-                # Determine weight_to (next weight or same for last entry)
-                weight_to = weight + 0.5 if weight < 30.0 else 30.0
-                
-                cursor.execute('''
-                    INSERT INTO dhl_express_rate_cards 
-                    (service_type, rate_section, weight_from, weight_to, 
-                     zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9, zone_10,
-                     zone_11, zone_12, zone_13, zone_14, zone_15, zone_16, zone_17, zone_18, zone_19)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (service_type, 'Non-documents', weight, weight_to, *zone_rates))
-                
-                loaded_count += 1
-                
-            except ValueError:
-                # Skip non-numeric weight values
-                continue
-        
-        conn.commit()
-        conn.close()
-        return loaded_count
+        # Data starts after the header row and runs until the multiplier section or end of data
+        data_start_row = non_doc_section_row + 2
+        section = df.iloc[data_start_row:]
+        multiplier_rows = label_rows(section[0], "Multiplier")
+        if len(multiplier_rows):
+            section = section.iloc[:multiplier_rows[0]]
+        
+        # Rows without a numeric weight (empty or text) are skipped
+        weights = float_values(section[0])
+        numeric = weights.notna().to_numpy()
+        weights = weights[numeric].tolist()
+        rates = zone_rates(section, np.flatnonzero(numeric), ZONE_COUNT)
+        
+        # weight_to is the next weight point, capped at 30 KG
+        return self._insert_rates([
+            (service_type, 'Non-documents', weight, weight + 0.5 if weight < 30.0 else 30.0, *zone_rate)
+            for weight, zone_rate in zip(weights, rates)
+        ])
     
     def _load_multiplier_section(self, df: pd.DataFrame, service_type: str) -> int:
         """Load Section 3: Multiplier rate per 0.5 KG from 30.1 KG"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        loaded_count = 0
+        # For Export sheet, look for explicit "Multiplier rate per 0.5 KG" section
+        # For Import sheet, look for weight ranges > 30kg (like 75.1-100, 100.1-200, etc.)
         
         if service_type == 'Export':
             # Find the "Multiplier rate per 0.5 KG" section
-            mult_section_row = None
-            for idx, row in df.iterrows():
-                if pd.notna(row[0]) and "Multiplier rate per 0.5" in str(row[0]):
-                    mult_section_row = idx
-                    break
+            mult_section_row = self._section_row(df, "Multiplier rate per 0.5")
             
             if mult_section_row is None:
                 print(f"  Warning: Multiplier section not found in {service_type}")
-                conn.close()
                 return 0
             
-            # Find the header row (From, To, Zone 1, etc.)
-            header_row = mult_section_row + 1
-            data_start_row = header_row + 1
+            # Up to 10 rows after the header row (From, To, Zone 1, etc.), skipping empty rows
+            data_start_row = mult_section_row + 2
+            section = df.iloc[data_start_row:data_start_row + 10]
+            section = section[section[0].notna().to_numpy()]
+            limits = section.reindex(columns=[0, 1])
+            weights_from = float_values(limits[0])
+            weights_to = float_values(limits[1])
+            
+            # Stop at the first row with non-numeric data (like Premium section); a blank To is open-ended
+            bad = weights_from.isna() | (limits[1].notna() & weights_to.isna())
+            rows = np.flatnonzero(~bad.cummax().to_numpy())
+            weights_from = weights_from.iloc[rows].tolist()
+            weights_to = weights_to.iloc[rows].where(limits[1].iloc[rows].notna(), 99999).tolist()
             
-            for row_idx in range(data_start_row, data_start_row + 10):
-                if row_idx >= len(df):
-                    break
-                    
-                row_data = df.iloc[row_idx]
-                
-                # Skip empty rows
-                if pd.isna(row_data[0]):
-                    continue
-                
-                try:
-                    weight_from = float(row_data[0])
-                    weight_to = float(row_data[1]) if pd.notna(row_data[1]) else 99999
-                    
-                    # Extract zone rates (multiplier rates)
-                    zone_rates = []
-                    max_zones = min(19, len(row_data) - 2)
-                    
-                    for zone_col in range(2, 2 + max_zones):
-                        if zone_col < len(row_data):
-                            try:
-                                rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                                zone_rates.append(rate)
-                            except:
-                                zone_rates.append(None)
-                        else:
-                            zone_rates.append(None)
-                    
-                    # Pad or truncate to exactly 19 zones
-                    while len(zone_rates) < 19:
-                        zone_rates.append(None)
-                    zone_rates = zone_rates[:19]
-                    
-                    cursor.execute('''
-                        INSERT INTO dhl_express_rate_cards 
-                        (service_type, rate_section, weight_from, weight_to, 
-                         zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9, zone_10,
-                         zone_11, zone_12, zone_13, zone_14, zone_15, zone_16, zone_17, zone_18, zone_19,
-                         is_multiplier, weight_range_from, weight_range_to)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (service_type, 'Multiplier', weight_from, weight_to, *zone_rates, 
-                         True, weight_from, weight_to))
-                    
-                    loaded_count += 1
-                    
-                except ValueError:
-                    # Stop when we hit non-numeric data (like Premium section)
-                    break
-        
         else:  # Import sheet
-            # For Import, look for weight ranges that look like multipliers (> 30kg)
-            for row_idx in range(len(df)):
-                row_data = df.iloc[row_idx]
-                
-                # Skip empty rows
-                if pd.isna(row_data[0]):
-                    continue
-                
-                try:
-                    weight_from = float(row_data[0])
-                    
-                    # Look for multiplier-style ranges (> 30kg and with decimal ranges)
-                    if weight_from > 30 and '.' in str(row_data[0]):
-                        # This looks like a multiplier range (e.g., 75.1, 100.1, 200.1)
-                        if pd.notna(row_data[1]):
-                            try:
-                                weight_to = float(row_data[1])
-                            except:
-                                weight_to = 99999
-                        else:
-                            weight_to = 99999
-                        
-                        # Extract zone rates
-                        zone_rates = []
-                        max_zones = min(19, len(row_data) - 2)
-                        
-                        for zone_col in range(2, 2 + max_zones):
-                            if zone_col < len(row_data):
-                                try:
-                                    rate = float(row_data[zone_col]) if pd.notna(row_data[zone_col]) else None
-                                    zone_rates.append(rate)
-                                except:
-                                    zone_rates.append(None)
-                            else:
-                                zone_rates.append(None)
-                        
-                        # Pad or truncate to exactly 19 zones
-                        while len(zone_rates) < 19:
-                            zone_rates.append(None)
-                        zone_rates = zone_rates[:19]
-                        
-                        cursor.execute('''
-                            INSERT INTO dhl_express_rate_cards 
-                            (service_type, rate_section, weight_from, weight_to, 
-                             zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9, zone_10,
-                             zone_11, zone_12, zone_13, zone_14, zone_15, zone_16, zone_17, zone_18, zone_19,
-                             is_multiplier, weight_range_from, weight_range_to)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (service_type, 'Multiplier', weight_from, weight_to, *zone_rates, 
-                             True, weight_from, weight_to))
-                        
-                        loaded_count += 1
-                        
-                except ValueError:
-                    continue
-        
-        conn.commit()
-        conn.close()
-        return loaded_count
+            # For Import, multiplier ranges are rows with a decimal weight above 30kg (e.g. 75.1, 100.1, 200.1)
+            if df.empty:
+                return 0
+            weights = float_values(df[0]).astype(np.float64)
+            decimal = np.zeros(len(df), dtype=bool)
+            decimal[label_rows(df[0], '.')] = True
+            rows = np.flatnonzero(decimal & (weights > 30).to_numpy())
+            
+            limits = df.iloc[rows].reindex(columns=[0, 1])
+            weights_from = weights.iloc[rows].tolist()
+            weights_to = float_values(limits[1], 99999).tolist()
+            section = df
+        
+        # Zone rates (multiplier rates)
+        rates = zone_rates(section, rows, ZONE_COUNT)
+        return self._insert_rates([
+            (service_type, 'Multiplier', weight_from, weight_to, *zone_rate, True, weight_from, weight_to)
+            for weight_from, weight_to, zone_rate in zip(weights_from, weights_to, rates)
+        ], multiplier=True)
+    
 
 def main():
     """Load Chinese DHL Express rate cards"""
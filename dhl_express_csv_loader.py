@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+DHL Express CSV Invoice Loader
+Columnar loader for DHL Express invoice CSVs: the file is read by pandas as
+string columns, dates and amounts are normalized as vector operations, rows
+are validated with boolean masks and written with executemany. Rows that fail
+validation are kept in the invoice_load_rejects side table.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dhl_express_audit_constants import DATE_FORMATS
+from pdf_text_cache import file_sha256
+from upload_dedup_index import CARRIER_DHL_EXPRESS, get_upload_dedup_index, row_keys
+
+LOADER_NAME = 'dhl_express_csv'
+
+# CSV positions of the dhl_express_invoices columns
+CSV_COLUMNS = [
+    'invoice_no', 'invoice_date', 'company_name', 'account_number', 'line_number',
+    'item_id', 'dhl_product_description', 'pal_col', 'amount', 'weight_charge',
+    'discount_amount', 'discount_code', 'tax_amount', 'tax_code', 'awb_number',
+    'weight', 'shipper_reference', 'shipment_date', 'origin_code', 'destination_code',
+    'shipper_details', 'receiver_details'
+]
+DATE_COLUMNS = ['invoice_date', 'shipment_date']
+INTEGER_COLUMNS = ['line_number', 'pal_col']
+AMOUNT_COLUMNS = ['amount', 'weight_charge', 'discount_amount', 'tax_amount', 'weight']
+
+# Rows per executemany call
+INSERT_BATCH_SIZE = 50000
+# Row errors returned to the caller (all rejects are stored)
+MAX_REPORTED_ERRORS = 10
+
+
+def normalize_dates(values: pd.Series) -> pd.Series:
+    """
+    parse_date over a column: the first of DATE_FORMATS that parses wins and
+    gives YYYY-MM-DD, unparseable text is kept as is, blanks become None.
+    Each distinct value is parsed once.
+    """
+    unique = pd.Series(values.unique())
+    unique = unique[unique != '']
+    parsed = pd.Series(None, index=unique.index, dtype=object)
+    remaining = pd.Series(True, index=unique.index)
+
+    for fmt in DATE_FORMATS:
+        if not remaining.any():
+            break
+        dates = pd.to_datetime(unique[remaining], format=fmt, errors='coerce')
+        matched = dates.notna()
+        matched_index = matched.index[matched]
+        parsed[matched_index] = dates[matched].dt.strftime('%Y-%m-%d')
+        remaining[matched_index] = False
+
+    parsed[remaining] = unique[remaining]
+    lookup = dict(zip(unique, parsed))
+    return values.map(lookup).astype(object).where(values != '', None)
+
+
+def parse_integers(values: pd.Series):
+    """
+    Column version of int(x) if x.strip().isdigit() else 0.
+    Returns (integers, invalid mask); digits int() rejects (e.g. superscripts) are invalid.
+    """
+    digits = values.str.isdigit()
+    numbers = pd.to_numeric(values.where(digits), errors='coerce')
+    invalid = digits & numbers.isna()
+    return numbers.fillna(0).astype(np.int64), invalid
+
+
+def parse_amounts(values: pd.Series):
+    """
+    Column version of float(x) if x.strip() else 0.0.
+    Returns (amounts, invalid mask) for text float() rejects.
+    """
+    present = values != ''
+    cells = values.to_numpy(dtype=object)
+    try:
+        # object to float64 conversion is float() per cell, in C
+        numbers = np.where(present, cells, '0').astype(np.float64)
+        return pd.Series(numbers, index=values.index), pd.Series(False, index=values.index)
+    except ValueError:
+        pass
+
+    # Some cells are not numbers: float() each distinct value once
+    lookup = {'': 0.0}
+    rejected = []
+    for value in pd.unique(cells[present.to_numpy()]):
+        try:
+            lookup[value] = float(value)
+        except ValueError:
+            lookup[value] = 0.0
+            rejected.append(value)
+    return values.map(lookup).astype(np.float64), values.isin(rejected)
+
+
+def create_rejects_table(cursor):
+    """Side table of rows a loader rejected, shared by the invoice loaders"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_load_rejects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            loader TEXT NOT NULL,
+            source_file TEXT,
+            file_hash TEXT,
+            row_number INTEGER,
+            reason TEXT,
+            row_data TEXT,
+            rejected_at TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_invoice_load_rejects_file
+        ON invoice_load_rejects(file_hash)
+    ''')
+
+
+def record_rejects(conn, loader: str, source_file: str, file_hash: Optional[str],
+                   row_numbers: List[int], reasons: List[str], rows: List):
+    """Store rejected rows with their reason and original cells"""
+    if not row_numbers:
+        return
+    now = datetime.now().isoformat()
+    conn.executemany('''
+        INSERT INTO invoice_load_rejects
+        (loader, source_file, file_hash, row_number, reason, row_data, rejected_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (loader, source_file, file_hash, int(row_number), reason, json.dumps(row, default=str), now)
+        for row_number, reason, row in zip(row_numbers, reasons, rows)
+    ])
+
+
+class DHLExpressCSVLoader:
+    """Loads DHL Express invoice CSV files into dhl_express_invoices"""
+
+    def __init__(self, db_path: str = 'dhl_audit.db'):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create the rejected rows side table"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        create_rejects_table(cursor)
+
+        conn.commit()
+        conn.close()
+
+    def read_csv(self, file_path: Path):
+        """
+        String columns in CSV_COLUMNS order, padded or cut to 22 fields like the
+        csv module loop did. Returns (frame, number of the first data row).
+        """
+        with open(file_path, 'r', encoding='utf-8') as csvfile:
+            first_line = csvfile.readline().strip()
+        has_header = 'Invoice No' in first_line or 'invoice_no' in first_line
+
+        options = dict(
+            header=None,
+            names=range(len(CSV_COLUMNS)),
+            skiprows=1 if has_header else 0,
+            dtype=str,
+            keep_default_na=False,
+            skip_blank_lines=False,
+            encoding='utf-8'
+        )
+        try:
+            # Short rows are padded with NaN up to the 22 names
+            frame = pd.read_csv(file_path, **options)
+        except pd.errors.ParserError:
+            # A row has more than 22 fields: the python parser can cut it
+            frame = pd.read_csv(file_path, engine='python',
+                                on_bad_lines=lambda fields: fields[:len(CSV_COLUMNS)], **options)
+        frame.columns = CSV_COLUMNS
+        frame = frame.fillna('')
+        for column in CSV_COLUMNS:
+            frame[column] = frame[column].str.strip()
+        return frame, 2 if has_header else 1
+
+    def load(self, file_path: str, file_hash: Optional[str] = None) -> Dict:
+        """Load one CSV file; returns the counts load_invoices_from_csv reports"""
+        file_path = Path(file_path)
+        if not file_path.exists():
+            return {'success': False, 'error': f'File not found: {file_path}'}
+
+        try:
+            # Reject a re-upload of a file that is already loaded before reading it
+            dedup_index = get_upload_dedup_index(self.db_path)
+            file_hash = file_hash or file_sha256(str(file_path))
+            if dedup_index.is_duplicate_file(file_hash):
+                return {'success': False, 'duplicate_file': True,
+                        'error': f'File already uploaded: {file_path.name}'}
+
+            raw, first_row_number = self.read_csv(file_path)
+            total_records = len(raw)
+            row_numbers = np.arange(total_records) + first_row_number
+
+            # Rows with nothing in them are skipped, not rejected
+            non_empty = (raw != '').any(axis=1)
+
+            invoices = raw.copy()
+            reasons = pd.Series('', index=raw.index, dtype=object)
+            for column in INTEGER_COLUMNS:
+                invoices[column], invalid = parse_integers(raw[column])
+                reasons = reasons.mask(invalid & (reasons == ''), f'invalid {column}')
+            for column in AMOUNT_COLUMNS:
+                invoices[column], invalid = parse_amounts(raw[column])
+                reasons = reasons.mask(invalid & (reasons == ''), f'invalid {column}')
+            for column in DATE_COLUMNS:
+                invoices[column] = normalize_dates(raw[column])
+            reasons = reasons.mask((raw['invoice_no'] == '') & (reasons == ''), 'missing invoice_no')
+
+            rejected = non_empty & (reasons != '')
+            valid = non_empty & ~rejected
+
+            conn = sqlite3.connect(self.db_path)
+            try:
+                # Duplicates within the file, then lines already loaded (queried only on a filter hit)
+                key_columns = ['invoice_no', 'awb_number', 'line_number']
+                in_file_duplicate = invoices.loc[valid, key_columns].duplicated(keep='first') \
+                    .reindex(raw.index, fill_value=False)
+                candidates = invoices[valid & ~in_file_duplicate]
+                keys = row_keys(CARRIER_DHL_EXPRESS, candidates['invoice_no'],
+                                candidates['awb_number'], candidates['line_number'].tolist())
+                known = np.array(dedup_index.find_duplicates(keys, conn), dtype=bool)
+                new_rows = candidates[~known] if len(keys) else candidates
+                new_keys = [key for key, is_known in zip(keys, known) if not is_known]
+
+                inserted_records = self._insert_rows(new_rows, conn)
+                duplicate_records = int(in_file_duplicate.sum()) + int(known.sum()) + \
+                    (len(new_rows) - inserted_records)
+
+                rejects = raw[rejected]
+                record_rejects(conn, LOADER_NAME, file_path.name, file_hash,
+                               row_numbers[rejected.to_numpy()].tolist(), reasons[rejected].tolist(),
+                               rejects.values.tolist())
+
+                dedup_index.add_rows(new_keys, file_hash, conn)
+                dedup_index.record_file(file_hash, CARRIER_DHL_EXPRESS, file_path.name,
+                                        file_path.stat().st_size, inserted_records, conn)
+                conn.commit()
+            finally:
+                conn.close()
+
+            errors = [
+                f"Row {row_number}: {reason}"
+                for row_number, reason in zip(row_numbers[rejected.to_numpy()][:MAX_REPORTED_ERRORS],
+                                              reasons[rejected][:MAX_REPORTED_ERRORS])
+            ]
+
+            return {
+                'success': True,
+                'total_records': total_records,
+                'inserted_records': inserted_records,
+                'duplicate_records': duplicate_records,
+                'error_records': int(rejected.sum()),
+                'errors': errors
+            }
+
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def _insert_rows(self, invoices: pd.DataFrame, conn) -> int:
+        """executemany in batches; returns the rows SQLite reports as inserted"""
+        columns = ', '.join(CSV_COLUMNS)
+        placeholders = ', '.join(['?'] * len(CSV_COLUMNS))
+        inserted = 0
+        for start in range(0, len(invoices), INSERT_BATCH_SIZE):
+            batch = invoices.iloc[start:start + INSERT_BATCH_SIZE]
+            rows = zip(*(batch[column].tolist() for column in CSV_COLUMNS))
+            cursor = conn.executemany(
+                f"INSERT OR IGNORE INTO dhl_express_invoices ({columns}) VALUES ({placeholders})", rows
+            )
+            inserted += cursor.rowcount
+        return inserted
+
+    def get_rejects(self, file_hash: str = None, limit: int = 100) -> List[Dict]:
+        """Most recent rejected rows, optionally of one file"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            query = '''
+                SELECT loader, source_file, row_number, reason, row_data, rejected_at
+                FROM invoice_load_rejects
+            '''
+            params: list = []
+            if file_hash:
+                query += ' WHERE file_hash = ?'
+                params.append(file_hash)
+            query += ' ORDER BY id DESC LIMIT ?'
+            params.append(limit)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        return [
+            {
+                'loader': row[0],
+                'source_file': row[1],
+                'row_number': row[2],
+                'reason': row[3],
+                'row_data': json.loads(row[4]) if row[4] else [],
+                'rejected_at': row[5]
+            }
+            for row in rows
+        ]
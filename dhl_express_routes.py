@@ -15,6 +15,7 @@ import pandas as pd
 from io import BytesIO
 from datetime import datetime
 from dhl_express_audit_engine import DHLExpressAuditEngine
+from upload_storage import save_upload
 # China audit engine (for CN invoices)
 try:
     from dhl_express_china_audit_engine import DHLExpressChinaAuditEngine
@@ -69,20 +70,18 @@ def upload_dhl_express_files(user_data=None):
             file = request.files[file_key]
             if file and file.filename:
                 filename = secure_filename(file.filename)
-                file_path = os.path.join('uploads', filename)
                 
-                # Ensure uploads directory exists
-                os.makedirs('uploads', exist_ok=True)
-                file.save(file_path)
+                # Streamed to uploads/ once; the hash is kept for duplicate detection
+                saved = save_upload(file, 'uploads', filename)
                 
                 file_info = {
                     'filename': filename,
                     'original_filename': file.filename,
-                    'size': os.path.getsize(file_path)
+                    'size': saved.size
                 }
                 
                 files_info.append(file_info)
-                uploaded_files.append((file_path, filename, file.filename))
+                uploaded_files.append((saved.path, filename, file.filename, saved.sha256))
         
         if not files_info:
             return jsonify({
@@ -96,12 +95,12 @@ def upload_dhl_express_files(user_data=None):
         # Process uploaded files
         results = {'success': True, 'files_processed': [], 'session_id': session_id}
         
-        for file_path, filename, original_filename in uploaded_files:
+        for file_path, filename, original_filename, file_hash in uploaded_files:
             try:
                 # Process based on file type
                 if filename.lower().endswith('.csv'):
                     # Process as invoice CSV
-                    result = engine.load_invoices_from_csv(file_path)
+                    result = engine.load_invoices_from_csv(file_path, file_hash)
                     
                     file_result = {
                         'filename': filename,
@@ -16,6 +16,9 @@ from pathlib import Path
 from decimal import Decimal, InvalidOperation
 import re
 
+from pdf_text_cache import file_sha256
+from upload_dedup_index import CARRIER_DHL_YTD, get_upload_dedup_index, row_key
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -270,8 +273,8 @@ class DHLYTDProcessor:
             logger.warning(f"Invalid date format for {field_name}: {value}")
             return None
     
-    def process_csv_file(self, file_path, batch_id=None):
-        """Process a DHL YTD CSV file"""
+    def process_csv_file(self, file_path, batch_id=None, file_hash=None):
+        """Process a DHL YTD CSV file (file_hash: its SHA-256, when the caller has it already)"""
         if not batch_id:
             batch_id = f"dhl_ytd_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
@@ -281,10 +284,36 @@ class DHLYTDProcessor:
         
         logger.info(f"Processing DHL YTD file: {file_path}")
         
+        dedup_index = get_upload_dedup_index(self.db_path)
+        file_hash = file_hash or file_sha256(str(file_path))
+        
         # Create upload record
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # Reject a re-upload of a file that is already loaded before reading it
+        if dedup_index.is_duplicate_file(file_hash):
+            error_msg = f"File already uploaded: {file_path.name}"
+            logger.warning(error_msg)
+            cursor.execute('''
+                INSERT INTO dhl_ytd_uploads 
+                (batch_id, filename, file_size, processing_status, error_message,
+                 processing_start_time, processing_end_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (batch_id, file_path.name, file_path.stat().st_size, 'duplicate', error_msg,
+                  datetime.now().isoformat(), datetime.now().isoformat()))
+            conn.commit()
+            conn.close()
+            return {
+                'batch_id': batch_id,
+                'duplicate_file': True,
+                'total_records': 0,
+                'processed_records': 0,
+                'failed_records': 0,
+                'duplicate_records': 0,
+                'errors': [error_msg]
+            }
+        
         cursor.execute('''
             INSERT INTO dhl_ytd_uploads 
             (batch_id, filename, file_size, processing_status, processing_start_time)
@@ -298,6 +327,8 @@ class DHLYTDProcessor:
         failed_records = 0
         duplicate_records = 0
         errors = []
+        inserted_keys = []  # Fingerprints of rows inserted since the last commit
+        file_keys = set()  # Rows inserted from this file, for duplicates within it
         
         try:
             # Read CSV file
@@ -316,9 +347,9 @@ class DHLYTDProcessor:
                         errors.append(f"Row {index + 2}: Missing Invoice No")
                         continue
                     
-                    # Check for existing invoice
-                    cursor.execute('SELECT id FROM dhl_ytd_invoices WHERE invoice_no = ?', (invoice_no,))
-                    if cursor.fetchone():
+                    # Check for existing invoice (queries only on a possible filter hit)
+                    key = row_key(CARRIER_DHL_YTD, invoice_no)
+                    if key in file_keys or dedup_index.is_duplicate_row(CARRIER_DHL_YTD, invoice_no, conn=conn):
                         duplicate_records += 1
                         logger.warning(f"Duplicate invoice skipped: {invoice_no}")
                         continue
@@ -336,9 +367,13 @@ class DHLYTDProcessor:
                     ''', list(data.values()))
                     
                     processed_records += 1
+                    inserted_keys.append(key)
+                    file_keys.add(key)
                     
                     if processed_records % 100 == 0:
                         logger.info(f"Processed {processed_records}/{total_records} records")
+                        dedup_index.add_rows(inserted_keys, file_hash, conn)
+                        inserted_keys = []
                         conn.commit()
                 
                 except Exception as e:
@@ -348,6 +383,9 @@ class DHLYTDProcessor:
                     logger.error(error_msg)
             
             # Final commit
+            dedup_index.add_rows(inserted_keys, file_hash, conn)
+            dedup_index.record_file(file_hash, CARRIER_DHL_YTD, file_path.name,
+                                    file_path.stat().st_size, processed_records, conn)
             conn.commit()
             
             # Update upload record
@@ -10,6 +10,7 @@ from flask import Blueprint, request, render_template, redirect, url_for, flash,
 import os
 from werkzeug.utils import secure_filename
 from dhl_ytd_processor import DHLYTDProcessor
+from upload_storage import save_upload
 import logging
 from datetime import datetime
 
@@ -108,16 +109,16 @@ def upload_ytd_file(user_data=None):
         unique_filename = f"dhl_ytd_{timestamp}_{filename}"
         
         upload_dir = os.path.join(os.getcwd(), 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
         
-        file_path = os.path.join(upload_dir, unique_filename)
-        file.save(file_path)
+        # Streamed to disk once, hashed on the way
+        saved = save_upload(file, upload_dir, unique_filename, MAX_FILE_SIZE)
+        file_path = saved.path
         
         # Process the file
         processor = DHLYTDProcessor()
         batch_id = f"dhl_ytd_{timestamp}"
         
-        result = processor.process_csv_file(file_path, batch_id)
+        result = processor.process_csv_file(file_path, batch_id, saved.sha256)
         
         # Clean up uploaded file after processing
         try:
@@ -125,6 +126,10 @@ def upload_ytd_file(user_data=None):
         except OSError:
             pass
         
+        if result.get('duplicate_file'):
+            flash(f'{result["errors"][0]} - nothing was imported', 'warning')
+            return redirect(url_for('dhl_ytd.upload_ytd_file'))
+        
         # Show results
         flash(f'File processed successfully! {result["processed_records"]} records imported, '
               f'{result["duplicate_records"]} duplicates skipped, '
@@ -13,16 +13,22 @@ during Excel uploads, ensuring that service charges are properly processed with:
 This replaces the basic INSERT OR IGNORE with intelligent processing.
 """
 
+import os
 import sqlite3
 import pandas as pd
 from datetime import datetime
 import re
 
+from rate_card_swap import RateCardValidationError, ShadowTableSwap
+from service_charge_protection import enhanced_service_charge_checks
+
 class EnhancedServiceChargeProcessor:
     """Processes service charges with full demerging and enhancement logic"""
     
     def __init__(self, db_path='dhl_audit.db'):
         self.db_path = db_path
+        # Charges are merged into a copy of the live table, which is swapped in after the checks
+        self.swap = ShadowTableSwap(db_path, 'dhl_express_services_surcharges')
         
         # Service charge demerging rules
         self.demerging_rules = {
@@ -75,6 +81,7 @@ class EnhancedServiceChargeProcessor:
         
         # Ensure enhanced table structure exists
         self._ensure_enhanced_table_structure(cursor)
+        conn.commit()
         
         # Read Excel data
         try:
@@ -87,6 +94,10 @@ class EnhancedServiceChargeProcessor:
         basic_entries = self._extract_basic_entries(df)
         print(f"📋 Found {len(basic_entries)} basic service charge entries")
         
+        # Enhanced entries the upload must keep, counted before it runs
+        checks = enhanced_service_charge_checks(cursor)
+        self.swap.create_shadow(copy_where='1=1')
+        
         processed_count = 0
         enhanced_count = 0
         updated_count = 0
@@ -100,6 +111,12 @@ class EnhancedServiceChargeProcessor:
         conn.commit()
         conn.close()
         
+        try:
+            version = self.swap.swap(checks, min_live_ratio=1.0, source=os.path.basename(excel_path))
+        except RateCardValidationError as e:
+            print(f"❌ Upload not applied: {e}")
+            return {'processed': 0, 'enhanced': 0, 'updated': 0, 'error': str(e)}
+        
         print(f"\n✅ PROCESSING COMPLETE:")
         print(f"   📊 Basic entries processed: {processed_count}")
         print(f"   ✨ Enhanced variants created: {enhanced_count}")
@@ -108,7 +125,8 @@ class EnhancedServiceChargeProcessor:
         return {
             'processed': processed_count,
             'enhanced': enhanced_count,
-            'updated': updated_count
+            'updated': updated_count,
+            'version': version
         }
     
     def _ensure_enhanced_table_structure(self, cursor):
@@ -211,8 +229,8 @@ class EnhancedServiceChargeProcessor:
                 variant_amount = charge_amount * rules['charge_multiplier'] if charge_amount else None
                 
                 # Check if variant already exists
-                cursor.execute('''
-                    SELECT id, charge_amount FROM dhl_express_services_surcharges 
+                cursor.execute(f'''
+                    SELECT id, charge_amount FROM {self.swap.shadow_table} 
                     WHERE service_code = ?
                 ''', (variant_code,))
                 
@@ -221,8 +239,8 @@ class EnhancedServiceChargeProcessor:
                 if existing:
                     # Update existing enhanced entry with new rate
                     if variant_amount:
-                        cursor.execute('''
-                            UPDATE dhl_express_services_surcharges 
+                        cursor.execute(f'''
+                            UPDATE {self.swap.shadow_table} 
                             SET charge_amount = ?, created_timestamp = ?
                             WHERE service_code = ?
                         ''', (variant_amount, datetime.now().isoformat(), variant_code))
@@ -230,8 +248,8 @@ class EnhancedServiceChargeProcessor:
                         print(f"  🔄 Updated {variant_code}: ${variant_amount}")
                 else:
                     # Create new enhanced entry
-                    cursor.execute('''
-                        INSERT INTO dhl_express_services_surcharges
+                    cursor.execute(f'''
+                        INSERT INTO {self.swap.shadow_table}
                         (service_code, service_name, charge_amount, products_applicable, 
                          original_service_code, description, created_timestamp)
                         VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -248,8 +266,8 @@ class EnhancedServiceChargeProcessor:
                     print(f"  ✨ Created enhanced {variant_code}: ${variant_amount} | Products: {rules['products']}")
         
         # Process basic entry
-        cursor.execute('''
-            SELECT id FROM dhl_express_services_surcharges 
+        cursor.execute(f'''
+            SELECT id FROM {self.swap.shadow_table} 
             WHERE service_code = ?
         ''', (service_code,))
         
@@ -258,8 +276,8 @@ class EnhancedServiceChargeProcessor:
         if existing_basic:
             # Update basic entry rate only (preserve enhanced data)
             if charge_amount:
-                cursor.execute('''
-                    UPDATE dhl_express_services_surcharges 
+                cursor.execute(f'''
+                    UPDATE {self.swap.shadow_table} 
                     SET charge_amount = ?, created_timestamp = ?
                     WHERE service_code = ? AND (products_applicable IS NULL OR products_applicable = '')
                 ''', (charge_amount, datetime.now().isoformat(), service_code))
@@ -270,8 +288,8 @@ class EnhancedServiceChargeProcessor:
             # Create basic entry with enhancement if applicable
             products_applicable = self.service_enhancements.get(service_code, '')
             
-            cursor.execute('''
-                INSERT INTO dhl_express_services_surcharges
+            cursor.execute(f'''
+                INSERT INTO {self.swap.shadow_table}
                 (service_code, service_name, charge_amount, products_applicable, created_timestamp)
                 VALUES (?, ?, ?, ?, ?)
             ''', (
@@ -7,14 +7,24 @@ for DHL EDI invoice files with full audit trail and error handling.
 """
 
 import os
+import re
 import hashlib
 import logging
+import sqlite3
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Any, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 import time
 
+from app.edi_parser import EDIParser
+from pdf_text_cache import file_sha256
+from upload_dedup_index import CARRIER_EDI, UploadDedupIndex, get_upload_dedup_index, row_key
+from upload_storage import SavedUpload, count_bytes, map_file, save_upload
+
 # Import the validator
 try:
     from app.invoice_validator import InvoiceValidator
@@ -47,6 +57,63 @@ class ProcessingResult:
     processing_time: float
     file_hash: str
 
+# Columns the single-upload path reads back from invoices before validating
+VALIDATION_FIELDS = (
+    'invoice_number', 'shipper_name', 'consignee_name',
+    'origin_port', 'destination_port', 'total_charges', 'weight', 'pieces',
+    'currency', 'exchange_rate', 'service_date', 'delivery_date',
+    'shipper_country', 'consignee_country', 'tracking_number', 'reference_number',
+    'pickup_date', 'invoice_date'
+)
+
+# Child table columns; invoice_id holds the invoice's index within its file until written
+CHARGE_COLUMNS = ('invoice_id', 'charge_type', 'amount', 'description', 'rate', 'quantity', 'unit', 'created_at')
+LINE_ITEM_COLUMNS = ('invoice_id', 'line_number', 'item_description', 'quantity',
+                     'weight', 'volume', 'dimensions', 'unit_type', 'created_at')
+REFERENCE_COLUMNS = ('invoice_id', 'reference_type', 'reference_value', 'created_at')
+
+# Derived columns update_calculated_fields sets when the schema has them
+COST_COLUMNS = ('cost_per_kg', 'cost_per_piece')
+
+# Invoice numbers per IN (...) query when checking for duplicates
+DUPLICATE_CHECK_BATCH = 500
+
+@dataclass
+class EDIFileRows:
+    """One parsed EDI file as column lists per table, ready for executemany"""
+    file_path: str
+    file_hash: str
+    invoices: Dict[str, List[Any]]
+    charges: Dict[str, List[Any]]
+    line_items: Dict[str, List[Any]]
+    references: Dict[str, List[Any]]
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    parse_seconds: float = 0.0
+
+    @property
+    def invoice_count(self) -> int:
+        return len(self.invoices.get('invoice_number', []))
+
+@dataclass
+class BatchIngestResult:
+    """Totals and throughput of a multi-file ingest"""
+    files_total: int
+    files_processed: int
+    invoices_processed: int
+    charges_processed: int
+    line_items_processed: int
+    elapsed_seconds: float
+    file_results: List[ProcessingResult]
+
+    @property
+    def files_per_second(self) -> float:
+        return round(self.files_total / self.elapsed_seconds, 2) if self.elapsed_seconds > 0 else 0.0
+
+    @property
+    def invoices_per_second(self) -> float:
+        return round(self.invoices_processed / self.elapsed_seconds, 1) if self.elapsed_seconds > 0 else 0.0
+
 class EnhancedEDIProcessor:
     """Enhanced EDI file processor with comprehensive validation and error handling"""
     
@@ -98,32 +165,46 @@ class EnhancedEDIProcessor:
         Validate EDI content structure
         Returns: (is_valid, errors, warnings)
         """
+        found_transactions = [tx_type for tx_type in self.supported_transaction_types
+                              if f'ST*{tx_type}*' in content or f'ST,{tx_type},' in content]
+        return self._edi_structure_result(bool(content.strip()), 'ISA' in content or 'ST' in content,
+                                          found_transactions, content.count('~'), content.count(','))
+    
+    def validate_edi_file(self, file_path: str) -> Tuple[bool, List[str], List[str]]:
+        """
+        validate_edi_content for a saved file, scanning a memory map of it
+        instead of a decoded copy
+        Returns: (is_valid, errors, warnings)
+        """
+        with map_file(file_path) as data:
+            found_transactions = [tx_type for tx_type in self.supported_transaction_types
+                                  if data.find(f'ST*{tx_type}*'.encode()) != -1
+                                  or data.find(f'ST,{tx_type},'.encode()) != -1]
+            return self._edi_structure_result(re.search(rb'\S', data) is not None,
+                                              data.find(b'ISA') != -1 or data.find(b'ST') != -1,
+                                              found_transactions, count_bytes(data, b'~'), count_bytes(data, b','))
+    
+    def _edi_structure_result(self, has_content: bool, has_segments: bool, found_transactions: List[str],
+                              segment_count_tilde: int, segment_count_comma: int) -> Tuple[bool, List[str], List[str]]:
+        """Errors and warnings for the structure facts gathered from EDI content"""
         errors = []
         warnings = []
         
-        if not content.strip():
+        if not has_content:
             errors.append("File content is empty")
             return False, errors, warnings
         
         # Check for basic EDI structure
-        if 'ISA' not in content and 'ST' not in content:
+        if not has_segments:
             errors.append("No valid EDI segments found (missing ISA or ST)")
         
         # Check for transaction types
-        found_transactions = []
-        for tx_type in self.supported_transaction_types:
-            if f'ST*{tx_type}*' in content or f'ST,{tx_type},' in content:
-                found_transactions.append(tx_type)
-        
         if not found_transactions:
             errors.append(f"No supported transaction types found. Expected: {', '.join(self.supported_transaction_types)}")
         else:
             warnings.append(f"Found transaction types: {', '.join(found_transactions)}")
         
         # Check segment count
-        segment_count_tilde = content.count('~')
-        segment_count_comma = content.count(',')
-        
         if segment_count_tilde < 5 and segment_count_comma < 5:
             warnings.append("Low segment count detected - file may be incomplete")
         
@@ -133,17 +214,146 @@ class EnhancedEDIProcessor:
         """Calculate SHA-256 hash of file content"""
         return hashlib.sha256(content.encode('utf-8')).hexdigest()
     
-    def save_uploaded_file(self, file_obj, content: str) -> str:
-        """Save uploaded file with timestamp and return filepath"""
+    def save_uploaded_file(self, file_obj) -> SavedUpload:
+        """
+        Stream the uploaded file to disk under a timestamped name, hashing it
+        on the way (the hash equals calculate_file_hash of its text)
+        """
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         safe_filename = "".join(c for c in file_obj.filename if c.isalnum() or c in '._-')
         saved_filename = f"{timestamp}_{safe_filename}"
-        file_path = os.path.join(self.upload_folder, saved_filename)
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # Uploads within the same second must not replace each other
+        base, ext = os.path.splitext(saved_filename)
+        suffix = 1
+        while os.path.exists(os.path.join(self.upload_folder, saved_filename)):
+            saved_filename = f"{base}_{suffix}{ext}"
+            suffix += 1
+        
+        return save_upload(file_obj, self.upload_folder, saved_filename, self.max_file_size)
+    
+    def build_invoice_fields(self, invoice_data: Dict[str, Any], file_path: str) -> Dict[str, Any]:
+        """Map parsed invoice data onto the invoices table columns"""
+        # Map all available invoice fields from the database schema
+        return {
+            'invoice_number': invoice_data.get('invoice_number'),
+            'client_code': invoice_data.get('client_code'),
+            'carrier_code': invoice_data.get('carrier_code'),
+            'account_number': invoice_data.get('account_number'),
+            'account_period': invoice_data.get('account_period'),
+            'billed_to_type': invoice_data.get('billed_to_type'),
+            'tracking_number': invoice_data.get('tracking_number'),
+            'invoice_date': invoice_data.get('invoice_date'),
+            'invoice_status': 'pending',
+            'audit_exception_status': None,
             
-        return file_path
+            # Address information
+            'shipper_name': invoice_data.get('shipper_name'),
+            'shipper_address': invoice_data.get('shipper_address'),
+            'shipper_city': invoice_data.get('shipper_city'),
+            'shipper_state': invoice_data.get('shipper_state'),
+            'shipper_postal_code': invoice_data.get('shipper_postal_code'),
+            'shipper_country': invoice_data.get('shipper_country'),
+            
+            'consignee_name': invoice_data.get('consignee_name'),
+            'consignee_address': invoice_data.get('consignee_address'),
+            'consignee_city': invoice_data.get('consignee_city'),
+            'consignee_state': invoice_data.get('consignee_state'),
+            'consignee_postal_code': invoice_data.get('consignee_postal_code'),
+            'consignee_country': invoice_data.get('consignee_country'),
+            
+            'bill_to_name': invoice_data.get('bill_to_name'),
+            'bill_to_address': invoice_data.get('bill_to_address'),
+            'bill_to_city': invoice_data.get('bill_to_city'),
+            'bill_to_state': invoice_data.get('bill_to_state'),
+            'bill_to_postal_code': invoice_data.get('bill_to_postal_code'),
+            'bill_to_country': invoice_data.get('bill_to_country'),
+            
+            # Shipment information
+            'vessel_name': invoice_data.get('vessel_name'),
+            'container_number': invoice_data.get('container_number'),
+            'bill_of_lading': invoice_data.get('bill_of_lading'),
+            'booking_number': invoice_data.get('booking_number'),
+            'origin_port': invoice_data.get('origin_port'),
+            'destination_port': invoice_data.get('destination_port'),
+            'pickup_date': invoice_data.get('pickup_date'),
+            'delivery_date': invoice_data.get('delivery_date'),
+            'service_date': invoice_data.get('service_date'),
+            'ship_date': invoice_data.get('ship_date'),
+            'shipment_entered_date': invoice_data.get('shipment_entered_date'),
+            'invoice_created_date': invoice_data.get('invoice_created_date'),
+            
+            # Reference information
+            'reference_number': invoice_data.get('reference_number'),
+            'pro_number': invoice_data.get('pro_number'),
+            
+            # Financial information
+            'total_charges': invoice_data.get('total_charges', 0.0),
+            'net_charge': invoice_data.get('net_charge', 0.0),
+            'invoice_amount': invoice_data.get('invoice_amount', 0.0),
+            'check_number': invoice_data.get('check_number'),
+            'check_date': invoice_data.get('check_date'),
+            
+            # Weight and measurement
+            'weight': invoice_data.get('weight', 0.0),
+            'bill_weight': invoice_data.get('bill_weight', 0.0),
+            'ship_weight': invoice_data.get('ship_weight', 0.0),
+            'pieces': invoice_data.get('pieces', 0),
+            'volume': invoice_data.get('volume', 0.0),
+            'declared_value': invoice_data.get('declared_value', 0.0),
+            
+            # Currency and rates
+            'currency': invoice_data.get('currency'),
+            'exchange_rate': invoice_data.get('exchange_rate', 1.0),
+            'from_currency': invoice_data.get('from_currency'),
+            'to_currency': invoice_data.get('to_currency'),
+            
+            # Service information
+            'shipping_mode': invoice_data.get('shipping_mode'),
+            'service_type': invoice_data.get('service_type'),
+            'delivery_commitment': invoice_data.get('delivery_commitment'),
+            'commodity_type': invoice_data.get('commodity_type'),
+            'incoterm': invoice_data.get('incoterm'),
+            
+            # Business information
+            'vendor_number': invoice_data.get('vendor_number'),
+            'customer_vat_registration': invoice_data.get('customer_vat_registration'),
+            'sap_plant': invoice_data.get('sap_plant'),
+            'shipper_company_code': invoice_data.get('shipper_company_code'),
+            'mode': invoice_data.get('mode'),
+            'allocation_percentage': invoice_data.get('allocation_percentage'),
+            'master_shipper_address': invoice_data.get('master_shipper_address'),
+            'company_code': invoice_data.get('company_code'),
+            'shipper_description': invoice_data.get('shipper_description'),
+            'gl_account': invoice_data.get('gl_account'),
+            
+            # Carrier information
+            'carrier_name': invoice_data.get('carrier_name'),
+            'carrier_address': invoice_data.get('carrier_address'),
+            'carrier_city': invoice_data.get('carrier_city'),
+            'carrier_state': invoice_data.get('carrier_state'),
+            'carrier_postal_code': invoice_data.get('carrier_postal_code'),
+            'carrier_country': invoice_data.get('carrier_country'),
+            'carrier_vat_registration': invoice_data.get('carrier_vat_registration'),
+            
+            # Additional business fields
+            'direction': invoice_data.get('direction'),
+            'charge_group': invoice_data.get('charge_group'),
+            'recipient_description': invoice_data.get('recipient_description'),
+            'partner_bank_type': invoice_data.get('partner_bank_type'),
+            'profit_center': invoice_data.get('profit_center'),
+            'recipient_type': invoice_data.get('recipient_type'),
+            'shipper_plant': invoice_data.get('shipper_plant'),
+            'tax_code': invoice_data.get('tax_code'),
+            
+            # System fields
+            'audit_status': 'pending',
+            'audit_notes': None,
+            'raw_edi': invoice_data.get('raw_edi', ''),
+            'uploaded_file_path': os.path.basename(file_path),
+            'created_at': datetime.now().isoformat(),
+            'updated_at': datetime.now().isoformat()
+        }
     
     def process_invoice_data(self, invoice_data: Dict[str, Any], conn, file_path: str, file_hash: str) -> Tuple[int, List[str]]:
         """
@@ -153,126 +363,7 @@ class EnhancedEDIProcessor:
         errors = []
         
         try:
-            # Map all available invoice fields from the database schema
-            invoice_fields = {
-                'invoice_number': invoice_data.get('invoice_number'),
-                'client_code': invoice_data.get('client_code'),
-                'carrier_code': invoice_data.get('carrier_code'),
-                'account_number': invoice_data.get('account_number'),
-                'account_period': invoice_data.get('account_period'),
-                'billed_to_type': invoice_data.get('billed_to_type'),
-                'tracking_number': invoice_data.get('tracking_number'),
-                'invoice_date': invoice_data.get('invoice_date'),
-                'invoice_status': 'pending',
-                'audit_exception_status': None,
-                
-                # Address information
-                'shipper_name': invoice_data.get('shipper_name'),
-                'shipper_address': invoice_data.get('shipper_address'),
-                'shipper_city': invoice_data.get('shipper_city'),
-                'shipper_state': invoice_data.get('shipper_state'),
-                'shipper_postal_code': invoice_data.get('shipper_postal_code'),
-                'shipper_country': invoice_data.get('shipper_country'),
-                
-                'consignee_name': invoice_data.get('consignee_name'),
-                'consignee_address': invoice_data.get('consignee_address'),
-                'consignee_city': invoice_data.get('consignee_city'),
-                'consignee_state': invoice_data.get('consignee_state'),
-                'consignee_postal_code': invoice_data.get('consignee_postal_code'),
-                'consignee_country': invoice_data.get('consignee_country'),
-                
-                'bill_to_name': invoice_data.get('bill_to_name'),
-                'bill_to_address': invoice_data.get('bill_to_address'),
-                'bill_to_city': invoice_data.get('bill_to_city'),
-                'bill_to_state': invoice_data.get('bill_to_state'),
-                'bill_to_postal_code': invoice_data.get('bill_to_postal_code'),
-                'bill_to_country': invoice_data.get('bill_to_country'),
-                
-                # Shipment information
-                'vessel_name': invoice_data.get('vessel_name'),
-                'container_number': invoice_data.get('container_number'),
-                'bill_of_lading': invoice_data.get('bill_of_lading'),
-                'booking_number': invoice_data.get('booking_number'),
-                'origin_port': invoice_data.get('origin_port'),
-                'destination_port': invoice_data.get('destination_port'),
-                'pickup_date': invoice_data.get('pickup_date'),
-                'delivery_date': invoice_data.get('delivery_date'),
-                'service_date': invoice_data.get('service_date'),
-                'ship_date': invoice_data.get('ship_date'),
-                'shipment_entered_date': invoice_data.get('shipment_entered_date'),
-                'invoice_created_date': invoice_data.get('invoice_created_date'),
-                
-                # Reference information
-                'reference_number': invoice_data.get('reference_number'),
-                'pro_number': invoice_data.get('pro_number'),
-                
-                # Financial information
-                'total_charges': invoice_data.get('total_charges', 0.0),
-                'net_charge': invoice_data.get('net_charge', 0.0),
-                'invoice_amount': invoice_data.get('invoice_amount', 0.0),
-                'check_number': invoice_data.get('check_number'),
-                'check_date': invoice_data.get('check_date'),
-                
-                # Weight and measurement
-                'weight': invoice_data.get('weight', 0.0),
-                'bill_weight': invoice_data.get('bill_weight', 0.0),
-                'ship_weight': invoice_data.get('ship_weight', 0.0),
-                'pieces': invoice_data.get('pieces', 0),
-                'volume': invoice_data.get('volume', 0.0),
-                'declared_value': invoice_data.get('declared_value', 0.0),
-                
-                # Currency and rates
-                'currency': invoice_data.get('currency'),
-                'exchange_rate': invoice_data.get('exchange_rate', 1.0),
-                'from_currency': invoice_data.get('from_currency'),
-                'to_currency': invoice_data.get('to_currency'),
-                
-                # Service information
-                'shipping_mode': invoice_data.get('shipping_mode'),
-                'service_type': invoice_data.get('service_type'),
-                'delivery_commitment': invoice_data.get('delivery_commitment'),
-                'commodity_type': invoice_data.get('commodity_type'),
-                'incoterm': invoice_data.get('incoterm'),
-                
-                # Business information
-                'vendor_number': invoice_data.get('vendor_number'),
-                'customer_vat_registration': invoice_data.get('customer_vat_registration'),
-                'sap_plant': invoice_data.get('sap_plant'),
-                'shipper_company_code': invoice_data.get('shipper_company_code'),
-                'mode': invoice_data.get('mode'),
-                'allocation_percentage': invoice_data.get('allocation_percentage'),
-                'master_shipper_address': invoice_data.get('master_shipper_address'),
-                'company_code': invoice_data.get('company_code'),
-                'shipper_description': invoice_data.get('shipper_description'),
-                'gl_account': invoice_data.get('gl_account'),
-                
-                # Carrier information
-                'carrier_name': invoice_data.get('carrier_name'),
-                'carrier_address': invoice_data.get('carrier_address'),
-                'carrier_city': invoice_data.get('carrier_city'),
-                'carrier_state': invoice_data.get('carrier_state'),
-                'carrier_postal_code': invoice_data.get('carrier_postal_code'),
-                'carrier_country': invoice_data.get('carrier_country'),
-                'carrier_vat_registration': invoice_data.get('carrier_vat_registration'),
-                
-                # Additional business fields
-                'direction': invoice_data.get('direction'),
-                'charge_group': invoice_data.get('charge_group'),
-                'recipient_description': invoice_data.get('recipient_description'),
-                'partner_bank_type': invoice_data.get('partner_bank_type'),
-                'profit_center': invoice_data.get('profit_center'),
-                'recipient_type': invoice_data.get('recipient_type'),
-                'shipper_plant': invoice_data.get('shipper_plant'),
-                'tax_code': invoice_data.get('tax_code'),
-                
-                # System fields
-                'audit_status': 'pending',
-                'audit_notes': None,
-                'raw_edi': invoice_data.get('raw_edi', ''),
-                'uploaded_file_path': os.path.basename(file_path),
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }
+            invoice_fields = self.build_invoice_fields(invoice_data, file_path)
             
             # Build dynamic INSERT statement
             columns = list(invoice_fields.keys())
@@ -383,6 +474,18 @@ class EnhancedEDIProcessor:
         
         return processed_count, errors
     
+    @staticmethod
+    def audit_status_for(validation_result) -> str:
+        """Audit status implied by an InvoiceValidator result"""
+        if validation_result.is_valid:
+            if validation_result.score >= 95:
+                return 'approved'
+            elif validation_result.score >= 80:
+                return 'pending'  # Good but needs review
+            else:
+                return 'review'   # Passed validation but has warnings
+        return 'flagged'  # Has errors
+    
     def validate_and_update_audit_status(self, invoice_id: int, conn) -> Tuple[str, List[str]]:
         """
         Run validation on processed invoice and update audit status
@@ -413,15 +516,7 @@ class EnhancedEDIProcessor:
             validation_result = validator.validate_invoice(invoice_dict)
             
             # Determine audit status based on validation
-            if validation_result.is_valid:
-                if validation_result.score >= 95:
-                    audit_status = 'approved'
-                elif validation_result.score >= 80:
-                    audit_status = 'pending'  # Good but needs review
-                else:
-                    audit_status = 'review'   # Passed validation but has warnings
-            else:
-                audit_status = 'flagged'  # Has errors
+            audit_status = self.audit_status_for(validation_result)
             
             # Update audit status in database
             conn.execute('''
@@ -439,3 +534,319 @@ class EnhancedEDIProcessor:
             error_msg = f"Error during validation: {str(e)}"
             self.logger.error(error_msg)
             return 'pending', [error_msg]
+    
+    def collect_edi_files(self, source: str) -> List[str]:
+        """
+        EDI files to ingest from a directory (searched recursively) or a
+        zip/tar archive, which is extracted into the upload folder first
+        """
+        if os.path.isdir(source):
+            paths = []
+            for root, _dirs, files in os.walk(source):
+                for name in files:
+                    if os.path.splitext(name)[1].lower() in self.allowed_extensions:
+                        paths.append(os.path.join(root, name))
+            return sorted(paths)
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        archive_name = "".join(c for c in os.path.basename(source) if c.isalnum() or c in '._-')
+        extract_dir = os.path.join(self.upload_folder, f"{timestamp}_{archive_name}")
+        paths = []
+        
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                members = [(info.filename, archive.open(info)) for info in archive.infolist() if not info.is_dir()]
+                paths = self._extract_members(members, extract_dir)
+        elif tarfile.is_tarfile(source):
+            with tarfile.open(source) as archive:
+                members = [(info.name, archive.extractfile(info)) for info in archive.getmembers() if info.isfile()]
+                paths = self._extract_members(members, extract_dir)
+        else:
+            raise ValidationError(f"Not a directory or zip/tar archive: {source}")
+        
+        return sorted(paths)
+    
+    def _extract_members(self, members: List[Tuple[str, Any]], extract_dir: str) -> List[str]:
+        """Write archive members with an EDI extension into extract_dir (flattened, no paths kept)"""
+        paths = []
+        for member_name, member_file in members:
+            name = os.path.basename(member_name)
+            if os.path.splitext(name)[1].lower() not in self.allowed_extensions:
+                continue
+            os.makedirs(extract_dir, exist_ok=True)
+            path = os.path.join(extract_dir, f"{len(paths):05d}_{name}")
+            with member_file, open(path, 'wb') as f:
+                while True:
+                    chunk = member_file.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            paths.append(path)
+        return paths
+    
+    def build_file_rows(self, file_path: str) -> EDIFileRows:
+        """
+        Parse, validate and map one EDI file into column lists (runs in a
+        worker process). Totals and audit status are computed here, so the
+        writer needs no per-invoice queries.
+        """
+        start = time.time()
+        rows = EDIFileRows(file_path, '', {}, {column: [] for column in CHARGE_COLUMNS},
+                           {column: [] for column in LINE_ITEM_COLUMNS},
+                           {column: [] for column in REFERENCE_COLUMNS})
+        
+        file_size = os.path.getsize(file_path)
+        if file_size > self.max_file_size:
+            rows.errors.append(f"File too large. Maximum size: {self.max_file_size / 1024 / 1024:.1f}MB")
+            return rows
+        if file_size == 0:
+            rows.errors.append("File is empty")
+            return rows
+        
+        rows.file_hash = file_sha256(file_path)
+        
+        is_valid_content, content_errors, _content_warnings = self.validate_edi_file(file_path)
+        if not is_valid_content:
+            rows.errors.extend(content_errors)
+            return rows
+        
+        validator = InvoiceValidator() if InvoiceValidator else None
+        now = datetime.now().isoformat()
+        
+        for index, invoice_data in enumerate(EDIParser().parse_edi_file(file_path)):
+            invoice_fields = self.build_invoice_fields(invoice_data, file_path)
+            
+            # Same totals update_calculated_fields derives from the inserted charges
+            charges = invoice_data.get('charges', [])
+            total_charges = sum(amount for amount in (charge.get('amount', 0.0) for charge in charges)
+                                if amount is not None)
+            invoice_fields['total_charges'] = total_charges
+            invoice_fields['net_charge'] = total_charges
+            invoice_fields['invoice_amount'] = total_charges
+            weight = invoice_fields.get('weight') or 0
+            pieces = invoice_fields.get('pieces') or 0
+            invoice_fields['cost_per_kg'] = total_charges / weight if weight > 0 else 0
+            invoice_fields['cost_per_piece'] = total_charges / pieces if pieces > 0 else 0
+            
+            if validator:
+                validation_result = validator.validate_invoice({name: invoice_fields.get(name)
+                                                                for name in VALIDATION_FIELDS})
+                invoice_fields['audit_status'] = self.audit_status_for(validation_result)
+                validation_errors = [issue.message for issue in validation_result.issues]
+            else:
+                validation_errors = ['Validation module not available']
+            rows.warnings.extend([f"Validation: {err}" for err in validation_errors[:3]])  # Limit to first 3
+            
+            for column, value in invoice_fields.items():
+                rows.invoices.setdefault(column, []).append(value)
+            
+            for charge in charges:
+                values = (index, charge.get('charge_type') or charge.get('type'), charge.get('amount', 0.0),
+                          charge.get('description'), charge.get('rate', 0.0), charge.get('quantity', 0.0),
+                          charge.get('unit'), now)
+                for column, value in zip(CHARGE_COLUMNS, values):
+                    rows.charges[column].append(value)
+            
+            for item in invoice_data.get('line_items', []):
+                values = (index, item.get('line_number'), item.get('description') or item.get('item_description'),
+                          item.get('quantity', 0.0), item.get('weight', 0.0), item.get('volume', 0.0),
+                          item.get('dimensions'), item.get('unit_type'), now)
+                for column, value in zip(LINE_ITEM_COLUMNS, values):
+                    rows.line_items[column].append(value)
+            
+            for ref in invoice_data.get('references', []):
+                values = (index, ref.get('reference_type') or ref.get('type'),
+                          ref.get('reference_value') or ref.get('value'), now)
+                for column, value in zip(REFERENCE_COLUMNS, values):
+                    rows.references[column].append(value)
+        
+        rows.parse_seconds = time.time() - start
+        return rows
+    
+    def write_file_rows(self, rows: EDIFileRows, conn,
+                        dedup_index: Optional[UploadDedupIndex] = None) -> ProcessingResult:
+        """
+        Insert one file's rows in a single transaction with executemany.
+        Invoices whose number already exists are skipped (as the UNIQUE
+        constraint skips them on the single-upload path) with their child rows.
+        With a dedup index, an already ingested file is rejected and only
+        invoice numbers the index may know are looked up.
+        """
+        start = time.time()
+        errors = list(rows.errors)
+        invoice_count = rows.invoice_count
+        counts = {'invoices': 0, 'charges': 0, 'line_items': 0, 'references': 0}
+        
+        def result(status: ProcessingStatus) -> ProcessingResult:
+            return ProcessingResult(
+                status=status,
+                invoices_processed=counts['invoices'],
+                charges_processed=counts['charges'],
+                line_items_processed=counts['line_items'],
+                errors=errors,
+                warnings=rows.warnings,
+                file_path=rows.file_path,
+                processing_time=rows.parse_seconds + time.time() - start,
+                file_hash=rows.file_hash
+            )
+        
+        if invoice_count == 0:
+            if not errors:
+                errors.append('No valid invoice data found in file')
+            return result(ProcessingStatus.FAILED)
+        
+        if dedup_index and dedup_index.is_duplicate_file(rows.file_hash):
+            errors.append('This file has already been uploaded')
+            return result(ProcessingStatus.FAILED)
+        
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            
+            keep = self._new_invoice_mask(rows.invoices['invoice_number'], conn, errors, dedup_index)
+            kept = [index for index in range(invoice_count) if keep[index]]
+            if not kept:
+                conn.execute('ROLLBACK')
+                return result(ProcessingStatus.FAILED)
+            
+            # Allocate ids up front (the write lock is held) so child rows can reference them
+            cursor = conn.execute('SELECT COALESCE(MAX(id), 0) FROM invoices')
+            next_id = cursor.fetchone()[0]
+            try:
+                cursor = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'invoices'")
+                sequence_row = cursor.fetchone()
+                if sequence_row:
+                    next_id = max(next_id, sequence_row[0])
+            except sqlite3.OperationalError:
+                pass
+            invoice_ids = {index: next_id + offset + 1 for offset, index in enumerate(kept)}
+            
+            table_columns = {row[1] for row in conn.execute('PRAGMA table_info(invoices)')}
+            columns = [column for column in rows.invoices
+                       if column not in COST_COLUMNS or column in table_columns]
+            column_values = [rows.invoices[column] for column in columns]
+            conn.executemany(
+                f"INSERT INTO invoices (id, {', '.join(columns)}) VALUES ({', '.join(['?'] * (len(columns) + 1))})",
+                ((invoice_ids[index], *(values[index] for values in column_values)) for index in kept)
+            )
+            counts['invoices'] = len(kept)
+            
+            for table, key, child_columns, child_rows in (
+                ('charges', 'charges', CHARGE_COLUMNS, rows.charges),
+                ('line_items', 'line_items', LINE_ITEM_COLUMNS, rows.line_items),
+                ('reference_numbers', 'references', REFERENCE_COLUMNS, rows.references),
+            ):
+                child_values = [child_rows[column] for column in child_columns]
+                insert_rows = [
+                    (invoice_ids[row[0]],) + row[1:]
+                    for row in zip(*child_values) if row[0] in invoice_ids
+                ]
+                if insert_rows:
+                    conn.executemany(
+                        f"INSERT INTO {table} ({', '.join(child_columns)}) "
+                        f"VALUES ({', '.join(['?'] * len(child_columns))})",
+                        insert_rows
+                    )
+                counts[key] = len(insert_rows)
+            
+            if dedup_index:
+                dedup_index.add_rows([row_key(CARRIER_EDI, rows.invoices['invoice_number'][index])
+                                      for index in kept], rows.file_hash, conn)
+                dedup_index.record_file(rows.file_hash, CARRIER_EDI, os.path.basename(rows.file_path),
+                                        os.path.getsize(rows.file_path), len(kept), conn)
+            
+            conn.execute('COMMIT')
+            
+        except Exception as e:
+            conn.execute('ROLLBACK')
+            counts = dict.fromkeys(counts, 0)
+            errors.append(f"Database transaction failed: {str(e)}")
+            self.logger.error(f"Transaction failed for {rows.file_path}: {str(e)}")
+            return result(ProcessingStatus.FAILED)
+        
+        self.logger.info(f"Inserted {counts['invoices']} invoices from {os.path.basename(rows.file_path)}")
+        return result(ProcessingStatus.COMPLETED if not errors else ProcessingStatus.PARTIAL)
+    
+    def _new_invoice_mask(self, invoice_numbers: List[Any], conn, errors: List[str],
+                          dedup_index: Optional[UploadDedupIndex] = None) -> List[bool]:
+        """False for invoice numbers already in the database or repeated within the file"""
+        candidates = list({number for number in invoice_numbers if number is not None})
+        if dedup_index:
+            candidates = [number for number in candidates
+                          if dedup_index.might_contain(row_key(CARRIER_EDI, number))]
+        existing = set()
+        for start in range(0, len(candidates), DUPLICATE_CHECK_BATCH):
+            batch = candidates[start:start + DUPLICATE_CHECK_BATCH]
+            cursor = conn.execute(
+                f"SELECT invoice_number FROM invoices WHERE invoice_number IN ({', '.join(['?'] * len(batch))})",
+                batch
+            )
+            existing.update(row[0] for row in cursor.fetchall())
+        
+        keep = []
+        for number in invoice_numbers:
+            if number is not None and number in existing:
+                errors.append(f"Error inserting invoice {number or 'Unknown'}: "
+                              f"UNIQUE constraint failed: invoices.invoice_number")
+                keep.append(False)
+            else:
+                keep.append(True)
+                if number is not None:
+                    existing.add(number)
+        return keep
+    
+    def ingest_batch(self, source: str, db_path: str = 'dhl_audit.db',
+                     workers: Optional[int] = None) -> BatchIngestResult:
+        """
+        Ingest a directory or archive of EDI files: files are parsed in a
+        process pool and written by this process, one transaction per file
+        """
+        start = time.time()
+        file_paths = self.collect_edi_files(source)
+        file_results = []
+        
+        if file_paths:
+            dedup_index = get_upload_dedup_index(db_path)
+            conn = sqlite3.connect(db_path)
+            conn.isolation_level = None  # Transactions are managed explicitly per file
+            try:
+                with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(file_paths))) as pool:
+                    futures = {pool.submit(_build_file_rows, self.upload_folder, self.max_file_size, path): path
+                               for path in file_paths}
+                    for future in as_completed(futures):
+                        try:
+                            rows = future.result()
+                        except Exception as e:
+                            file_results.append(ProcessingResult(
+                                status=ProcessingStatus.FAILED, invoices_processed=0, charges_processed=0,
+                                line_items_processed=0, errors=[f"Error parsing file: {str(e)}"], warnings=[],
+                                file_path=futures[future], processing_time=0.0, file_hash=''
+                            ))
+                            continue
+                        file_results.append(self.write_file_rows(rows, conn, dedup_index))
+            finally:
+                conn.close()
+        
+        result = BatchIngestResult(
+            files_total=len(file_paths),
+            files_processed=sum(1 for r in file_results if r.status != ProcessingStatus.FAILED),
+            invoices_processed=sum(r.invoices_processed for r in file_results),
+            charges_processed=sum(r.charges_processed for r in file_results),
+            line_items_processed=sum(r.line_items_processed for r in file_results),
+            elapsed_seconds=time.time() - start,
+            file_results=file_results
+        )
+        self.logger.info(f"Batch ingest: {result.files_total} files, {result.invoices_processed} invoices "
+                         f"in {result.elapsed_seconds:.2f}s ({result.files_per_second} files/s, "
+                         f"{result.invoices_per_second} invoices/s)")
+        return result
+
+
+_worker_processors: Dict[Tuple[str, int], EnhancedEDIProcessor] = {}
+
+def _build_file_rows(upload_folder: str, max_file_size: int, file_path: str) -> EDIFileRows:
+    """Process pool entry point: one processor per worker process"""
+    processor = _worker_processors.get((upload_folder, max_file_size))
+    if processor is None:
+        processor = EnhancedEDIProcessor(upload_folder, max_file_size)
+        _worker_processors[(upload_folder, max_file_size)] = processor
+    return processor.build_file_rows(file_path)
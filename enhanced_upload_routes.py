@@ -3,12 +3,14 @@ Flask route integration for enhanced file upload processing
 """
 
 from flask import request, jsonify, render_template, redirect, url_for, flash
+import os
 import sqlite3
 import time
 import traceback
 from app.edi_parser import EDIParser
-from app.database import get_db_connection
+from app.database import DATABASE_NAME, get_db_connection
 from enhanced_upload_processor import EnhancedEDIProcessor, ProcessingResult, ProcessingStatus
+from upload_dedup_index import CARRIER_EDI, get_upload_dedup_index, row_key
 
 
 def enhanced_upload_file():
@@ -30,6 +32,7 @@ def enhanced_upload_file():
             return redirect(request.url)
         
         start_time = time.time()
+        file_path = None
         
         try:
             # PHASE 1: File Validation
@@ -39,13 +42,21 @@ def enhanced_upload_file():
                     flash(error, 'error')
                 return redirect(request.url)
             
-            # Read file content
-            content = file_obj.read().decode('utf-8')
-            file_hash = processor.calculate_file_hash(content)
+            # PHASE 2: Save File (streamed to disk once, hashed on the way)
+            saved = processor.save_uploaded_file(file_obj)
+            file_path = saved.path
+            file_hash = saved.sha256
             
-            # PHASE 2: Content Validation
-            is_valid_content, content_errors, content_warnings = processor.validate_edi_content(content)
+            # Reject a re-upload of a file that is already loaded
+            if get_upload_dedup_index(DATABASE_NAME).is_duplicate_file(file_hash):
+                os.remove(file_path)
+                flash('This file has already been uploaded', 'error')
+                return redirect(request.url)
+            
+            # PHASE 3: Content Validation
+            is_valid_content, content_errors, content_warnings = processor.validate_edi_file(file_path)
             if not is_valid_content:
+                os.remove(file_path)
                 for error in content_errors:
                     flash(error, 'error')
                 return redirect(request.url)
@@ -54,14 +65,12 @@ def enhanced_upload_file():
             for warning in content_warnings:
                 flash(warning, 'warning')
             
-            # PHASE 3: Save File
-            file_path = processor.save_uploaded_file(file_obj, content)
-            
             # PHASE 4: Parse EDI Content
             parser = EDIParser()
-            parsed_data = parser.parse_edi_content(content)
+            parsed_data = parser.parse_edi_file(file_path)
             
             if not parsed_data:
+                os.remove(file_path)
                 flash('No valid invoice data found in file', 'error')
                 return redirect(request.url)
             
@@ -95,6 +104,9 @@ def enhanced_upload_file():
             return redirect(url_for('core.edi_invoice_dashboard'))
             
         except Exception as e:
+            # Don't keep an upload that could not be decoded or parsed
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
             flash(f'Processing failed: {str(e)}', 'error')
             return redirect(request.url)
     
@@ -111,7 +123,9 @@ def process_edi_data_enhanced(parsed_data: dict, file_path: str, file_hash: str,
     references_processed = 0
     all_errors = []
     all_warnings = []
+    inserted_keys = []
     
+    dedup_index = get_upload_dedup_index(DATABASE_NAME)
     conn = get_db_connection()
     
     try:
@@ -129,6 +143,7 @@ def process_edi_data_enhanced(parsed_data: dict, file_path: str, file_hash: str,
                     continue
                 
                 invoices_processed += 1
+                inserted_keys.append(row_key(CARRIER_EDI, invoice_data.get('invoice_number')))
                 
                 # STEP 2: Process charges
                 if 'charges' in invoice_data:
@@ -176,6 +191,9 @@ def process_edi_data_enhanced(parsed_data: dict, file_path: str, file_hash: str,
         
         # Commit if we processed any data successfully
         if invoices_processed > 0:
+            dedup_index.add_rows(inserted_keys, file_hash, conn)
+            dedup_index.record_file(file_hash, CARRIER_EDI, os.path.basename(file_path),
+                                    None, invoices_processed, conn)
             conn.execute('COMMIT')
             status = ProcessingStatus.COMPLETED if len(all_errors) == 0 else ProcessingStatus.PARTIAL
         else:
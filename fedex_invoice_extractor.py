@@ -4,22 +4,47 @@ FedEx Invoice Number Extraction System
 Extracts 10-digit invoice numbers from FedEx PDF invoices
 """
 
-import fitz  # PyMuPDF
-import PyPDF2
 import re
 import os
 from pathlib import Path
 import sqlite3
 from datetime import datetime
 import logging
+from contextlib import closing
+from pdf_text_cache import iter_pdf_pages, iter_pymupdf_pages, ENGINE_PYPDF2
+from pdf_ingestion_pipeline import PDFIngestionPipeline, DEFAULT_PARSE_WORKERS
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# FedEx specific patterns - 10 digit invoice number, in priority order
+FEDEX_INVOICE_PATTERNS = [
+    re.compile(r'Invoice Number[:\s]*(\d{10})', re.IGNORECASE),  # "Invoice Number: 951092043"
+    re.compile(r'Invoice No[:\s]*(\d{10})', re.IGNORECASE),      # "Invoice No: 951092043"
+    re.compile(r'账单号码[:\s]*(\d{10})', re.IGNORECASE),         # Chinese version
+    re.compile(r'INV[:\s]*(\d{10})', re.IGNORECASE),             # "INV: 951092043"
+    re.compile(r'\b(\d{10})\b'),                                 # Any standalone 10-digit number
+]
+TEN_DIGIT_RE = re.compile(r'\b(\d{10})\b')
+
+
+def find_fedex_invoice_number(text):
+    """
+    Return the first FedEx invoice number found in page text, or None
+    """
+    for pattern in FEDEX_INVOICE_PATTERNS:
+        for match in pattern.findall(text):
+            # Validate it looks like a FedEx invoice number
+            if len(match) == 10 and match.isdigit():
+                return match
+    return None
+
+
 class FedExInvoiceExtractor:
     def __init__(self, db_path='dhl_audit.db'):
         self.db_path = db_path
+        self.last_ingestion_stats = {}
         self.setup_database()
     
     def setup_database(self):
@@ -45,62 +70,39 @@ class FedExInvoiceExtractor:
     
     def extract_invoice_number_pymupdf(self, pdf_path):
         """
-        Extract invoice number using PyMuPDF - more accurate for positioned text
+        Extract invoice number using PyMuPDF - more accurate for positioned text.
+        Pages are loaded lazily and the document is closed as soon as a match is found.
         """
         try:
-            doc = fitz.open(pdf_path)
-            
             # Check both page 1 and page 2 as mentioned
-            pages_to_check = [0, 1] if len(doc) > 1 else [0]
-            
-            for page_num in pages_to_check:
-                if page_num >= len(doc):
-                    continue
+            with closing(iter_pymupdf_pages(pdf_path, max_pages=2)) as pages:
+                for page_num, page in enumerate(pages):
+                    text = page.get_text()
                     
-                page = doc[page_num]
-                text = page.get_text()
-                
-                # FedEx specific patterns - 10 digit invoice number
-                patterns = [
-                    r'Invoice Number[:\s]*(\d{10})',  # "Invoice Number: 951092043"
-                    r'Invoice No[:\s]*(\d{10})',     # "Invoice No: 951092043"
-                    r'账单号码[:\s]*(\d{10})',        # Chinese version
-                    r'INV[:\s]*(\d{10})',            # "INV: 951092043"
-                    r'\b(\d{10})\b',                 # Any standalone 10-digit number
-                ]
-                
-                for pattern in patterns:
-                    matches = re.findall(pattern, text, re.IGNORECASE)
-                    if matches:
-                        # Validate it looks like a FedEx invoice number
-                        for match in matches:
-                            if len(match) == 10 and match.isdigit():
-                                doc.close()
-                                return match, f"PyMuPDF_Page{page_num+1}_Pattern"
-                
-                # Try to find text blocks in specific positions (top-right area)
-                text_dict = page.get_text("dict")
-                page_width = page.rect.width
-                page_height = page.rect.height
-                
-                # Look in top-right quadrant where invoice numbers typically appear
-                for block in text_dict["blocks"]:
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            line_bbox = line["bbox"]
-                            # Check if in top-right area (right 60%, top 40%)
-                            if (line_bbox[0] > page_width * 0.4 and 
-                                line_bbox[1] < page_height * 0.4):
-                                
-                                for span in line["spans"]:
-                                    span_text = span["text"]
-                                    # Look for 10-digit numbers in this area
-                                    numbers = re.findall(r'\b(\d{10})\b', span_text)
-                                    if numbers:
-                                        doc.close()
-                                        return numbers[0], f"PyMuPDF_Positioned_Page{page_num+1}"
+                    invoice_number = find_fedex_invoice_number(text)
+                    if invoice_number:
+                        return invoice_number, f"PyMuPDF_Page{page_num+1}_Pattern"
+                    
+                    # Try to find text blocks in specific positions (top-right area)
+                    text_dict = page.get_text("dict")
+                    page_width = page.rect.width
+                    page_height = page.rect.height
+                    
+                    # Look in top-right quadrant where invoice numbers typically appear
+                    for block in text_dict["blocks"]:
+                        if "lines" in block:
+                            for line in block["lines"]:
+                                line_bbox = line["bbox"]
+                                # Check if in top-right area (right 60%, top 40%)
+                                if (line_bbox[0] > page_width * 0.4 and 
+                                    line_bbox[1] < page_height * 0.4):
+                                    
+                                    for span in line["spans"]:
+                                        # Look for 10-digit numbers in this area
+                                        numbers = TEN_DIGIT_RE.findall(span["text"])
+                                        if numbers:
+                                            return numbers[0], f"PyMuPDF_Positioned_Page{page_num+1}"
             
-            doc.close()
             return None, "PyMuPDF_NotFound"
             
         except Exception as e:
@@ -109,36 +111,17 @@ class FedExInvoiceExtractor:
     
     def extract_invoice_number_pypdf2(self, pdf_path):
         """
-        Fallback extraction using PyPDF2
+        Fallback extraction using PyPDF2, reading at most the first two pages
         """
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Check first two pages
-                pages_to_check = min(2, len(pdf_reader.pages))
-                
-                for page_num in range(pages_to_check):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    
-                    # Same patterns as PyMuPDF
-                    patterns = [
-                        r'Invoice Number[:\s]*(\d{10})',
-                        r'Invoice No[:\s]*(\d{10})',
-                        r'账单号码[:\s]*(\d{10})',
-                        r'INV[:\s]*(\d{10})',
-                        r'\b(\d{10})\b',
-                    ]
-                    
-                    for pattern in patterns:
-                        matches = re.findall(pattern, text, re.IGNORECASE)
-                        if matches:
-                            for match in matches:
-                                if len(match) == 10 and match.isdigit():
-                                    return match, f"PyPDF2_Page{page_num+1}_Pattern"
-                
-                return None, "PyPDF2_NotFound"
+            # Check first two pages
+            with closing(iter_pdf_pages(pdf_path, ENGINE_PYPDF2, max_pages=2)) as pages:
+                for page_num, text in enumerate(pages):
+                    invoice_number = find_fedex_invoice_number(text)
+                    if invoice_number:
+                        return invoice_number, f"PyPDF2_Page{page_num+1}_Pattern"
+            
+            return None, "PyPDF2_NotFound"
                 
         except Exception as e:
             logger.error(f"PyPDF2 extraction error for {pdf_path}: {e}")
@@ -194,41 +177,77 @@ class FedExInvoiceExtractor:
             'success': invoice_number is not None
         }
     
-    def process_folder(self, folder_path):
+    def process_folder(self, folder_path, extract_workers=None, parse_workers=DEFAULT_PARSE_WORKERS):
         """
-        Process all PDF files in a folder
+        Process all PDF files in a folder.
+        Invoice numbers are extracted in a process pool and stored by a single DB writer.
         """
         folder_path = Path(folder_path)
         pdf_files = list(folder_path.glob("*.pdf"))
         
-        results = []
-        success_count = 0
-        
         logger.info(f"Found {len(pdf_files)} PDF files to process")
         
-        for pdf_file in pdf_files:
-            try:
-                result = self.process_single_file(str(pdf_file))
-                results.append(result)
-                
-                if result['success']:
-                    success_count += 1
-                    logger.info(f"✓ {result['file_name']} -> {result['invoice_number']}")
-                else:
-                    logger.warning(f"✗ {result['file_name']} -> Failed to extract")
-                    
-            except Exception as e:
-                logger.error(f"Error processing {pdf_file}: {e}")
-                results.append({
-                    'file_name': pdf_file.name,
-                    'invoice_number': None,
-                    'method': f"Error: {str(e)}",
-                    'success': False
-                })
+        def parse(pdf_path, extracted):
+            invoice_number, method = extracted
+            result = {
+                'file_name': os.path.basename(pdf_path),
+                'invoice_number': invoice_number,
+                'method': method,
+                'success': invoice_number is not None
+            }
+            if result['success']:
+                logger.info(f"✓ {result['file_name']} -> {result['invoice_number']}")
+            else:
+                logger.warning(f"✗ {result['file_name']} -> Failed to extract")
+            return result
+        
+        def write(batch):
+            self.store_extracted_invoices([
+                (pdf_path, result['file_name'], result['invoice_number'], result['method'])
+                for pdf_path, _extracted, result in batch
+            ])
         
+        def extraction_error(pdf_path, error):
+            logger.error(f"Error processing {pdf_path}: {error}")
+            return {
+                'file_name': os.path.basename(pdf_path),
+                'invoice_number': None,
+                'method': f"Error: {str(error)}",
+                'success': False
+            }
+        
+        pipeline = PDFIngestionPipeline(
+            extract_fn=self.extract_invoice_number,
+            parse_fn=parse,
+            write_fn=write,
+            error_fn=extraction_error,
+            extract_workers=extract_workers,
+            parse_workers=parse_workers
+        )
+        results = pipeline.run([str(pdf_file) for pdf_file in pdf_files])
+        self.last_ingestion_stats = pipeline.last_stats
+        
+        success_count = sum(1 for result in results if result['success'])
         logger.info(f"Processing complete: {success_count}/{len(pdf_files)} successful extractions")
         return results
     
+    def store_extracted_invoices(self, rows):
+        """
+        Store (file_path, file_name, invoice_number, method) rows in one transaction
+        """
+        notes = f"Extracted on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT INTO fedex_extracted_invoices 
+            (file_path, file_name, invoice_number, extraction_method, notes)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [row + (notes,) for row in rows])
+        
+        conn.commit()
+        conn.close()
+    
     def get_extracted_invoices(self):
         """
         Get all extracted invoice numbers from database
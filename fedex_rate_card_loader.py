@@ -10,6 +10,7 @@ import json
 import sqlite3
 from datetime import datetime, date
 from fedex_rate_card_schema import FedExRateCardSchema
+from rate_card_versions import bump_rate_card_version
 import os
 
 class FedExRateCardLoader:
@@ -63,7 +64,7 @@ class FedExRateCardLoader:
             self._load_service_types(data)
             
             # 5. Load rate cards
-            self._load_rate_cards(data)
+            self._load_rate_cards(data, os.path.basename(json_file_path))
             
             # 6. Load surcharges
             self._load_surcharges(data)
@@ -241,7 +242,7 @@ class FedExRateCardLoader:
         conn.commit()
         conn.close()
     
-    def _load_rate_cards(self, data):
+    def _load_rate_cards(self, data, source=None):
         """Load rate card data"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -278,6 +279,7 @@ class FedExRateCardLoader:
                  rate, rate_per_kg, currency_code, active, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', rate_cards)
+            bump_rate_card_version(cursor, 'fedex_rate_cards', source)
             print(f"Loaded {len(rate_cards)} rate cards")
         
         conn.commit()
@@ -6,9 +6,12 @@ Fixed 3rd Party Zone Parser
 Parse zones from multi-column layout in AU Zones 3rdCty TD sheet
 """
 
+import os
 import sqlite3
 import pandas as pd
 
+from rate_card_versions import bump_rate_card_version
+
 
 def load_zone_mappings_fixed(excel_path: str, db_path: str):
     """Load country to zone mappings from multi-column layout"""
@@ -72,6 +75,7 @@ def load_zone_mappings_fixed(excel_path: str, db_path: str):
                 (country_code, zone, region) VALUES (?, ?, ?)
             """, (data['country_code'], data['zone'], data['country_name']))
         
+        bump_rate_card_version(conn.cursor(), 'dhl_express_3rd_party_zones', os.path.basename(excel_path))
         conn.commit()
         print(f"✅ Loaded {len(zone_data)} zone mappings")
         
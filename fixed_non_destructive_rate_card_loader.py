@@ -4,6 +4,7 @@ Fixed version of the non-destructive rate card loader that:
 1. Processes ALL multiplier weight ranges (not just first one)
 2. Uses proper UPDATE/DELETE logic instead of INSERT OR REPLACE to avoid duplicates
 3. Maintains non-destructive behavior for manually added data
+4. Writes to a shadow copy of the rate cards that is swapped in after validation
 """
 
 import pandas as pd
@@ -12,19 +13,22 @@ import re
 import os
 from datetime import datetime
 
+from multiplier_range_protection import critical_multiplier_checks
+from rate_card_swap import ShadowTableSwap
+
 class FixedNonDestructiveRateCardLoader:
     def __init__(self, database_path='dhl_audit.db'):
         self.database_path = database_path
         self.conn = sqlite3.connect(database_path)
         self.cursor = self.conn.cursor()
         
-    def _update_multiplier_section_fixed(self, df, service_type, cursor):
-        """FIXED: Update multiplier section processing ALL rows, not just first one"""
+    def _update_multiplier_section_fixed(self, df, service_type, cursor, table='dhl_express_rate_cards'):
+        """FIXED: Update multiplier section processing ALL rows, not just first one (in table)"""
         
         # Check for existing multiplier ranges > 70kg (preserve manual data)
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT weight_from, weight_to, zone_5 
-            FROM dhl_express_rate_cards 
+            FROM {table} 
             WHERE service_type = ? AND is_multiplier = 1 
             AND weight_from > 70
             ORDER BY weight_from
@@ -131,8 +135,8 @@ class FixedNonDestructiveRateCardLoader:
         print(f"  📊 Excel covers weight range: {min_excel_weight}kg - {max_excel_weight}kg")
         
         # Delete existing ranges that overlap with what we're loading from Excel
-        cursor.execute('''
-            DELETE FROM dhl_express_rate_cards 
+        cursor.execute(f'''
+            DELETE FROM {table} 
             WHERE service_type = ? AND is_multiplier = 1 
             AND weight_from >= ? AND weight_from <= ?
         ''', (service_type, min_excel_weight, max_excel_weight))
@@ -166,8 +170,8 @@ class FixedNonDestructiveRateCardLoader:
                 weight_to = actual_weight + 0.5
             
             # Insert the new multiplier range
-            cursor.execute('''
-                INSERT INTO dhl_express_rate_cards 
+            cursor.execute(f'''
+                INSERT INTO {table} 
                 (service_type, rate_section, weight_from, weight_to, 
                  zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9,
                  zone_10, zone_11, zone_12, zone_13, zone_14, zone_15, zone_16, zone_17, zone_18, zone_19,
@@ -184,13 +188,13 @@ class FixedNonDestructiveRateCardLoader:
         
         return loaded_count, preserved_count
     
-    def _update_rate_cards_fixed(self, df, service_type, cursor):
-        """FIXED: Update rate cards using proper DELETE/INSERT to avoid duplicates"""
+    def _update_rate_cards_fixed(self, df, service_type, cursor, table='dhl_express_rate_cards'):
+        """FIXED: Update rate cards using proper DELETE/INSERT to avoid duplicates (in table)"""
         
         # Check for existing manual ranges > 30kg (preserve manual data)
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT weight_from, weight_to, zone_5 
-            FROM dhl_express_rate_cards 
+            FROM {table} 
             WHERE service_type = ? AND is_multiplier = 0 
             AND weight_from > 30
             ORDER BY weight_from
@@ -259,15 +263,15 @@ class FixedNonDestructiveRateCardLoader:
             print(f"  📊 Excel covers weight range: {min_weight}kg - {max_weight}kg")
             
             # Delete existing ranges that overlap with what we're loading from Excel
-            cursor.execute('''
-                DELETE FROM dhl_express_rate_cards 
+            cursor.execute(f'''
+                DELETE FROM {table} 
                 WHERE service_type = ? AND is_multiplier = 0 
                 AND weight_from >= ? AND weight_from <= ?
             ''', (service_type, min_weight, max_weight))
         else:
             # Fallback: delete up to 30kg
-            cursor.execute('''
-                DELETE FROM dhl_express_rate_cards 
+            cursor.execute(f'''
+                DELETE FROM {table} 
                 WHERE service_type = ? AND is_multiplier = 0 
                 AND weight_from <= 30
             ''', (service_type,))
@@ -310,8 +314,8 @@ class FixedNonDestructiveRateCardLoader:
                                 zone_rates.append(None)
                             
                             # Insert rate card
-                            cursor.execute('''
-                                INSERT INTO dhl_express_rate_cards 
+                            cursor.execute(f'''
+                                INSERT INTO {table} 
                                 (service_type, rate_section, weight_from, weight_to, 
                                  zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9,
                                  zone_10, zone_11, zone_12, zone_13, zone_14, zone_15, zone_16, zone_17, zone_18, zone_19,
@@ -354,8 +358,8 @@ class FixedNonDestructiveRateCardLoader:
                                 zone_rates.append(None)
                             
                             # Insert rate card
-                            cursor.execute('''
-                                INSERT INTO dhl_express_rate_cards 
+                            cursor.execute(f'''
+                                INSERT INTO {table} 
                                 (service_type, rate_section, weight_from, weight_to, 
                                  zone_1, zone_2, zone_3, zone_4, zone_5, zone_6, zone_7, zone_8, zone_9,
                                  zone_10, zone_11, zone_12, zone_13, zone_14, zone_15, zone_16, zone_17, zone_18, zone_19,
@@ -403,6 +407,10 @@ def test_fixed_loader():
     # Initialize loader
     loader = FixedNonDestructiveRateCardLoader()
     
+    # Updates go to a copy of the live rate cards, swapped in after validation
+    swap = ShadowTableSwap(loader.database_path, 'dhl_express_rate_cards')
+    swap.create_shadow(copy_where='1=1')
+    
     total_multiplier_loaded = 0
     total_cards_loaded = 0
     
@@ -434,7 +442,8 @@ def test_fixed_loader():
             print(f"MULTIPLIER SECTION - {service_type}")
             print(f"{'-'*30}")
             
-            multiplier_loaded, multiplier_preserved = loader._update_multiplier_section_fixed(df, service_type, loader.cursor)
+            multiplier_loaded, multiplier_preserved = loader._update_multiplier_section_fixed(
+                df, service_type, loader.cursor, swap.shadow_table)
             total_multiplier_loaded += multiplier_loaded
             
             # Test rate cards fix
@@ -442,15 +451,17 @@ def test_fixed_loader():
             print(f"RATE CARDS SECTION - {service_type}")
             print(f"{'-'*30}")
             
-            cards_loaded, cards_preserved = loader._update_rate_cards_fixed(df, service_type, loader.cursor)
+            cards_loaded, cards_preserved = loader._update_rate_cards_fixed(df, service_type, loader.cursor, swap.shadow_table)
             total_cards_loaded += cards_loaded
             
             print(f"\n✅ {service_type} Results:")
             print(f"   Multiplier ranges loaded: {multiplier_loaded}")
             print(f"   Rate card ranges loaded: {cards_loaded}")
         
-        # Commit all changes
+        # Commit all changes, then swap them in (most of the live rows must still be there)
         loader.conn.commit()
+        version = swap.swap(critical_multiplier_checks(), min_live_ratio=0.5, source=excel_file)
+        print(f"🔄 Rate card table swapped in (version {version})")
         
         print("\n" + "="*60)
         print("FINAL TEST RESULTS")
@@ -500,6 +511,7 @@ def test_fixed_loader():
         import traceback
         traceback.print_exc()
         loader.conn.rollback()
+        swap.discard()
     finally:
         loader.conn.close()
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Invoice Fast Path
+Deterministic regex/template extraction tried before the LLM, plus a log of
+which tier produced each extraction and the LLM latency that was avoided
+"""
+
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pdf_invoice_processor import PDFInvoiceProcessor
+
+EXTRACTION_MODE_TIERED = 'tiered'
+EXTRACTION_MODE_LLM = 'llm'
+EXTRACTION_MODES = (EXTRACTION_MODE_TIERED, EXTRACTION_MODE_LLM)
+
+# Fields the LLM prompt asks for; the LLM is only queried for the ones the fast path misses
+LLM_FIELDS = ('invoice_no', 'invoice_date', 'customer_name', 'currency', 'final_total')
+
+# Same cut-off the processors use for manual review
+FAST_PATH_CONFIDENCE_THRESHOLD = 0.7
+
+CURRENCY_RE = re.compile(r'\b(AUD|USD|EUR|SGD|HKD|CNY|NZD|GBP)\b')
+INVOICE_DATE_PATTERNS = [
+    re.compile(r'Invoice\s*Date\s*[:\-]?\s*(\d{1,2}[\-/ ][A-Za-z]{3}[\-/ ]\d{2,4})', re.IGNORECASE),
+    re.compile(r'Invoice\s*Date\s*[:\-]?\s*(\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2})', re.IGNORECASE),
+    re.compile(r'\bDate\s*[:\-]?\s*(\d{1,2}[\-/ ][A-Za-z]{3}[\-/ ]\d{2,4})', re.IGNORECASE),
+]
+# Date formats the patterns above capture; output matches the LLM's DD-MMM-YY
+INVOICE_DATE_FORMATS = ('%d-%b-%Y', '%d-%b-%y', '%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d')
+INVOICE_DATE_OUTPUT_FORMAT = '%d-%b-%y'
+CUSTOMER_PATTERNS = [
+    re.compile(r'(?:Bill(?:ed)?\s*To|Customer\s*Name|Sold\s*To)\s*[:\-]?[ \t]*([^\n]{3,80})', re.IGNORECASE),
+    re.compile(r'Customer\s*[:\-][ \t]*([^\n]{3,80})', re.IGNORECASE),
+]
+
+# parse_charges charge types -> LLM line item categories
+CHARGE_CATEGORIES = {
+    'freight': 'FREIGHT',
+    'fuel_surcharge': 'FUEL_SURCHARGE',
+    'duty_tax': 'DUTY_TAX',
+    'security': 'SECURITY_CHARGE',
+    'customs': 'SERVICE_CHARGE',
+    'origin_handling': 'SERVICE_CHARGE',
+    'destination_handling': 'SERVICE_CHARGE',
+    'documentation': 'SERVICE_CHARGE',
+    'emergency': 'SURCHARGE',
+    'storage': 'SURCHARGE',
+}
+
+
+class FastPathExtractor:
+    """
+    Template extraction of the LLM processor's output fields using the
+    regexes of PDFInvoiceProcessor. Returns data in the same shape as
+    LLMEnhancedPDFProcessor.extract_invoice_data_with_llm plus charges,
+    service type and shipment details.
+    """
+
+    def __init__(self, db_path: str = 'dhl_audit.db'):
+        self.invoice_processor = PDFInvoiceProcessor(db_path)
+
+    @staticmethod
+    def _first_match(patterns: List, text: str) -> Optional[str]:
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                return match.group(1).strip()
+        return None
+
+    @staticmethod
+    def _normalize_date(value: str) -> str:
+        """DD-MMM-YY like the LLM path; unparseable dates are kept as found"""
+        candidate = re.sub(r'[/ ]', '-', value) if re.search(r'[A-Za-z]', value) else value
+        for date_format in INVOICE_DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, date_format).strftime(INVOICE_DATE_OUTPUT_FORMAT)
+            except ValueError:
+                continue
+        return value
+
+    def extract(self, text: str) -> Dict:
+        """Extract what the templates can find; missing fields are left out"""
+        processor = self.invoice_processor
+        data = {}
+
+        invoice_no = processor.parse_invoice_number(text)
+        if invoice_no:
+            data['invoice_no'] = invoice_no
+
+        invoice_date = self._first_match(INVOICE_DATE_PATTERNS, text)
+        if invoice_date:
+            data['invoice_date'] = self._normalize_date(invoice_date)
+
+        customer_name = self._first_match(CUSTOMER_PATTERNS, text)
+        if customer_name:
+            data['customer_name'] = customer_name
+
+        # extract_total_amount defaults the currency to USD, so detect it separately
+        total_amount, _currency = processor.extract_total_amount(text)
+        if total_amount > 0:
+            data['final_total'] = total_amount
+        currency = CURRENCY_RE.search(text)
+        if currency:
+            data['currency'] = currency.group(1)
+
+        charges = processor.parse_charges(text)
+        descriptions = charges.pop('_descriptions', {})
+        if charges:
+            data['charges'] = [
+                {
+                    'description': descriptions.get(charge_type, charge_type.replace('_', ' ')),
+                    'amount': amount,
+                    'category': CHARGE_CATEGORIES.get(charge_type, 'OTHER')
+                }
+                for charge_type, amount in charges.items()
+            ]
+            data['service_type'] = processor.identify_service_type(charges, text)
+
+        references = processor.extract_shipment_references(text)
+        if references:
+            data['shipment_details'] = references
+
+        return data
+
+
+def missing_llm_fields(data: Dict) -> List[str]:
+    """LLM fields the fast path did not fill"""
+    missing = []
+    for field in LLM_FIELDS:
+        value = data.get(field)
+        if field == 'final_total':
+            if not isinstance(value, (int, float)) or value <= 0:
+                missing.append(field)
+        elif not value:
+            missing.append(field)
+    return missing
+
+
+class ExtractionTierLog:
+    """Per-document record of which extraction tier was used and how long it took"""
+
+    def __init__(self, db_path: str = 'dhl_audit.db'):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create the tier log table"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS extraction_tier_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_no TEXT,
+                pdf_filename TEXT,
+                extraction_mode TEXT,
+                llm_skipped INTEGER,
+                llm_fields TEXT,
+                fast_path_confidence REAL,
+                final_confidence REAL,
+                fast_path_seconds REAL,
+                llm_seconds REAL,
+                created_at TEXT
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def record(self, invoice_no: str, pdf_filename: str, extraction_mode: str,
+               llm_fields: List[str], fast_path_confidence: Optional[float],
+               final_confidence: float, fast_path_seconds: float, llm_seconds: float):
+        """Log one extraction"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT INTO extraction_tier_log
+                (invoice_no, pdf_filename, extraction_mode, llm_skipped, llm_fields,
+                 fast_path_confidence, final_confidence, fast_path_seconds, llm_seconds, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (invoice_no, pdf_filename, extraction_mode, 0 if llm_fields else 1,
+                  ','.join(llm_fields), fast_path_confidence, final_confidence,
+                  round(fast_path_seconds, 3), round(llm_seconds, 3), datetime.now().isoformat()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_report(self) -> Dict:
+        """
+        Share of tiered extractions that skipped the LLM and the latency saved.
+        Saved time for a skipped document is estimated as the average LLM time
+        of documents that did call it, minus the fast path time actually spent.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*),
+                       COALESCE(SUM(llm_skipped), 0),
+                       COALESCE(SUM(CASE WHEN llm_skipped = 1 THEN fast_path_seconds ELSE 0 END), 0),
+                       AVG(fast_path_seconds)
+                FROM extraction_tier_log WHERE extraction_mode = ?
+            ''', (EXTRACTION_MODE_TIERED,))
+            tiered_total, skipped, skipped_fast_path_seconds, avg_fast_path_seconds = cursor.fetchone()
+
+            cursor.execute('SELECT AVG(llm_seconds), COUNT(*) FROM extraction_tier_log WHERE llm_skipped = 0')
+            avg_llm_seconds, llm_documents = cursor.fetchone()
+
+            cursor.execute('''
+                SELECT llm_fields, COUNT(*) FROM extraction_tier_log
+                WHERE extraction_mode = ? AND llm_skipped = 0
+                GROUP BY llm_fields ORDER BY COUNT(*) DESC
+            ''', (EXTRACTION_MODE_TIERED,))
+            fallback_fields = cursor.fetchall()
+        finally:
+            conn.close()
+
+        avg_llm_seconds = avg_llm_seconds or 0.0
+        seconds_saved = max(0.0, skipped * avg_llm_seconds - skipped_fast_path_seconds)
+        return {
+            'tiered_documents': tiered_total,
+            'llm_skipped': skipped,
+            'skip_rate': round(skipped / tiered_total, 3) if tiered_total else 0.0,
+            'llm_documents': llm_documents,
+            'avg_llm_seconds': round(avg_llm_seconds, 3),
+            'avg_fast_path_seconds': round(avg_fast_path_seconds or 0.0, 3),
+            'estimated_seconds_saved': round(seconds_saved, 1),
+            'llm_fallback_fields': [
+                {'fields': fields, 'documents': count} for fields, count in fallback_fields
+            ]
+        }
+
+
+_tier_logs: Dict[str, ExtractionTierLog] = {}
+_tier_logs_lock = threading.Lock()
+
+
+def get_extraction_tier_log(db_path: str = 'dhl_audit.db') -> ExtractionTierLog:
+    """Return the shared tier log for a database, creating its table once"""
+    with _tier_logs_lock:
+        tier_log = _tier_logs.get(db_path)
+        if tier_log is None:
+            tier_log = ExtractionTierLog(db_path)
+            _tier_logs[db_path] = tier_log
+        return tier_log
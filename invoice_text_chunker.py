@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Invoice Text Chunker
+Token-budgeted segmentation of invoice text for LLM extraction: page/section
+chunking, boilerplate line stripping learned across invoices, context window
+sizing and merging of per-chunk schema results
+"""
+
+import hashlib
+import math
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Rough chars-per-token ratio for Llama-family tokenizers on invoice text
+CHARS_PER_TOKEN = 4
+
+# Invoice text tokens per chunk; leaves room for the schema prompt and the JSON answer
+DEFAULT_CHUNK_TOKEN_BUDGET = 2500
+# Tokens reserved for the model's answer when sizing num_ctx
+DEFAULT_OUTPUT_TOKEN_RESERVE = 2048
+MIN_CONTEXT_TOKENS = 2048
+MAX_CONTEXT_TOKENS = 8192
+CONTEXT_STEP_TOKENS = 1024
+
+# A footer line is boilerplate once it appears in this share of the invoices seen
+BOILERPLATE_MIN_SHARE = 0.6
+# ...and only after enough invoices have been seen to judge
+BOILERPLATE_MIN_DOCUMENTS = 20
+
+# Footer and legal text the filter may strip. Field labels and column headers
+# ("Invoice Number", "Bill To", "Total") repeat on every invoice too, but the
+# LLM anchors fields on them, so only lines with one of these phrases qualify.
+BOILERPLATE_PHRASES = (
+    'terms and conditions', 'conditions of carriage', 'standard trading conditions',
+    'liability', 'liable', 'governing law', 'jurisdiction', 'disclaimer', 'confidential',
+    'privacy', 'all rights reserved', 'copyright', 'registered office', 'registered in',
+    'please remit', 'remittance', 'bank', 'swift', 'iban', 'bsb', 'thank you for',
+    'www.', 'http', '@'
+)
+
+# Summary fields printed at the end of an invoice: the last chunk that has them wins
+SUMMARY_FIELDS_FROM_LAST = ('subtotal', 'gst_total', 'final_total')
+
+_PAGE_MARKER_RE = re.compile(r'^--- Page \d+/\d+ ---$', re.MULTILINE)
+_SECTION_BREAK_RE = re.compile(r'\n\s*\n')
+_WHITESPACE_RE = re.compile(r'\s+')
+_DIGIT_RE = re.compile(r'\d')
+_BOILERPLATE_RE = re.compile('|'.join(re.escape(phrase) for phrase in BOILERPLATE_PHRASES))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer dependency)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def context_window_for(prompt_tokens: int, output_tokens: int = DEFAULT_OUTPUT_TOKEN_RESERVE) -> int:
+    """num_ctx large enough for the prompt plus answer, rounded up and clamped"""
+    needed = prompt_tokens + output_tokens
+    window = math.ceil(needed / CONTEXT_STEP_TOKENS) * CONTEXT_STEP_TOKENS
+    return max(MIN_CONTEXT_TOKENS, min(MAX_CONTEXT_TOKENS, window))
+
+
+def split_pages(text: str) -> List[str]:
+    """Split on the '--- Page n/total ---' markers (or form feeds), keeping the markers"""
+    starts = [match.start() for match in _PAGE_MARKER_RE.finditer(text)]
+    if starts:
+        if starts[0] > 0:
+            starts.insert(0, 0)
+        bounds = starts + [len(text)]
+        pages = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+    else:
+        pages = text.split('\f')
+    return [page for page in pages if page.strip()]
+
+
+def _pack(parts: List[str], token_budget: int, separator: str) -> List[str]:
+    """Greedily join consecutive parts into chunks of at most token_budget tokens"""
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    separator_tokens = estimate_tokens(separator)
+
+    for part in parts:
+        part_tokens = estimate_tokens(part)
+        if current and current_tokens + separator_tokens + part_tokens > token_budget:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += part_tokens + (separator_tokens if len(current) > 1 else 0)
+
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _split_oversized(text: str, token_budget: int) -> List[str]:
+    """Break one page that exceeds the budget into sections, then lines, then slices"""
+    if estimate_tokens(text) <= token_budget:
+        return [text]
+
+    sections = [section for section in _SECTION_BREAK_RE.split(text) if section.strip()]
+    if len(sections) > 1:
+        parts = []
+        for section in sections:
+            parts.extend(_split_oversized(section, token_budget))
+        return _pack(parts, token_budget, '\n\n')
+
+    lines = text.split('\n')
+    if len(lines) > 1:
+        parts = []
+        for line in lines:
+            parts.extend(_split_oversized(line, token_budget))
+        return _pack(parts, token_budget, '\n')
+
+    slice_chars = token_budget * CHARS_PER_TOKEN
+    return [text[i:i + slice_chars] for i in range(0, len(text), slice_chars)]
+
+
+def chunk_invoice_text(text: str, token_budget: int = DEFAULT_CHUNK_TOKEN_BUDGET) -> List[str]:
+    """
+    Segment invoice text into chunks of at most token_budget estimated tokens.
+    Whole pages are packed together where they fit; oversized pages are split
+    on blank-line sections, then lines.
+    """
+    if not text or not text.strip():
+        return []
+    if estimate_tokens(text) <= token_budget:
+        return [text]
+
+    parts = []
+    for page in split_pages(text):
+        parts.extend(_split_oversized(page, token_budget))
+    return _pack(parts, token_budget, '\n')
+
+
+def _normalize_line(line: str) -> str:
+    return _WHITESPACE_RE.sub(' ', line).strip().lower()
+
+
+def _line_hash(normalized_line: str) -> str:
+    return hashlib.sha1(normalized_line.encode('utf-8')).hexdigest()
+
+
+def _footer_line_hashes(text: str) -> set:
+    """Hashes of the lines of text that may be boilerplate: footer or legal phrases, no digits"""
+    return {_line_hash(normalized) for normalized in map(_normalize_line, text.split('\n'))
+            if normalized and not _DIGIT_RE.search(normalized) and _BOILERPLATE_RE.search(normalized)}
+
+
+class BoilerplateFilter:
+    """
+    Learns which footer lines repeat across invoices (terms and conditions, bank
+    details, contact footers) and strips them before text is sent to the LLM.
+
+    Only lines with one of BOILERPLATE_PHRASES are considered, so field labels
+    and column headers are kept however often they repeat. Line document
+    frequencies are kept in SQLite; each distinct invoice text is counted once.
+    Lines containing digits are never stripped, since they can carry amounts,
+    dates or references.
+    """
+
+    def __init__(self, db_path: str = 'dhl_audit.db',
+                 min_share: float = BOILERPLATE_MIN_SHARE,
+                 min_documents: int = BOILERPLATE_MIN_DOCUMENTS):
+        self.db_path = db_path
+        self.min_share = min_share
+        self.min_documents = min_documents
+        self.init_database()
+
+    def init_database(self):
+        """Create the line statistics tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS invoice_text_line_stats (
+                line_hash TEXT PRIMARY KEY,
+                document_count INTEGER DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS invoice_text_documents (
+                text_sha256 TEXT PRIMARY KEY,
+                observed_at TEXT
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def observe(self, text: str):
+        """Count the distinct footer lines of one invoice text (once per distinct text)"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        line_hashes = _footer_line_hashes(text)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('INSERT OR IGNORE INTO invoice_text_documents (text_sha256, observed_at) VALUES (?, ?)',
+                           (digest, datetime.now().isoformat()))
+            if cursor.rowcount == 0:
+                return  # Already counted
+            cursor.executemany('INSERT OR IGNORE INTO invoice_text_line_stats (line_hash) VALUES (?)',
+                               [(line_hash,) for line_hash in line_hashes])
+            cursor.executemany('''
+                UPDATE invoice_text_line_stats SET document_count = document_count + 1
+                WHERE line_hash = ?
+            ''', [(line_hash,) for line_hash in line_hashes])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def boilerplate_hashes(self, text: str) -> set:
+        """Hashes of the lines in text that count as boilerplate"""
+        candidates = _footer_line_hashes(text)
+        if not candidates:
+            return set()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM invoice_text_documents')
+            total_documents = cursor.fetchone()[0]
+            if total_documents < self.min_documents:
+                return set()
+
+            threshold = self.min_share * total_documents
+            found = set()
+            candidate_list = list(candidates)
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(candidate_list), 500):
+                batch = candidate_list[start:start + 500]
+                cursor.execute(f'''
+                    SELECT line_hash FROM invoice_text_line_stats
+                    WHERE document_count >= ? AND line_hash IN ({",".join("?" * len(batch))})
+                ''', [threshold] + batch)
+                found.update(row[0] for row in cursor.fetchall())
+            return found
+        finally:
+            conn.close()
+
+    def strip(self, text: str) -> str:
+        """Remove boilerplate lines, leaving all other lines in place"""
+        boilerplate = self.boilerplate_hashes(text)
+        if not boilerplate:
+            return text
+        kept = [line for line in text.split('\n')
+                if not _normalize_line(line) or _line_hash(_normalize_line(line)) not in boilerplate]
+        return '\n'.join(kept)
+
+
+def _has_value(value) -> bool:
+    return value is not None and value != '' and value != 'null'
+
+
+def merge_chunk_results(chunk_results: List[Optional[Dict]], schema: Dict) -> Dict:
+    """
+    Merge per-chunk schema extractions into one invoice.
+
+    Summary fields take the first chunk that has a value, except the totals in
+    SUMMARY_FIELDS_FROM_LAST which take the last. Line items are concatenated
+    in chunk order and renumbered. Chunks that failed (None) are skipped.
+    """
+    summaries = [result.get('invoice_summary') or {} for result in chunk_results
+                 if isinstance(result, dict)]
+    summary = {}
+    for field in schema['invoice_summary']:
+        ordered = reversed(summaries) if field in SUMMARY_FIELDS_FROM_LAST else summaries
+        for chunk_summary in ordered:
+            if _has_value(chunk_summary.get(field)):
+                summary[field] = chunk_summary[field]
+                break
+        else:
+            summary[field] = None
+
+    line_items = []
+    for result in chunk_results:
+        if not isinstance(result, dict):
+            continue
+        for item in result.get('billing_line_items') or []:
+            if isinstance(item, dict):
+                item = dict(item)
+                item['line_item_index'] = len(line_items) + 1
+                line_items.append(item)
+
+    return {'invoice_summary': summary, 'billing_line_items': line_items}
@@ -9,9 +9,31 @@ import sqlite3
 import requests
 from typing import Dict, List, Optional
 import pdfplumber
-import fitz  # PyMuPDF
 from datetime import datetime
 from model_manager import ModelManager
+from pdf_text_cache import get_pdf_text_cache, ENGINE_PYMUPDF
+from ollama_scheduler import get_ollama_session, post_generate, OllamaHTTPError
+from llm_response_cache import get_llm_response_cache, make_cache_key
+from invoice_text_chunker import context_window_for, estimate_tokens
+from invoice_fast_path import (
+    FastPathExtractor, get_extraction_tier_log, missing_llm_fields, LLM_FIELDS,
+    EXTRACTION_MODE_TIERED, EXTRACTION_MODE_LLM, FAST_PATH_CONFIDENCE_THRESHOLD
+)
+
+# Bump when the extraction prompt or its parsing changes to invalidate cached responses
+LLM_PROMPT_VERSION = 'billing-summary-v1'
+
+# The five-field answer is short; keep the context window close to the prompt size
+LLM_OUTPUT_TOKEN_RESERVE = 1024
+
+# JSON format hint for each field the extraction prompt can ask for
+LLM_FIELD_FORMATS = {
+    'invoice_no': '"string"',
+    'invoice_date': '"DD-MMM-YY format"',
+    'customer_name': '"string"',
+    'currency': '"string (AUD, USD, etc.)"',
+    'final_total': 'number'
+}
 
 
 class LLMEnhancedPDFProcessor:
@@ -21,6 +43,10 @@ class LLMEnhancedPDFProcessor:
     
     def __init__(self, db_path: str = 'dhl_audit.db', model_name: str = None):
         self.db_path = db_path
+        self.last_text_cache_hit = False
+        self.last_llm_cache_hit = False
+        # Regex fast path first, LLM only for fields it could not fill
+        self.extraction_mode = EXTRACTION_MODE_TIERED
         # Model Configuration - defaults to faster Llama3.2
         self.ollama_url = "http://localhost:11434"
         self.model_name = model_name or "llama3.2:latest"
@@ -30,6 +56,10 @@ class LLMEnhancedPDFProcessor:
         self.num_predict = 8192  # Increased to ensure complete JSON responses
         self.init_database()
         
+        # Built once: the extractor's PDFInvoiceProcessor and the tier log table
+        self.fast_path_extractor = FastPathExtractor(db_path)
+        self.tier_log = get_extraction_tier_log(db_path)
+        
         # Initialize model manager for automatic model loading
         self.model_manager = ModelManager()
         
@@ -235,150 +265,125 @@ class LLMEnhancedPDFProcessor:
         """Extract text from PDF using PyMuPDF (fitz) with enhanced capacity for large documents"""
         import time
         time_start = time.time()
-        text_content = ""
+        self.last_text_cache_hit = False
         
         try:
-            # Open the PDF with PyMuPDF
-            time_before_open = time.time()
-            with fitz.open(pdf_path) as doc:
-                time_after_open = time.time()
-                
-                # Get total pages for logging
-                total_pages = len(doc)
-                print(f"Extracting text from PDF with {total_pages} pages using PyMuPDF...")
-                print(f"[TIMING] PDF open time: {(time_after_open - time_before_open):.3f}s")
-                
-                page_times = []
-                for page_num, page in enumerate(doc, 1):
-                    time_before_page = time.time()
-                    # Extract text with PyMuPDF
-                    page_text = page.get_text()
-                    time_after_page = time.time()
-                    page_times.append(time_after_page - time_before_page)
-                    
-                    if page_text:
-                        # Add page number for better traceability
-                        text_content += f"--- Page {page_num}/{total_pages} ---\n{page_text}\n\n"
-                
-                # Report page extraction timing statistics
-                if page_times:
-                    avg_time = sum(page_times) / len(page_times)
-                    max_time = max(page_times)
-                    max_page = page_times.index(max_time) + 1
-                    print(f"[TIMING] Average page extraction time: {avg_time:.3f}s")
-                    print(f"[TIMING] Slowest page was #{max_page}: {max_time:.3f}s")
-                
-                # Log the extraction size
-                print(f"Extracted {len(text_content)} characters from PDF")
+            # Parsed pages are cached by file content, so reprocessing skips PyMuPDF
+            extraction = get_pdf_text_cache(self.db_path).extract(pdf_path, ENGINE_PYMUPDF)
+            text_content = extraction.paged_text()
+            self.last_text_cache_hit = extraction.cache_hit
+            
+            source = "text cache" if extraction.cache_hit else "PyMuPDF"
+            print(f"Extracted text from PDF with {len(extraction.pages)} pages using {source}...")
+            print(f"[TIMING] PDF text extraction ({source}): {(time.time() - time_start):.3f}s")
+            
+            # Log the extraction size
+            print(f"Extracted {len(text_content)} characters from PDF")
         except Exception as e:
             print(f"Error extracting text from PDF: {e}")
             return ""
         
         return text_content
 
+    @staticmethod
+    def build_full_prompt(prompt: str, pdf_text: str) -> str:
+        """Prompt followed by the invoice text, as sent to the model"""
+        return f"{prompt}\n\nINVOICE TEXT:\n{pdf_text}"
+
+    def get_generation_options(self, full_prompt: str) -> Dict:
+        """Ollama generation options used for extraction requests"""
+        return {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "num_predict": self.num_predict,
+            # GPU optimization options; context sized to the prompt rather than a fixed 8192
+            "num_ctx": context_window_for(estimate_tokens(full_prompt), LLM_OUTPUT_TOKEN_RESERVE),
+            "num_batch": 512,
+            "num_gpu": 1,
+            "gpu_layers": -1  # Use all GPU layers
+        }
+
     def query_llm(self, prompt: str, pdf_text: str) -> Optional[str]:
         """Query the local LLM via Ollama with streaming support"""
         import time
         
         try:
             time_start = time.time()
-            full_prompt = f"{prompt}\n\nINVOICE TEXT:\n{pdf_text}"
+            full_prompt = self.build_full_prompt(prompt, pdf_text)
             print(f"Querying LLM with {len(full_prompt)} characters of prompt...")
             
             payload = {
                 "model": self.model_name,
                 "prompt": full_prompt,
                 "stream": True,  # Enable streaming for complete responses
-                "options": {
-                    "temperature": self.temperature,
-                    "top_p": self.top_p,
-                    "num_predict": self.num_predict,
-                    # GPU optimization options
-                    "num_ctx": 8192,
-                    "num_batch": 512,
-                    "num_gpu": 1,
-                    "gpu_layers": -1  # Use all GPU layers
-                }
+                "options": self.get_generation_options(full_prompt)
             }
             
             print(f"Sending streaming request to {self.ollama_url}/api/generate...")
             
             time_before_llm_request = time.time()
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=payload,
-                timeout=self.timeout,
-                stream=True  # Enable streaming
+            # Pooled keep-alive session instead of a new connection per request
+            full_response, final_chunk = post_generate(
+                get_ollama_session(self.ollama_url), self.ollama_url, payload, self.timeout
             )
-            
-            print(f"LLM response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                # Process streaming response
-                full_response = ""
-                total_tokens = 0
-                
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            chunk = line.decode('utf-8')
-                            data = json.loads(chunk)
-                            
-                            if 'response' in data:
-                                full_response += data['response']
-                            
-                            if 'eval_count' in data:
-                                total_tokens = data['eval_count']
-                            
-                            # Check if this is the final chunk
-                            if data.get('done', False):
-                                break
-                        except json.JSONDecodeError:
-                            continue  # Skip malformed chunks
-                
-                time_after_llm_request = time.time()
-                llm_request_time = time_after_llm_request - time_before_llm_request
-                print(f"[TIMING] LLM request time: {llm_request_time:.3f}s")
-                
-                # Calculate tokens per second
-                if total_tokens > 0:
-                    tokens_per_second = total_tokens / llm_request_time if llm_request_time > 0 else 0
-                    print(f"[TIMING] Processed {total_tokens} tokens at {tokens_per_second:.1f} tokens/sec")
-                
-                # Calculate total time for LLM processing
-                time_complete = time.time()
-                total_time = time_complete - time_start
-                print(f"[TIMING] Total LLM time: {total_time:.3f}s")
-                print(f"LLM response received: {len(full_response)} characters")
-                return full_response
-            else:
-                print(f"LLM query failed: {response.status_code}")
-                print(f"Response: {response.text}")
-                return None
+            total_tokens = final_chunk.get('eval_count', 0)
+            
+            time_after_llm_request = time.time()
+            llm_request_time = time_after_llm_request - time_before_llm_request
+            print(f"[TIMING] LLM request time: {llm_request_time:.3f}s")
+            
+            # Calculate tokens per second
+            if total_tokens > 0:
+                tokens_per_second = total_tokens / llm_request_time if llm_request_time > 0 else 0
+                print(f"[TIMING] Processed {total_tokens} tokens at {tokens_per_second:.1f} tokens/sec")
+            
+            # Calculate total time for LLM processing
+            time_complete = time.time()
+            total_time = time_complete - time_start
+            print(f"[TIMING] Total LLM time: {total_time:.3f}s")
+            print(f"LLM response received: {len(full_response)} characters")
+            return full_response
                 
+        except OllamaHTTPError as e:
+            print(f"LLM query failed: {e.status_code}")
+            print(f"Response: {e.body}")
+            return None
         except Exception as e:
             print(f"Error querying LLM: {e}")
             import traceback
             traceback.print_exc()
             return None
 
-    def extract_invoice_data_with_llm(self, pdf_text: str) -> Dict:
-        """Extract structured invoice data using DeepSeek-R1 LLM"""
-        
-        prompt = """You are an expert at extracting billing details from DHL invoices.
+    @staticmethod
+    def build_extraction_prompt(fields=LLM_FIELDS) -> str:
+        """Extraction prompt asking for the given fields only"""
+        field_lines = ",\n".join(f'    "{field}": {LLM_FIELD_FORMATS[field]}' for field in fields)
+        scope = f"these {len(fields)} fields" if len(fields) > 1 else "this field"
+        return f"""You are an expert at extracting billing details from DHL invoices.
 
 Analyze this DHL invoice text and extract essential billing information in JSON format.
 
 Return ONLY a valid JSON object with these EXACT fields:
-{
-    "invoice_no": "string",
-    "invoice_date": "DD-MMM-YY format",
-    "customer_name": "string",
-    "currency": "string (AUD, USD, etc.)",
-    "final_total": number
-}
+{{
+{field_lines}
+}}
 
-Keep response short and focused. Extract only these 5 fields."""
+Keep response short and focused. Extract only {scope}."""
+
+    def extract_invoice_data_with_llm(self, pdf_text: str, fields=LLM_FIELDS) -> Dict:
+        """Extract structured invoice data using DeepSeek-R1 LLM"""
+        
+        prompt = self.build_extraction_prompt(fields)
+        
+        response_cache = get_llm_response_cache(self.db_path)
+        cache_key = make_cache_key(self.model_name, LLM_PROMPT_VERSION,
+                                   self.get_generation_options(self.build_full_prompt(prompt, pdf_text)),
+                                   prompt, pdf_text)
+        cached_data = response_cache.get(cache_key, self.model_name)
+        self.last_llm_cache_hit = cached_data is not None
+        if cached_data is not None:
+            print(f"LLM response cache hit for model {self.model_name}")
+            return cached_data
         
         llm_response = self.query_llm(prompt, pdf_text)
         
@@ -475,6 +480,8 @@ Keep response short and focused. Extract only these 5 fields."""
                         except (ValueError, TypeError):
                             pass  # Keep as string if conversion fails
                     
+                    if extracted_data:
+                        response_cache.put(cache_key, extracted_data, self.model_name, LLM_PROMPT_VERSION)
                     return extracted_data
                 else:
                     print("No valid JSON found in LLM response")
@@ -489,33 +496,23 @@ Keep response short and focused. Extract only these 5 fields."""
         else:
             return {}
 
-    def process_pdf_with_llm(self, pdf_path: str, invoice_no: str = None) -> Dict:
-        """Process a PDF file with LLM enhanced extraction"""
+    def process_pdf_with_llm(self, pdf_path: str, invoice_no: str = None,
+                             extraction_mode: str = None) -> Dict:
+        """
+        Process a PDF file with LLM enhanced extraction.
+        In tiered mode the regex fast path runs first; the LLM is skipped when it
+        fills every field with enough confidence, otherwise it is asked only for
+        the missing fields (or all fields when fast path confidence is low).
+        """
         import time
         time_start = time.time()
         timing = {}
+        extraction_mode = extraction_mode or self.extraction_mode
         
         try:
             print(f"[TIMING] Starting PDF processing for {pdf_path}")
             print(f"🤖 Using model: {self.model_name}")
             
-            # Ensure model is loaded and ready before processing
-            print(f"🔄 Ensuring model {self.model_name} is ready...")
-            time_before_model_prep = time.time()
-            model_ready, model_message = self.model_manager.ensure_model_ready(self.model_name)
-            time_after_model_prep = time.time()
-            timing['model_preparation'] = round(time_after_model_prep - time_before_model_prep, 3)
-            print(f"[TIMING] Model preparation: {timing['model_preparation']:.3f}s")
-            
-            if not model_ready:
-                return {
-                    'success': False, 
-                    'error': f'Model preparation failed: {model_message}',
-                    'timing': timing
-                }
-            
-            print(f"✅ Model ready: {model_message}")
-            
             # Extract text from PDF
             time_before_extraction = time.time()
             pdf_text = self.extract_text_from_pdf(pdf_path)
@@ -537,13 +534,55 @@ Keep response short and focused. Extract only these 5 fields."""
             time_after_detection = time.time()
             timing['invoice_detection'] = round(time_after_detection - time_before_detection, 3)
             
-            # Extract structured data using LLM
-            time_before_llm = time.time()
-            extracted_data = self.extract_invoice_data_with_llm(pdf_text)
-            time_after_llm = time.time()
-            llm_time = time_after_llm - time_before_llm
-            timing['llm_processing'] = round(llm_time, 3)
-            print(f"[TIMING] LLM extraction: {llm_time:.3f}s")
+            # Tier 1: deterministic template extraction
+            extracted_data = {}
+            fast_path_confidence = None
+            llm_fields = list(LLM_FIELDS)
+            timing['fast_path'] = 0.0
+            if extraction_mode == EXTRACTION_MODE_TIERED:
+                time_before_fast_path = time.time()
+                extracted_data = self.fast_path_extractor.extract(pdf_text)
+                fast_path_confidence = self.calculate_extraction_confidence(extracted_data)
+                if fast_path_confidence >= FAST_PATH_CONFIDENCE_THRESHOLD:
+                    llm_fields = missing_llm_fields(extracted_data)
+                timing['fast_path'] = round(time.time() - time_before_fast_path, 3)
+                print(f"[TIMING] Fast path extraction: {timing['fast_path']:.3f}s "
+                      f"(confidence {fast_path_confidence:.2f}, LLM fields: {', '.join(llm_fields) or 'none'})")
+            
+            # Tier 2: LLM for the fields the fast path could not settle
+            if llm_fields:
+                # Ensure model is loaded and ready before processing
+                print(f"🔄 Ensuring model {self.model_name} is ready...")
+                time_before_model_prep = time.time()
+                model_ready, model_message = self.model_manager.ensure_model_ready(self.model_name)
+                time_after_model_prep = time.time()
+                timing['model_preparation'] = round(time_after_model_prep - time_before_model_prep, 3)
+                print(f"[TIMING] Model preparation: {timing['model_preparation']:.3f}s")
+                
+                if not model_ready:
+                    return {
+                        'success': False, 
+                        'error': f'Model preparation failed: {model_message}',
+                        'timing': timing
+                    }
+                
+                print(f"✅ Model ready: {model_message}")
+                
+                time_before_llm = time.time()
+                llm_data = self.extract_invoice_data_with_llm(pdf_text, tuple(llm_fields))
+                time_after_llm = time.time()
+                llm_time = time_after_llm - time_before_llm
+                timing['llm_processing'] = round(llm_time, 3)
+                print(f"[TIMING] LLM extraction: {llm_time:.3f}s")
+                
+                # LLM answers win for the fields it was asked about
+                extracted_data.update({key: value for key, value in llm_data.items()
+                                       if key in llm_fields or key not in extracted_data})
+            else:
+                self.last_llm_cache_hit = False
+                timing['model_preparation'] = 0.0
+                timing['llm_processing'] = 0.0
+                print("Fast path filled every field, skipping LLM")
             
             # Calculate confidence
             time_before_confidence = time.time()
@@ -553,6 +592,14 @@ Keep response short and focused. Extract only these 5 fields."""
             
             manual_review_needed = confidence < 0.7
             
+            try:
+                self.tier_log.record(
+                    invoice_no, os.path.basename(pdf_path), extraction_mode, llm_fields,
+                    fast_path_confidence, confidence, timing['fast_path'], timing['llm_processing']
+                )
+            except Exception as e:
+                print(f"Error recording extraction tier: {e}")
+            
             # Save to database
             time_before_save = time.time()
             self.save_llm_extraction(
@@ -583,6 +630,11 @@ Keep response short and focused. Extract only these 5 fields."""
                 'extracted_data': extracted_data,
                 'confidence': confidence,
                 'manual_review_needed': manual_review_needed,
+                'text_cache_hit': self.last_text_cache_hit,
+                'llm_cache_hit': self.last_llm_cache_hit,
+                'extraction_mode': extraction_mode,
+                'llm_skipped': not llm_fields,
+                'llm_fields': llm_fields,
                 'timing': timing
             }
             
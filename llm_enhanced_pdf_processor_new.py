@@ -8,7 +8,7 @@ import json
 import sqlite3
 import requests
 from typing import Dict, List, Optional
-import pdfplumber
+from pdf_text_cache import get_pdf_text_cache, ENGINE_PDFPLUMBER
 from datetime import datetime
 
 
@@ -109,13 +109,8 @@ class LLMEnhancedPDFProcessor:
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from PDF using pdfplumber"""
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                text_content = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text + "\n"
-                return text_content.strip()
+            extraction = get_pdf_text_cache(self.db_path).extract(pdf_path, ENGINE_PDFPLUMBER)
+            return extraction.joined_text().strip()
         except Exception as e:
             print(f"Error extracting text from PDF: {e}")
             return ""
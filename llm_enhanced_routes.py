@@ -11,6 +11,8 @@ import sqlite3
 from llm_enhanced_pdf_processor import LLMEnhancedPDFProcessor
 from schema_driven_llm_processor import SchemaDrivenLLMProcessor
 from model_manager import ModelManager
+from llm_response_cache import get_llm_response_cache
+from invoice_fast_path import get_extraction_tier_log, EXTRACTION_MODES, EXTRACTION_MODE_LLM
 
 # Authentication (optional)
 try:
@@ -100,9 +102,12 @@ def upload_page():
             file_path = os.path.join(upload_dir, pdf_file.filename)
             pdf_file.save(file_path)
             
-            # Process with LLM
+            # Process with LLM (tiered unless the form asks for LLM-only extraction)
             processor = LLMEnhancedPDFProcessor()
-            result = processor.process_pdf_with_llm(file_path)
+            extraction_mode = request.form.get('extraction_mode')
+            result = processor.process_pdf_with_llm(
+                file_path, extraction_mode=extraction_mode if extraction_mode in EXTRACTION_MODES else None
+            )
             
             # Clean up
             if os.path.exists(file_path):
@@ -537,18 +542,33 @@ def stats():
         
         conn.close()
         
+        llm_cache_stats = get_llm_response_cache('dhl_audit.db').get_stats()
+        extraction_tiers = get_extraction_tier_log('dhl_audit.db').get_report()
+        
         return render_template('llm_pdf_performance.html',
                              total_processed=total_processed,
                              avg_confidence=avg_confidence,
                              total_summaries=total_summaries,
-                             daily_stats=daily_stats)
+                             daily_stats=daily_stats,
+                             llm_cache_stats=llm_cache_stats,
+                             extraction_tiers=extraction_tiers)
     except Exception as e:
         print(f"Stats error: {e}")
         return render_template('llm_pdf_performance.html',
                              total_processed=0,
                              avg_confidence=0,
                              total_summaries=0,
-                             daily_stats=[])
+                             daily_stats=[],
+                             llm_cache_stats=None,
+                             extraction_tiers=None)
+
+@llm_pdf_bp.route('/llm-pdf/api/extraction-tiers')
+def api_extraction_tiers():
+    """Share of documents that skipped the LLM and the latency saved"""
+    try:
+        return jsonify(get_extraction_tier_log('dhl_audit.db').get_report())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @llm_pdf_bp.route('/llm-pdf/results')
 def results():
@@ -842,7 +862,8 @@ def api_run_benchmark():
                     result = processor.process_pdf_with_schema(file_path)
                 else:
                     processor = LLMEnhancedPDFProcessor()
-                    result = processor.process_pdf_with_llm(file_path)
+                    # Benchmarks measure the model, so bypass the regex fast path
+                    result = processor.process_pdf_with_llm(file_path, extraction_mode=EXTRACTION_MODE_LLM)
                 
                 # Append result regardless of success status
                 # This ensures we capture timing data even from failed attempts
@@ -913,9 +934,12 @@ def api_process_pdf():
         file_path = os.path.join(upload_dir, pdf_file.filename)
         pdf_file.save(file_path)
         
-        # Process with LLM
+        # Process with LLM (tiered unless the form asks for LLM-only extraction)
         processor = LLMEnhancedPDFProcessor()
-        result = processor.process_pdf_with_llm(file_path)
+        extraction_mode = request.form.get('extraction_mode')
+        result = processor.process_pdf_with_llm(
+            file_path, extraction_mode=extraction_mode if extraction_mode in EXTRACTION_MODES else None
+        )
         
         # Clean up
         if os.path.exists(file_path):
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache
+Persistent cache of structured LLM extraction output keyed by the hash of
+(model, prompt template version, generation options, prompt/invoice text), so
+reprocessing and model comparison runs skip the model for text it has seen
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+# Entries not used for this long are evicted
+DEFAULT_MAX_AGE_DAYS = 90
+# Total size of cached responses kept, least recently used evicted first
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Run eviction after this many new entries
+EVICT_EVERY_STORES = 100
+
+
+def make_cache_key(model: str, prompt_version: str, options: Optional[Dict], *texts: str) -> str:
+    """SHA-256 over the model, prompt version, options and the prompt/invoice text"""
+    digest = hashlib.sha256()
+    header = json.dumps({'model': model, 'prompt_version': prompt_version,
+                         'options': options or {}}, sort_keys=True)
+    digest.update(header.encode('utf-8'))
+    for text in texts:
+        # Length prefix keeps ('ab', 'c') and ('a', 'bc') apart
+        encoded = (text or '').encode('utf-8')
+        digest.update(f"\x00{len(encoded)}\x00".encode('ascii'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed store of parsed LLM output.
+
+    Only successful extractions are stored. Hit/miss counters are kept in the
+    database as well as in-process so the stats page covers every worker.
+    """
+
+    def __init__(self, db_path: str = 'dhl_audit.db',
+                 max_age_days: int = DEFAULT_MAX_AGE_DAYS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._stores_since_evict = 0
+        self.init_database()
+
+    def init_database(self):
+        """Create the cache and counter tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                prompt_version TEXT,
+                response_json TEXT NOT NULL,
+                size_bytes INTEGER,
+                hit_count INTEGER DEFAULT 0,
+                created_at TEXT,
+                last_used_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used
+            ON llm_response_cache (last_used_at)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_response_cache_stats (
+                model TEXT PRIMARY KEY,
+                hits INTEGER DEFAULT 0,
+                misses INTEGER DEFAULT 0
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def get(self, cache_key: str, model: str = None) -> Optional[Any]:
+        """Return the cached output for a key, or None on a miss"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT response_json FROM llm_response_cache WHERE cache_key = ?',
+                           (cache_key,))
+            row = cursor.fetchone()
+            hit = row is not None
+
+            if hit:
+                cursor.execute('''
+                    UPDATE llm_response_cache
+                    SET hit_count = hit_count + 1, last_used_at = ?
+                    WHERE cache_key = ?
+                ''', (datetime.now().isoformat(), cache_key))
+            self._count(cursor, model or '', hit)
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if hit else None
+
+    def put(self, cache_key: str, response: Any, model: str = None, prompt_version: str = None):
+        """Store parsed output for a key"""
+        response_json = json.dumps(response, default=str)
+        now = datetime.now().isoformat()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_response_cache
+                (cache_key, model, prompt_version, response_json, size_bytes, hit_count, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+            ''', (cache_key, model, prompt_version, response_json,
+                  len(response_json.encode('utf-8')), now, now))
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._stats_lock:
+            self._stores_since_evict += 1
+            evict_due = self._stores_since_evict >= EVICT_EVERY_STORES
+            if evict_due:
+                self._stores_since_evict = 0
+        if evict_due:
+            self.evict()
+
+    def evict(self, max_age_days: int = None, max_bytes: int = None) -> int:
+        """
+        Drop entries unused for max_age_days, then the least recently used
+        entries until the total response size fits in max_bytes.
+        Returns the number of entries removed.
+        """
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM llm_response_cache WHERE last_used_at < ?', (cutoff,))
+            removed = cursor.rowcount
+
+            cursor.execute('''
+                DELETE FROM llm_response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key,
+                               SUM(size_bytes) OVER (ORDER BY last_used_at DESC, cache_key) AS running_bytes
+                        FROM llm_response_cache
+                    ) WHERE running_bytes > ?
+                )
+            ''', (max_bytes,))
+            removed += cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+
+        if removed:
+            print(f"LLM response cache: evicted {removed} entries")
+        return removed
+
+    def clear(self):
+        """Remove every cached response (counters are kept)"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('DELETE FROM llm_response_cache')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _count(cursor, model: str, hit: bool):
+        cursor.execute('INSERT OR IGNORE INTO llm_response_cache_stats (model) VALUES (?)', (model,))
+        column = 'hits' if hit else 'misses'
+        cursor.execute(f'UPDATE llm_response_cache_stats SET {column} = {column} + 1 WHERE model = ?',
+                       (model,))
+
+    def get_stats(self) -> Dict:
+        """Persistent hit rate per model plus entry count and size"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), MIN(created_at) FROM llm_response_cache')
+            entries, total_bytes, oldest_entry = cursor.fetchone()
+            cursor.execute('SELECT model, hits, misses FROM llm_response_cache_stats ORDER BY model')
+            model_rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        hits = sum(row[1] for row in model_rows)
+        misses = sum(row[2] for row in model_rows)
+        with self._stats_lock:
+            process_total = self.hits + self.misses
+            process_hit_rate = round(self.hits / process_total, 3) if process_total else 0.0
+
+        return {
+            'entries': entries,
+            'total_bytes': total_bytes,
+            'oldest_entry': oldest_entry,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'process_hit_rate': process_hit_rate,
+            'max_age_days': self.max_age_days,
+            'max_bytes': self.max_bytes,
+            'by_model': [
+                {
+                    'model': model or 'unknown',
+                    'hits': model_hits,
+                    'misses': model_misses,
+                    'hit_rate': round(model_hits / (model_hits + model_misses), 3)
+                    if model_hits + model_misses else 0.0
+                }
+                for model, model_hits, model_misses in model_rows
+            ]
+        }
+
+
+_caches: Dict[str, LLMResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_response_cache(db_path: str = 'dhl_audit.db') -> LLMResponseCache:
+    """Return the shared response cache for a database"""
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = LLMResponseCache(db_path)
+            _caches[db_path] = cache
+        return cache
@@ -8,7 +8,7 @@ import json
 import os
 from typing import Dict, List, Tuple
 from schema_driven_llm_processor import SchemaDrivenLLMProcessor
-import PyPDF2
+from pdf_text_cache import get_pdf_text_cache, ENGINE_PYPDF2
 
 
 class LLMTrainingDataGenerator:
@@ -159,12 +159,8 @@ class LLMTrainingDataGenerator:
     def extract_pdf_text(self, pdf_path: str) -> str:
         """Extract text from PDF file"""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
+            extraction = get_pdf_text_cache(self.db_path).extract(pdf_path, ENGINE_PYPDF2)
+            return extraction.joined_text(skip_empty=False).strip()
         except Exception as e:
             print(f"Error extracting text from {pdf_path}: {e}")
             return ""
@@ -7,6 +7,8 @@ This script creates test data matching the actual database schema.
 import sqlite3
 from datetime import datetime, date
 
+from rate_card_versions import bump_rate_card_version
+
 def load_correct_test_data():
     """Load test data into FedEx rate card tables with correct schema"""
     conn = sqlite3.connect('fedex_audit.db')
@@ -108,6 +110,7 @@ def load_correct_test_data():
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (surcharge_code, surcharge_name, description, rate_type, rate_value, min_charge, max_charge, applies_to, origin_regions, dest_regions, weight_threshold, active, effective_date, expiry_date))
         
+        bump_rate_card_version(cursor, 'fedex_rate_cards', 'load_correct_fedex_data')
         conn.commit()
         print("✅ FedEx test data loaded successfully!")
         
@@ -7,6 +7,8 @@ This script creates sample rate card data for testing the management interface.
 import sqlite3
 from datetime import datetime, date
 
+from rate_card_versions import bump_rate_card_version
+
 def load_test_data():
     """Load sample test data into FedEx rate card tables"""
     conn = sqlite3.connect('fedex_audit.db')
@@ -141,6 +143,7 @@ def load_test_data():
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', surcharges)
     
+    bump_rate_card_version(cursor, 'fedex_rate_cards', 'load_fedex_test_data')
     conn.commit()
     conn.close()
     
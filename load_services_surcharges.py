@@ -7,6 +7,7 @@ import pandas as pd
 import sqlite3
 import re
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 def parse_net_charge(net_charge_str):
     """Parse the Net Charge string to extract rate and minimum values"""
@@ -127,6 +128,7 @@ def load_services_surcharges():
                     inserted_count += 1
                     print(f"Inserted {code} - {name}: ${charge_amount}")
         
+        bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'load_services_surcharges')
         conn.commit()
         print(f"\nSummary:")
         print(f"  Inserted: {inserted_count} new services")
@@ -7,6 +7,8 @@ This script creates minimal test data to demonstrate the management interface.
 import sqlite3
 from datetime import datetime, date
 
+from rate_card_versions import bump_rate_card_version
+
 def load_simple_test_data():
     """Load minimal test data into FedEx rate card tables"""
     conn = sqlite3.connect('fedex_audit.db')
@@ -85,6 +87,7 @@ def load_simple_test_data():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', ('RES', 'Residential Surcharge', 'Residential delivery surcharge', 'residential', 5.20, 0, 'USD', 1, date.today()))
         
+        bump_rate_card_version(cursor, 'fedex_rate_cards', 'load_simple_fedex_data')
         conn.commit()
         print("✅ Simple FedEx test data loaded successfully!")
         
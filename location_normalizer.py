@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Location Normalizer
+Cached parsing of raw lane/location strings into canonical (city, port code, country)
+tuples shared by the ocean and air freight audit engines
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+
+# Large enough to hold every lane string of a full rate card set plus invoice locations
+LOCATION_CACHE_SIZE = 65536
+
+# 5 character UN/LOCODE, e.g. CNSHA, AUSYD
+_LOCODE_RE = re.compile(r'\b([A-Z]{2}[A-Z2-9]{3})\b')
+_CODE_RE = re.compile(r'\b[A-Z]{2,3}\b')
+_PARENTHESES_RE = re.compile(r'\([^)]*\)')
+_AFTER_COMMA_RE = re.compile(r',.*$')
+
+
+class NormalizedLocation(NamedTuple):
+    """Canonical form of a raw location string"""
+    text: str                   # lower-cased, stripped raw string
+    city: str                   # main city name (see extract_city_name)
+    port_code: Optional[str]    # UN/LOCODE found in the raw string
+    country: Optional[str]      # LOCODE country prefix or trailing ", Country" part
+
+
+@lru_cache(maxsize=LOCATION_CACHE_SIZE)
+def extract_city_name(location: str) -> str:
+    """Extract the main city name from a location string"""
+    # Remove common port/airport codes and country names
+    location = _CODE_RE.sub('', location)  # Remove codes like SHA, SYD
+    location = _PARENTHESES_RE.sub('', location)  # Remove parentheses content
+    location = _AFTER_COMMA_RE.sub('', location)  # Take only first part before comma
+    return location.strip()
+
+
+@lru_cache(maxsize=LOCATION_CACHE_SIZE)
+def normalize_location(location: Optional[str]) -> NormalizedLocation:
+    """Parse a raw location string into its canonical (city, port code, country) form"""
+    raw = (location or '').strip()
+    text = raw.lower()
+
+    locode = _LOCODE_RE.search(raw)
+    port_code = locode.group(1) if locode else None
+
+    country = None
+    if port_code:
+        country = port_code[:2]
+    elif ',' in text:
+        country = text.rsplit(',', 1)[1].strip() or None
+
+    return NormalizedLocation(text, extract_city_name(text), port_code, country)
+
+
+def normalize_port_code(code: Optional[str]) -> str:
+    """Canonical port code for exact-match lookups (upper-cased, stripped)"""
+    if not code:
+        return ''
+    return normalize_location(code).port_code or code.strip().upper()
+
+
+def warm_location_cache(locations: Iterable[Optional[str]]):
+    """Precompute normalized forms for rate card location strings"""
+    for location in locations:
+        if location:
+            normalize_location(location)
@@ -9,6 +9,7 @@ with support for merged entries, descriptions, and enhanced charge types.
 
 import sqlite3
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 def migrate_service_charges_table():
     """Migrate dhl_express_services_surcharges table to enhanced structure"""
@@ -58,6 +59,7 @@ def migrate_service_charges_table():
                 WHERE charge_amount IS NULL AND flat_rate IS NOT NULL
             """)
         
+        bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'migrate_service_charges_table')
         conn.commit()
         
         # Verify final structure
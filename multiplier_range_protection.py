@@ -4,11 +4,33 @@ Multiplier Range Protection System
 ================================
 
 This system ensures critical multiplier ranges (especially for MELR001510911)
-are always available after Excel uploads.
+are always available after Excel uploads. Loaders that reload through a
+shadow table use critical_multiplier_checks() to reject a rate card without
+them before it goes live.
 """
 
 import sqlite3
 from datetime import datetime
+from typing import List
+
+from rate_card_swap import ShadowCheck
+from rate_card_versions import bump_rate_card_version
+
+# Weights every multiplier table must cover (85kg Export is MELR001510911)
+CRITICAL_MULTIPLIER_WEIGHTS = {
+    'Export': [30.1, 85],
+    'Import': [30.1, 85]
+}
+
+def critical_multiplier_checks(service_types=('Export', 'Import')) -> List[ShadowCheck]:
+    """Pre-swap checks that a reloaded rate card still covers the critical multiplier weights"""
+    return [
+        ShadowCheck(f'{service_type} multiplier range covering {weight}kg',
+                    'service_type = ? AND is_multiplier = 1 AND weight_from <= ? AND weight_to >= ?',
+                    (service_type, weight, weight))
+        for service_type in service_types
+        for weight in CRITICAL_MULTIPLIER_WEIGHTS[service_type]
+    ]
 
 def ensure_critical_multiplier_ranges():
     """Ensure critical multiplier ranges exist after upload"""
@@ -105,6 +127,7 @@ def ensure_critical_multiplier_ranges():
         ))
         print(f"   🔧 Emergency range added: 70.1-100kg")
     
+    bump_rate_card_version(cursor, 'dhl_express_rate_cards', 'ensure_critical_multiplier_ranges')
     conn.commit()
     conn.close()
     
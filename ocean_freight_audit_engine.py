@@ -6,16 +6,46 @@ Comprehensive audit engine for ocean freight invoices using actual rate card mat
 
 import sqlite3
 import json
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 from difflib import SequenceMatcher
-import re
 from datetime import datetime
 
+from location_normalizer import extract_city_name, normalize_location
+from ocean_lane_index import get_lane_index
+
+# Transportation modes audited by the ocean engine
+OCEAN_TRANSPORTATION_MODES = ('sea', 'ocean', 'lcl', 'fcl', 'maritime')
+
+# dhl_ytd_invoices columns unpacked by _invoice_row_to_charges
+INVOICE_CHARGE_COLUMNS = """
+    transportation_mode, fcl_lcl, origin, destination,
+    shipment_weight_kg, total_charges_without_duty_tax_usd,
+    total_charges_with_duty_tax_usd, invoice_currency,
+    pickup_charges_usd, origin_handling_charges_usd,
+    origin_demurrage_charges_usd, origin_storage_charges_usd,
+    origin_customs_charges_usd, freight_charges_usd,
+    fuel_surcharges_usd, security_surcharges_usd,
+    destination_customs_charges_usd,
+    destination_storage_charges_usd,
+    destination_demurrage_charges_usd,
+    destination_handling_charges_usd,
+    delivery_charges_usd, other_charges_usd,
+    duties_and_taxes_usd,
+    total_shipment_volume_m3, port_terminal_loading,
+    port_discharge, housebill_origin, housebill_destination
+"""
+
 class OceanFreightAuditEngine:
     """Advanced ocean freight audit engine with fuzzy rate card matching"""
     
-    def __init__(self, db_path: str = 'dhl_audit.db'):
+    def __init__(self, db_path: str = 'dhl_audit.db', lane_index_top_k: Optional[int] = None):
         self.db_path = db_path
+        # Opt-in cap on trigram candidates per lane sent to the fuzzy scorer
+        # (None = every card sharing a trigram with the lane)
+        self.lane_index_top_k = lane_index_top_k
     
     def audit_invoice(self, invoice_no: str) -> Dict:
         """
@@ -41,9 +71,11 @@ class OceanFreightAuditEngine:
         if not invoice_location or not rate_card_location:
             return 0.0
             
-        # Normalize strings
-        inv_loc = invoice_location.lower().strip()
-        rate_loc = rate_card_location.lower().strip()
+        # Normalize strings (cached per raw string)
+        inv_normalized = normalize_location(invoice_location)
+        rate_normalized = normalize_location(rate_card_location)
+        inv_loc = inv_normalized.text
+        rate_loc = rate_normalized.text
         
         # Exact match gets highest score
         if inv_loc == rate_loc:
@@ -54,8 +86,8 @@ class OceanFreightAuditEngine:
             return 0.9
             
         # Extract city names (remove country codes, port codes)
-        inv_city = self.extract_city_name(inv_loc)
-        rate_city = self.extract_city_name(rate_loc)
+        inv_city = inv_normalized.city
+        rate_city = rate_normalized.city
         
         if inv_city and rate_city:
             # Check city match
@@ -73,123 +105,121 @@ class OceanFreightAuditEngine:
     
     def extract_city_name(self, location: str) -> str:
         """Extract the main city name from a location string"""
-        # Remove common port/airport codes and country names
-        location = re.sub(r'\b[A-Z]{2,3}\b', '', location)  # Remove codes like SHA, SYD
-        location = re.sub(r'\([^)]*\)', '', location)  # Remove parentheses content
-        location = re.sub(r',.*$', '', location)  # Take only first part before comma
-        return location.strip()
+        return extract_city_name(location)
     
     def find_matching_rate_cards(self, origin: str, destination: str, service_type: str = None) -> List[Dict]:
         """
         Find rate cards that match origin and destination with fuzzy logic
+
+        Candidates come from the lane index (exact port/city maps plus a
+        trigram index) so only plausible cards reach the fuzzy scorer.
         """
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get all ocean rate cards
-        cursor.execute("""
-            SELECT id, lane_description, lane_origin, lane_destination, service, 
-                   rate_validity, contract_validity, origin_port_code, destination_port_code,
-                   cities_included_origin, cities_included_destination, created_at,
-                   port_of_loading, port_of_discharge
-            FROM ocean_rate_cards
-            ORDER BY created_at DESC
-        """)
-        
-        rate_cards = cursor.fetchall()
-        conn.close()
+        return self._match_rate_cards(origin, destination, service_type)[0]
+    
+    def _match_rate_cards(self, origin: str, destination: str,
+                          service_type: str = None) -> Tuple[List[Dict], int]:
+        """find_matching_rate_cards plus the number of rate cards that were scored"""
+        lane_index = get_lane_index(self.db_path)
+        rate_cards = lane_index.rate_cards
+        
+        positions = lane_index.candidate_positions(
+            origin, destination, service_type, self.lane_index_top_k)
+        if positions is None:
+            # Lane too short for trigram lookup - score every card
+            positions = range(len(rate_cards))
         
         matches = []
         
-        for card in rate_cards:
-            (card_id, lane_description, lane_origin, lane_destination, service,
-             rate_validity, contract_validity, origin_port_code,
-             destination_port_code, cities_included_origin,
-             cities_included_destination, created_at,
-             port_of_loading, port_of_discharge) = card
-            
-            # First, check for exact port code matches (highest priority)
-            origin_score = 0.0
-            destination_score = 0.0
-            
-            # Check exact port code matches
-            if port_of_loading and origin:
-                if port_of_loading.upper() == origin.upper():
-                    origin_score = 1.0  # Perfect match
-                elif (port_of_loading.upper() in origin.upper() or
-                      origin.upper() in port_of_loading.upper()):
-                    origin_score = 0.95  # Close match
-            
-            if port_of_discharge and destination:
-                if port_of_discharge.upper() == destination.upper():
-                    destination_score = 1.0  # Perfect match
-                elif (port_of_discharge.upper() in destination.upper() or
-                      destination.upper() in port_of_discharge.upper()):
-                    destination_score = 0.95  # Close match
-            
-            # If no port code match, fall back to fuzzy matching on lane names
-            if origin_score < 0.5:
-                origin_score = self.fuzzy_match_location(origin, lane_origin)
-            
-            if destination_score < 0.5:
-                destination_score = self.fuzzy_match_location(
-                    destination, lane_destination)
-            
-            # Also check cities_included fields for better matching
-            if origin_score < 0.6 and cities_included_origin:
-                for city in cities_included_origin.split(','):
-                    city_score = self.fuzzy_match_location(
-                        origin, city.strip())
-                    if city_score > origin_score:
-                        origin_score = city_score
-            
-            if destination_score < 0.6 and cities_included_destination:
-                for city in cities_included_destination.split(','):
-                    city_score = self.fuzzy_match_location(
-                        destination, city.strip())
-                    if city_score > destination_score:
-                        destination_score = city_score
-            
-            # Debug output for rate card ID 96 (Shanghai-Sydney)
-            # if card_id == 96:
-            #     print(f"DEBUG: Rate card 96 - '{lane_origin}' -> '{lane_destination}'")
-            #     print(f"DEBUG: Cities included origin: '{cities_included_origin}'")
-            #     print(f"DEBUG: Cities included destination: '{cities_included_destination}'")
-            #     print(f"DEBUG: Origin score: {origin_score:.3f} ({origin} vs {lane_origin})")
-            #     print(f"DEBUG: Destination score: {destination_score:.3f} ({destination} vs {lane_destination})")
-            
-            # Combined score (both origin and destination must match reasonably well)
-            if origin_score > 0.6 and destination_score > 0.6:
-                combined_score = (origin_score + destination_score) / 2
-                
-                # Bonus for service type match
-                service_bonus = 0.0
-                if service_type and service:
-                    if service_type.lower() == service.lower():
-                        service_bonus = 0.1
-                
-                final_score = min(1.0, combined_score + service_bonus)
-                
-                matches.append({
-                    'rate_card_id': card_id,
-                    'lane_name': lane_description,
-                    'lane_origin': lane_origin,
-                    'lane_destination': lane_destination,
-                    'service_type': service,
-                    'origin_port_code': origin_port_code,
-                    'destination_port_code': destination_port_code,
-                    'port_of_loading': port_of_loading,
-                    'port_of_discharge': port_of_discharge,
-                    'match_score': final_score,
-                    'origin_score': origin_score,
-                    'destination_score': destination_score,
-                    'rate_validity': rate_validity,
-                    'contract_validity': contract_validity
-                })
+        for position in positions:
+            match = self._score_rate_card(rate_cards[position], origin, destination, service_type)
+            if match:
+                matches.append(match)
         
         # Sort by match score (highest first)
         matches.sort(key=lambda x: x['match_score'], reverse=True)
-        return matches
+        return matches, len(positions)
+    
+    def _score_rate_card(self, card: Tuple, origin: str, destination: str,
+                         service_type: str = None) -> Optional[Dict]:
+        """Score a single rate card row against an invoice lane"""
+        (card_id, lane_description, lane_origin, lane_destination, service,
+         rate_validity, contract_validity, origin_port_code,
+         destination_port_code, cities_included_origin,
+         cities_included_destination, created_at,
+         port_of_loading, port_of_discharge) = card
+        
+        # First, check for exact port code matches (highest priority)
+        origin_score = 0.0
+        destination_score = 0.0
+        
+        # Check exact port code matches
+        if port_of_loading and origin:
+            if port_of_loading.upper() == origin.upper():
+                origin_score = 1.0  # Perfect match
+            elif (port_of_loading.upper() in origin.upper() or
+                  origin.upper() in port_of_loading.upper()):
+                origin_score = 0.95  # Close match
+        
+        if port_of_discharge and destination:
+            if port_of_discharge.upper() == destination.upper():
+                destination_score = 1.0  # Perfect match
+            elif (port_of_discharge.upper() in destination.upper() or
+                  destination.upper() in port_of_discharge.upper()):
+                destination_score = 0.95  # Close match
+        
+        # If no port code match, fall back to fuzzy matching on lane names
+        if origin_score < 0.5:
+            origin_score = self.fuzzy_match_location(origin, lane_origin)
+        
+        if destination_score < 0.5:
+            destination_score = self.fuzzy_match_location(
+                destination, lane_destination)
+        
+        # Also check cities_included fields for better matching
+        if origin_score < 0.6 and cities_included_origin:
+            for city in cities_included_origin.split(','):
+                city_score = self.fuzzy_match_location(
+                    origin, city.strip())
+                if city_score > origin_score:
+                    origin_score = city_score
+        
+        if destination_score < 0.6 and cities_included_destination:
+            for city in cities_included_destination.split(','):
+                city_score = self.fuzzy_match_location(
+                    destination, city.strip())
+                if city_score > destination_score:
+                    destination_score = city_score
+        
+        # Combined score (both origin and destination must match reasonably well)
+        if origin_score <= 0.6 or destination_score <= 0.6:
+            return None
+        
+        combined_score = (origin_score + destination_score) / 2
+        
+        # Bonus for service type match
+        service_bonus = 0.0
+        if service_type and service:
+            if service_type.lower() == service.lower():
+                service_bonus = 0.1
+        
+        final_score = min(1.0, combined_score + service_bonus)
+        
+        return {
+            'rate_card_id': card_id,
+            'lane_name': lane_description,
+            'lane_origin': lane_origin,
+            'lane_destination': lane_destination,
+            'service_type': service,
+            'origin_port_code': origin_port_code,
+            'destination_port_code': destination_port_code,
+            'port_of_loading': port_of_loading,
+            'port_of_discharge': port_of_discharge,
+            'match_score': final_score,
+            'origin_score': origin_score,
+            'destination_score': destination_score,
+            'rate_validity': rate_validity,
+            'contract_validity': contract_validity
+        }
     
     def get_rate_card_pricing(self, rate_card_id: int) -> Dict:
         """Get detailed pricing for a specific rate card (both FCL and LCL)"""
@@ -440,22 +470,8 @@ class OceanFreightAuditEngine:
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT transportation_mode, fcl_lcl, origin, destination,
-                   shipment_weight_kg, total_charges_without_duty_tax_usd,
-                   total_charges_with_duty_tax_usd, invoice_currency,
-                   pickup_charges_usd, origin_handling_charges_usd,
-                   origin_demurrage_charges_usd, origin_storage_charges_usd,
-                   origin_customs_charges_usd, freight_charges_usd,
-                   fuel_surcharges_usd, security_surcharges_usd,
-                   destination_customs_charges_usd,
-                   destination_storage_charges_usd,
-                   destination_demurrage_charges_usd,
-                   destination_handling_charges_usd,
-                   delivery_charges_usd, other_charges_usd,
-                   duties_and_taxes_usd,
-                   total_shipment_volume_m3, port_terminal_loading,
-                   port_discharge, housebill_origin, housebill_destination
+        cursor.execute(f"""
+            SELECT {INVOICE_CHARGE_COLUMNS}
             FROM dhl_ytd_invoices
             WHERE invoice_no = ?
         """, (invoice_no,))
@@ -466,6 +482,51 @@ class OceanFreightAuditEngine:
         if not invoice:
             return {}
         
+        return self._invoice_row_to_charges(invoice)
+    
+    def extract_invoice_charges_bulk(self, invoice_nos: List[str] = None) -> Dict[str, Dict]:
+        """
+        Extract charges for many invoices in one pass.
+        
+        When invoice_nos is None every ocean invoice in dhl_ytd_invoices is
+        returned. Keys are invoice numbers; the first row per invoice wins,
+        as with extract_invoice_charges.
+        """
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        rows = []
+        
+        try:
+            if invoice_nos is None:
+                placeholders = ', '.join('?' for _ in OCEAN_TRANSPORTATION_MODES)
+                cursor.execute(f"""
+                    SELECT invoice_no, {INVOICE_CHARGE_COLUMNS}
+                    FROM dhl_ytd_invoices
+                    WHERE LOWER(transportation_mode) IN ({placeholders})
+                """, OCEAN_TRANSPORTATION_MODES)
+                rows = cursor.fetchall()
+            else:
+                # Stay under SQLite's bound-parameter limit
+                for i in range(0, len(invoice_nos), 500):
+                    chunk = invoice_nos[i:i + 500]
+                    placeholders = ', '.join('?' for _ in chunk)
+                    cursor.execute(f"""
+                        SELECT invoice_no, {INVOICE_CHARGE_COLUMNS}
+                        FROM dhl_ytd_invoices
+                        WHERE invoice_no IN ({placeholders})
+                    """, chunk)
+                    rows.extend(cursor.fetchall())
+        finally:
+            conn.close()
+        
+        invoices = {}
+        for row in rows:
+            if row[0] not in invoices:
+                invoices[row[0]] = self._invoice_row_to_charges(row[1:])
+        return invoices
+    
+    def _invoice_row_to_charges(self, invoice: Tuple) -> Dict:
+        """Convert a dhl_ytd_invoices row (INVOICE_CHARGE_COLUMNS) to the charges dict"""
         (transportation_mode, fcl_lcl, origin, destination,
          shipment_weight_kg, total_without_duty_tax_usd,
          total_with_duty_tax_usd, invoice_currency,
@@ -526,6 +587,38 @@ class OceanFreightAuditEngine:
         
         # Get invoice data
         invoice_data = self.extract_invoice_charges(invoice_no)
+        return self._audit_invoice_data(invoice_no, invoice_data, start_time)
+    
+    def _lane_key(self, invoice_data: Dict) -> Tuple:
+        """
+        Lane an invoice is matched on: housebill port codes first,
+        fallback to city names if no housebill codes available
+        """
+        origin_for_matching = (
+            invoice_data.get('housebill_origin_port_code') or
+            invoice_data['origin_port'])
+        destination_for_matching = (
+            invoice_data.get('housebill_destination_port_code') or
+            invoice_data['destination_port'])
+        return (origin_for_matching, destination_for_matching,
+                invoice_data['service_type'])
+    
+    def _is_ocean_invoice(self, invoice_data: Dict) -> bool:
+        """Check if this is an ocean freight invoice"""
+        transportation_mode = invoice_data.get(
+            'transportation_mode', '').lower()
+        return transportation_mode in OCEAN_TRANSPORTATION_MODES
+    
+    def _audit_invoice_data(self, invoice_no: str, invoice_data: Dict, start_time: datetime,
+                            matching_cards: List[Dict] = None, get_pricing=None,
+                            rate_cards_checked: int = None) -> Dict:
+        """
+        Audit already extracted invoice charges.
+        
+        Batch callers pass the lane's matching_cards (with the number of rate
+        cards scored to find them) and a memoized get_pricing so each lane and
+        rate card is resolved once per batch.
+        """
         if not invoice_data:
             return {
                 'invoice_no': invoice_no,
@@ -534,12 +627,7 @@ class OceanFreightAuditEngine:
                 'processing_time_ms': 0
             }
         
-        # Check if this is an ocean freight invoice
-        transportation_mode = invoice_data.get(
-            'transportation_mode', '').lower()
-        
-        if transportation_mode not in ['sea', 'ocean', 'lcl', 'fcl',
-                                       'maritime']:
+        if not self._is_ocean_invoice(invoice_data):
             return {
                 'invoice_no': invoice_no,
                 'audit_status': 'skipped',
@@ -549,20 +637,9 @@ class OceanFreightAuditEngine:
                 'processing_time_ms': 0
             }
         
-        # Find matching rate cards using housebill port codes first,
-        # fallback to city names if no housebill codes available
-        origin_for_matching = (
-            invoice_data.get('housebill_origin_port_code') or
-            invoice_data['origin_port'])
-        destination_for_matching = (
-            invoice_data.get('housebill_destination_port_code') or
-            invoice_data['destination_port'])
-        
-        matching_cards = self.find_matching_rate_cards(
-            origin_for_matching,
-            destination_for_matching,
-            invoice_data['service_type']
-        )
+        if matching_cards is None:
+            matching_cards, rate_cards_checked = self._match_rate_cards(
+                *self._lane_key(invoice_data))
         
         if not matching_cards:
             return {
@@ -575,7 +652,7 @@ class OceanFreightAuditEngine:
         
         # Get rate card pricing for best match
         best_match = matching_cards[0]
-        rate_card_pricing = self.get_rate_card_pricing(
+        rate_card_pricing = (get_pricing or self.get_rate_card_pricing)(
             best_match['rate_card_id'])
         
         # Calculate expected costs
@@ -705,6 +782,7 @@ class OceanFreightAuditEngine:
             },
             'rate_card_info': {
                 'rate_cards_found': len(matching_cards),
+                'rate_cards_checked': rate_cards_checked,
                 'selected_rate_card': {
                     'rate_card_id': best_match['rate_card_id'],
                     'lane_name': best_match.get('lane_name', 'N/A'),
@@ -718,6 +796,119 @@ class OceanFreightAuditEngine:
                 (datetime.now() - start_time).total_seconds() * 1000)
         }
 
+    def audit_all(self, invoice_nos: List[str] = None, workers: int = 4,
+                  batch_run_id: int = None, save_results: bool = True) -> Dict:
+        """
+        Audit many ocean freight invoices in one batch.
+        
+        Invoices are grouped by lane so rate card matching runs once per lane,
+        lanes are audited in parallel, rate card pricing is memoized for the
+        whole batch and results are written to ytd_audit_results in bulk.
+        
+        Args:
+            invoice_nos: Invoices to audit (None = every ocean invoice)
+            workers: Number of lanes audited concurrently
+            batch_run_id: Optional ytd_batch_audit_runs id for the saved results
+            save_results: Persist results to ytd_audit_results
+            
+        Returns:
+            Dict containing per-invoice results and batch statistics
+        """
+        start_time = datetime.now()
+        
+        invoices = self.extract_invoice_charges_bulk(invoice_nos)
+        if invoice_nos is None:
+            invoice_nos = list(invoices.keys())
+        else:
+            invoice_nos = list(dict.fromkeys(invoice_nos))
+        
+        # Group auditable invoices by lane; missing/non-ocean ones resolve immediately
+        results = {}
+        lanes = defaultdict(list)
+        for invoice_no in invoice_nos:
+            invoice_data = invoices.get(invoice_no)
+            if invoice_data and self._is_ocean_invoice(invoice_data):
+                lanes[self._lane_key(invoice_data)].append(invoice_no)
+            else:
+                results[invoice_no] = self._audit_invoice_data(
+                    invoice_no, invoice_data, datetime.now())
+        
+        # Rate card pricing shared by every lane in this batch
+        pricing_cache = {}
+        pricing_stats = {'hits': 0, 'misses': 0}
+        pricing_lock = threading.Lock()
+        
+        def get_pricing(rate_card_id: int) -> Dict:
+            with pricing_lock:
+                if rate_card_id in pricing_cache:
+                    pricing_stats['hits'] += 1
+                else:
+                    pricing_stats['misses'] += 1
+                    pricing_cache[rate_card_id] = self.get_rate_card_pricing(rate_card_id)
+                return pricing_cache[rate_card_id]
+        
+        def audit_lane(lane: Tuple) -> List[Tuple[str, Dict]]:
+            matching_cards, rate_cards_checked = self._match_rate_cards(*lane)
+            return [
+                (invoice_no, self._audit_invoice_data(
+                    invoice_no, invoices[invoice_no], datetime.now(),
+                    matching_cards, get_pricing, rate_cards_checked))
+                for invoice_no in lanes[lane]
+            ]
+        
+        if workers and workers > 1 and len(lanes) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                lane_results = list(executor.map(audit_lane, lanes))
+        else:
+            lane_results = [audit_lane(lane) for lane in lanes]
+        
+        for lane_result in lane_results:
+            results.update(lane_result)
+        
+        ordered_results = [results[invoice_no] for invoice_no in invoice_nos]
+        
+        saved = False
+        if save_results and ordered_results:
+            # Imported here: the ytd_audit package itself imports this module
+            from ytd_audit.database import DatabaseManager
+            saved = DatabaseManager(self.db_path).save_audit_results(
+                batch_run_id, [self._audit_result_row(result) for result in ordered_results])
+        
+        elapsed = (datetime.now() - start_time).total_seconds()
+        return {
+            'total_invoices': len(ordered_results),
+            'lanes': len(lanes),
+            'status_counts': dict(Counter(r['audit_status'] for r in ordered_results)),
+            'pricing_cache': {
+                'rate_cards': len(pricing_cache),
+                'hits': pricing_stats['hits'],
+                'misses': pricing_stats['misses']
+            },
+            'results_saved': saved,
+            'processing_time_ms': elapsed * 1000,
+            'invoices_per_second': len(ordered_results) / elapsed if elapsed > 0 else 0,
+            'results': ordered_results
+        }
+    
+    def _audit_result_row(self, result: Dict) -> Tuple:
+        """Map an audit result to the ytd_audit_results columns"""
+        invoice_summary = result.get('invoice_data', {})
+        rate_card_info = result.get('rate_card_info', {})
+        selected = rate_card_info.get('selected_rate_card', {})
+        return (
+            result['invoice_no'],
+            result['audit_status'],
+            invoice_summary.get('transportation_mode', 'ocean'),
+            invoice_summary.get('total_actual_usd', 0) or 0,
+            invoice_summary.get('total_expected_usd', 0) or 0,
+            invoice_summary.get('total_variance_usd', 0) or 0,
+            invoice_summary.get('variance_percentage', 0) or 0,
+            rate_card_info.get('rate_cards_checked') or 0,
+            rate_card_info.get('rate_cards_found', 0),
+            selected.get('lane_name') or '',
+            result
+        )
+
     def test_audit_specific_invoice(self, invoice_no: str) -> Dict:
         """Test the audit engine with a specific invoice"""
         print(f"\n=== Testing Ocean Freight Audit for Invoice {invoice_no} ===")
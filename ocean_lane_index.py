@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Ocean Lane Index
+Candidate index over ocean_rate_cards so the ocean audit engine only fuzzy-scores
+the rate cards that can plausibly match an invoice lane
+"""
+
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from location_normalizer import normalize_location
+from rate_card_versions import RateCardSubscription
+
+# Columns loaded for every ocean rate card, in the order the audit engine unpacks them
+RATE_CARD_COLUMNS = """
+    id, lane_description, lane_origin, lane_destination, service,
+    rate_validity, contract_validity, origin_port_code, destination_port_code,
+    cities_included_origin, cities_included_destination, created_at,
+    port_of_loading, port_of_discharge
+"""
+
+
+def location_trigrams(text: str) -> Set[str]:
+    """Return the padded character trigrams of a normalized location string"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class OceanLaneIndex:
+    """
+    In-memory lane index built from ocean_rate_cards.
+
+    Holds exact maps on port code and normalized city name plus a trigram
+    posting list for origin and destination strings. Rate cards keep the
+    position they had in the engine's created_at DESC scan so callers can
+    score candidates in the same order as a full scan.
+    """
+
+    def __init__(self, rate_cards: List[Tuple]):
+        self.rate_cards = rate_cards
+
+        self.origin_ports: Dict[str, Set[int]] = defaultdict(set)
+        self.destination_ports: Dict[str, Set[int]] = defaultdict(set)
+        self.origin_cities: Dict[str, Set[int]] = defaultdict(set)
+        self.destination_cities: Dict[str, Set[int]] = defaultdict(set)
+        self.origin_trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self.destination_trigrams: Dict[str, Set[int]] = defaultdict(set)
+
+        for position, card in enumerate(rate_cards):
+            (_card_id, _lane_description, lane_origin, lane_destination, _service,
+             _rate_validity, _contract_validity, _origin_port_code,
+             _destination_port_code, cities_included_origin,
+             cities_included_destination, _created_at,
+             port_of_loading, port_of_discharge) = card
+
+            self._add_side(position, port_of_loading, lane_origin, cities_included_origin,
+                           self.origin_ports, self.origin_cities, self.origin_trigrams)
+            self._add_side(position, port_of_discharge, lane_destination, cities_included_destination,
+                           self.destination_ports, self.destination_cities, self.destination_trigrams)
+
+    @classmethod
+    def from_database(cls, db_path: str) -> 'OceanLaneIndex':
+        """Load every ocean rate card and build the index"""
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {RATE_CARD_COLUMNS}
+                FROM ocean_rate_cards
+                ORDER BY created_at DESC
+            """)
+            rate_cards = cursor.fetchall()
+        finally:
+            conn.close()
+        return cls(rate_cards)
+
+    @staticmethod
+    def _add_side(position: int, port: Optional[str], lane: Optional[str], cities: Optional[str],
+                  ports: Dict[str, Set[int]], city_map: Dict[str, Set[int]],
+                  trigram_map: Dict[str, Set[int]]):
+        """
+        Register one side (origin or destination) of a rate card.
+
+        Normalizing the raw strings here also precomputes them in the shared
+        location cache the fuzzy scorer reads from.
+        """
+        locations = []
+        if port:
+            ports[port.upper()].add(position)
+            locations.append(normalize_location(port).text)
+        if lane:
+            locations.append(normalize_location(lane).text)
+        if cities:
+            locations.extend(normalize_location(city.strip()).text for city in cities.split(','))
+
+        for location in locations:
+            if not location:
+                continue
+            city_map[location].add(position)
+            for trigram in location_trigrams(location):
+                trigram_map[trigram].add(position)
+
+    @staticmethod
+    def _side_scores(location: str, ports: Dict[str, Set[int]], city_map: Dict[str, Set[int]],
+                     trigram_map: Dict[str, Set[int]]) -> Dict[int, float]:
+        """
+        Score rate card positions for one side of a lane.
+
+        Exact port or city hits score 1.0; everything else scores the fraction
+        of the query's trigrams found on that side of the card.
+        """
+        normalized = normalize_location(location).text
+        query_trigrams = location_trigrams(normalized)
+
+        hits: Dict[int, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in trigram_map.get(trigram, ()):
+                hits[position] += 1
+
+        scores = {position: count / len(query_trigrams) for position, count in hits.items()}
+        for position in ports.get(location.upper(), ()):
+            scores[position] = 1.0
+        for position in city_map.get(normalized, ()):
+            scores[position] = 1.0
+        return scores
+
+    def candidate_positions(self, origin: str, destination: str, service_type: str = None,
+                            top_k: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Return rate card positions worth fuzzy-scoring for a lane, in scan order.
+
+        A card must share at least one trigram (or an exact port/city hit) on
+        both the origin and the destination side. Every such card is returned
+        unless top_k is given: then, when more than top_k cards qualify, they
+        are pre-ranked on trigram overlap (mean of both sides plus the service
+        bonus, capped at 1.0, ties in scan order) and only the best top_k are
+        kept. That overlap is not the fuzzy score, so a top_k cut can drop the
+        card a full scan would match best. Returns None when the lane is too
+        short for trigram lookup, in which case the caller should score every card.
+        """
+        if not origin or not destination:
+            return []
+        if len(origin.strip()) < 3 or len(destination.strip()) < 3:
+            return None
+
+        origin_scores = self._side_scores(origin, self.origin_ports, self.origin_cities,
+                                          self.origin_trigrams)
+        destination_scores = self._side_scores(destination, self.destination_ports,
+                                               self.destination_cities, self.destination_trigrams)
+
+        positions = origin_scores.keys() & destination_scores.keys()
+        if top_k is not None and len(positions) > top_k:
+            service = service_type.lower() if service_type else None
+
+            def rank(position: int) -> Tuple[float, int]:
+                score = (origin_scores[position] + destination_scores[position]) / 2
+                card_service = self.rate_cards[position][4]
+                if service and card_service and card_service.lower() == service:
+                    score += 0.1
+                return (-min(1.0, score), position)
+
+            positions = sorted(positions, key=rank)[:top_k]
+        return sorted(positions)
+
+
+# Rebuilt when an upload bumps the ocean_rate_cards version
+_lane_indexes = RateCardSubscription(['ocean_rate_cards'], OceanLaneIndex.from_database)
+
+
+def get_lane_index(db_path: str) -> OceanLaneIndex:
+    """Return the lane index for a database, rebuilding it after a rate card upload"""
+    return _lane_indexes.get(db_path)
+
+
+def invalidate_lane_index(db_path: str = None):
+    """Drop cached lane indexes (all of them when db_path is None)"""
+    _lane_indexes.invalidate(db_path)
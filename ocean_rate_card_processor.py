@@ -12,6 +12,12 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import os
 
+from rate_card_ingest import (
+    PhaseTimer, bulk_insert, clean_numeric, clean_text, find_sheet, int_values, next_row_id,
+    open_workbook, read_sheet, sql_values
+)
+from rate_card_versions import bump_rate_card_version
+
 class OceanRateCardProcessor:
     def __init__(self, db_path: str = 'dhl_audit.db'):
         self.db_path = db_path
@@ -103,32 +109,30 @@ class OceanRateCardProcessor:
             "LCL Total Min \n(USD)": 'lcl_total_min_usd',
             "LCL Total \n(USD/CBM)": 'lcl_total_usd_per_cbm'
         }
-
-    def clean_numeric_value(self, value) -> Optional[float]:
-        """Clean and convert numeric values"""
-        if pd.isna(value) or value is None or value == '':
-            return None
         
-        try:
-            if isinstance(value, str):
-                # Remove currency symbols and whitespace
-                value = value.strip().replace('$', '').replace(',', '')
-                if value == '' or value.lower() in ['n/a', 'na', 'null']:
-                    return None
-            return float(value)
-        except (ValueError, TypeError):
-            return None
+        # Database columns that are not cleaned as plain numbers
+        self.main_numeric_columns = {'annual_feu_forecast'}
+        self.main_int_columns = {'number_transship_ports', 'pickup_to_port_transit_days',
+                                 'port_to_port_transit_days', 'port_to_final_transit_days', 'dtd_transit_days'}
+        self.fcl_int_columns = {'origin_free_days', 'dest_free_days',
+                                'origin_detention_demurrage_rate', 'dest_detention_demurrage_rate'}
+        self.lcl_text_columns = {'lcl_transit_validation'}
 
-    def clean_text_value(self, value) -> Optional[str]:
-        """Clean text values"""
-        if pd.isna(value) or value is None:
-            return None
-        
-        text = str(value).strip()
-        if text.lower() in ['nan', 'null', 'n/a', 'na', '']:
-            return None
-        
-        return text
+    def _convert_columns(self, df: pd.DataFrame, column_map: Dict[str, str], text_columns: set,
+                         int_columns: set = frozenset()) -> Dict[str, list]:
+        """Cleaned values of the mapped Excel columns present in df, by database column"""
+        values = {}
+        for excel_col, db_col in column_map.items():
+            if excel_col not in df.columns:
+                continue
+            if db_col in text_columns:
+                column = clean_text(df[excel_col])
+            else:
+                column = clean_numeric(df[excel_col])
+                if db_col in int_columns:
+                    column = int_values(column)
+            values[db_col] = sql_values(column)
+        return values
 
     def process_excel_file(self, file_path: str) -> Dict:
         """Process ocean rate card Excel file"""
@@ -136,10 +140,21 @@ class OceanRateCardProcessor:
         
         try:
             self.logger.info(f"Processing ocean rate card file: {file_path}")
+            timer = PhaseTimer()
             
-            # Read Excel file
-            df = pd.read_excel(file_path)
-            self.logger.info(f"Found {len(df)} rows in Excel file")
+            # Read only the rate card sheet, and only the columns that are mapped
+            mapped_columns = list(self.main_columns) + list(self.fcl_columns) + list(self.lcl_columns)
+            workbook = open_workbook(file_path)
+            sheet_name = find_sheet(workbook, mapped_columns) or workbook.sheet_names[0]
+            df = read_sheet(workbook, sheet_name, mapped_columns)
+            timer.lap('read')
+            self.logger.info(f"Found {len(df)} rows in sheet '{sheet_name}'")
+            
+            main_text_columns = set(self.main_columns.values()) - self.main_numeric_columns - self.main_int_columns
+            main_values = self._convert_columns(df, self.main_columns, main_text_columns, self.main_int_columns)
+            fcl_values = self._convert_columns(df, self.fcl_columns, set(), self.fcl_int_columns)
+            lcl_values = self._convert_columns(df, self.lcl_columns, self.lcl_text_columns)
+            timer.lap('clean')
             
             # Track upload
             file_size = os.path.getsize(file_path)
@@ -155,79 +170,30 @@ class OceanRateCardProcessor:
                 VALUES (?, ?, ?, ?)
             ''', (upload_id, filename, file_size, len(df)))
             
-            processed_records = 0
-            failed_records = 0
-            errors = []
+            # Rate card ids are assigned up front so the charge rows can reference them
+            first_id = next_row_id(cursor, 'ocean_rate_cards')
+            rate_card_ids = list(range(first_id, first_id + len(df)))
+            
+            main_rows = list(zip(rate_card_ids, [upload_id] * len(df), *main_values.values()))
+            inserted, errors_by_row = bulk_insert(
+                cursor, 'ocean_rate_cards', ['id', 'upload_id'] + list(main_values), main_rows
+            )
+            failed = dict(errors_by_row)
             
-            for idx, row in df.iterrows():
-                try:
-                    # Process main rate card data
-                    main_data = {'upload_id': upload_id}
-                    for excel_col, db_col in self.main_columns.items():
-                        if excel_col in df.columns:
-                            if db_col in ['annual_feu_forecast']:
-                                main_data[db_col] = self.clean_numeric_value(row[excel_col])
-                            elif db_col in ['number_transship_ports', 'pickup_to_port_transit_days',
-                                          'port_to_port_transit_days', 'port_to_final_transit_days', 
-                                          'dtd_transit_days']:
-                                val = self.clean_numeric_value(row[excel_col])
-                                main_data[db_col] = int(val) if val is not None else None
-                            else:
-                                main_data[db_col] = self.clean_text_value(row[excel_col])
-                    
-                    # Insert main record
-                    columns = list(main_data.keys())
-                    placeholders = ', '.join(['?' for _ in columns])
-                    query = f"INSERT INTO ocean_rate_cards ({', '.join(columns)}) VALUES ({placeholders})"
-                    
-                    cursor.execute(query, list(main_data.values()))
-                    rate_card_id = cursor.lastrowid
-                    
-                    # Process FCL charges
-                    fcl_data = {'rate_card_id': rate_card_id}
-                    for excel_col, db_col in self.fcl_columns.items():
-                        if excel_col in df.columns:
-                            if db_col in ['origin_free_days', 'dest_free_days']:
-                                val = self.clean_numeric_value(row[excel_col])
-                                fcl_data[db_col] = int(val) if val is not None else None
-                            elif db_col in ['origin_detention_demurrage_rate', 'dest_detention_demurrage_rate']:
-                                val = self.clean_numeric_value(row[excel_col])
-                                fcl_data[db_col] = int(val) if val is not None else None
-                            else:
-                                fcl_data[db_col] = self.clean_numeric_value(row[excel_col])
-                    
-                    fcl_columns = list(fcl_data.keys())
-                    fcl_placeholders = ', '.join(['?' for _ in fcl_columns])
-                    fcl_query = f"INSERT INTO ocean_fcl_charges ({', '.join(fcl_columns)}) VALUES ({fcl_placeholders})"
-                    
-                    cursor.execute(fcl_query, list(fcl_data.values()))
-                    
-                    # Process LCL rates
-                    lcl_data = {'rate_card_id': rate_card_id}
-                    for excel_col, db_col in self.lcl_columns.items():
-                        if excel_col in df.columns:
-                            if db_col == 'lcl_transit_validation':
-                                lcl_data[db_col] = self.clean_text_value(row[excel_col])
-                            else:
-                                lcl_data[db_col] = self.clean_numeric_value(row[excel_col])
-                    
-                    lcl_columns = list(lcl_data.keys())
-                    lcl_placeholders = ', '.join(['?' for _ in lcl_columns])
-                    lcl_query = f"INSERT INTO ocean_lcl_rates ({', '.join(lcl_columns)}) VALUES ({lcl_placeholders})"
-                    
-                    cursor.execute(lcl_query, list(lcl_data.values()))
-                    
-                    processed_records += 1
-                    
-                    if processed_records % 50 == 0:
-                        self.logger.info(f"Processed {processed_records}/{len(df)} records")
-                        
-                except Exception as e:
-                    failed_records += 1
-                    error_msg = f"Row {idx}: {str(e)}"
-                    errors.append(error_msg)
-                    self.logger.error(error_msg)
-                    continue
+            # Charges only for the rate cards that were inserted
+            for table, values in (('ocean_fcl_charges', fcl_values), ('ocean_lcl_rates', lcl_values)):
+                rows = list(zip(rate_card_ids, *values.values()))
+                _, child_errors = bulk_insert(cursor, table, ['rate_card_id'] + list(values),
+                                              [rows[position] for position in inserted])
+                for child_position, error in child_errors:
+                    failed.setdefault(inserted[child_position], error)
+            timer.lap('insert')
+            
+            failed_records = len(failed)
+            processed_records = len(df) - failed_records
+            errors = [f"Row {df.index[position]}: {str(error)}" for position, error in sorted(failed.items())]
+            for error_msg in errors:
+                self.logger.error(error_msg)
             
             # Update upload status
             cursor.execute('''
@@ -237,6 +203,9 @@ class OceanRateCardProcessor:
             ''', (datetime.now(), processed_records, failed_records, 
                   'completed' if failed_records == 0 else 'completed_with_errors', upload_id))
             
+            # Audits rebuild their lane index from the new rate cards
+            bump_rate_card_version(cursor, 'ocean_rate_cards', filename)
+            
             conn.commit()
             conn.close()
             
@@ -245,10 +214,12 @@ class OceanRateCardProcessor:
                 'total_records': len(df),
                 'processed_records': processed_records,
                 'failed_records': failed_records,
-                'errors': errors[:10]  # Limit error messages
+                'errors': errors[:10],  # Limit error messages
+                'timings': timer.timings
             }
             
             self.logger.info(f"Processing completed: {result}")
+            self.logger.info(f"Rate card load times: {timer.summary()}")
             return result
             
         except Exception as e:
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Ollama Scheduler
+Pooled HTTP sessions and an asyncio scheduler for concurrent /api/generate calls,
+with a concurrency limit that adapts to observed latency instead of fixed sleeps
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+# Match the server's parallel request slots (OLLAMA_NUM_PARALLEL)
+DEFAULT_PARALLEL_SLOTS = int(os.environ.get('OLLAMA_NUM_PARALLEL', '4'))
+
+# Latency above baseline * tolerance is treated as queueing on the server
+DEFAULT_LATENCY_TOLERANCE = 2.0
+# Fraction the latency baseline may rise per sample, so it follows longer prompts
+BASELINE_DRIFT = 0.05
+LATENCY_SMOOTHING = 0.3
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+class OllamaHTTPError(Exception):
+    """Non-200 response from the Ollama API"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Ollama returned HTTP {status_code}: {body[:200]}")
+        self.status_code = status_code
+        self.body = body
+
+
+def get_ollama_session(ollama_url: str = DEFAULT_OLLAMA_URL,
+                       pool_size: int = DEFAULT_PARALLEL_SLOTS) -> requests.Session:
+    """Shared keep-alive session for an Ollama server"""
+    with _sessions_lock:
+        session = _sessions.get(ollama_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[ollama_url] = session
+        return session
+
+
+def post_generate(session: requests.Session, ollama_url: str, payload: Dict,
+                  timeout: float = 300) -> Tuple[str, Dict]:
+    """
+    POST /api/generate and return (response text, final chunk metadata).
+    Handles both streamed (NDJSON) and non-streamed responses. The response is
+    always read to the end or closed, so the connection goes back to the pool.
+    Raises OllamaHTTPError for non-200 responses.
+    """
+    stream = payload.get('stream', True)
+    response = session.post(f"{ollama_url}/api/generate", json=payload,
+                            timeout=timeout, stream=stream)
+    with response:
+        if response.status_code != 200:
+            raise OllamaHTTPError(response.status_code, response.text)
+
+        if not stream:
+            data = response.json()
+            return data.get('response', ''), data
+
+        parts = []
+        final_chunk: Dict = {}
+        for line in response.iter_lines():
+            if not line:
+                continue
+            try:
+                data = json.loads(line.decode('utf-8'))
+            except json.JSONDecodeError:
+                continue  # Skip malformed chunks
+
+            if 'response' in data:
+                parts.append(data['response'])
+            if data.get('done', False):
+                final_chunk = data
+                break
+        return "".join(parts), final_chunk
+
+
+class LLMRequest(NamedTuple):
+    """One /api/generate call; key identifies it to the result handler"""
+    key: Any
+    model: str
+    prompt: str
+    options: Dict
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Asyncio concurrency gate whose limit follows observed latency.
+
+    The limit starts at max_limit. When smoothed latency rises above the
+    baseline times latency_tolerance (requests queueing inside Ollama) the
+    limit drops by one; failures halve it; fast responses raise it again
+    up to max_limit.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1,
+                 latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE):
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = max(min(min_limit, self.max_limit), 1)
+        self.latency_tolerance = latency_tolerance
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self.smoothed_latency: Optional[float] = None
+        self._condition: Optional[asyncio.Condition] = None
+
+    async def acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    async def release(self, latency: float, ok: bool):
+        async with self._condition:
+            self.in_flight -= 1
+            self.observe(latency, ok)
+            self._condition.notify_all()
+
+    def observe(self, latency: float, ok: bool):
+        """Adjust the limit from one completed request"""
+        if not ok:
+            self.limit = max(self.min_limit, self.limit // 2)
+            return
+
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+            self.baseline_latency = latency
+        else:
+            self.smoothed_latency = (LATENCY_SMOOTHING * latency
+                                     + (1 - LATENCY_SMOOTHING) * self.smoothed_latency)
+            self.baseline_latency = min(latency, self.baseline_latency * (1 + BASELINE_DRIFT))
+
+        if self.smoothed_latency > self.baseline_latency * self.latency_tolerance:
+            self.limit = max(self.min_limit, self.limit - 1)
+        elif self.limit < self.max_limit:
+            self.limit += 1
+
+
+class OllamaScheduler:
+    """
+    Runs batches of LLM requests concurrently against one Ollama server.
+
+    HTTP calls go through a pooled requests.Session on a thread pool sized to
+    the server's parallel slots; the asyncio event loop only schedules them and
+    calls the result handler, so handlers (parsing, DB updates) run one at a
+    time in a single thread.
+    """
+
+    def __init__(self, ollama_url: str = DEFAULT_OLLAMA_URL,
+                 max_parallel: int = DEFAULT_PARALLEL_SLOTS, timeout: float = 300,
+                 latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE):
+        self.ollama_url = ollama_url.rstrip('/')
+        self.max_parallel = max(max_parallel, 1)
+        self.timeout = timeout
+        self.latency_tolerance = latency_tolerance
+        self.session = get_ollama_session(self.ollama_url, self.max_parallel)
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'total_latency': 0.0,
+            'eval_tokens': 0,
+            'peak_in_flight': 0,
+            'final_limit': self.max_parallel
+        }
+        self._stats_lock = threading.Lock()
+
+    def generate(self, request: LLMRequest) -> Tuple[str, Dict]:
+        """Blocking /api/generate call over the pooled session"""
+        payload = {
+            "model": request.model,
+            "prompt": request.prompt,
+            "stream": True,
+            "options": request.options or {}
+        }
+        return post_generate(self.session, self.ollama_url, payload, self.timeout)
+
+    def run_batch(self, llm_requests: List[LLMRequest],
+                  on_result: Callable[[LLMRequest, Optional[str], Optional[Exception], float], Any]) -> List[Any]:
+        """
+        Run every request and return on_result(request, response_text, error, latency)
+        for each, in input order. on_result is called as responses arrive.
+        """
+        if not llm_requests:
+            return []
+        return asyncio.run(self._run_batch(llm_requests, on_result))
+
+    async def _run_batch(self, llm_requests: List[LLMRequest], on_result: Callable) -> List[Any]:
+        limiter = AdaptiveConcurrencyLimiter(self.max_parallel,
+                                             latency_tolerance=self.latency_tolerance)
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            async def run_one(request: LLMRequest):
+                await limiter.acquire()
+                start = time.time()
+                response_text, error, metadata = None, None, {}
+                try:
+                    response_text, metadata = await loop.run_in_executor(executor, self.generate, request)
+                except Exception as e:
+                    error = e
+                latency = time.time() - start
+                await limiter.release(latency, error is None)
+                self._record(latency, error, metadata)
+                return on_result(request, response_text, error, latency)
+
+            results = await asyncio.gather(*(run_one(request) for request in llm_requests))
+
+        with self._stats_lock:
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], limiter.peak_in_flight)
+            self.stats['final_limit'] = limiter.limit
+        return list(results)
+
+    def _record(self, latency: float, error: Optional[Exception], metadata: Dict):
+        with self._stats_lock:
+            self.stats['requests'] += 1
+            self.stats['total_latency'] += latency
+            self.stats['eval_tokens'] += metadata.get('eval_count', 0) or 0
+            if error is not None:
+                self.stats['errors'] += 1
+
+    def get_stats(self) -> Dict:
+        """Request counts, latency and concurrency figures"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['avg_latency'] = round(stats['total_latency'] / stats['requests'], 3) if stats['requests'] else 0.0
+        stats['total_latency'] = round(stats['total_latency'], 3)
+        stats['max_parallel'] = self.max_parallel
+        return stats
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+PDF Ingestion Pipeline
+Staged bulk processing of PDF folders: a process pool for CPU-bound text
+extraction, a thread pool for regex parsing / ML classification and a single
+DB writer thread, connected by bounded queues
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pdf_text_cache import PDFExtraction, PDFTextCache
+
+DEFAULT_PARSE_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_WRITE_BATCH_SIZE = 50
+
+STAGES = ('extract', 'parse', 'write')
+
+# (pdf_path, extraction payload, result dict) handed to the writer
+WriteItem = Tuple[str, Any, Dict]
+
+
+def _timed_call(fn: Callable, pdf_path: str) -> Tuple[Any, float]:
+    """Run an extraction function in a worker process and time it there"""
+    start = time.time()
+    payload = fn(pdf_path)
+    return payload, time.time() - start
+
+
+class StageCounter:
+    """Throughput counter for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, ok: bool = True, count: int = 1):
+        with self._lock:
+            self.busy_seconds += elapsed
+            if ok:
+                self.processed += count
+            else:
+                self.errors += count
+
+    def snapshot(self, wall_seconds: float) -> Dict:
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'errors': self.errors,
+                'busy_seconds': round(self.busy_seconds, 3),
+                'items_per_second': round(self.processed / wall_seconds, 2) if wall_seconds > 0 else 0.0
+            }
+
+
+class PDFIngestionPipeline:
+    """
+    extract (process pool) -> parse (thread pool) -> write (single thread).
+
+    extract_fn(pdf_path) runs in a worker process, so it and its payload must be
+    picklable. parse_fn(pdf_path, payload) returns the per-file result dict.
+    write_fn(batch) receives lists of (pdf_path, payload, result) and is the only
+    code that writes to SQLite; when a text_cache is given, extraction cache
+    misses are persisted there by the same thread. Results come back in input order.
+    """
+
+    def __init__(self, extract_fn: Callable[[str], Any],
+                 parse_fn: Callable[[str, Any], Dict],
+                 write_fn: Optional[Callable[[List[WriteItem]], None]] = None,
+                 error_fn: Optional[Callable[[str, Exception], Dict]] = None,
+                 text_cache: Optional[PDFTextCache] = None,
+                 extract_workers: Optional[int] = None,
+                 parse_workers: int = DEFAULT_PARSE_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 write_batch_size: int = DEFAULT_WRITE_BATCH_SIZE):
+        self.extract_fn = extract_fn
+        self.parse_fn = parse_fn
+        self.write_fn = write_fn
+        self.error_fn = error_fn
+        self.text_cache = text_cache
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.write_batch_size = write_batch_size
+        self.last_stats: Dict = {}
+
+    def run(self, pdf_paths: List[str]) -> List[Dict]:
+        """Process every PDF and return one result dict per path"""
+        counters = {stage: StageCounter(stage) for stage in STAGES}
+        results: List[Optional[Dict]] = [None] * len(pdf_paths)
+        start = time.time()
+
+        if pdf_paths:
+            # Bounded queues: the feeder stops submitting extractions when parsing
+            # falls behind, and parsing blocks when the writer falls behind
+            extracted = queue.Queue(maxsize=self.queue_size)
+            to_write = queue.Queue(maxsize=self.queue_size)
+
+            writer = threading.Thread(target=self._write_worker, args=(to_write, counters['write']),
+                                      daemon=True)
+            writer.start()
+
+            with ProcessPoolExecutor(max_workers=min(self.extract_workers, len(pdf_paths))) as pool:
+                parsers = [
+                    threading.Thread(target=self._parse_worker,
+                                     args=(extracted, to_write, counters, results), daemon=True)
+                    for _ in range(min(self.parse_workers, len(pdf_paths)))
+                ]
+                for parser in parsers:
+                    parser.start()
+
+                for index, pdf_path in enumerate(pdf_paths):
+                    extracted.put((index, pdf_path, pool.submit(_timed_call, self.extract_fn, pdf_path)))
+                for _ in parsers:
+                    extracted.put(None)
+                for parser in parsers:
+                    parser.join()
+
+            to_write.put(None)
+            writer.join()
+
+        wall_seconds = time.time() - start
+        self.last_stats = {
+            'total_files': len(pdf_paths),
+            'wall_seconds': round(wall_seconds, 3),
+            'files_per_second': round(len(pdf_paths) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+            'extract_workers': self.extract_workers,
+            'parse_workers': self.parse_workers,
+            'queue_size': self.queue_size,
+            'stages': {stage: counters[stage].snapshot(wall_seconds) for stage in STAGES}
+        }
+        if pdf_paths:
+            stage_rates = ', '.join(f"{stage} {counters[stage].snapshot(wall_seconds)['items_per_second']}/s"
+                                    for stage in STAGES)
+            print(f"PDF ingestion: {len(pdf_paths)} files in {wall_seconds:.1f}s ({stage_rates})")
+        return results
+
+    def _error_result(self, pdf_path: str, error: Exception) -> Dict:
+        if self.error_fn is not None:
+            return self.error_fn(pdf_path, error)
+        return {'error': str(error), 'filename': os.path.basename(pdf_path)}
+
+    def _parse_worker(self, extracted: queue.Queue, to_write: queue.Queue,
+                      counters: Dict[str, StageCounter], results: List[Optional[Dict]]):
+        while True:
+            job = extracted.get()
+            if job is None:
+                return
+            index, pdf_path, future = job
+
+            try:
+                payload, extract_seconds = future.result()
+                counters['extract'].record(extract_seconds)
+            except Exception as e:
+                counters['extract'].record(0.0, ok=False)
+                results[index] = self._error_result(pdf_path, e)
+                continue
+
+            parse_start = time.time()
+            try:
+                result = self.parse_fn(pdf_path, payload)
+                counters['parse'].record(time.time() - parse_start)
+            except Exception as e:
+                counters['parse'].record(time.time() - parse_start, ok=False)
+                result = self._error_result(pdf_path, e)
+
+            results[index] = result
+            to_write.put((pdf_path, payload, result))
+
+    def _write_worker(self, to_write: queue.Queue, counter: StageCounter):
+        batch: List[WriteItem] = []
+        while True:
+            item = to_write.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= self.write_batch_size or to_write.empty()):
+                self._flush(batch, counter)
+                batch = []
+            if item is None:
+                return
+
+    def _flush(self, batch: List[WriteItem], counter: StageCounter):
+        start = time.time()
+
+        if self.text_cache is not None:
+            try:
+                self.text_cache.store_many([payload for _, payload, _ in batch
+                                            if isinstance(payload, PDFExtraction) and not payload.cache_hit])
+            except Exception as e:
+                print(f"Error storing PDF text cache entries: {e}")
+
+        if self.write_fn is None:
+            counter.record(time.time() - start, count=len(batch))
+            return
+
+        try:
+            self.write_fn(batch)
+            counter.record(time.time() - start, count=len(batch))
+        except Exception as e:
+            print(f"Error writing PDF ingestion batch: {e}")
+            counter.record(time.time() - start, ok=False, count=len(batch))
+            for _, _, result in batch:
+                result['write_error'] = str(e)
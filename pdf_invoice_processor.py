@@ -3,10 +3,11 @@ import re
 import json
 import sqlite3
 from datetime import datetime
+from functools import partial
 from typing import Dict, List, Optional, Tuple
-import PyPDF2
-import pdfplumber
 from werkzeug.utils import secure_filename
+from pdf_text_cache import get_pdf_text_cache, extract_plain_text_pages, PLAIN_TEXT_ENGINES
+from pdf_ingestion_pipeline import PDFIngestionPipeline, DEFAULT_PARSE_WORKERS
 
 class PDFInvoiceProcessor:
     """
@@ -16,6 +17,8 @@ class PDFInvoiceProcessor:
     def __init__(self, db_path: str = 'dhl_audit.db', upload_folder: str = 'uploads'):
         self.db_path = db_path
         self.upload_folder = upload_folder
+        self.last_text_cache_hit = False
+        self.last_ingestion_stats = {}
         self.init_database()
     
     def init_database(self):
@@ -59,27 +62,18 @@ class PDFInvoiceProcessor:
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from PDF using multiple methods"""
-        text_content = ""
+        # Parsed pages are cached by file content, so reprocessing skips the parse
+        self.last_text_cache_hit = False
         
         try:
-            # Try pdfplumber first (better for tables)
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text + "\n"
-        except:
-            # Fallback to PyPDF2
-            try:
-                with open(pdf_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        text_content += page.extract_text() + "\n"
-            except Exception as e:
-                print(f"Error extracting text from PDF: {e}")
-                return ""
-        
-        return text_content
+            # Try pdfplumber first (better for tables), fall back to PyPDF2
+            extraction = get_pdf_text_cache(self.db_path).extract_first(pdf_path, PLAIN_TEXT_ENGINES)
+        except Exception as e:
+            print(f"Error extracting text from PDF: {e}")
+            return ""
+        
+        self.last_text_cache_hit = extraction.cache_hit
+        return extraction.plain_text()
     
     def parse_invoice_number(self, text: str) -> Optional[str]:
         """Extract invoice number from PDF text"""
@@ -281,9 +275,33 @@ class PDFInvoiceProcessor:
     
     def process_pdf(self, pdf_path: str, invoice_no: str = None) -> Dict:
         """Process a PDF invoice and extract all details"""
+        # Extract text
+        text = self.extract_text_from_pdf(pdf_path)
+        result = self.analyze_pdf_text(text, invoice_no, self.last_text_cache_hit)
+        if not result.get('success'):
+            return result
+        
+        try:
+            # Store in database
+            self.store_pdf_details(
+                invoice_no=result['invoice_no'],
+                pdf_path=pdf_path,
+                charges=result['charges'],
+                references=result['references'],
+                service_type=result['service_type'],
+                total_amount=result['total_amount'],
+                currency=result['currency'],
+                confidence=result['confidence']
+            )
+        except Exception as e:
+            return {'error': f'Error processing PDF: {str(e)}'}
+        
+        return result
+    
+    def analyze_pdf_text(self, text: str, invoice_no: str = None,
+                         text_cache_hit: bool = False) -> Dict:
+        """Extract all invoice details from already extracted PDF text"""
         try:
-            # Extract text
-            text = self.extract_text_from_pdf(pdf_path)
             if not text:
                 return {'error': 'Could not extract text from PDF'}
             
@@ -302,21 +320,10 @@ class PDFInvoiceProcessor:
             # Calculate confidence score
             confidence = self.calculate_confidence(charges, references, total_amount)
             
-            # Store in database
-            self.store_pdf_details(
-                invoice_no=invoice_no,
-                pdf_path=pdf_path,
-                charges=charges,
-                references=references,
-                service_type=service_type,
-                total_amount=total_amount,
-                currency=currency,
-                confidence=confidence
-            )
-            
             return {
                 'success': True,
                 'invoice_no': invoice_no,
+                'text_cache_hit': text_cache_hit,
                 'charges': charges,
                 'references': references,
                 'service_type': service_type,
@@ -350,22 +357,24 @@ class PDFInvoiceProcessor:
                          references: Dict, service_type: str, total_amount: float, 
                          currency: str, confidence: float):
         """Store PDF extraction results in database"""
+        self.store_pdf_details_batch([(
+            invoice_no, pdf_path, os.path.basename(pdf_path), json.dumps(charges),
+            json.dumps(references), service_type, total_amount, currency,
+            datetime.now(), confidence
+        )])
+    
+    def store_pdf_details_batch(self, rows: List[Tuple]):
+        """Store many invoice_pdf_details rows in one transaction"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        filename = os.path.basename(pdf_path)
-        
-        cursor.execute('''
+        cursor.executemany('''
             INSERT OR REPLACE INTO invoice_pdf_details 
             (invoice_no, pdf_file_path, pdf_filename, extracted_charges, 
              shipment_references, service_type, total_amount, currency, 
              extraction_timestamp, extraction_confidence)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            invoice_no, pdf_path, filename, json.dumps(charges),
-            json.dumps(references), service_type, total_amount, currency,
-            datetime.now(), confidence
-        ))
+        ''', rows)
         
         conn.commit()
         conn.close()
@@ -399,12 +408,54 @@ class PDFInvoiceProcessor:
         
         return None
     
-    def process_uploads_folder(self) -> List[Dict]:
-        """Process all PDFs in the uploads folder"""
-        results = []
-        
+    def process_uploads_folder(self, extract_workers: int = None,
+                               parse_workers: int = DEFAULT_PARSE_WORKERS) -> List[Dict]:
+        """
+        Process all PDFs in the uploads folder through the ingestion pipeline
+        (process pool text extraction, threaded parsing, single DB writer)
+        """
         if not os.path.exists(self.upload_folder):
-            return results
+            return []
+        
+        pdf_paths = [os.path.join(self.upload_folder, filename)
+                     for filename in os.listdir(self.upload_folder)
+                     if filename.lower().endswith('.pdf')]
+        
+        def parse(pdf_path: str, extraction) -> Dict:
+            filename = os.path.basename(pdf_path)
+            
+            # Try to extract invoice number from filename
+            invoice_match = re.search(r'([A-Z]\d{7,})', filename)
+            invoice_no = invoice_match.group(1) if invoice_match else None
+            
+            result = self.analyze_pdf_text(extraction.plain_text(), invoice_no, extraction.cache_hit)
+            result['filename'] = filename
+            return result
+        
+        def write(batch):
+            self.store_pdf_details_batch([
+                (result['invoice_no'], pdf_path, result['filename'], json.dumps(result['charges']),
+                 json.dumps(result['references']), result['service_type'], result['total_amount'],
+                 result['currency'], datetime.now(), result['confidence'])
+                for pdf_path, _extraction, result in batch if result.get('success')
+            ])
+        
+        def extraction_error(pdf_path: str, error: Exception) -> Dict:
+            print(f"Error extracting text from PDF: {error}")
+            return {'error': 'Could not extract text from PDF', 'filename': os.path.basename(pdf_path)}
+        
+        pipeline = PDFIngestionPipeline(
+            extract_fn=partial(extract_plain_text_pages, db_path=self.db_path),
+            parse_fn=parse,
+            write_fn=write,
+            error_fn=extraction_error,
+            text_cache=get_pdf_text_cache(self.db_path),
+            extract_workers=extract_workers,
+            parse_workers=parse_workers
+        )
+        results = pipeline.run(pdf_paths)
+        self.last_ingestion_stats = pipeline.last_stats
+        return results
         
         for filename in os.listdir(self.upload_folder):
             if filename.lower().endswith('.pdf'):
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+PDF Text Cache
+Content-addressed cache of page-level PDF text (and pdfplumber tables) shared by
+the PDF processors, keyed by the SHA-256 of the file bytes and the extraction engine
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+ENGINE_PDFPLUMBER = 'pdfplumber'
+ENGINE_PYPDF2 = 'pypdf2'
+ENGINE_PYMUPDF = 'pymupdf'
+ENGINES = (ENGINE_PDFPLUMBER, ENGINE_PYPDF2, ENGINE_PYMUPDF)
+
+# pdfplumber first (better for tables), PyPDF2 as fallback
+PLAIN_TEXT_ENGINES = (ENGINE_PDFPLUMBER, ENGINE_PYPDF2)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class PDFExtraction(NamedTuple):
+    """Page-level extraction output for one PDF"""
+    file_sha256: str
+    engine: str
+    pages: List[str]                     # text per page, '' for pages without text
+    tables: Optional[List[List]]         # pdfplumber tables per page, when requested
+    cache_hit: bool
+
+    def joined_text(self, skip_empty: bool = True) -> str:
+        """Pages joined one per line, the format used by the pdfplumber/PyPDF2 processors"""
+        return "".join(page + "\n" for page in self.pages if page or not skip_empty)
+
+    def plain_text(self) -> str:
+        """Text in the format of the pdfplumber/PyPDF2 processors (PyPDF2 keeps blank pages)"""
+        return self.joined_text(skip_empty=self.engine == ENGINE_PDFPLUMBER)
+
+    def paged_text(self) -> str:
+        """Pages with '--- Page n/total ---' headers, the format used by the LLM processors"""
+        total_pages = len(self.pages)
+        return "".join(f"--- Page {page_num}/{total_pages} ---\n{page_text}\n\n"
+                       for page_num, page_text in enumerate(self.pages, 1) if page_text)
+
+
+def file_sha256(pdf_path: str) -> str:
+    """SHA-256 of the file bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_pymupdf_pages(pdf_path: str, max_pages: Optional[int] = None) -> Iterator:
+    """
+    Yield PyMuPDF page objects one at a time. The document is closed as soon as
+    the consumer stops iterating (wrap in contextlib.closing for an early exit).
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        for page_index in range(len(doc) if max_pages is None else min(max_pages, len(doc))):
+            yield doc.load_page(page_index)
+
+
+def _iter_pdfplumber(pdf_path: str, max_pages: Optional[int] = None) -> Iterator[str]:
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in islice(pdf.pages, max_pages):
+            yield page.extract_text() or ''
+            # Drop the parsed layout objects so long documents don't accumulate them
+            page.flush_cache()
+
+
+def _iter_pypdf2(pdf_path: str, max_pages: Optional[int] = None) -> Iterator[str]:
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in islice(pdf_reader.pages, max_pages):
+            yield page.extract_text() or ''
+
+
+def _iter_pymupdf(pdf_path: str, max_pages: Optional[int] = None) -> Iterator[str]:
+    for page in iter_pymupdf_pages(pdf_path, max_pages):
+        yield page.get_text() or ''
+
+
+_PAGE_ITERATORS = {
+    ENGINE_PDFPLUMBER: _iter_pdfplumber,
+    ENGINE_PYPDF2: _iter_pypdf2,
+    ENGINE_PYMUPDF: _iter_pymupdf,
+}
+
+
+def iter_pdf_pages(pdf_path: str, engine: str = ENGINE_PDFPLUMBER,
+                   max_pages: Optional[int] = None) -> Iterator[str]:
+    """
+    Lazily yield page text. Pages are parsed only as they are consumed, so
+    header-only lookups can stop after the first page.
+    """
+    if engine not in _PAGE_ITERATORS:
+        raise ValueError(f"Unknown PDF extraction engine: {engine}")
+    return _PAGE_ITERATORS[engine](pdf_path, max_pages)
+
+
+def _extract_pdfplumber(pdf_path: str, include_tables: bool):
+    if not include_tables:
+        return list(_iter_pdfplumber(pdf_path)), None
+
+    import pdfplumber
+
+    pages, tables = [], []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            pages.append(page.extract_text() or '')
+            tables.append(page.extract_tables())
+            page.flush_cache()
+    return pages, tables
+
+
+def _extract_pypdf2(pdf_path: str, include_tables: bool):
+    return list(_iter_pypdf2(pdf_path)), None
+
+
+def _extract_pymupdf(pdf_path: str, include_tables: bool):
+    return list(_iter_pymupdf(pdf_path)), None
+
+
+_EXTRACTORS = {
+    ENGINE_PDFPLUMBER: _extract_pdfplumber,
+    ENGINE_PYPDF2: _extract_pypdf2,
+    ENGINE_PYMUPDF: _extract_pymupdf,
+}
+
+
+class PDFTextCache:
+    """
+    SQLite-backed extraction cache.
+
+    Identical files (re-uploads, reprocessing, validation runs) are parsed once
+    per engine. Extraction errors are raised to the caller and never cached, so
+    processors keep their own fallback behaviour.
+    """
+
+    def __init__(self, db_path: str = 'dhl_audit.db'):
+        self.db_path = db_path
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.init_database()
+
+    def init_database(self):
+        """Create the cache tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pdf_text_cache (
+                file_sha256 TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                page_count INTEGER,
+                has_tables INTEGER DEFAULT 0,
+                created_at TEXT,
+                last_used_at TEXT,
+                PRIMARY KEY (file_sha256, engine)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pdf_text_cache_pages (
+                file_sha256 TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                page_no INTEGER NOT NULL,
+                page_text TEXT,
+                tables_json TEXT,
+                PRIMARY KEY (file_sha256, engine, page_no)
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def extract(self, pdf_path: str, engine: str = ENGINE_PDFPLUMBER,
+                include_tables: bool = False, store: bool = True) -> PDFExtraction:
+        """
+        Return page-level text for a PDF, parsing it only on a cache miss.
+
+        With store=False the cache is only read; the caller is expected to pass
+        the returned extraction to store() (used by the ingestion pipeline so
+        that only its DB writer thread writes to SQLite).
+        """
+        if engine not in _EXTRACTORS:
+            raise ValueError(f"Unknown PDF extraction engine: {engine}")
+
+        digest = file_sha256(pdf_path)
+        cached = self._load(digest, engine, include_tables, touch=store)
+        if cached is not None:
+            with self._stats_lock:
+                self.hits += 1
+            return cached
+
+        pages, tables = _EXTRACTORS[engine](pdf_path, include_tables)
+        extraction = PDFExtraction(digest, engine, pages, tables, False)
+        if store:
+            self.store(extraction)
+        with self._stats_lock:
+            self.misses += 1
+        return extraction
+
+    def extract_first(self, pdf_path: str, engines=PLAIN_TEXT_ENGINES,
+                      store: bool = True) -> PDFExtraction:
+        """Try each engine in turn and return the first successful extraction"""
+        error = None
+        for engine in engines:
+            try:
+                return self.extract(pdf_path, engine, store=store)
+            except Exception as e:
+                error = e
+        raise error
+
+    def iter_pages(self, pdf_path: str, engine: str = ENGINE_PDFPLUMBER,
+                   max_pages: Optional[int] = None) -> Iterator[str]:
+        """
+        Lazily yield page text, streaming it from the cache when the file has
+        been extracted before and parsing page by page otherwise. Partial reads
+        are not written back to the cache.
+        """
+        digest = file_sha256(pdf_path)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT page_count FROM pdf_text_cache
+                WHERE file_sha256 = ? AND engine = ?
+            ''', (digest, engine))
+            if cursor.fetchone():
+                with self._stats_lock:
+                    self.hits += 1
+                cursor.execute('''
+                    SELECT page_text FROM pdf_text_cache_pages
+                    WHERE file_sha256 = ? AND engine = ?
+                    ORDER BY page_no
+                    LIMIT ?
+                ''', (digest, engine, -1 if max_pages is None else max_pages))
+                for (page_text,) in cursor:
+                    yield page_text or ''
+                return
+        finally:
+            conn.close()
+
+        yield from iter_pdf_pages(pdf_path, engine, max_pages)
+
+    def _load(self, digest: str, engine: str, include_tables: bool,
+              touch: bool = True) -> Optional[PDFExtraction]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT page_count, has_tables FROM pdf_text_cache
+                WHERE file_sha256 = ? AND engine = ?
+            ''', (digest, engine))
+            row = cursor.fetchone()
+            if not row or (include_tables and not row[1]):
+                return None
+
+            cursor.execute('''
+                SELECT page_text, tables_json FROM pdf_text_cache_pages
+                WHERE file_sha256 = ? AND engine = ?
+                ORDER BY page_no
+            ''', (digest, engine))
+            page_rows = cursor.fetchall()
+            if len(page_rows) != row[0]:
+                return None
+
+            if touch:
+                cursor.execute('''
+                    UPDATE pdf_text_cache SET last_used_at = ?
+                    WHERE file_sha256 = ? AND engine = ?
+                ''', (datetime.now().isoformat(), digest, engine))
+                conn.commit()
+        finally:
+            conn.close()
+
+        pages = [page_text or '' for page_text, _ in page_rows]
+        tables = [json.loads(tables_json or '[]') for _, tables_json in page_rows] if include_tables else None
+        return PDFExtraction(digest, engine, pages, tables, True)
+
+    def store(self, extraction: PDFExtraction):
+        """Write one extraction to the cache"""
+        self.store_many([extraction])
+
+    def store_many(self, extractions: List[PDFExtraction]):
+        """Write extractions to the cache in a single transaction"""
+        if not extractions:
+            return
+
+        now = datetime.now().isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            for digest, engine, pages, tables, _cache_hit in extractions:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO pdf_text_cache
+                    (file_sha256, engine, page_count, has_tables, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (digest, engine, len(pages), 1 if tables is not None else 0, now, now))
+                cursor.execute('DELETE FROM pdf_text_cache_pages WHERE file_sha256 = ? AND engine = ?',
+                               (digest, engine))
+                cursor.executemany('''
+                    INSERT INTO pdf_text_cache_pages (file_sha256, engine, page_no, page_text, tables_json)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [
+                    (digest, engine, page_no, page_text,
+                     json.dumps(tables[page_no - 1]) if tables is not None else None)
+                    for page_no, page_text in enumerate(pages, 1)
+                ])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_stats(self) -> Dict:
+        """In-process hit/miss counters"""
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+_caches: Dict[str, PDFTextCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_pdf_text_cache(db_path: str = 'dhl_audit.db') -> PDFTextCache:
+    """Return the shared cache for a database"""
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = PDFTextCache(db_path)
+            _caches[db_path] = cache
+        return cache
+
+
+def extract_plain_text_pages(pdf_path: str, db_path: str = 'dhl_audit.db') -> PDFExtraction:
+    """
+    Process pool entry point: pdfplumber/PyPDF2 extraction that only reads the cache.
+    The parent process persists misses through PDFTextCache.store_many().
+    """
+    return get_pdf_text_cache(db_path).extract_first(pdf_path, PLAIN_TEXT_ENGINES, store=False)
@@ -226,6 +226,7 @@ Extract EVERY charge line precisely. Include USD amounts, AUD conversions, excha
         # Save validation results
         self.save_validation_results(invoice_no, ytd_data, pdf_charges, validation_result, pdf_path)
         
+        validation_result['text_cache_hit'] = self.llm_processor.last_text_cache_hit
         return validation_result
     
     def compare_charges(self, ytd_charges: dict, pdf_charges: dict, invoice_no: str) -> dict:
@@ -6,31 +6,33 @@ import io
 import os
 import glob
 
+# FedEx invoice numbers are 10 digits
+INVOICE_NUMBER_RE = re.compile(r'\b\d{10}\b')
+
 def extract_fedex_invoice_number_pymupdf(pdf_path):
     """Extract FedEx invoice number using PyMuPDF + OCR"""
     try:
-        # Open PDF
-        doc = fitz.open(pdf_path)
-        print(f"PDF has {doc.page_count} pages")
-        
-        # Focus on page 2 (index 1) where you mentioned the invoice number is
-        page_index = 1 if doc.page_count >= 2 else 0
-        page = doc[page_index]
-        
-        # First try text extraction
-        text = page.get_text()
-        if text.strip():
-            print(f"Found extractable text on page {page_index + 1}")
-            pattern = r'\b\d{10}\b'
-            matches = re.findall(pattern, text)
-            if matches:
-                doc.close()
-                return matches[0]
+        # Open PDF; only the header page is loaded and the document is closed on every exit path
+        with fitz.open(pdf_path) as doc:
+            print(f"PDF has {doc.page_count} pages")
+            
+            # Focus on page 2 (index 1) where you mentioned the invoice number is
+            page_index = 1 if doc.page_count >= 2 else 0
+            page = doc.load_page(page_index)
+            
+            # First try text extraction
+            text = page.get_text()
+            if text.strip():
+                print(f"Found extractable text on page {page_index + 1}")
+                matches = INVOICE_NUMBER_RE.findall(text)
+                if matches:
+                    return matches[0]
+            
+            # If no text, convert page to image and use OCR
+            print(f"No extractable text, using OCR on page {page_index + 1}")
+            pix = page.get_pixmap()
+            img_data = pix.tobytes("png")
         
-        # If no text, convert page to image and use OCR
-        print(f"No extractable text, using OCR on page {page_index + 1}")
-        pix = page.get_pixmap()
-        img_data = pix.tobytes("png")
         img = Image.open(io.BytesIO(img_data))
         
         # Use OCR
@@ -38,10 +40,7 @@ def extract_fedex_invoice_number_pymupdf(pdf_path):
         print(f"OCR Text sample: {ocr_text[:200]}...")
         
         # Look for invoice number
-        pattern = r'\b\d{10}\b'
-        matches = re.findall(pattern, ocr_text)
-        
-        doc.close()
+        matches = INVOICE_NUMBER_RE.findall(ocr_text)
         
         if matches:
             print(f"Found potential invoice numbers: {matches}")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Rate Card Ingest
+Shared helpers for the Excel rate card, quote and invoice importers: only the
+sheets and columns a loader maps are read, cells are cleaned a column at a time
+and rows are written with executemany
+"""
+
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    # pandas' default: openpyxl in read-only mode for .xlsx, xlrd for .xls
+    EXCEL_ENGINE = None
+
+# Text cells that mean "no value" in rate cards
+NULL_TEXT = ['nan', 'null', 'n/a', 'na', '']
+
+
+def open_workbook(path: str) -> pd.ExcelFile:
+    """Open a workbook once so each sheet read reuses the parsed file"""
+    return pd.ExcelFile(path, engine=EXCEL_ENGINE)
+
+
+def read_sheet(workbook, sheet_name, columns: Optional[Iterable[str]] = None, header=0) -> pd.DataFrame:
+    """One sheet; with columns, only those header names are converted"""
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda column: column in wanted
+    return pd.read_excel(workbook, sheet_name=sheet_name, usecols=usecols, header=header)
+
+
+def find_sheet(workbook: pd.ExcelFile, columns: Iterable[str]) -> Optional[str]:
+    """The sheet whose header row has the most of columns (None when no sheet has any)"""
+    wanted = set(columns)
+    best_sheet, best_matches = None, 0
+    for sheet_name in workbook.sheet_names:
+        header = pd.read_excel(workbook, sheet_name=sheet_name, nrows=0)
+        matches = len(wanted.intersection(header.columns))
+        if matches > best_matches:
+            best_sheet, best_matches = sheet_name, matches
+    return best_sheet
+
+
+def _cells(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Cells as an object array with a mask of the missing (None/NaN/NaT) ones"""
+    cells = values.to_numpy(dtype=object)
+    return cells, pd.isna(cells)
+
+
+def _map_distinct(cells: np.ndarray, convert: Callable) -> np.ndarray:
+    """convert() over each distinct cell once (for cells the array conversions cannot take)"""
+    lookup = {}
+    result = np.empty(len(cells), dtype=object)
+    for i, cell in enumerate(cells):
+        if cell not in lookup:
+            lookup[cell] = convert(cell)
+        result[i] = lookup[cell]
+    return result
+
+
+def map_distinct(values: pd.Series, convert: Callable) -> pd.Series:
+    """convert() applied once per distinct value of a column (parsers of free-text cells)"""
+    return pd.Series(_map_distinct(values.to_numpy(dtype=object), convert), index=values.index, dtype=object)
+
+
+def text_values(values: pd.Series, default=None) -> pd.Series:
+    """str(cell).strip() per cell, default for missing cells"""
+    cells, missing = _cells(values)
+    if not len(cells):
+        return pd.Series([], index=values.index, dtype=object)
+    text = np.char.strip(np.where(missing, '', cells).astype(str)).astype(object)
+    text[missing] = default
+    return pd.Series(text, index=values.index, dtype=object)
+
+
+def clean_text(values: pd.Series) -> pd.Series:
+    """text_values, with the NULL_TEXT placeholders as None"""
+    text = text_values(values, '')
+    if not len(text):
+        return text
+    placeholders = np.isin(np.char.lower(text.to_numpy(dtype=str)), NULL_TEXT)
+    return text.mask(placeholders, None)
+
+
+def _to_float(cell):
+    try:
+        return float(cell)
+    except (TypeError, ValueError, OverflowError):
+        return np.nan
+
+
+def float_values(values: pd.Series, default=None) -> pd.Series:
+    """float(cell) per cell; default for missing cells and cells float() rejects"""
+    cells, missing = _cells(values)
+    present = np.where(missing, np.nan, cells)
+    try:
+        numbers = present.astype(np.float64)
+    except (TypeError, ValueError):
+        numbers = _map_distinct(present, _to_float).astype(np.float64)
+    result = numbers.astype(object)
+    result[np.isnan(numbers)] = default
+    return pd.Series(result, index=values.index, dtype=object)
+
+
+def clean_numeric(values: pd.Series) -> pd.Series:
+    """
+    Numbers from rate card cells: text has whitespace, '$' and ',' removed and
+    the NULL_TEXT placeholders are None, as is anything float() rejects
+    """
+    try:
+        text = values.str.strip().str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+    except AttributeError:
+        # No text cells in the column
+        return float_values(values)
+    is_text = text.notna()
+    values = text.where(is_text, values).mask(is_text & text.str.lower().isin(NULL_TEXT), None)
+    return float_values(values)
+
+
+def int_values(numbers: pd.Series) -> pd.Series:
+    """int() of float or None cells (truncating), None kept"""
+    floats = pd.to_numeric(numbers, errors='coerce').to_numpy(dtype=np.float64)
+    valid = np.isfinite(floats)
+    result = np.full(len(floats), None, dtype=object)
+    result[valid] = np.trunc(floats[valid]).astype(np.int64).tolist()
+    return pd.Series(result, index=numbers.index, dtype=object)
+
+
+def label_rows(values: pd.Series, text: str) -> np.ndarray:
+    """Positions of the cells whose str() contains text (section labels of header-less sheets)"""
+    cells, missing = _cells(values)
+    if not len(cells):
+        return np.array([], dtype=np.int64)
+    found = np.char.find(np.where(missing, '', cells).astype(str), text) >= 0
+    return np.flatnonzero(found & ~missing)
+
+
+def zone_rates(sheet: pd.DataFrame, rows: Sequence[int], zones: int, first_column: int = 2) -> List[tuple]:
+    """
+    Zone rate tuples of a header-less sheet's rows: float() of columns
+    first_column onwards, None for blank, non-numeric or absent cells
+    """
+    block = sheet.iloc[list(rows)].reindex(columns=range(first_column, first_column + zones))
+    return list(zip(*(sql_values(float_values(block[column])) for column in block.columns)))
+
+
+def sql_values(values: pd.Series) -> list:
+    """Column as a list of Python values for executemany, NaN/NaT as None"""
+    cells, missing = _cells(values)
+    if missing.any():
+        cells = cells.copy()
+        cells[missing] = None
+    return cells.tolist()
+
+
+def next_row_id(cursor, table: str) -> int:
+    """First id a bulk insert with explicit ids can use (past AUTOINCREMENT's high-water mark)"""
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+    max_id = cursor.fetchone()[0]
+    try:
+        cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+        row = cursor.fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    return max(max_id, row[0] if row else 0) + 1
+
+
+def bulk_insert(cursor, table: str, columns: Sequence[str], rows: List[tuple],
+                mode: str = 'INSERT') -> Tuple[List[int], List[Tuple[int, Exception]]]:
+    """
+    executemany the rows in one savepoint. If SQLite refuses a row, the
+    savepoint is rolled back and the rows are inserted one at a time.
+    Returns (positions inserted, [(position, exception)] for refused rows).
+    """
+    query = f"{mode} INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+    if not rows:
+        return [], []
+
+    # A savepoint outside a transaction would commit on release
+    if not cursor.connection.in_transaction:
+        cursor.execute('BEGIN')
+    cursor.execute('SAVEPOINT bulk_insert')
+    try:
+        cursor.executemany(query, rows)
+        cursor.execute('RELEASE bulk_insert')
+        return list(range(len(rows))), []
+    except sqlite3.Error:
+        cursor.execute('ROLLBACK TO bulk_insert')
+
+    inserted, errors = [], []
+    for position, row in enumerate(rows):
+        try:
+            cursor.execute(query, row)
+            inserted.append(position)
+        except sqlite3.Error as e:
+            errors.append((position, e))
+    cursor.execute('RELEASE bulk_insert')
+    return inserted, errors
+
+
+class PhaseTimer:
+    """Seconds spent in each phase of a load, for the loaders' results and logs"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        self.timings[phase] = round(self.timings.get(phase, 0.0) + now - self._start, 4)
+        self._start = now
+
+    def summary(self) -> str:
+        return ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in self.timings.items())
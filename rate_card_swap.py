@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Rate Card Swap
+Reloads write into a shadow copy of a rate card table while audits keep
+reading the live one. The shadow is checked (row counts, critical ranges)
+and only then swapped in with ALTER TABLE ... RENAME in one short write
+transaction that also bumps the table's rate card version.
+"""
+
+import re
+import sqlite3
+from typing import List, NamedTuple, Optional, Sequence
+
+from rate_card_versions import bump_rate_card_version
+
+SHADOW_SUFFIX = '_shadow'
+# Not '_backup': maintenance scripts rename live tables to <table>_backup themselves
+BACKUP_SUFFIX = '_swap_backup'
+
+
+class RateCardValidationError(ValueError):
+    """The shadow table failed its checks; the live table was left as it was"""
+
+    def __init__(self, table: str, failures: List[str]):
+        self.table = table
+        self.failures = failures
+        super().__init__(f"{table} reload rejected: {'; '.join(failures)}")
+
+
+class ShadowCheck(NamedTuple):
+    """At least min_rows shadow rows must match where (an SQL condition)"""
+    description: str
+    where: str = '1=1'
+    params: tuple = ()
+    min_rows: int = 1
+
+
+class ShadowTableSwap:
+    """Shadow table, validation and atomic swap for one rate card table"""
+
+    def __init__(self, db_path: str, table: str, create_sql: Optional[str] = None,
+                 keep_backup: bool = True):
+        """
+        create_sql is a CREATE TABLE statement with {table} for the table name;
+        without it the shadow copies the live table's schema
+        """
+        self.db_path = db_path
+        self.table = table
+        self.create_sql = create_sql
+        self.keep_backup = keep_backup
+        self.shadow_table = table + SHADOW_SUFFIX
+        self.backup_table = table + BACKUP_SUFFIX
+
+    def _table_sql(self, cursor, table: str) -> Optional[str]:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _columns(self, cursor, table: str) -> List[str]:
+        cursor.execute(f'PRAGMA table_info({table})')
+        return [row[1] for row in cursor.fetchall()]
+
+    def _count(self, cursor, table: str, where: str = '1=1', params: Sequence = ()) -> int:
+        cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE {where}', tuple(params))
+        return cursor.fetchone()[0]
+
+    def create_shadow(self, copy_where: Optional[str] = None, params: Sequence = ()) -> str:
+        """
+        (Re)create the empty shadow table and return its name. With copy_where,
+        the live rows matching it are copied in first, for loaders that update
+        part of a rate card and keep the rest.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'DROP TABLE IF EXISTS {self.shadow_table}')
+
+            live_sql = self._table_sql(cursor, self.table)
+            if self.create_sql:
+                cursor.execute(self.create_sql.format(table=self.shadow_table))
+            elif live_sql:
+                cursor.execute(re.sub(
+                    r'^(CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?)["`\[]?' + re.escape(self.table) + r'["`\]]?',
+                    lambda match: match.group(1) + self.shadow_table, live_sql, count=1, flags=re.IGNORECASE
+                ))
+            else:
+                raise ValueError(f'{self.table} does not exist and no CREATE statement was given')
+
+            if copy_where and live_sql:
+                live_columns = set(self._columns(cursor, self.table))
+                columns = ', '.join(c for c in self._columns(cursor, self.shadow_table) if c in live_columns)
+                cursor.execute(f'''
+                    INSERT INTO {self.shadow_table} ({columns})
+                    SELECT {columns} FROM {self.table} WHERE {copy_where}
+                ''', tuple(params))
+
+            conn.commit()
+        finally:
+            conn.close()
+        return self.shadow_table
+
+    def validate(self, checks: Sequence[ShadowCheck] = (), min_rows: int = 1,
+                 min_live_ratio: Optional[float] = None) -> List[str]:
+        """
+        Failures of the shadow table (empty when it may be swapped in).
+        min_live_ratio rejects a reload that shrinks the table below that
+        fraction of the live row count.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            failures = []
+            rows = self._count(cursor, self.shadow_table)
+            if rows < min_rows:
+                failures.append(f'{rows} rows loaded, at least {min_rows} expected')
+
+            if min_live_ratio and self._table_sql(cursor, self.table):
+                live_rows = self._count(cursor, self.table)
+                if rows < live_rows * min_live_ratio:
+                    failures.append(f'{rows} rows loaded, the live table has {live_rows}')
+
+            for check in checks:
+                matched = self._count(cursor, self.shadow_table, check.where, check.params)
+                if matched < check.min_rows:
+                    failures.append(f'{check.description}: {matched} rows, at least {check.min_rows} expected')
+            return failures
+        finally:
+            conn.close()
+
+    def swap(self, checks: Sequence[ShadowCheck] = (), min_rows: int = 1,
+             min_live_ratio: Optional[float] = None, source: Optional[str] = None) -> int:
+        """
+        Validate the shadow and rename it over the live table in one transaction.
+        The live table becomes the backup (or is dropped), its indexes and
+        triggers are recreated on the new table and the version is bumped.
+        Returns the new version; raises RateCardValidationError (after
+        discarding the shadow) when a check fails.
+        """
+        failures = self.validate(checks, min_rows, min_live_ratio)
+        if failures:
+            self.discard()
+            raise RateCardValidationError(self.table, failures)
+
+        # Autocommit mode so BEGIN/COMMIT below are the only transaction boundaries
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            # Renames must not rewrite views, triggers or foreign keys of other tables to the backup
+            cursor.execute('PRAGMA legacy_alter_table = ON')
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('''
+                    SELECT type, name, sql FROM sqlite_master
+                    WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+                ''', (self.table,))
+                dependents = cursor.fetchall()
+
+                if self._table_sql(cursor, self.table):
+                    if self.keep_backup:
+                        cursor.execute(f'DROP TABLE IF EXISTS {self.backup_table}')
+                        cursor.execute(f'ALTER TABLE {self.table} RENAME TO {self.backup_table}')
+                        # Indexes and triggers moved with the table; their names are needed again
+                        for kind, name, _sql in dependents:
+                            cursor.execute(f'DROP {kind.upper()} IF EXISTS {name}')
+                    else:
+                        cursor.execute(f'DROP TABLE {self.table}')
+
+                cursor.execute(f'ALTER TABLE {self.shadow_table} RENAME TO {self.table}')
+                for _kind, _name, sql in dependents:
+                    cursor.execute(sql)
+
+                version = bump_rate_card_version(cursor, self.table, source, self._count(cursor, self.table))
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        return version
+
+    def discard(self):
+        """Drop the shadow table"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(f'DROP TABLE IF EXISTS {self.shadow_table}')
+            conn.commit()
+        finally:
+            conn.close()
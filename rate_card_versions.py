@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Rate Card Versions
+One row per rate card table with a version number that is bumped in the same
+transaction as every reload, so in-memory caches can tell a stale copy from
+the live table with one indexed read. Engines hold compiled rate structures
+in a RateCardSubscription, which rebuilds them only when a version moves.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Tables written by the DHL Express 3rd party loaders (zones, zone matrix, rates)
+DHL_EXPRESS_3RD_PARTY_TABLES = (
+    'dhl_express_3rd_party_zones',
+    'dhl_express_3rd_party_matrix',
+    'dhl_express_3rd_party_rates'
+)
+
+
+def create_rate_card_versions_table(cursor):
+    """Version per rate card table, shared by the loaders and the caches"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_card_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            source TEXT,
+            row_count INTEGER,
+            updated_at TEXT
+        )
+    ''')
+
+
+def bump_rate_card_version(cursor, table_name: str, source: Optional[str] = None,
+                           row_count: Optional[int] = None) -> int:
+    """
+    Next version of a table, written on the caller's cursor so it commits
+    (or rolls back) with the reload itself. row_count is counted when not
+    given. Returns the new version.
+    """
+    create_rate_card_versions_table(cursor)
+    if row_count is None:
+        cursor.execute(f'SELECT COUNT(*) FROM {table_name}')
+        row_count = cursor.fetchone()[0]
+    cursor.execute('''
+        INSERT INTO rate_card_versions (table_name, version, source, row_count, updated_at)
+        VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT(table_name) DO UPDATE SET
+            version = version + 1,
+            source = excluded.source,
+            row_count = excluded.row_count,
+            updated_at = excluded.updated_at
+    ''', (table_name, source, row_count, datetime.now().isoformat()))
+    cursor.execute('SELECT version FROM rate_card_versions WHERE table_name = ?', (table_name,))
+    return cursor.fetchone()[0]
+
+
+def stamp_rate_card_tables(db_path: str, table_names: Sequence[str],
+                           source: Optional[str] = None) -> Dict[str, int]:
+    """Bump the versions of tables a loader has already committed; returns the new versions"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        versions = {name: bump_rate_card_version(cursor, name, source) for name in table_names}
+        conn.commit()
+    finally:
+        conn.close()
+    return versions
+
+
+def read_rate_card_versions(cursor, table_names: Sequence[str]) -> Tuple[int, ...]:
+    """Versions of table_names in order (0 if never stamped), in one primary key lookup"""
+    try:
+        cursor.execute(f'''
+            SELECT table_name, version FROM rate_card_versions
+            WHERE table_name IN ({', '.join(['?'] * len(table_names))})
+        ''', tuple(table_names))
+        versions = dict(cursor.fetchall())
+    except sqlite3.OperationalError:
+        # No loader has stamped a version yet
+        versions = {}
+    return tuple(versions.get(name, 0) for name in table_names)
+
+
+def get_rate_card_version(db_path: str, table_name: str) -> int:
+    """Current version of a table, 0 if it was never stamped"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return read_rate_card_versions(conn.cursor(), [table_name])[0]
+    finally:
+        conn.close()
+
+
+def get_rate_card_versions(db_path: str) -> List[Dict]:
+    """Every stamped table with its version, source and row count"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT table_name, version, source, row_count, updated_at
+            FROM rate_card_versions ORDER BY table_name
+        ''')
+        rows = cursor.fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+
+    return [
+        {
+            'table_name': row[0],
+            'version': row[1],
+            'source': row[2],
+            'row_count': row[3],
+            'updated_at': row[4]
+        }
+        for row in rows
+    ]
+
+
+class RateCardSubscription:
+    """
+    A structure compiled from rate card tables (a lookup array, an index),
+    held per database and rebuilt by build(db_path) only when the version of
+    one of the tables has changed. get() costs one indexed read, so engines
+    call it once per batch and use the result for every line.
+    """
+
+    def __init__(self, table_names: Sequence[str], build: Callable[[str], Any]):
+        self.table_names = tuple(table_names)
+        self.build = build
+        self._compiled: Dict[str, Tuple[Tuple[int, ...], Any]] = {}
+        self._lock = threading.Lock()
+
+    def versions(self, db_path: str, conn=None) -> Tuple[int, ...]:
+        """Current versions of the subscribed tables (read on conn when given)"""
+        if conn is not None:
+            return read_rate_card_versions(conn.cursor(), self.table_names)
+        conn = sqlite3.connect(db_path)
+        try:
+            return read_rate_card_versions(conn.cursor(), self.table_names)
+        finally:
+            conn.close()
+
+    def get(self, db_path: str, conn=None) -> Any:
+        """The compiled structure for db_path, rebuilt if a table was reloaded since it was built"""
+        versions = self.versions(db_path, conn)
+        with self._lock:
+            compiled = self._compiled.get(db_path)
+            if compiled is None or compiled[0] != versions:
+                compiled = (versions, self.build(db_path))
+                self._compiled[db_path] = compiled
+            return compiled[1]
+
+    def invalidate(self, db_path: str = None):
+        """Drop compiled structures (all of them when db_path is None)"""
+        with self._lock:
+            if db_path is None:
+                self._compiled.clear()
+            else:
+                self._compiled.pop(db_path, None)
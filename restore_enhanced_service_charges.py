@@ -12,6 +12,7 @@ import sqlite3
 import pandas as pd
 import re
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 def restore_enhanced_table_structure():
     """Add missing enhanced columns to the service charges table"""
@@ -79,6 +80,7 @@ def restore_enhanced_table_structure():
     except sqlite3.OperationalError as e:
         print(f"  ⚠️ Could not extend service_code column: {e}")
     
+    bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'restore_enhanced_table_structure')
     conn.commit()
     conn.close()
     print("✅ Enhanced table structure restored!")
@@ -128,6 +130,7 @@ def reload_enhanced_service_charges():
             ''', (*entry, datetime.now().isoformat()))
             print(f"  ✅ Added {entry[0]}: {entry[1]} - ${entry[3]}")
         
+        bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'reload_enhanced_service_charges')
         conn.commit()
         conn.close()
         print("✅ Fallback enhanced entries added!")
@@ -9,6 +9,7 @@ and populates it with the complete enhanced service charges data including descr
 
 import sqlite3
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 def restore_service_charges_table():
     """Completely restore dhl_express_services_surcharges table with full enhanced structure"""
@@ -111,6 +112,7 @@ def restore_service_charges_table():
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (*charge_data, datetime.now().isoformat()))
         
+        bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'restore_service_charges_table')
         conn.commit()
         
         # Verify final structure and data
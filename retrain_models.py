@@ -8,30 +8,25 @@ to eliminate version compatibility warnings.
 """
 
 import os
-import pickle
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestClassifier
 from advanced_pdf_processor import AdvancedPDFProcessor
+from charge_model_registry import VECTORIZER_NAME, CLASSIFIER_NAMES
 
 def retrain_models():
     """Retrain ML models with current scikit-learn version"""
     print("Retraining ML models with current scikit-learn version...")
     
-    # Remove old model files
+    # Remove old model files (legacy pickles and joblib artifacts)
     models_path = 'ml_models'
-    vectorizer_path = os.path.join(models_path, 'tfidf_vectorizer.pkl')
-    classifier_path = os.path.join(models_path, 'charge_classifier.pkl')
+    for name in [VECTORIZER_NAME] + list(CLASSIFIER_NAMES.values()):
+        for extension in ('pkl', 'joblib'):
+            path = os.path.join(models_path, f'{name}.{extension}')
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"Removed old model file {path}")
     
-    if os.path.exists(vectorizer_path):
-        os.remove(vectorizer_path)
-        print("Removed old vectorizer model")
-    
-    if os.path.exists(classifier_path):
-        os.remove(classifier_path)
-        print("Removed old classifier model")
-    
-    # Create new processor instance (this will create new models)
+    # Models load lazily, so train explicitly
     processor = AdvancedPDFProcessor()
+    processor.train_initial_models()
     
     print("Successfully retrained ML models with current scikit-learn version!")
     print("The version warnings should no longer appear on startup.")
@@ -11,8 +11,23 @@ import requests
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import re
-import fitz  # PyMuPDF
 from model_manager import ModelManager
+from pdf_text_cache import get_pdf_text_cache, ENGINE_PYMUPDF
+from ollama_scheduler import get_ollama_session, post_generate, OllamaHTTPError, OllamaScheduler, LLMRequest
+from llm_response_cache import get_llm_response_cache, make_cache_key
+from invoice_text_chunker import (
+    BoilerplateFilter, chunk_invoice_text, context_window_for, estimate_tokens,
+    merge_chunk_results, DEFAULT_CHUNK_TOKEN_BUDGET
+)
+
+# Bump when the schema prompt or response validation changes to invalidate cached responses
+SCHEMA_PROMPT_VERSION = 'schema-v1'
+
+SCHEMA_LLM_OPTIONS = {
+    "temperature": 0.1,  # Low temperature for consistent extraction
+    "top_p": 0.9,
+    "num_predict": 8192  # Increased for complete responses
+}
 
 
 class SchemaDrivenLLMProcessor:
@@ -22,6 +37,8 @@ class SchemaDrivenLLMProcessor:
         self.ollama_url = "http://localhost:11434"
         self.model = model_name  # Allow model selection
         self.db_path = "dhl_audit.db"
+        self.chunk_token_budget = DEFAULT_CHUNK_TOKEN_BUDGET
+        self.boilerplate_filter = BoilerplateFilter(self.db_path)
         
         # Initialize model manager for automatic model loading
         self.model_manager = ModelManager()
@@ -103,10 +120,15 @@ class SchemaDrivenLLMProcessor:
             }
         }
     
-    def create_structured_prompt(self, pdf_text: str) -> str:
-        """Create a schema-driven prompt for maximum extraction accuracy"""
+    def create_structured_prompt(self, pdf_text: str, part: Optional[tuple] = None) -> str:
+        """Create a schema-driven prompt for maximum extraction accuracy.
+        part=(index, count) marks the text as one chunk of a longer invoice."""
         
         schema = self.get_extraction_schema()
+        part_rule = ""
+        if part:
+            part_rule = (f"\n7. This text is part {part[0]} of {part[1]} of a longer invoice: use null for "
+                         f"fields not shown in this part and extract ONLY the line items shown in this part")
         
         prompt = f"""CRITICAL: You MUST respond with ONLY valid JSON in the EXACT format specified below. 
 NO explanations, NO markdown, NO additional text. Start directly with {{ and end with }}.
@@ -166,7 +188,7 @@ MANDATORY RULES:
 3. Extract ALL line items from charges section
 4. Convert dates to YYYY-MM-DD format
 5. Use null for missing values, not empty strings
-6. Categories: FREIGHT, SERVICE_CHARGE, SURCHARGE, DUTY_TAX, FUEL_SURCHARGE, SECURITY_CHARGE, OTHER
+6. Categories: FREIGHT, SERVICE_CHARGE, SURCHARGE, DUTY_TAX, FUEL_SURCHARGE, SECURITY_CHARGE, OTHER{part_rule}
 
 INVOICE TEXT:
 {pdf_text}
@@ -175,7 +197,11 @@ RESPOND WITH ONLY THE JSON OBJECT:"""
         
         return prompt
     
-    def query_llm(self, prompt: str) -> Optional[str]:
+    def get_generation_options(self, prompt: str) -> Dict:
+        """Generation options with num_ctx sized to the prompt instead of a fixed window"""
+        return {**SCHEMA_LLM_OPTIONS, "num_ctx": context_window_for(estimate_tokens(prompt))}
+    
+    def query_llm(self, prompt: str, options: Dict = None) -> Optional[str]:
         """Query the LLM with the structured prompt using streaming and model manager"""
         try:
             print(f"Querying LLM with {len(prompt)} characters of structured prompt...")
@@ -195,57 +221,27 @@ RESPOND WITH ONLY THE JSON OBJECT:"""
                 "model": self.model,
                 "prompt": prompt,
                 "stream": True,  # Enable streaming for complete responses
-                "options": {
-                    "temperature": 0.1,  # Low temperature for consistent extraction
-                    "top_p": 0.9,
-                    "num_predict": 8192  # Increased for complete responses
-                }
+                "options": options or SCHEMA_LLM_OPTIONS
             }
             
             print(f"Sending streaming request to {self.ollama_url}/api/generate...")
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=payload,
-                timeout=300,  # 5 minutes
-                stream=True   # Enable streaming
-            )
+            try:
+                # Pooled keep-alive session instead of a new connection per request
+                full_response, _final_chunk = post_generate(
+                    get_ollama_session(self.ollama_url), self.ollama_url, payload, timeout=300  # 5 minutes
+                )
+            except OllamaHTTPError as e:
+                print(f"LLM query failed with status {e.status_code}")
+                print(f"Error response: {e.body}")
+                return None
             
-            print(f"Response status: {response.status_code}")
+            print(f"LLM response length: {len(full_response)} characters")
+            print(f"LLM response (first 200 chars): {repr(full_response[:200])}")
             
-            if response.status_code == 200:
-                # Process streaming response
-                full_response = ""
-                total_tokens = 0
-                
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            chunk = line.decode('utf-8')
-                            data = json.loads(chunk)
-                            
-                            if 'response' in data:
-                                full_response += data['response']
-                            
-                            if 'eval_count' in data:
-                                total_tokens = data['eval_count']
-                            
-                            # Check if this is the final chunk
-                            if data.get('done', False):
-                                break
-                        except json.JSONDecodeError:
-                            continue  # Skip malformed chunks
-                
-                print(f"LLM response length: {len(full_response)} characters")
-                print(f"LLM response (first 200 chars): {repr(full_response[:200])}")
-                
-                if not full_response:
-                    print("ERROR: LLM returned empty response!")
-                
-                return full_response
-            else:
-                print(f"LLM query failed with status {response.status_code}")
-                print(f"Error response: {response.text}")
-                return None
+            if not full_response:
+                print("ERROR: LLM returned empty response!")
+            
+            return full_response
                 
         except requests.exceptions.Timeout:
             print("ERROR: Request to Ollama timed out (5 minutes)")
@@ -661,68 +657,146 @@ RESPOND WITH ONLY THE JSON OBJECT:"""
             # Store PDF text for potential use in conversion
             self._current_pdf_text = pdf_text
             
-            # Create structured prompt
-            prompt = self.create_structured_prompt(pdf_text)
-            print(f"Created prompt with {len(prompt)} characters")
-            
-            # Query LLM
-            print("Querying LLM...")
-            llm_response = self.query_llm(prompt)
-            
-            if llm_response is None:
-                return {"success": False, "error": "LLM query returned None"}
+            # Reuse the stored result when this model has already seen the same invoice text
+            response_cache = get_llm_response_cache(self.db_path)
+            cache_key = make_cache_key(self.model, SCHEMA_PROMPT_VERSION,
+                                       {**SCHEMA_LLM_OPTIONS, "chunk_token_budget": self.chunk_token_budget},
+                                       self.create_structured_prompt(pdf_text))
+            cached_result = response_cache.get(cache_key, self.model)
+            if cached_result is not None:
+                print(f"LLM response cache hit for model {self.model}")
+                cached_result["llm_cache_hit"] = True
+                return cached_result
             
-            if not llm_response:
-                return {"success": False, "error": "LLM returned empty response"}
+            # Drop lines repeated across invoices, then split long invoices into token-budgeted chunks
+            self.boilerplate_filter.observe(pdf_text)
+            invoice_text = self.boilerplate_filter.strip(pdf_text)
+            chunks = chunk_invoice_text(invoice_text, self.chunk_token_budget)
+            print(f"Invoice text: ~{estimate_tokens(invoice_text)} tokens in {len(chunks)} chunk(s)")
             
-            print(f"Received LLM response: {len(llm_response)} characters")
-            
-            # Clean and parse response
-            cleaned_response = self.clean_llm_response(llm_response)
-            print(f"Cleaned response length: {len(cleaned_response)} characters")
-            print(f"Cleaned LLM response (first 500 chars): {cleaned_response[:500]}")
-            
-            if not cleaned_response:
-                return {"success": False, "error": "Cleaned response is empty"}
-            
-            try:
-                extracted_data = json.loads(cleaned_response)
-                print(f"Successfully parsed JSON with keys: {list(extracted_data.keys()) if isinstance(extracted_data, dict) else 'Not a dict'}")
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                print(f"Raw LLM response: {llm_response[:1000]}")
-                print(f"Cleaned response: {cleaned_response[:1000]}")
-                return {"success": False, "error": f"Failed to parse LLM response: {e}"}
-            
-            # Validate against schema
-            try:
-                validated_data = self.validate_extracted_data(extracted_data)
-            except ValueError as ve:
-                print(f"Schema validation error: {ve}")
-                print(f"Raw extracted data keys: {list(extracted_data.keys()) if extracted_data else 'None'}")
-                print(f"Raw extracted data: {extracted_data}")
-                
-                # Try to convert the response to correct schema as fallback
-                print("Attempting to convert response to correct schema...")
-                try:
-                    converted_data = self.convert_response_to_schema(extracted_data, pdf_text)
-                    validated_data = self.validate_extracted_data(converted_data)
-                    print("✅ Successfully converted to schema format!")
-                except Exception as ce:
-                    print(f"❌ Schema conversion also failed: {ce}")
-                    return {"success": False, "error": f"Schema validation failed: {ve}"}
+            if len(chunks) > 1:
+                result = self.extract_chunked(chunks)
+            else:
+                result = self.extract_single(invoice_text, pdf_text)
             
-            return {
-                "success": True,
-                "data": validated_data,
-                "confidence": validated_data.get("confidence", 0.8),
-                "processing_notes": validated_data.get("processing_notes", "")
-            }
+            if result.get("success"):
+                response_cache.put(cache_key, result, self.model, SCHEMA_PROMPT_VERSION)
+                result["llm_cache_hit"] = False
+            return result
             
         except Exception as e:
             print(f"Error in schema extraction: {e}")
             return {"success": False, "error": str(e)}
     
+    def extract_single(self, invoice_text: str, pdf_text: str) -> Dict:
+        """One LLM call over the whole invoice text"""
+        prompt = self.create_structured_prompt(invoice_text)
+        print(f"Created prompt with {len(prompt)} characters")
+        
+        # Query LLM
+        print("Querying LLM...")
+        llm_response = self.query_llm(prompt, self.get_generation_options(prompt))
+        
+        if llm_response is None:
+            return {"success": False, "error": "LLM query returned None"}
+        
+        if not llm_response:
+            return {"success": False, "error": "LLM returned empty response"}
+        
+        print(f"Received LLM response: {len(llm_response)} characters")
+        
+        # Clean and parse response
+        cleaned_response = self.clean_llm_response(llm_response)
+        print(f"Cleaned response length: {len(cleaned_response)} characters")
+        print(f"Cleaned LLM response (first 500 chars): {cleaned_response[:500]}")
+        
+        if not cleaned_response:
+            return {"success": False, "error": "Cleaned response is empty"}
+        
+        try:
+            extracted_data = json.loads(cleaned_response)
+            print(f"Successfully parsed JSON with keys: {list(extracted_data.keys()) if isinstance(extracted_data, dict) else 'Not a dict'}")
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error: {e}")
+            print(f"Raw LLM response: {llm_response[:1000]}")
+            print(f"Cleaned response: {cleaned_response[:1000]}")
+            return {"success": False, "error": f"Failed to parse LLM response: {e}"}
+        
+        # Validate against schema
+        try:
+            validated_data = self.validate_extracted_data(extracted_data)
+        except ValueError as ve:
+            print(f"Schema validation error: {ve}")
+            print(f"Raw extracted data keys: {list(extracted_data.keys()) if extracted_data else 'None'}")
+            print(f"Raw extracted data: {extracted_data}")
+            
+            # Try to convert the response to correct schema as fallback
+            print("Attempting to convert response to correct schema...")
+            try:
+                converted_data = self.convert_response_to_schema(extracted_data, pdf_text)
+                validated_data = self.validate_extracted_data(converted_data)
+                print("✅ Successfully converted to schema format!")
+            except Exception as ce:
+                print(f"❌ Schema conversion also failed: {ce}")
+                return {"success": False, "error": f"Schema validation failed: {ve}"}
+        
+        return {
+            "success": True,
+            "data": validated_data,
+            "confidence": validated_data.get("confidence", 0.8),
+            "processing_notes": validated_data.get("processing_notes", "")
+        }
+    
+    def parse_chunk_response(self, response_text: Optional[str]) -> Optional[Dict]:
+        """Parse one chunk's response; validation happens after merging"""
+        if not response_text:
+            return None
+        try:
+            data = json.loads(self.clean_llm_response(response_text))
+        except json.JSONDecodeError as e:
+            print(f"Chunk JSON parsing error: {e}")
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get("invoice_summary", {}), dict):
+            return None
+        return data
+    
+    def extract_chunked(self, chunks: List[str]) -> Dict:
+        """Extract each chunk concurrently and merge the results using the extraction schema"""
+        model_ready, model_message = self.model_manager.ensure_model_ready(self.model)
+        if not model_ready:
+            return {"success": False, "error": f"Model preparation failed: {model_message}"}
+        
+        llm_requests = []
+        for index, chunk in enumerate(chunks):
+            prompt = self.create_structured_prompt(chunk, part=(index + 1, len(chunks)))
+            llm_requests.append(LLMRequest(index, self.model, prompt, self.get_generation_options(prompt)))
+        
+        def on_result(request, response_text, error, latency):
+            if error is not None:
+                print(f"Chunk {request.key + 1}/{len(chunks)} failed after {latency:.1f}s: {error}")
+                return None
+            print(f"Chunk {request.key + 1}/{len(chunks)} answered in {latency:.1f}s")
+            return self.parse_chunk_response(response_text)
+        
+        chunk_results = OllamaScheduler(self.ollama_url).run_batch(llm_requests, on_result)
+        parsed_count = sum(1 for result in chunk_results if result is not None)
+        if not parsed_count:
+            return {"success": False, "error": f"All {len(chunks)} chunk extractions failed"}
+        
+        merged = merge_chunk_results(chunk_results, self.get_extraction_schema())
+        try:
+            validated_data = self.validate_extracted_data(merged)
+        except ValueError as ve:
+            print(f"Schema validation error after merging chunks: {ve}")
+            return {"success": False, "error": f"Schema validation failed: {ve}"}
+        
+        return {
+            "success": True,
+            "data": validated_data,
+            "confidence": round(0.8 * parsed_count / len(chunks), 3),
+            "processing_notes": f"Merged from {parsed_count} of {len(chunks)} text chunks"
+        }
+    
     def save_to_database(self, invoice_no: str, extraction_data: Dict, pdf_text: str = "") -> bool:
         """Save extracted data to database using schema mapping"""
         try:
@@ -843,28 +917,15 @@ RESPOND WITH ONLY THE JSON OBJECT:"""
         try:
             # Extract text from PDF with PyMuPDF
             print(f"Extracting text from PDF with schema-driven processor: {pdf_path}")
-            with fitz.open(pdf_path) as doc:
-                # Get total pages for logging
-                total_pages = len(doc)
-                text_content = ""
-                
-                for page_num, page in enumerate(doc, 1):
-                    # Extract text with PyMuPDF
-                    page_text = page.get_text()
-                    if page_text:
-                        # Add page number for better traceability
-                        text_content += f"--- Page {page_num}/{total_pages} ---\n{page_text}\n\n"
+            extraction = get_pdf_text_cache(self.db_path).extract(pdf_path, ENGINE_PYMUPDF)
+            text_content = extraction.paged_text()
             
             if not text_content.strip():
                 return {"success": False, "error": "No text extracted from PDF"}
             
             print(f"Extracted {len(text_content)} characters from PDF")
             
-            # Check content length - limit to 20KB for safety
-            if len(text_content) > 20000:
-                print(f"WARNING: PDF content is {len(text_content)} chars, truncating to 20000")
-                text_content = text_content[:20000] + "\n[CONTENT TRUNCATED]"
-            
+            # Long invoices are chunked by extract_invoice_data_with_schema, so no truncation here
             # Extract data using schema
             extraction_result = self.extract_invoice_data_with_schema(text_content)
             
@@ -883,7 +944,9 @@ RESPOND WITH ONLY THE JSON OBJECT:"""
                     "invoice_no": invoice_no,
                     "confidence": extraction_result.get('confidence', 0.0),
                     "line_items_count": len(extraction_result['data']['billing_line_items']),
-                    "processing_notes": extraction_result.get('processing_notes', '')
+                    "processing_notes": extraction_result.get('processing_notes', ''),
+                    "text_cache_hit": extraction.cache_hit,
+                    "llm_cache_hit": extraction_result.get('llm_cache_hit', False)
                 }
             else:
                 return {"success": False, "error": "Failed to save to database"}
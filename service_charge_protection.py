@@ -7,11 +7,38 @@ This script ensures that enhanced service charges (with product descriptions,
 demerging logic, etc.) are preserved when uploading new rate cards.
 
 It automatically detects and restores enhanced service charges that may have
-been overwritten by basic Excel uploads.
+been overwritten by basic Excel uploads. Reloads through a shadow table can
+use enhanced_service_charge_checks() to be rejected before they go live.
 """
 
 import sqlite3
 from datetime import datetime
+from typing import List
+
+from rate_card_swap import ShadowCheck
+
+# Fewer enhanced or demerged entries than this means they were overwritten
+MIN_ENHANCED_CHARGES = 10
+MIN_DEMERGED_CHARGES = 3
+
+# Conditions of the enhanced and the demerged entries
+ENHANCED_CONDITION = "products_applicable IS NOT NULL AND products_applicable != ''"
+DEMERGED_CONDITION = "original_service_code IS NOT NULL AND original_service_code != ''"
+
+def enhanced_service_charge_checks(cursor) -> List[ShadowCheck]:
+    """
+    Pre-swap checks that a dhl_express_services_surcharges reload kept the
+    enhanced and demerged entries: as many as the live table has, up to the
+    protection thresholds
+    """
+    checks = []
+    for description, condition, threshold in (
+        ('Service charges enhanced with products', ENHANCED_CONDITION, MIN_ENHANCED_CHARGES),
+        ('Demerged service charge variants', DEMERGED_CONDITION, MIN_DEMERGED_CHARGES)
+    ):
+        cursor.execute(f'SELECT COUNT(*) FROM dhl_express_services_surcharges WHERE {condition}')
+        checks.append(ShadowCheck(description, condition, min_rows=min(threshold, cursor.fetchone()[0])))
+    return checks
 
 def protect_enhanced_service_charges():
     """Ensure enhanced service charges are preserved during uploads"""
@@ -57,7 +84,7 @@ def protect_enhanced_service_charges():
         print(f"   {entry[0]}: Products={products} | Original={original}")
     
     # If we have fewer than expected enhanced entries, restore them
-    if enhanced_charges < 10 or demerged_charges < 3:
+    if enhanced_charges < MIN_ENHANCED_CHARGES or demerged_charges < MIN_DEMERGED_CHARGES:
         print(f"\n⚠️  INSUFFICIENT ENHANCED ENTRIES DETECTED")
         print(f"   Expected: >10 enhanced, >3 demerged")
         print(f"   Found: {enhanced_charges} enhanced, {demerged_charges} demerged")
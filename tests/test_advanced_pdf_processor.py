@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from advanced_pdf_processor import AdvancedPDFProcessor
+
+
+class InvoiceNumberFromPagesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.processor = AdvancedPDFProcessor(os.path.join(self.tmp.name, 'audit.db'),
+                                              os.path.join(self.tmp.name, 'uploads'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pattern_priority_matches_whole_text(self):
+        pages = ['Bill No: B1111111\nCharges', 'Invoice No: D2222222\nTotal']
+        self.assertEqual(self.processor.parse_invoice_number_from_pages(pages), 'D2222222')
+        self.assertEqual(self.processor.parse_invoice_number_from_pages(pages),
+                         self.processor.parse_invoice_number('\n'.join(pages)))
+
+    def test_stops_at_first_priority_match(self):
+        read = []
+
+        def pages():
+            for page in ['Invoice No: D1234567', 'Invoice No: D7654321']:
+                read.append(page)
+                yield page
+
+        self.assertEqual(self.processor.parse_invoice_number_from_pages(pages()), 'D1234567')
+        self.assertEqual(len(read), 1)
+
+    def test_lower_priority_pattern(self):
+        self.assertEqual(self.processor.parse_invoice_number_from_pages(['Charges', 'Document No: X9999999']),
+                         'X9999999')
+
+
+class PagedExtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.processor = AdvancedPDFProcessor(os.path.join(self.tmp.name, 'audit.db'),
+                                              os.path.join(self.tmp.name, 'uploads'))
+        filler = '\n'.join(f'Narrative line {n} without amounts' for n in range(20))
+        self.pages = [
+            'Invoice No: D1234567\nFreight charges: $1,234.50\n' + filler + '\nFuel surcharge -',
+            '88.10\n' + filler + '\nStorage | 12.00\nMAWB: 12345678',
+            'Origin: SYD\nTotal AUD 1,500.00',
+        ]
+        self.text = ''.join(page + '\n' for page in self.pages)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_charges_match_joined_text(self):
+        charges = self.processor.extract_charges_from_pages(self.pages)
+        self.assertEqual(charges, self.processor.extract_charges_with_descriptions(self.text))
+        self.assertIn('Fuel surcharge', [charge['description'] for charge in charges])
+
+    def test_references_and_total_match_joined_text(self):
+        self.assertEqual(self.processor.extract_shipment_references_from_pages(self.pages),
+                         self.processor.extract_shipment_references(self.text))
+        self.assertEqual(self.processor.extract_total_amount_from_pages(self.pages), (1500.0, 'AUD'))
+
+    def test_match_across_page_break(self):
+        pages = ['Charges\n' + 'x' * 500 + '\nInvoice Number:', 'D7654321\nTotal 10.00']
+        self.assertEqual(self.processor.parse_invoice_number_from_pages(pages), 'D7654321')
+
+
+if __name__ == '__main__':
+    unittest.main()
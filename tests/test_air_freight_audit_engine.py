@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from air_freight_audit_engine import get_air_rate_card_index, invalidate_air_rate_card_index
+from rate_card_versions import bump_rate_card_version
+
+
+class AirRateCardIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'audit.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript('''
+            CREATE TABLE air_rate_cards (id INTEGER PRIMARY KEY, card_name TEXT,
+                                         validity_start TEXT, validity_end TEXT);
+            CREATE TABLE air_rate_entries (id INTEGER PRIMARY KEY, rate_card_id INTEGER, lane_id TEXT,
+                                           origin_port_code TEXT, destination_port_code TEXT);
+            INSERT INTO air_rate_cards VALUES (1, 'Card', '2025-01-01', '2025-12-31');
+            INSERT INTO air_rate_entries VALUES (1, 1, 'L1', 'SYD', 'LAX');
+        ''')
+        conn.close()
+
+    def tearDown(self):
+        invalidate_air_rate_card_index(self.db_path)
+        self.tmp.cleanup()
+
+    def test_index_reused_until_rate_cards_reloaded(self):
+        index = get_air_rate_card_index(self.db_path)
+        self.assertEqual(list(index), [('SYD', 'LAX')])
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO air_rate_entries VALUES (2, 1, 'L2', 'MEL', 'HKG')")
+        conn.commit()
+        self.assertIs(get_air_rate_card_index(self.db_path), index)
+
+        bump_rate_card_version(conn.cursor(), 'air_rate_cards', 'test')
+        conn.commit()
+        conn.close()
+        self.assertEqual(sorted(get_air_rate_card_index(self.db_path)), [('MEL', 'HKG'), ('SYD', 'LAX')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import charge_model_registry
+from charge_model_registry import (ChargeModelRegistry, MODEL_KIND_LINEAR, MODEL_KIND_ONLINE,
+                                   create_classifier, create_vectorizer)
+
+
+class MissingModelsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = ChargeModelRegistry(os.path.join(self.tmp.name, 'ml_models'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_missing_kind_is_not_reloaded(self):
+        with mock.patch.object(charge_model_registry, 'load_artifact',
+                               side_effect=FileNotFoundError) as load:
+            self.assertIsNone(self.registry.get(MODEL_KIND_LINEAR))
+            self.assertIsNone(self.registry.get(MODEL_KIND_LINEAR))
+        self.assertEqual(load.call_count, 1)
+        self.assertTrue(self.registry.is_missing(MODEL_KIND_LINEAR))
+
+    def test_missing_mark_expires(self):
+        self.assertIsNone(self.registry.get(MODEL_KIND_LINEAR))
+        expired = time.monotonic() + charge_model_registry.MISSING_RETRY_SECONDS + 1
+        with mock.patch.object(charge_model_registry.time, 'monotonic', return_value=expired):
+            self.assertFalse(self.registry.is_missing(MODEL_KIND_LINEAR))
+
+    def test_put_clears_only_trained_kinds(self):
+        self.assertIsNone(self.registry.get(MODEL_KIND_LINEAR))
+        self.assertIsNone(self.registry.get(MODEL_KIND_ONLINE))
+
+        vectorizer = create_vectorizer()
+        X = vectorizer.fit_transform(['fuel surcharge', 'freight charges', 'customs clearance'])
+        classifier = create_classifier(MODEL_KIND_LINEAR).fit(X, ['fuel', 'freight', 'customs'])
+        self.registry.put(vectorizer, {MODEL_KIND_LINEAR: classifier})
+
+        self.assertIsNotNone(self.registry.get(MODEL_KIND_LINEAR))
+        self.assertTrue(self.registry.is_missing(MODEL_KIND_ONLINE))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import sqlite3
+
+from dhl_express_csv_loader import CSV_COLUMNS, DHLExpressCSVLoader
+
+
+def invoice_row(invoice_no, fields):
+    """A CSV row of the first `fields` columns of a DHL Express invoice line"""
+    cells = [invoice_no, '01/07/2025', 'Acme', '123456', '1', 'ITEM', 'EXPRESS WORLDWIDE', '0',
+             '100.50', '90', '0', '', '0', '', f'AWB{invoice_no}', '2.5', 'REF', '30/06/2025',
+             'SYD', 'LAX', 'Sender;AU', 'Receiver;US', 'extra', 'extra']
+    return ','.join(cells[:fields])
+
+
+def write_csv(path, rows):
+    path.write_text('\n'.join(rows) + '\n', encoding='utf-8')
+    return path
+
+
+def test_read_csv_pads_short_rows_and_cuts_long_rows(tmp_path):
+    csv_path = write_csv(tmp_path / 'short.csv', [
+        invoice_row('INV5', 5), invoice_row('INV20', 20), invoice_row('INV21', 21),
+        invoice_row('INV22', 22), invoice_row('INV24', 24)
+    ])
+
+    frame, first_row_number = DHLExpressCSVLoader(str(tmp_path / 'audit.db')).read_csv(csv_path)
+
+    assert first_row_number == 1
+    assert list(frame.columns) == CSV_COLUMNS
+    assert frame['invoice_no'].tolist() == ['INV5', 'INV20', 'INV21', 'INV22', 'INV24']
+    assert frame.loc[0, 'line_number'] == '1'
+    assert frame.loc[0, 'awb_number'] == ''
+    assert frame.loc[1, 'destination_code'] == 'LAX'
+    assert frame.loc[1, 'shipper_details'] == ''
+    assert frame.loc[2, 'shipper_details'] == 'Sender;AU'
+    assert frame.loc[2, 'receiver_details'] == ''
+    assert frame.loc[4, 'receiver_details'] == 'Receiver;US'
+
+
+def test_load_accepts_short_rows(tmp_path):
+    db_path = str(tmp_path / 'audit.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE dhl_express_invoices (id INTEGER PRIMARY KEY, {', '.join(CSV_COLUMNS)})")
+    conn.commit()
+    conn.close()
+    csv_path = write_csv(tmp_path / 'short.csv', [
+        invoice_row('INV5', 5), invoice_row('INV20', 20), invoice_row('INV21', 21)
+    ])
+
+    result = DHLExpressCSVLoader(db_path).load(str(csv_path))
+
+    assert result['success'], result
+    assert result['total_records'] == 3
+    assert result['inserted_records'] == 3
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT invoice_no, amount, awb_number FROM dhl_express_invoices ORDER BY id').fetchall()
+    conn.close()
+    assert rows == [('INV5', 0.0, ''), ('INV20', 100.5, 'AWBINV20'), ('INV21', 100.5, 'AWBINV21')]
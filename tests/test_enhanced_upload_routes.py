@@ -0,0 +1,40 @@
+import io
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+
+from enhanced_upload_routes import enhanced_upload_file
+
+
+class EnhancedUploadCleanupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        # Uploads and the audit database are relative to the working directory
+        os.chdir(self.tmp.name)
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        app.add_url_rule('/upload', view_func=enhanced_upload_file, methods=['GET', 'POST'])
+        self.client = app.test_client()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def upload(self, content: bytes):
+        return self.client.post('/upload', data={'file': (io.BytesIO(content), 'invoice.edi')},
+                                content_type='multipart/form-data')
+
+    def saved_uploads(self):
+        return os.listdir('uploads') if os.path.isdir('uploads') else []
+
+    def test_undecodable_upload_is_removed(self):
+        response = self.upload(b'ISA*00*~ST*210*0001~B3*\xff\xfe*INV1~SE*3*0001~')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.saved_uploads(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+
+from invoice_fast_path import FastPathExtractor, get_extraction_tier_log
+
+
+class NormalizeDateTest(unittest.TestCase):
+    def test_dates_match_llm_format(self):
+        for raw in ('01-Jul-2025', '01 Jul 2025', '01/Jul/25', '01/07/2025', '2025-07-01', '01-JUL-25'):
+            self.assertEqual(FastPathExtractor._normalize_date(raw), '01-Jul-25', raw)
+
+    def test_unparseable_date_kept(self):
+        self.assertEqual(FastPathExtractor._normalize_date('31/02/2025'), '31/02/2025')
+
+    def test_extract_normalizes_invoice_date(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            extractor = FastPathExtractor(os.path.join(tmp, 'audit.db'))
+            data = extractor.extract('Invoice Date: 15/08/2025\nTotal AUD 100.00')
+            self.assertEqual(data['invoice_date'], '15-Aug-25')
+
+
+class TierLogTest(unittest.TestCase):
+    def test_tier_log_shared_per_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'audit.db')
+            self.assertIs(get_extraction_tier_log(db_path), get_extraction_tier_log(db_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
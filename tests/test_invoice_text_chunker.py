@@ -0,0 +1,42 @@
+from invoice_text_chunker import BOILERPLATE_MIN_DOCUMENTS, BoilerplateFilter
+
+LABELS = ['Invoice Number', 'Bill To', 'Ship To', 'Description Quantity Unit Price Amount', 'Total']
+FOOTER = [
+    'All business is subject to our Standard Trading Conditions',
+    'Bank: Commonwealth Bank of Australia',
+    'Email: accounts@example.com'
+]
+
+
+def invoice_text(number):
+    """Labels, values that change per invoice, then the same footer"""
+    return '\n'.join([
+        'Invoice Number', f'INV-{number:05d}',
+        'Bill To', f'Customer {chr(65 + number % 26)} Pty Ltd',
+        'Ship To', 'Warehouse',
+        'Description Quantity Unit Price Amount', f'Freight 1 {number}.00 {number}.00',
+        'Total', f'{number}.00',
+        *FOOTER
+    ])
+
+
+def test_field_labels_survive_footer_is_stripped(tmp_path):
+    boilerplate_filter = BoilerplateFilter(str(tmp_path / 'audit.db'))
+    for number in range(BOILERPLATE_MIN_DOCUMENTS + 5):
+        boilerplate_filter.observe(invoice_text(number))
+
+    stripped = boilerplate_filter.strip(invoice_text(999)).split('\n')
+
+    for label in LABELS:
+        assert label in stripped
+    assert 'INV-00999' in stripped
+    for line in FOOTER:
+        assert line not in stripped
+
+
+def test_nothing_is_stripped_before_enough_invoices(tmp_path):
+    boilerplate_filter = BoilerplateFilter(str(tmp_path / 'audit.db'))
+    for number in range(BOILERPLATE_MIN_DOCUMENTS - 1):
+        boilerplate_filter.observe(invoice_text(number))
+
+    assert boilerplate_filter.strip(invoice_text(999)) == invoice_text(999)
@@ -0,0 +1,71 @@
+import sqlite3
+
+from ocean_freight_audit_engine import OceanFreightAuditEngine
+from ocean_lane_index import RATE_CARD_COLUMNS, get_lane_index
+
+ORIGIN = 'Shanghai Yangshan Deep Water Port Terminal 4'
+DESTINATION = 'Los Angeles'
+DECOYS = 60
+
+
+def rate_card_db(tmp_path):
+    """
+    Decoy cards share most trigrams with the origin but fail the fuzzy
+    scorer; the one matching card ('Shanghai', contained in the origin)
+    shares few trigrams with it.
+    """
+    db_path = str(tmp_path / 'ocean.db')
+    columns = [column.strip() for column in RATE_CARD_COLUMNS.split(',')]
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE ocean_rate_cards ({', '.join(columns)})")
+    rows = [
+        (card_id, f'Decoy {card_id}', 'Terminal 4 Port Water Deep Yangshan', DESTINATION, 'FCL',
+         None, None, None, None, None, None, f'2025-01-{card_id % 28 + 1:02d}', None, None)
+        for card_id in range(1, DECOYS + 1)
+    ]
+    rows.append((DECOYS + 1, 'Shanghai - Los Angeles', 'Shanghai', DESTINATION, 'FCL',
+                 None, None, None, None, None, None, '2024-12-01', None, None))
+    conn.executemany(f"INSERT INTO ocean_rate_cards VALUES ({', '.join(['?'] * len(columns))})", rows)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_best_match_with_low_trigram_overlap_is_found(tmp_path):
+    engine = OceanFreightAuditEngine(rate_card_db(tmp_path))
+
+    matches = engine.find_matching_rate_cards(ORIGIN, DESTINATION, 'FCL')
+
+    full_scan = [engine._score_rate_card(card, ORIGIN, DESTINATION, 'FCL')
+                 for card in get_lane_index(engine.db_path).rate_cards]
+    full_scan = sorted((match for match in full_scan if match), key=lambda m: m['match_score'], reverse=True)
+    assert [m['rate_card_id'] for m in matches] == [m['rate_card_id'] for m in full_scan] == [DECOYS + 1]
+
+
+def test_top_k_is_opt_in(tmp_path):
+    db_path = rate_card_db(tmp_path)
+    lane_index = get_lane_index(db_path)
+
+    every_candidate = lane_index.candidate_positions(ORIGIN, DESTINATION, 'FCL')
+    pre_ranked = lane_index.candidate_positions(ORIGIN, DESTINATION, 'FCL', top_k=50)
+
+    assert len(every_candidate) == DECOYS + 1
+    # The trigram pre-ranking keeps the decoys and cuts the real match
+    best_position = next(position for position, card in enumerate(lane_index.rate_cards) if card[0] == DECOYS + 1)
+    assert best_position in every_candidate
+    assert best_position not in pre_ranked
+
+
+def test_rate_cards_checked_counts_scored_cards(tmp_path):
+    engine = OceanFreightAuditEngine(rate_card_db(tmp_path))
+    engine.lane_index_top_k = 10
+
+    matches, rate_cards_checked = engine._match_rate_cards(ORIGIN, DESTINATION, 'FCL')
+
+    assert rate_cards_checked == 10
+    assert len(matches) <= rate_cards_checked
+
+    result = {'invoice_no': 'X1', 'audit_status': 'approved',
+              'rate_card_info': {'rate_cards_found': 1, 'rate_cards_checked': DECOYS + 1}}
+    row = engine._audit_result_row(result)
+    assert row[7:9] == (DECOYS + 1, 1)
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ollama_scheduler import AdaptiveConcurrencyLimiter, LLMRequest, OllamaHTTPError, OllamaScheduler
+
+
+class StubGenerateHandler(BaseHTTPRequestHandler):
+    """/api/generate stub: streams the prompt's words as NDJSON chunks, HTTP 500 for 'fail' prompts"""
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if payload['prompt'].startswith('fail'):
+                self.send_response(500)
+                self.end_headers()
+                self.wfile.write(b'model crashed')
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            words = payload['prompt'].split(' ')
+            for position, word in enumerate(words):
+                text = word if position == 0 else ' ' + word
+                self.wfile.write(json.dumps({'response': text, 'done': False}).encode() + b'\n')
+                self.wfile.flush()
+            self.wfile.write(json.dumps({'response': '', 'done': True, 'eval_count': len(words)}).encode() + b'\n')
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OllamaSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGenerateHandler)
+        self.server.lock = threading.Lock()
+        self.server.in_flight = 0
+        self.server.peak_in_flight = 0
+        self.server.delay = 0.05
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_batch(self, scheduler, prompts):
+        requests = [LLMRequest(position, 'stub', prompt, {}) for position, prompt in enumerate(prompts)]
+        return scheduler.run_batch(requests, lambda request, text, error, latency: (request.key, text, error))
+
+    def test_results_in_input_order_within_parallel_limit(self):
+        scheduler = OllamaScheduler(self.url, max_parallel=3)
+        prompts = [f'invoice {n} extracted with streamed chunks' for n in range(12)]
+
+        results = self.run_batch(scheduler, prompts)
+
+        self.assertEqual([key for key, _, _ in results], list(range(12)))
+        self.assertEqual([text for _, text, _ in results], prompts)
+        self.assertTrue(all(error is None for _, _, error in results))
+        self.assertLessEqual(self.server.peak_in_flight, 3)
+        self.assertGreater(self.server.peak_in_flight, 1)
+        self.assertLessEqual(scheduler.get_stats()['peak_in_flight'], 3)
+
+    def test_http_500_halves_limit_and_surfaces_as_error(self):
+        scheduler = OllamaScheduler(self.url, max_parallel=4)
+
+        [(_, text, error)] = self.run_batch(scheduler, ['fail this one'])
+
+        self.assertIsNone(text)
+        self.assertIsInstance(error, OllamaHTTPError)
+        self.assertEqual(error.status_code, 500)
+        self.assertEqual(scheduler.get_stats()['final_limit'], 2)
+        self.assertEqual(scheduler.get_stats()['errors'], 1)
+
+    def test_limiter_halves_on_failure(self):
+        limiter = AdaptiveConcurrencyLimiter(8)
+        limiter.observe(1.0, ok=False)
+        self.assertEqual(limiter.limit, 4)
+        limiter.observe(1.0, ok=False)
+        self.assertEqual(limiter.limit, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
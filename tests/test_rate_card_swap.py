@@ -0,0 +1,29 @@
+import sqlite3
+
+from rate_card_swap import ShadowTableSwap
+
+TABLE = 'dhl_express_services_surcharges'
+
+
+def test_swap_backup_leaves_table_backup_name_free(tmp_path):
+    db_path = str(tmp_path / 'audit.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute(f'CREATE TABLE {TABLE} (service_code TEXT, charge_amount REAL)')
+    conn.execute(f"INSERT INTO {TABLE} VALUES ('YY', 150)")
+    conn.commit()
+    conn.close()
+
+    swap = ShadowTableSwap(db_path, TABLE)
+    swap.create_shadow(copy_where='1=1')
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"UPDATE {swap.shadow_table} SET charge_amount = 160")
+    conn.commit()
+    conn.close()
+    swap.swap()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(f'SELECT charge_amount FROM {TABLE}').fetchall() == [(160,)]
+    assert conn.execute(f'SELECT charge_amount FROM {swap.backup_table}').fetchall() == [(150,)]
+    # restore_enhanced_service_charges renames the live table to <table>_backup
+    conn.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_backup')
+    conn.close()
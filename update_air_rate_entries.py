@@ -1,5 +1,7 @@
 import sqlite3
 
+from rate_card_versions import bump_rate_card_version
+
 def update_air_rate_entries(db_path="dhl_audit.db"):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -29,6 +31,8 @@ def update_air_rate_entries(db_path="dhl_audit.db"):
         WHERE {destination_country_col} IS NOT NULL AND {destination_port_code_col} IS NOT NULL
     """)
 
+    # Air audits key their cached rate card index on the air_rate_cards version
+    bump_rate_card_version(cursor, 'air_rate_cards', 'update_air_rate_entries.py')
     conn.commit()
     conn.close()
 
@@ -4,6 +4,8 @@ import sqlite3
 import sys
 from datetime import datetime
 
+from rate_card_versions import bump_rate_card_version
+
 def create_complete_fedex_rate_cards():
     """
     Create complete FedEx rate cards for all three service types:
@@ -277,6 +279,7 @@ def create_complete_fedex_rate_cards():
         print(f"✅ Created {service_type} rates")
         
         # Commit changes
+        bump_rate_card_version(cursor, 'fedex_rate_cards', 'update_fedex_rate_cards_complete')
         conn.commit()
         
         # Get final count
@@ -1,5 +1,7 @@
 import sqlite3
 
+from rate_card_versions import bump_rate_card_version
+
 # Update rate cards with more accurate data
 conn = sqlite3.connect('fedex_audit.db')
 cursor = conn.cursor()
@@ -94,6 +96,7 @@ for rate in additional_rates:
     cursor.execute('''INSERT OR REPLACE INTO fedex_rate_cards 
         (service_type, zone, weight_kg, rate_usd, fuel_surcharge_rate) VALUES (?, ?, ?, ?, ?)''', rate)
 
+bump_rate_card_version(cursor, 'fedex_rate_cards', 'update_fedex_rates')
 conn.commit()
 conn.close()
 
@@ -4,6 +4,7 @@
 import pandas as pd
 import sqlite3
 from datetime import datetime
+from rate_card_versions import bump_rate_card_version
 
 def update_import_rates():
     """Load Import rates from Excel and update the database"""
@@ -91,6 +92,7 @@ def update_import_rates():
             
             inserted_count += 1
         
+        bump_rate_card_version(cursor, 'dhl_express_rate_cards', 'update_import_rates')
         conn.commit()
         print(f"Successfully inserted {inserted_count} rate card entries")
         
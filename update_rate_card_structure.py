@@ -5,6 +5,7 @@ This script updates the rate card table to support both Export (9 zones) and Imp
 """
 
 import sqlite3
+from rate_card_versions import bump_rate_card_version
 
 def update_rate_card_structure():
     """Update the rate card table structure to support 19 zones"""
@@ -66,6 +67,7 @@ def update_rate_card_structure():
             ON dhl_express_rate_cards(weight_from, weight_to)
         ''')
         
+        bump_rate_card_version(cursor, 'dhl_express_rate_cards', 'update_rate_card_structure')
         conn.commit()
         print("4. Table structure updated successfully!")
         
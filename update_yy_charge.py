@@ -1,4 +1,5 @@
 import sqlite3
+from rate_card_versions import bump_rate_card_version
 conn = sqlite3.connect('dhl_audit.db')
 cursor = conn.cursor()
 
@@ -9,6 +10,7 @@ cursor.execute('''
     WHERE service_code = "YY"
 ''')
 
+bump_rate_card_version(cursor, 'dhl_express_services_surcharges', 'update_yy_charge')
 conn.commit()
 print('Updated YY (OVERWEIGHT PIECE) charge amount to $160.00')
 
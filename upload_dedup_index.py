@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Upload Dedup Index
+Shared duplicate detection for invoice uploads: SHA-256 of every ingested file,
+a (carrier, invoice_no, awb, line) fingerprint per ingested row, and an
+in-memory Bloom filter over the fingerprints so most rows are accepted as new
+without a database lookup
+"""
+
+import math
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+CARRIER_EDI = 'edi'
+CARRIER_DHL_YTD = 'dhl_ytd'
+CARRIER_DHL_EXPRESS = 'dhl_express'
+
+# False positive rate of each Bloom filter; a false positive costs one SELECT
+DEFAULT_ERROR_RATE = 0.01
+# Smallest filter allocated, so a fresh database does not grow filters right away
+MIN_FILTER_CAPACITY = 100000
+# Keys hashed per array operation in the batch Bloom methods (bounds the position arrays)
+BLOOM_BATCH_SIZE = 100000
+
+RowKey = Tuple[str, str, str, str]
+
+
+class DedupSource(NamedTuple):
+    """Carrier table a row fingerprint stands for, and the columns identifying a row"""
+    table: str
+    invoice_column: str
+    awb_column: Optional[str] = None
+    line_column: Optional[str] = None
+
+
+# Key columns follow each table's uniqueness: one row per invoice for EDI and YTD,
+# one row per invoice line for DHL Express
+DEDUP_SOURCES = {
+    CARRIER_EDI: DedupSource('invoices', 'invoice_number'),
+    CARRIER_DHL_YTD: DedupSource('dhl_ytd_invoices', 'invoice_no'),
+    CARRIER_DHL_EXPRESS: DedupSource('dhl_express_invoices', 'invoice_no', 'awb_number', 'line_number'),
+}
+
+
+def row_key(carrier: str, invoice_no, awb=None, line=None) -> RowKey:
+    """Normalized fingerprint of a row ('' for missing parts)"""
+    return (carrier,
+            str(invoice_no).strip() if invoice_no is not None else '',
+            str(awb).strip() if awb is not None else '',
+            str(line).strip() if line is not None else '')
+
+
+def row_keys(carrier: str, invoice_nos: Iterable, awbs: Optional[Iterable] = None,
+             lines: Optional[Iterable] = None) -> List[RowKey]:
+    """row_key over columns of values (loaders that work on whole columns)"""
+    def normalize(values):
+        return ['' if value is None else str(value).strip() for value in values]
+
+    invoice_nos = normalize(invoice_nos)
+    awbs = normalize(awbs) if awbs is not None else [''] * len(invoice_nos)
+    lines = normalize(lines) if lines is not None else [''] * len(invoice_nos)
+    return list(zip([carrier] * len(invoice_nos), invoice_nos, awbs, lines))
+
+
+def key_hashes(keys: List[RowKey]) -> np.ndarray:
+    """Built-in hashes of keys as unsigned 64-bit integers, for the batch Bloom methods"""
+    return np.fromiter((hash(key) & 0xFFFFFFFFFFFFFFFF for key in keys), dtype=np.uint64, count=len(keys))
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over row keys. Filters live in one process only, so
+    the key's built-in hash is used (double hashing of its two 32-bit halves).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: RowKey):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add(self, key: RowKey):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: RowKey) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def _positions_many(self, hashes: np.ndarray) -> np.ndarray:
+        """_positions for an array of key hashes, one row of positions per key"""
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.hash_count, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.size)
+
+    def add_many(self, hashes: np.ndarray):
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        for start in range(0, len(hashes), BLOOM_BATCH_SIZE):
+            positions = self._positions_many(hashes[start:start + BLOOM_BATCH_SIZE]).ravel()
+            np.bitwise_or.at(bits, positions >> np.uint64(3),
+                             np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+        self.count += len(hashes)
+
+    def contains_many(self, hashes: np.ndarray) -> np.ndarray:
+        """Boolean array: the `in` test for each key hash"""
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        found = np.empty(len(hashes), dtype=bool)
+        for start in range(0, len(hashes), BLOOM_BATCH_SIZE):
+            positions = self._positions_many(hashes[start:start + BLOOM_BATCH_SIZE])
+            set_bits = (bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+            found[start:start + BLOOM_BATCH_SIZE] = set_bits.all(axis=1)
+        return found
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class UploadDedupIndex:
+    """
+    File hashes and row fingerprints of ingested uploads.
+
+    Known file hashes are held in a set, so a re-upload is recognised without a
+    query. Row fingerprints go into Bloom filters (a new, larger filter is added
+    when the current one fills up); only a possible hit is confirmed with a
+    SELECT on the carrier table, which stays the source of truth, so rows
+    removed by the clear scripts can be loaded again.
+    """
+
+    def __init__(self, db_path: str = 'dhl_audit.db', error_rate: float = DEFAULT_ERROR_RATE):
+        self.db_path = db_path
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._filters: List[BloomFilter] = []
+        self._file_hashes: Dict[str, str] = {}
+        self._last_fingerprint_id = 0
+        self._last_file_id = 0
+        self.stats = {'rows_checked': 0, 'filter_hits': 0, 'confirmed_duplicates': 0,
+                      'files_checked': 0, 'duplicate_files': 0}
+        self.init_database()
+
+    def init_database(self):
+        """Create the file hash and row fingerprint tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upload_file_hashes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_hash TEXT UNIQUE NOT NULL,
+                carrier TEXT NOT NULL,
+                filename TEXT,
+                file_size INTEGER,
+                row_count INTEGER,
+                uploaded_at TEXT
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upload_row_fingerprints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                carrier TEXT NOT NULL,
+                invoice_no TEXT NOT NULL,
+                awb TEXT NOT NULL DEFAULT '',
+                line_key TEXT NOT NULL DEFAULT '',
+                file_hash TEXT,
+                created_at TEXT,
+                UNIQUE(carrier, invoice_no, awb, line_key)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_upload_row_fingerprints_file
+            ON upload_row_fingerprints(file_hash)
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def warm(self):
+        """
+        Fingerprint rows already in the carrier tables (loaded before this
+        index existed) and load all fingerprints and file hashes into memory
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            now = datetime.now().isoformat()
+            for carrier, source in DEDUP_SOURCES.items():
+                if source.table not in tables:
+                    continue
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO upload_row_fingerprints (carrier, invoice_no, awb, line_key, created_at)
+                    SELECT ?, TRIM({source.invoice_column}),
+                           {self._key_expression(source.awb_column)}, {self._key_expression(source.line_column)}, ?
+                    FROM {source.table}
+                    WHERE {source.invoice_column} IS NOT NULL
+                ''', (carrier, now))
+            conn.commit()
+
+            count = conn.execute('SELECT COUNT(*) FROM upload_row_fingerprints').fetchone()[0]
+            with self._lock:
+                self._filters = [BloomFilter(max(MIN_FILTER_CAPACITY, count * 2), self.error_rate)]
+                self._last_fingerprint_id = 0
+                self._last_file_id = 0
+                self._file_hashes = {}
+            self.sync(conn)
+        finally:
+            conn.close()
+
+        print(f"Upload dedup index warmed: {count} row fingerprints, {len(self._file_hashes)} files")
+
+    @staticmethod
+    def _key_expression(column: Optional[str]) -> str:
+        return f"COALESCE(TRIM(CAST({column} AS TEXT)), '')" if column else "''"
+
+    def sync(self, conn=None):
+        """Load fingerprints and file hashes written since the last sync (e.g. by another process)"""
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+        try:
+            with self._lock:
+                cursor = conn.execute('''
+                    SELECT id, carrier, invoice_no, awb, line_key FROM upload_row_fingerprints
+                    WHERE id > ? ORDER BY id
+                ''', (self._last_fingerprint_id,))
+                while True:
+                    rows = cursor.fetchmany(BLOOM_BATCH_SIZE)
+                    if not rows:
+                        break
+                    self._add_keys([tuple(row[1:]) for row in rows])
+                    self._last_fingerprint_id = rows[-1][0]
+
+                cursor = conn.execute('''
+                    SELECT id, file_hash, carrier FROM upload_file_hashes WHERE id > ? ORDER BY id
+                ''', (self._last_file_id,))
+                for file_id, file_hash, carrier in cursor:
+                    self._file_hashes[file_hash] = carrier
+                    self._last_file_id = file_id
+        finally:
+            if should_close:
+                conn.close()
+
+    def _add_keys(self, keys: List[RowKey]):
+        """Add to the newest filter, allocating a twice larger one when it is full (lock held)"""
+        hashes = key_hashes(keys)
+        start = 0
+        while start < len(hashes):
+            current = self._filters[-1]
+            if current.full:
+                current = BloomFilter(current.capacity * 2, self.error_rate)
+                self._filters.append(current)
+            room = current.capacity - current.count
+            current.add_many(hashes[start:start + room])
+            start += room
+
+    def might_contain(self, key: RowKey) -> bool:
+        """False means the row was never ingested; True needs confirming"""
+        with self._lock:
+            return any(key in bloom for bloom in self._filters)
+
+    def is_duplicate_row(self, carrier: str, invoice_no, awb=None, line=None, conn=None) -> bool:
+        """
+        True when the row is already in its carrier table. Pass the loader's
+        connection so rows inserted earlier in the same transaction are seen.
+        """
+        key = row_key(carrier, invoice_no, awb, line)
+        self.stats['rows_checked'] += 1
+        if not self.might_contain(key):
+            return False
+
+        self.stats['filter_hits'] += 1
+        if self._row_exists(key, conn):
+            self.stats['confirmed_duplicates'] += 1
+            return True
+        return False
+
+    def find_duplicates(self, keys: List[RowKey], conn=None) -> List[bool]:
+        """is_duplicate_row for many keys: one pass over the filters, a SELECT per possible hit"""
+        hashes = key_hashes(keys)
+        hits = np.zeros(len(keys), dtype=bool)
+        with self._lock:
+            for bloom in self._filters:
+                hits |= bloom.contains_many(hashes)
+        self.stats['rows_checked'] += len(keys)
+        self.stats['filter_hits'] += int(hits.sum())
+
+        duplicates = [bool(hit) and self._row_exists(key, conn) for key, hit in zip(keys, hits.tolist())]
+        self.stats['confirmed_duplicates'] += sum(duplicates)
+        return duplicates
+
+    def _row_exists(self, key: RowKey, conn=None) -> bool:
+        carrier, invoice_no, awb, line = key
+        source = DEDUP_SOURCES[carrier]
+        conditions = [f"{source.invoice_column} = ?"]
+        params = [invoice_no]
+        if source.awb_column:
+            conditions.append(f"COALESCE(TRIM(CAST({source.awb_column} AS TEXT)), '') = ?")
+            params.append(awb)
+        if source.line_column:
+            conditions.append(f"COALESCE(TRIM(CAST({source.line_column} AS TEXT)), '') = ?")
+            params.append(line)
+
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(f"SELECT 1 FROM {source.table} WHERE {' AND '.join(conditions)} LIMIT 1",
+                                  params)
+            return cursor.fetchone() is not None
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            if should_close:
+                conn.close()
+
+    def add_rows(self, keys: Iterable[RowKey], file_hash: Optional[str] = None, conn=None):
+        """
+        Fingerprint newly inserted rows, in the caller's transaction when conn is
+        given. Rolled back rows stay in the filters, where they only cost a
+        confirming SELECT.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        now = datetime.now().isoformat()
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+        try:
+            conn.executemany('''
+                INSERT INTO upload_row_fingerprints (carrier, invoice_no, awb, line_key, file_hash, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(carrier, invoice_no, awb, line_key) DO UPDATE SET file_hash = excluded.file_hash
+            ''', [key + (file_hash, now) for key in keys])
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+        with self._lock:
+            self._add_keys(keys)
+
+    def is_duplicate_file(self, file_hash: str) -> bool:
+        """
+        True when a file with this hash was ingested and its rows are still
+        loaded. A hash whose rows have since been cleared is forgotten.
+        """
+        self.stats['files_checked'] += 1
+        self.sync()
+        with self._lock:
+            carrier = self._file_hashes.get(file_hash)
+        if carrier is None:
+            return False
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute('''
+                SELECT carrier, invoice_no, awb, line_key FROM upload_row_fingerprints
+                WHERE file_hash = ? LIMIT 1
+            ''', (file_hash,))
+            row = cursor.fetchone()
+            if row is not None and self._row_exists(tuple(row), conn):
+                self.stats['duplicate_files'] += 1
+                return True
+
+            conn.execute('DELETE FROM upload_file_hashes WHERE file_hash = ?', (file_hash,))
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._file_hashes.pop(file_hash, None)
+        return False
+
+    def record_file(self, file_hash: str, carrier: str, filename: str = None,
+                    file_size: int = None, row_count: int = 0, conn=None):
+        """Remember an ingested file; files that inserted no rows are not recorded"""
+        if not row_count:
+            return
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO upload_file_hashes
+                (file_hash, carrier, filename, file_size, row_count, uploaded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (file_hash, carrier, filename, file_size, row_count, datetime.now().isoformat()))
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+        with self._lock:
+            self._file_hashes[file_hash] = carrier
+
+    def get_stats(self) -> Dict:
+        """Filter sizes and check counters of this process"""
+        with self._lock:
+            return {
+                **self.stats,
+                'fingerprints': sum(bloom.count for bloom in self._filters),
+                'filters': len(self._filters),
+                'filter_bytes': sum(len(bloom.bits) for bloom in self._filters),
+                'files': len(self._file_hashes),
+            }
+
+
+_indexes: Dict[str, UploadDedupIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_upload_dedup_index(db_path: str = 'dhl_audit.db') -> UploadDedupIndex:
+    """Return the shared, warmed index for a database"""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = UploadDedupIndex(db_path)
+            index.warm()
+            _indexes[db_path] = index
+        return index
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Upload Storage
+Streams uploaded request files to disk in one pass while hashing them, so an
+upload is never held in memory as a whole; parsers then read the saved file
+through a buffered reader or a memory map
+"""
+
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional
+
+# Bytes copied per read from the request stream
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeded the size limit while it was being saved"""
+    pass
+
+
+class SavedUpload(NamedTuple):
+    """An upload written to disk"""
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+
+def save_upload(file_obj, upload_folder: str, filename: str,
+                max_size: Optional[int] = None, chunk_size: int = UPLOAD_CHUNK_SIZE) -> SavedUpload:
+    """
+    Copy a Werkzeug FileStorage (or any binary file object) to
+    upload_folder/filename, updating the SHA-256 from the same buffer that is
+    written. Data goes to a .part file that is renamed when complete, so
+    readers never see a partial upload. Raises UploadTooLarge past max_size.
+    """
+    stream = getattr(file_obj, 'stream', file_obj)
+    os.makedirs(upload_folder, exist_ok=True)
+    path = os.path.join(upload_folder, filename)
+    part_path = f"{path}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    readinto = getattr(stream, 'readinto', None)
+
+    try:
+        with open(part_path, 'wb') as out:
+            while True:
+                if readinto is not None:
+                    n = readinto(buffer)
+                    chunk = view[:n] if n else None
+                else:
+                    chunk = stream.read(chunk_size)
+                    n = len(chunk) if chunk else 0
+                if not n:
+                    break
+                size += n
+                if max_size is not None and size > max_size:
+                    raise UploadTooLarge(f"File too large. Maximum size: {max_size / 1024 / 1024:.1f}MB")
+                digest.update(chunk)
+                out.write(chunk)
+        os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    return SavedUpload(path, filename, size, digest.hexdigest())
+
+
+@contextmanager
+def map_file(path: str) -> Iterator:
+    """Read-only memory map of a file (b'' for an empty file, which cannot be mapped)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def count_bytes(data, needle: bytes, chunk_size: int = UPLOAD_CHUNK_SIZE) -> int:
+    """Occurrences of a one-byte needle in a mapped file, counted a chunk at a time"""
+    return sum(data[start:start + chunk_size].count(needle) for start in range(0, len(data), chunk_size))
@@ -292,6 +292,44 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def save_audit_results(self, batch_run_id: int, results: List[Tuple]) -> bool:
+        """Save many audit results in a single transaction.
+        
+        Args:
+            batch_run_id: ID of the batch run.
+            results: Tuples of (invoice_no, status, transportation_mode,
+                invoice_amount, expected_amount, variance, variance_percent,
+                rate_cards_checked, matching_lanes, best_match_rate_card,
+                audit_details), as taken by save_audit_result.
+            
+        Returns:
+            True if save was successful, False otherwise.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        created_at = datetime.now()
+        
+        try:
+            cursor.executemany("""
+                INSERT INTO ytd_audit_results (
+                    batch_run_id, invoice_no, audit_status, transportation_mode,
+                    total_invoice_amount, total_expected_amount, total_variance,
+                    variance_percent, rate_cards_checked, matching_lanes,
+                    best_match_rate_card, audit_details, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (batch_run_id, *result[:10], json.dumps(result[10]), created_at)
+                for result in results
+            ])
+            
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error saving audit results: {e}")
+            return False
+        finally:
+            conn.close()
+    
     def save_error_result(self, batch_run_id: int, invoice_no: str, error_message: str) -> bool:
         """Save an error result to the database.
         